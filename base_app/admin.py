@@ -2,15 +2,28 @@ from django.contrib import admin
 from django.contrib import messages
 from django.template.response import TemplateResponse
 from django import forms
-from django.db.models import Avg, Count, Q
-from django.http import HttpResponse
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Sum
+from django.db.models.functions import Cast
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-import csv
 from .models import (
     Course, Group, Student, Topic, Task, AttendanceSession, Attendance, FollowUp,
-    OperatorProfile, CoinWallet, CoinTransaction,
+    OperatorProfile, CoinWallet, CoinTransaction, GradeAggregate,
 )
+from .csv_export import csv_response, keyset_chunks, keyset_iter
+from .grade_stats import apply_task_grade_change, apply_task_removal
+
+
+def _first_group_names(student_ids):
+    """{student_id: birinchi (eng kichik id li) guruh nomi} — student.groups.first() ning bulk varianti."""
+    names = {}
+    for student_id, group_name in (
+        Student.groups.through.objects.filter(student_id__in=student_ids)
+        .order_by('student_id', 'group_id')
+        .values_list('student_id', 'group__name')
+    ):
+        names.setdefault(student_id, group_name)
+    return names
 
 
 class CourseAdmin(admin.ModelAdmin):
@@ -64,79 +77,50 @@ class GroupAdmin(admin.ModelAdmin):
             self.message_user(request, "Hech qanday guruh tanlanmadi!", messages.ERROR)
             return
         
-        # Barcha tanlangan guruhlardagi studentlar
-        all_students_data = []
-        
-        for group in queryset:
-            # Student groups da shu guruhga tegishli bo'lishi mumkin
-            students = Student.objects.filter(Q(groups=group)).distinct()
-            
-            # Guruh course ga qarab task_type ni aniqlash
-            task_type = group.course.task_type if group.course else 'test'
-            
-            for student in students:
-                # Student barcha testlari yoki vazifalari
-                tasks = Task.objects.filter(
-                    student=student,
-                    task_type=task_type,
-                    grade__isnull=False
-                )
-                
-                if not tasks.exists():
-                    continue
-                
-                # O'rtacha ball
-                avg_grade = tasks.aggregate(avg=Avg('grade'))['avg']
-                total_tasks = tasks.count()
-                total_score = sum(task.grade for task in tasks)
-                
-                all_students_data.append({
-                    'student': student,
-                    'group': group,
-                    'avg_grade': round(avg_grade, 2) if avg_grade else 0,
-                    'total_tasks': total_tasks,
-                    'total_score': total_score,
-                })
-        
-        # O'rtacha ball bo'yicha kamayish tartibida
-        all_students_data.sort(key=lambda x: x['avg_grade'], reverse=True)
-        
-        # CSV yaratish
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        # Barcha tanlangan guruhlardagi studentlar — o'rtacha/jami ball tayyor
+        # GradeAggregate (student + kurs + task turi) qatorlaridan olinadi, Task'lar qayta
+        # yig'ilmaydi; guruh kursining task_type'idagi baholargina hisoblanadi.
+        # Student bir nechta guruhda bo'lsa — har guruh uchun alohida qator.
+        # Saralash DB'da, qatorlar chunk'lab o'qiladi va oqim bilan yuboriladi.
+        aggregates = (
+            GradeAggregate.objects
+            .filter(
+                student__groups__in=queryset,
+                student__groups__course_id=F('course_id'),
+                task_type=F('student__groups__course__task_type'),
+                submitted_count__gt=0,
+            )
+            .annotate(
+                group_id=F('student__groups__id'),
+                group_name=F('student__groups__name'),
+                avg=ExpressionWrapper(F('grade_sum') * 1.0 / F('submitted_count'), output_field=FloatField()),
+            )
+            .values('id', 'group_id', 'group_name', 'avg', 'student__full_name', 'submitted_count', 'grade_sum')
+        )
+        total = aggregates.count()
+
+        def rows():
+            # O'rtacha ball bo'yicha kamayish tartibida
+            for idx, data in enumerate(keyset_iter(aggregates, ('-avg', 'id', 'group_id')), start=1):
+                yield [
+                    idx,
+                    data['student__full_name'],
+                    data['group_name'],
+                    round(data['avg'], 2),
+                    data['submitted_count'],
+                    data['grade_sum'],
+                ]
+
         group_names = '_'.join([g.name.replace(' ', '_') for g in queryset[:3]])
-        filename = f'reyting_{group_names}.csv'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # UTF-8 BOM
-        response.write('\ufeff')
-        
-        writer = csv.writer(response)
-        
-        # Header
-        writer.writerow([
-            '№',
-            'F.I.Sh',
-            'Guruh',
-            "O'rtacha ball",
-            'Testlar soni',
-            'Jami ball'
-        ])
-        
-        # Ma'lumotlar
-        for idx, data in enumerate(all_students_data, start=1):
-            student = data['student']
-            writer.writerow([
-                idx,
-                student.full_name,
-                data['group'].name,
-                data['avg_grade'],
-                data['total_tasks'],
-                data['total_score'],
-            ])
-        
+        response = csv_response(
+            f'reyting_{group_names}.csv',
+            ['№', 'F.I.Sh', 'Guruh', "O'rtacha ball", 'Testlar soni', 'Jami ball'],
+            rows(),
+        )
+
         self.message_user(
             request,
-            f"✅ {len(all_students_data)} ta studentning reytingi eksport qilindi!",
+            f"✅ {total} ta studentning reytingi eksport qilindi!",
             messages.SUCCESS
         )
         
@@ -174,12 +158,14 @@ class TaskAdmin(admin.ModelAdmin):
     def delete_model(self, request, obj):
         from .coins import reverse_task_coins
         reverse_task_coins(obj)
+        apply_task_removal(obj)
         super().delete_model(request, obj)
 
     def delete_queryset(self, request, queryset):
         from .coins import reverse_task_coins
         for obj in queryset:
             reverse_task_coins(obj)
+            apply_task_removal(obj)
         super().delete_queryset(request, queryset)
 
     def add_custom_points_to_tests(self, request, queryset):
@@ -216,8 +202,10 @@ class TaskAdmin(admin.ModelAdmin):
                     new_grade = min(task.grade + points, max_grade)
                     
                     if new_grade != task.grade:
+                        old_grade = task.grade
                         task.grade = new_grade
                         task.save()
+                        apply_task_grade_change(task, old_grade)
                         updated_count += 1
                     else:
                         skipped_count += 1
@@ -270,8 +258,10 @@ class TaskAdmin(admin.ModelAdmin):
                     new_grade = max(task.grade - points, 0)
                     
                     if new_grade != task.grade:
+                        old_grade = task.grade
                         task.grade = new_grade
                         task.save()
+                        apply_task_grade_change(task, old_grade)
                         updated_count += 1
                     else:
                         skipped_count += 1
@@ -308,7 +298,25 @@ class TopicAdmin(admin.ModelAdmin):
     search_fields = ('title',)
     list_editable = ('show_detailed_results',)
     actions = ['export_detailed_rating_csv']
-    
+
+    def delete_queryset(self, request, queryset):
+        # queryset.delete() Topic.delete() ni chaqirmaydi — streak ketma-ketligi keshini shu yerda yangilaymiz
+        from django.db import transaction as db_transaction
+        from .coin_rollups import refresh_topic_rollups, topic_wallet_ids
+        from .coins import invalidate_course_topics
+        from .test_keys import owned_test_codes, reassign_test_keys
+        course_ids = set(queryset.values_list('course_id', flat=True))
+        activated_ats = set(queryset.values_list('activated_at', flat=True))
+        topic_ids = list(queryset.values_list('id', flat=True))
+        wallet_ids = topic_wallet_ids(topic_ids)
+        with db_transaction.atomic():
+            codes = owned_test_codes(topic_ids)
+            super().delete_queryset(request, queryset)
+            # O'chirilgan mavzularning kodlari shu kodga ega qolgan mavzuga o'tadi
+            reassign_test_keys(codes)
+        invalidate_course_topics(*course_ids)
+        refresh_topic_rollups(wallet_ids, *activated_ats)
+
     def export_detailed_rating_csv(self, request, queryset):
         """
         Tanlangan topiklar bo'yicha har bir topic uchun alohida natijalar va umumiy o'rtacha ball.
@@ -342,61 +350,14 @@ class TopicAdmin(admin.ModelAdmin):
         # Course dan task_type ni olish
         task_type = course.task_type
         
-        # OPTIMIZATSIYA: Barcha tasklarni bir marta olish
-        all_tasks = Task.objects.filter(
+        graded_tasks = Task.objects.filter(
             topic_id__in=topic_ids,
             task_type=task_type,
             grade__isnull=False
-        ).select_related('student').order_by('student_id', 'topic_id')
-        
-        # Tasklarni student va topic bo'yicha guruhlash
-        students_data = {}
-        
-        for task in all_tasks:
-            student_id = task.student.id
-            topic_id = task.topic_id
-
-            if student_id not in students_data:
-                students_data[student_id] = {
-                    'student': task.student,
-                    'topics': {},
-                    'total_score': 0,
-                    'total_tasks': 0,
-                }
-
-            # Har bir student+topic kombinatsiyasi uchun faqat birinchi taskni olish
-            if topic_id not in students_data[student_id]['topics']:
-                students_data[student_id]['topics'][topic_id] = {
-                    'grade': task.grade,
-                    'submitted_at': task.submitted_at,
-                }
-                students_data[student_id]['total_score'] += task.grade
-                students_data[student_id]['total_tasks'] += 1
-        
-        # Har bir studentga barcha topiklarni qo'shish (topshirmagan topiklar None bo'ladi)
-        total_topics_count = len(topic_ids)
-        for student_id in students_data:
-            for topic_id in topic_ids:
-                if topic_id not in students_data[student_id]['topics']:
-                    students_data[student_id]['topics'][topic_id] = None  # topshirmagan
-            
-            # O'rtacha ball - barcha active mavzular soniga bo'lish
-            if total_topics_count > 0:
-                students_data[student_id]['avg_grade'] = round(
-                    students_data[student_id]['total_score'] / total_topics_count, 2
-                )
-            else:
-                students_data[student_id]['avg_grade'] = 0
-        
-        # O'rtacha ball bo'yicha kamayish tartibida saralash
-        sorted_students = sorted(
-            students_data.values(),
-            key=lambda x: x['avg_grade'],
-            reverse=True
         )
-        
+
         # Agar hech qanday student topilmasa
-        if not sorted_students:
+        if not graded_tasks.exists():
             task_type_name = "maxsus topshiriq" if task_type == "assignment" else "test"
             self.message_user(
                 request,
@@ -404,18 +365,55 @@ class TopicAdmin(admin.ModelAdmin):
                 messages.WARNING
             )
             return
-        
-        # CSV yaratish
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        course_name = course.name.replace(' ', '_')
-        filename = f'reyting_detallari_{course_name}.csv'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # UTF-8 BOM
-        response.write('\ufeff')
-        
-        writer = csv.writer(response)
-        
+
+        # Student bo'yicha jami ball va topshiriqlar soni — DB'da. O'rtacha ball barcha
+        # tanlangan mavzular soniga bo'linadi, shuning uchun jami ball bo'yicha saralash yetarli
+        per_student = (
+            graded_tasks.values('student_id')
+            .annotate(total_score=Sum('grade'), total_tasks=Count('id'))
+        )
+        total_students = per_student.count()
+        total_topics_count = len(topic_ids)
+
+        def rows():
+            idx = 0
+            for chunk in keyset_chunks(per_student, ('-total_score', 'student_id')):
+                student_ids = [data['student_id'] for data in chunk]
+                names = dict(Student.objects.filter(id__in=student_ids).values_list('id', 'full_name'))
+                groups = _first_group_names(student_ids)
+                # Chunk studentlarining tanlangan topiklar bo'yicha tasklari
+                topic_grades = {}
+                for student_id, topic_id, grade, submitted in graded_tasks.filter(
+                    student_id__in=student_ids
+                ).values_list('student_id', 'topic_id', 'grade', 'submitted_at'):
+                    topic_grades.setdefault(student_id, {})[topic_id] = (grade, submitted)
+
+                for data in chunk:
+                    idx += 1
+                    student_id = data['student_id']
+                    row = [
+                        idx,
+                        names.get(student_id, ''),
+                        groups.get(student_id, "Yo'q"),
+                    ]
+
+                    # Har bir topic bo'yicha ball va vaqt
+                    grades = topic_grades.get(student_id, {})
+                    for topic_id in topic_ids:
+                        topic_data = grades.get(topic_id)
+                        if topic_data is None:
+                            row.append('-')
+                            row.append('-')
+                        else:
+                            grade, submitted = topic_data
+                            row.append(grade)
+                            row.append(submitted.strftime('%d.%m.%Y %H:%M') if submitted else '-')
+
+                    # O'rtacha ball - barcha tanlangan mavzular soniga bo'lish
+                    row.append(round(data['total_score'] / total_topics_count, 2) if total_topics_count else 0)
+                    row.append(data['total_tasks'])
+                    yield row
+
         # Header - har bir topic uchun ball va vaqt ustunlari
         header = ['№', 'F.I.Sh', 'Guruh']
         for topic_id in topic_ids:
@@ -427,39 +425,12 @@ class TopicAdmin(admin.ModelAdmin):
         tasks_label = "Vazifalar soni" if task_type == "assignment" else "Testlar soni"
         header.extend(["O'rtacha ball", tasks_label])
 
-        writer.writerow(header)
-
-        # Ma'lumotlar
-        for idx, data in enumerate(sorted_students, start=1):
-            student = data['student']
-            # Studentning birinchi guruhini olish (ko'p guruh boʻlishi mumkin)
-            first_group = student.groups.first()
-            row = [
-                idx,
-                student.full_name,
-                first_group.name if first_group else "Yo'q",
-            ]
-
-            # Har bir topic bo'yicha ball va vaqt
-            for topic_id in topic_ids:
-                topic_data = data['topics'].get(topic_id)
-                if topic_data is None:
-                    row.append('-')
-                    row.append('-')
-                else:
-                    row.append(topic_data['grade'])
-                    submitted = topic_data['submitted_at']
-                    row.append(submitted.strftime('%d.%m.%Y %H:%M') if submitted else '-')
-
-            # O'rtacha va jami
-            row.append(data['avg_grade'])
-            row.append(data['total_tasks'])
-            
-            writer.writerow(row)
+        course_name = course.name.replace(' ', '_')
+        response = csv_response(f'reyting_detallari_{course_name}.csv', header, rows())
         
         self.message_user(
             request,
-            f"✅ {len(sorted_students)} ta studentning batafsil reytingi eksport qilindi!",
+            f"✅ {total_students} ta studentning batafsil reytingi eksport qilindi!",
             messages.SUCCESS
         )
         
@@ -499,78 +470,51 @@ class TopicAdmin(admin.ModelAdmin):
         # Course dan task_type ni olish
         task_type = course.task_type
         
-        # Studentlarni va ularning o'rtacha ballini hisoblash
-        students_data = []
-        students = Student.objects.filter(
-            tasks__topic_id__in=topic_ids,
-            tasks__task_type=task_type
-        ).distinct()
-        
-        for student in students:
-            # Shu studentning tanlangan topiklar bo'yicha tasklar
-            tasks = Task.objects.filter(
-                student=student,
+        # Studentlarning o'rtacha / jami bali — bitta GROUP BY so'rovda (student boshiga
+        # alohida so'rovlar o'rniga), o'rtacha ball bo'yicha kamayish tartibida chunk'lab
+        per_student = (
+            Task.objects.filter(
                 topic_id__in=topic_ids,
                 task_type=task_type,
                 grade__isnull=False
             )
-            
-            if not tasks.exists():
-                continue
-            
-            # O'rtacha ball va jami tasklar soni
-            avg_grade = tasks.aggregate(avg=Avg('grade'))['avg']
-            total_tasks = tasks.count()
-            total_score = sum(task.grade for task in tasks)
-            
-            students_data.append({
-                'student': student,
-                'avg_grade': round(avg_grade, 2) if avg_grade else 0,
-                'total_tasks': total_tasks,
-                'total_score': total_score,
-            })
-        
-        # O'rtacha ball bo'yicha kamayish tartibida saralash
-        students_data.sort(key=lambda x: x['avg_grade'], reverse=True)
-        
-        # CSV yaratish
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        course_name = course.name.replace(' ', '_')
-        filename = f'reyting_{course_name}.csv'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # UTF-8 BOM qo'shish (Excel uchun)
-        response.write('\ufeff')
-        
-        writer = csv.writer(response)
-        
-        # Header
+            .values('student_id')
+            .annotate(
+                avg_grade=Cast(Avg('grade'), FloatField()),
+                total_tasks=Count('id'),
+                total_score=Sum('grade'),
+            )
+        )
+        total_students = per_student.count()
+
+        def rows():
+            idx = 0
+            for chunk in keyset_chunks(per_student, ('-avg_grade', 'student_id')):
+                student_ids = [data['student_id'] for data in chunk]
+                names = dict(Student.objects.filter(id__in=student_ids).values_list('id', 'full_name'))
+                groups = _first_group_names(student_ids)
+                for data in chunk:
+                    idx += 1
+                    yield [
+                        idx,
+                        names.get(data['student_id'], ''),
+                        groups.get(data['student_id'], 'Yo\'q'),
+                        round(data['avg_grade'], 2) if data['avg_grade'] else 0,
+                        data['total_tasks'],
+                        data['total_score'],
+                    ]
+
         tasks_label = "Vazifalar soni" if task_type == "assignment" else "Testlar soni"
-        writer.writerow([
-            '№',
-            'F.I.Sh',
-            'Guruh',
-            "O'rtacha ball",
-            tasks_label,
-            'Jami ball'
-        ])
-        
-        # Ma'lumotlar
-        for idx, data in enumerate(students_data, start=1):
-            student = data['student']
-            first_group = student.groups.first()
-            writer.writerow([
-                idx,
-                student.full_name,
-                first_group.name if first_group else 'Yo\'q',
-                data['avg_grade'],
-                data['total_tasks'],
-                data['total_score'],
-            ])
+        course_name = course.name.replace(' ', '_')
+        response = csv_response(
+            f'reyting_{course_name}.csv',
+            ['№', 'F.I.Sh', 'Guruh', "O'rtacha ball", tasks_label, 'Jami ball'],
+            rows(),
+        )
         
         self.message_user(
             request,
-            f"✅ {len(students_data)} ta studentning reytingi eksport qilindi!",
+            f"✅ {total_students} ta studentning reytingi eksport qilindi!",
             messages.SUCCESS
         )
         
@@ -613,8 +557,10 @@ class TopicAdmin(admin.ModelAdmin):
                         new_grade = min(task.grade + points, max_grade)
                         
                         if new_grade != task.grade:
+                            old_grade = task.grade
                             task.grade = new_grade
                             task.save()
+                            apply_task_grade_change(task, old_grade)
                             updated_count += 1
                         else:
                             skipped_count += 1
@@ -675,8 +621,10 @@ class TopicAdmin(admin.ModelAdmin):
                         new_grade = max(task.grade - points, 0)
                         
                         if new_grade != task.grade:
+                            old_grade = task.grade
                             task.grade = new_grade
                             task.save()
+                            apply_task_grade_change(task, old_grade)
                             updated_count += 1
                         else:
                             skipped_count += 1
@@ -732,23 +680,26 @@ class AttendanceSessionAdmin(admin.ModelAdmin):
     attendance_count.short_description = 'Qatnashganlar'
 
     def export_attendance_csv(self, request, queryset):
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = 'attachment; filename="davomat.csv"'
-        response.write('﻿')
-        writer = csv.writer(response)
-        writer.writerow(['Sessiya kodi', 'Sana', 'F.I.Sh', 'Telefon', 'Vaqt'])
-        for session in queryset:
-            for att in session.attendances.select_related('student').all():
-                import pytz
-                tz = pytz.timezone('Asia/Tashkent')
-                writer.writerow([
-                    session.code,
-                    session.created_at.astimezone(tz).strftime('%d.%m.%Y'),
+        import pytz
+        tz = pytz.timezone('Asia/Tashkent')
+        attendances = (
+            Attendance.objects.filter(session__in=queryset)
+            .select_related('session', 'student')
+            .only('id', 'marked_at', 'session__code', 'session__created_at', 'student__full_name', 'student__phone')
+        )
+
+        def rows():
+            # Sessiyalar yangi → eski, har sessiya ichida oxirgi belgilanganlar birinchi
+            for att in keyset_iter(attendances, ('-session__created_at', '-session_id', '-marked_at', '-id')):
+                yield [
+                    att.session.code,
+                    att.session.created_at.astimezone(tz).strftime('%d.%m.%Y'),
                     att.student.full_name,
                     att.student.phone or '—',
                     att.marked_at.astimezone(tz).strftime('%d.%m.%Y %H:%M'),
-                ])
-        return response
+                ]
+
+        return csv_response('davomat.csv', ['Sessiya kodi', 'Sana', 'F.I.Sh', 'Telefon', 'Vaqt'], rows())
     export_attendance_csv.short_description = 'Tanlangan sessiyalar davomatini CSV yuklab olish'
 
 
@@ -802,6 +753,29 @@ class CoinTransactionAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     ordering = ('-created_at',)
 
+    # Qo'lda tahrirlangan / o'chirilgan tranzaksiyalar — kunlik rollup'lar qayta hisoblanadi
+    def save_model(self, request, obj, form, change):
+        from .coin_rollups import refresh_rollups, rollup_day
+        old = CoinTransaction.objects.filter(pk=obj.pk).values_list('wallet_id', 'topic__activated_at').first()
+        super().save_model(request, obj, form, change)
+        wallet_ids = {obj.wallet_id}
+        days = {rollup_day(obj.topic.activated_at)}
+        if old:
+            wallet_ids.add(old[0])
+            days.add(rollup_day(old[1]))
+        refresh_rollups(wallet_ids, days)
+
+    def delete_model(self, request, obj):
+        from .coin_rollups import refresh_rollups, rollup_day
+        super().delete_model(request, obj)
+        refresh_rollups({obj.wallet_id}, {rollup_day(obj.topic.activated_at)})
+
+    def delete_queryset(self, request, queryset):
+        from .coin_rollups import refresh_rollups, rollup_day
+        rows = list(queryset.values_list('wallet_id', 'topic__activated_at'))
+        super().delete_queryset(request, queryset)
+        refresh_rollups({w for w, _ in rows}, {rollup_day(a) for _, a in rows})
+
 
 class OperatorProfileInline(admin.StackedInline):
     model = OperatorProfile
@@ -0,0 +1,188 @@
+"""
+Kurs tanga ledger'ini qayta qurish va hamyonlar bilan muvofiqligini tekshirish
+(`rebuild_coin_ledger` buyrug'i).
+
+  - ledger_drift(course_id) — hamyon (total_coins, current_streak, longest_streak) va
+    tranzaksiyalar (SUM, MAX, oxirgi streak_after) farqi — bitta aggregate so'rov
+  - iter_wallet_shards(course_id, shard_size) — kurs hamyonlari keyset bilan chunk'lab
+    o'qiladi; har shard'ga shu hamyonlarning tranzaksiyalari va studentlarning task'lari
+    (har biri bitta so'rov) qo'shiladi. Shard — faqat oddiy tuple'lar (worker jarayonga
+    pickle qilinadi)
+  - replay_shard(shard) — DB siz: streak'lar replay_streaks bilan (award_task_coins
+    qoidasi) qayta o'ynaladi, result_coins task bahosiga tenglashtiriladi (qayta
+    baholash bilan bir xil); faqat o'zgargan tranzaksiya va hamyonlar qaytadi
+  - apply_ledger_fixes(...) — bulk_update, so'ng kunlik rollup'lar qayta quriladi
+
+streak_coins=0 tranzaksiyalar (qayta baholashda retroaktiv yaratilgan) streak
+zanjirida qatnashmaydi: streak_coins=0 qoladi, streak_after — o'sha paytdagi streak.
+Hamyonda reverse_task_coins dagi kabi: total_coins — jami, longest_streak — eng katta
+streak_after, current_streak — oxirgi (created_at, id) tranzaksiyaniki. last_topic va
+last_submitted_at tekshirilmaydi (award_task_coins ularni tranzaksiyadan biroz oldin yozadi).
+"""
+from collections import namedtuple
+
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .coins import course_topic_sequence, replay_streaks
+from .csv_export import keyset_chunks
+
+SHARD_SIZE = 200  # bitta worker vazifasidagi hamyonlar soni
+
+TX_FIELDS = ('result_coins', 'streak_coins', 'total_coins', 'streak_after')
+WALLET_FIELDS = ('total_coins', 'current_streak', 'longest_streak', 'updated_at')
+
+# Shard ichidagi qatorlar (values / values_list tartibida)
+LedgerWallet = namedtuple('LedgerWallet', 'id student_id total_coins current_streak longest_streak')
+LedgerTx = namedtuple(
+    'LedgerTx', 'id topic_id task_type activated_at created_at result_coins streak_coins total_coins streak_after'
+)
+LedgerTask = namedtuple('LedgerTask', 'topic_id task_type grade submitted_at')
+
+# replay_shard natijasi
+TxFix = namedtuple('TxFix', ('id',) + TX_FIELDS)
+WalletFix = namedtuple('WalletFix', 'id total_coins current_streak longest_streak')
+ShardResult = namedtuple('ShardResult', 'wallets transactions tx_fixes wallet_fixes orphans')
+
+
+def ledger_drift(course_id=None):
+    """
+    Tranzaksiyalar bilan mos kelmaydigan hamyonlar — bitta aggregate so'rov.
+    Qaytaradi: [{'id', 'course_id', 'telegram_id', 'full_name', 'total_coins', 'ledger_coins',
+                 'current_streak', 'ledger_streak', 'longest_streak', 'ledger_longest'}, ...]
+    """
+    from .models import CoinTransaction, CoinWallet
+
+    last_tx = CoinTransaction.objects.filter(wallet=OuterRef('pk')).order_by('-created_at', '-id')
+    qs = CoinWallet.objects.all()
+    if course_id is not None:
+        qs = qs.filter(course_id=course_id)
+    return list(
+        qs.annotate(
+            ledger_coins=Coalesce(Sum('transactions__total_coins'), 0),
+            ledger_longest=Coalesce(Max('transactions__streak_after'), 0),
+            ledger_streak=Coalesce(Subquery(last_tx.values('streak_after')[:1]), 0),
+        )
+        .filter(
+            ~Q(total_coins=F('ledger_coins'))
+            | ~Q(current_streak=F('ledger_streak'))
+            | ~Q(longest_streak=F('ledger_longest'))
+        )
+        .order_by('course_id', 'id')
+        .values(
+            'id', 'course_id', 'total_coins', 'ledger_coins', 'current_streak', 'ledger_streak',
+            'longest_streak', 'ledger_longest',
+            telegram_id=F('student__telegram_id'), full_name=F('student__full_name'),
+        )
+    )
+
+
+def iter_wallet_shards(course, shard_size=SHARD_SIZE):
+    """
+    Kurs hamyonlari shard'lari: (sequence, wallets, txs_by_wallet, tasks_by_student).
+    course DB dan yangi o'qilgan bo'lishi kerak (course_topic_sequence uchun).
+    """
+    from .models import CoinTransaction, CoinWallet, Task
+
+    sequence = course_topic_sequence(course)
+    wallets_qs = CoinWallet.objects.filter(course_id=course.id).values(*LedgerWallet._fields)
+    for chunk in keyset_chunks(wallets_qs, ('id',), shard_size):
+        wallets = [LedgerWallet(**row) for row in chunk]
+
+        txs_by_wallet = {w.id: [] for w in wallets}
+        for wallet_id, *values in (
+            CoinTransaction.objects.filter(wallet_id__in=txs_by_wallet)
+            .order_by('wallet_id', 'created_at', 'id')
+            .values_list('wallet_id', 'id', 'topic_id', 'task_type', 'topic__activated_at', 'created_at',
+                         *TX_FIELDS)
+        ):
+            txs_by_wallet[wallet_id].append(LedgerTx(*values))
+
+        tasks_by_student = {w.student_id: [] for w in wallets}
+        for student_id, *values in (
+            Task.objects.filter(student_id__in=tasks_by_student, topic__course_id=course.id)
+            .values_list('student_id', *LedgerTask._fields)
+        ):
+            tasks_by_student[student_id].append(LedgerTask(*values))
+
+        yield sequence, wallets, txs_by_wallet, tasks_by_student
+
+
+def _replay_wallet(wallet, txs, tasks, sequence):
+    """Bitta hamyon: (o'zgargan tranzaksiyalar, WalletFix yoki None, task'siz tranzaksiyalar soni)."""
+    grades = {(t.topic_id, t.task_type): t.grade for t in tasks if t.grade is not None}
+    chain = [tx for tx in txs if tx.streak_coins]
+    streaks = replay_streaks(
+        [(tx.topic_id, tx.activated_at, tx.created_at) for tx in chain],
+        [(t.topic_id, t.submitted_at) for t in tasks],
+        sequence,
+    )
+
+    tx_fixes = []
+    orphans = 0
+    current_streak = 0
+    total_coins = 0
+    longest_streak = 0
+    for tx in txs:
+        grade = grades.get((tx.topic_id, tx.task_type))
+        if grade is None:
+            # Task o'chirilgan (yoki bahosiz) — natija tangasi o'zgartirilmaydi
+            orphans += 1
+            result_coins = tx.result_coins
+        else:
+            result_coins = max(0, grade)
+        if tx.streak_coins:
+            current_streak = next(streaks)
+            streak_coins = current_streak
+        else:
+            streak_coins = 0
+        fix = TxFix(tx.id, result_coins, streak_coins, result_coins + streak_coins, current_streak)
+        if fix[1:] != (tx.result_coins, tx.streak_coins, tx.total_coins, tx.streak_after):
+            tx_fixes.append(fix)
+        total_coins += fix.total_coins
+        longest_streak = max(longest_streak, fix.streak_after)
+
+    expected = WalletFix(wallet.id, total_coins, current_streak, longest_streak)
+    actual = (wallet.id, wallet.total_coins, wallet.current_streak, wallet.longest_streak)
+    return tx_fixes, (expected if expected != actual else None), orphans
+
+
+def replay_shard(shard):
+    """Worker jarayonda bajariladi (DB ga murojaat qilmaydi). Qaytaradi: ShardResult."""
+    sequence, wallets, txs_by_wallet, tasks_by_student = shard
+    tx_fixes = []
+    wallet_fixes = []
+    orphans = 0
+    transactions = 0
+    for wallet in wallets:
+        txs = txs_by_wallet[wallet.id]
+        transactions += len(txs)
+        fixes, wallet_fix, wallet_orphans = _replay_wallet(
+            wallet, txs, tasks_by_student[wallet.student_id], sequence
+        )
+        tx_fixes.extend(fixes)
+        if wallet_fix is not None:
+            wallet_fixes.append(wallet_fix)
+        orphans += wallet_orphans
+    return ShardResult(len(wallets), transactions, tx_fixes, wallet_fixes, orphans)
+
+
+def apply_ledger_fixes(course_id, tx_fixes, wallet_fixes):
+    """Tuzatishlarni bulk_update bilan yozadi. Tranzaksiya ichida chaqirilishi kerak."""
+    from .coin_rollups import rebuild_coin_rollups
+    from .leaderboard import invalidate_course_on_commit
+    from .models import CoinTransaction, CoinWallet
+
+    if tx_fixes:
+        CoinTransaction.objects.bulk_update(
+            [CoinTransaction(**fix._asdict()) for fix in tx_fixes], TX_FIELDS, batch_size=500,
+        )
+        rebuild_coin_rollups(course_id)
+    if wallet_fixes:
+        now = timezone.now()
+        CoinWallet.objects.bulk_update(
+            [CoinWallet(**fix._asdict(), updated_at=now) for fix in wallet_fixes], WALLET_FIELDS, batch_size=500,
+        )
+    if tx_fixes or wallet_fixes:
+        invalidate_course_on_commit(course_id)
@@ -0,0 +1,145 @@
+"""
+CoinDailyRollup — hamyon + kun bo'yicha tanga yig'indisi va eng katta streak.
+
+Kun — mavzu faollashtirilgan vaqtning (topic.activated_at) Toshkent sanasi: davr
+reytinglari ham tanga olingan vaqt emas, mavzu faollashgan vaqt bo'yicha
+filtrlanadi. activated_at yo'q mavzular tranzaksiyalari day=NULL qatorda
+saqlanadi — hech qaysi davrga kirmaydi, lekin sanasiz (barcha vaqt) yig'indida
+qatnashadi (avvalgidek). Shu tufayli ixtiyoriy davr reytingi va "qaysi oylarda
+ma'lumot bor" menyulari butun ledger + Topic JOIN o'rniga (course, day)
+indeksidagi kichik oraliqni o'qiydi.
+
+Yangilanish:
+  - award_task_coins — add_to_rollup: odatda bitta UPDATE
+  - reverse_task_coins, qayta baholash, admin tahrirlari — refresh_rollups:
+    tegishli (hamyon, kun) qatorlari tranzaksiyalardan qayta hisoblanadi
+  - mavzu activated_at o'zgarsa / mavzu o'chirilsa — refresh_topic_rollups
+  - `rebuild_coin_rollups` buyrug'i noldan quradi
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction as db_transaction
+from django.db.models import F, Max, Q, Sum, Value
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .coins import TASHKENT_TZ
+
+
+def rollup_day(activated_at):
+    """Mavzu faollashgan vaqt → rollup kuni (Toshkent sanasi) yoki None."""
+    if activated_at is None:
+        return None
+    return timezone.localtime(activated_at, TASHKENT_TZ).date()
+
+
+def day_start(day):
+    """Toshkent kunining boshlanishi (aware datetime)."""
+    return TASHKENT_TZ.localize(datetime.combine(day, time.min))
+
+
+def add_to_rollup(wallet, day, coins, streak):
+    """Yangi tranzaksiyani kun qatoriga qo'shadi (qator yo'q bo'lsa yaratadi)."""
+    from .models import CoinDailyRollup
+
+    updates = {
+        'coins': F('coins') + coins,
+        'max_streak': Greatest(F('max_streak'), Value(streak)),
+    }
+    # Odatda shu kun qatori bor — bitta UPDATE
+    if CoinDailyRollup.objects.filter(wallet_id=wallet.pk, day=day).update(**updates):
+        return
+
+    row, created = CoinDailyRollup.objects.get_or_create(
+        wallet_id=wallet.pk, day=day,
+        defaults={'course_id': wallet.course_id, 'coins': coins, 'max_streak': streak},
+    )
+    if not created:
+        CoinDailyRollup.objects.filter(pk=row.pk).update(**updates)
+
+
+def _rollup_objects(transactions):
+    """CoinTransaction queryset → CoinDailyRollup obyektlari (bitta aggregate so'rov)."""
+    from .models import CoinDailyRollup
+
+    rows = (
+        transactions
+        .annotate(day=TruncDate('topic__activated_at', tzinfo=TASHKENT_TZ))
+        .values('wallet_id', 'wallet__course_id', 'day')
+        .annotate(coins_sum=Sum('total_coins'), streak_max=Max('streak_after'))
+        .order_by()
+    )
+    return [
+        CoinDailyRollup(
+            wallet_id=r['wallet_id'],
+            course_id=r['wallet__course_id'],
+            day=r['day'],
+            coins=r['coins_sum'] or 0,
+            max_streak=r['streak_max'] or 0,
+        )
+        for r in rows
+    ]
+
+
+def refresh_rollups(wallet_ids, days):
+    """wallet_ids × days qatorlarini tranzaksiyalardan qayta hisoblaydi (day None — sanasiz qator)."""
+    from .models import CoinDailyRollup, CoinTransaction
+
+    wallet_ids = set(wallet_ids)
+    days = set(days)
+    dated = days - {None}
+    if not wallet_ids or not days:
+        return
+
+    tx_filter = Q()
+    rollup_filter = Q()
+    if dated:
+        tx_filter |= Q(
+            topic__activated_at__gte=day_start(min(dated)),
+            topic__activated_at__lt=day_start(max(dated) + timedelta(days=1)),
+        )
+        rollup_filter |= Q(day__in=dated)
+    if None in days:
+        tx_filter |= Q(topic__activated_at__isnull=True)
+        rollup_filter |= Q(day__isnull=True)
+
+    transactions = CoinTransaction.objects.filter(tx_filter, wallet_id__in=wallet_ids)
+    objs = [obj for obj in _rollup_objects(transactions) if obj.day in days]
+    with db_transaction.atomic():
+        CoinDailyRollup.objects.filter(rollup_filter, wallet_id__in=wallet_ids).delete()
+        CoinDailyRollup.objects.bulk_create(objs, batch_size=1000)
+
+
+def topic_wallet_ids(topic_ids):
+    """Mavzu(lar) bo'yicha tangasi bor hamyonlar — mavzu o'chirilishidan OLDIN olinadi."""
+    from .models import CoinTransaction
+
+    return set(
+        CoinTransaction.objects.filter(topic_id__in=topic_ids).values_list('wallet_id', flat=True)
+    )
+
+
+def refresh_topic_rollups(wallet_ids, *activated_ats):
+    """Mavzu faollashgan vaqti o'zgarganda / mavzu o'chirilganda — eski va yangi kunlar."""
+    refresh_rollups(wallet_ids, {rollup_day(a) for a in activated_ats})
+
+
+def rebuild_coin_rollups(course_id=None):
+    """
+    CoinDailyRollup jadvalini tranzaksiyalardan noldan quradi (bitta aggregate so'rov).
+    course_id berilsa — faqat shu kurs qayta quriladi.
+    Returns: yaratilgan qatorlar soni.
+    """
+    from .models import CoinDailyRollup, CoinTransaction
+
+    transactions = CoinTransaction.objects.all()
+    existing = CoinDailyRollup.objects.all()
+    if course_id is not None:
+        transactions = transactions.filter(wallet__course_id=course_id)
+        existing = existing.filter(course_id=course_id)
+
+    objs = _rollup_objects(transactions)
+    with db_transaction.atomic():
+        existing.delete()
+        CoinDailyRollup.objects.bulk_create(objs, batch_size=1000)
+    return len(objs)
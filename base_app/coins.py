@@ -1,11 +1,14 @@
 import pytz
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
-from datetime import datetime
+from datetime import date, datetime
 
 from django.db import transaction as db_transaction
 from django.db.models import Sum
 from django.utils import timezone
 
+from .leaderboard import invalidate_course_on_commit
+
 TASHKENT_TZ = pytz.timezone('Asia/Tashkent')
 
 
@@ -18,57 +21,218 @@ def _month_bounds(year, month):
     return start, end
 
 
+def _month_days(year, month):
+    """Oyning birinchi kuni va keyingi oyning birinchi kuni (CoinDailyRollup.day oralig'i)."""
+    first_day = date(year, month, 1)
+    return first_day, date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+
+
 def is_monthly_streak_enabled(year, month):
     from .models import MonthlyStreakSetting
     return MonthlyStreakSetting.objects.filter(year=year, month=month, enabled=True).exists()
 
 
-def _replay_month_txs(txs, all_tasks, active_topics):
+class _OpenSlots:
     """
-    Pure-Python qayta hisoblash — hech qanday DB so'rovi yubormaydi.
-    txs: shu oy uchun CoinTransaction'lar ro'yxati (created_at bo'yicha tartiblangan, topic prefetch qilingan)
+    Tartiblangan o'rinlar (0..size-1) ichida "hali yopilmagan" birinchi o'rinni topish:
+    find(i) — i dan boshlab birinchi ochiq o'rin (yo'q bo'lsa size), close(i) — o'rinni yopish.
+    Path compression tufayli amortizatsiyalangan deyarli O(1).
+    """
+
+    __slots__ = ('next',)
+
+    def __init__(self, size):
+        self.next = list(range(size + 1))
+
+    def find(self, i):
+        nxt = self.next
+        root = i
+        while nxt[root] != root:
+            root = nxt[root]
+        while nxt[i] != root:
+            nxt[i], i = root, nxt[i]
+        return root
+
+    def close(self, i):
+        self.next[i] = i + 1
+
+
+class CourseTopicSequence:
+    """
+    Kursdagi faol mavzular faollashish ketma-ketligi — streak uzilishini (gap)
+    aniqlash uchun barcha tanga kodi (award_task_coins, oy-reset replay, reyting)
+    shu tuzilmadan foydalanadi.
+      act_ids / acts — activated_at (teng bo'lsa id) bo'yicha tartiblangan mavzular
+      act_rank       — topic_id → act_ids dagi o'rni
+      ids / id_rank  — id tartibi (activated_at yo'q mavzular uchun)
+    "A va B orasida bajarilmagan mavzu bormi" — o'rinlar oralig'i + bajarilganlar to'plami.
+    active_topics: [(topic_id, activated_at), ...]
+    """
+
+    __slots__ = ('acts', 'act_ids', 'act_rank', 'ids', 'id_rank')
+
+    def __init__(self, active_topics):
+        by_act = sorted((act, tid) for tid, act in active_topics if act is not None)
+        self.acts = [act for act, _ in by_act]
+        self.act_ids = [tid for _, tid in by_act]
+        self.act_rank = {tid: i for i, (_, tid) in enumerate(by_act)}
+        self.ids = sorted(tid for tid, _ in active_topics)
+        self.id_rank = {tid: i for i, tid in enumerate(self.ids)}
+
+    def act_range(self, last_activated_at, activated_at):
+        """(last_activated_at, activated_at] oralig'ida faollashgan mavzular o'rinlari: [lo, hi)."""
+        lo = bisect_right(self.acts, last_activated_at) if last_activated_at is not None else 0
+        return lo, bisect_right(self.acts, activated_at)
+
+    def id_range(self, last_topic_id, topic_id):
+        """id bo'yicha (last_topic_id, topic_id) oralig'idagi mavzular o'rinlari: [lo, hi)."""
+        return bisect_right(self.ids, last_topic_id), bisect_left(self.ids, topic_id)
+
+    def between(self, last_topic_id, last_activated_at, topic_id, activated_at):
+        """Oxirgi topshirilgan mavzu bilan joriy mavzu orasidagi faol mavzular (joriy mavzusiz)."""
+        if activated_at is not None:
+            lo, hi = self.act_range(last_activated_at, activated_at)
+            ids = self.act_ids[lo:hi]
+        else:
+            lo, hi = self.id_range(last_topic_id, topic_id)
+            ids = self.ids[lo:hi]
+        return [tid for tid in ids if tid != topic_id]
+
+    def has_uncompleted_between(self, last_topic_id, last_activated_at, topic_id, activated_at, completed):
+        """Oraliqda completed to'plamida bo'lmagan faol mavzu bormi (streak uziladimi)."""
+        return any(
+            tid not in completed
+            for tid in self.between(last_topic_id, last_activated_at, topic_id, activated_at)
+        )
+
+
+_sequences = {}  # course_id -> (topics_version, CourseTopicSequence)
+
+
+def course_topic_sequence(course):
+    """
+    Kursning faollashish ketma-ketligi — jarayon xotirasida keshlanadi va
+    course.topics_version o'zgarmaguncha qayta ishlatiladi (boshqa jarayondagi
+    o'zgarishlar ham shu versiya orqali ko'rinadi). course DB dan yangi o'qilgan
+    bo'lishi kerak.
+    """
+    from .models import Topic
+
+    cached = _sequences.get(course.id)
+    if cached is not None and cached[0] == course.topics_version:
+        return cached[1]
+    sequence = CourseTopicSequence(list(
+        Topic.objects.filter(course_id=course.id, is_active=True).values_list('id', 'activated_at')
+    ))
+    _sequences[course.id] = (course.topics_version, sequence)
+    return sequence
+
+
+def invalidate_course_topics(*course_ids):
+    """
+    Mavzu saqlanganda / o'chirilganda / faollashtirilganda: shu jarayon keshini
+    tozalaydi va boshqa jarayonlar uchun kurs versiyasini oshiradi.
+    """
+    from django.db.models import F
+    from .models import Course
+
+    course_ids = [cid for cid in course_ids if cid]
+    if not course_ids:
+        return
+    for course_id in course_ids:
+        _sequences.pop(course_id, None)
+    Course.objects.filter(pk__in=course_ids).update(topics_version=F('topics_version') + 1)
+
+
+def replay_streaks(events, all_tasks, sequence):
+    """
+    Streak zanjirini qayta o'ynash — award_task_coins qoidasi bilan, DB so'rovlarisiz.
+    events: [(topic_id, activated_at, created_at), ...] created_at bo'yicha tartiblangan
     all_tasks: [(topic_id, submitted_at), ...] — shu student/kurs uchun barcha Task'lar
-    active_topics: [(topic_id, activated_at), ...] — shu kursdagi barcha FAOL mavzular
-    Returns: (period_coins, streak_at_end, longest_streak_in_period)
+    sequence: CourseTopicSequence — shu kursdagi barcha FAOL mavzular
+    Har event uchun new_streak qaytaradi (generator).
+
+    Inkremental: task'lar submitted_at bo'yicha bir marta saralanib, ko'rsatkich bilan
+    "bajarilgan" deb belgilanib boriladi (mavzuning rank'dagi o'rni yopiladi); oraliqda
+    bajarilmagan faol mavzu borligi — oraliq boshidan birinchi ochiq o'rinni topish.
+    ~O(events + tasks + topics) (tasks saralashidan tashqari).
     """
+    acts, act_rank = sequence.acts, sequence.act_rank
+    ids, id_rank = sequence.ids, sequence.id_rank
+
+    # Bajarilmagan faol mavzular — activated_at va id tartibidagi ochiq o'rinlar
+    open_by_act = _OpenSlots(len(acts))
+    open_by_id = _OpenSlots(len(ids))
+    completed = set()
+
+    tasks = sorted((sub_at, tid) for tid, sub_at in all_tasks if sub_at is not None)
+    task_pos = 0
+    n_tasks = len(tasks)
+
     current_streak = 0
-    longest_streak = 0
     last_topic_id = None
     last_activated_at = None
-    period_coins = 0
 
-    for tx in txs:
-        topic = tx.topic
-        completed_ids = {
-            tid for tid, sub_at in all_tasks
-            if sub_at is not None and sub_at <= tx.created_at
-        }
+    for topic_id, activated_at, created_at in events:
+        # Shu tranzaksiyagacha topshirilgan task'lar bajarilganlar to'plamiga qo'shiladi
+        while task_pos < n_tasks and tasks[task_pos][0] <= created_at:
+            tid = tasks[task_pos][1]
+            task_pos += 1
+            if tid in completed:
+                continue
+            completed.add(tid)
+            if tid in act_rank:
+                open_by_act.close(act_rank[tid])
+            if tid in id_rank:
+                open_by_id.close(id_rank[tid])
 
         if last_topic_id is None:
             new_streak = 1
         else:
-            if topic.activated_at is not None:
-                upper = topic.activated_at
-                lower = last_activated_at
-                has_gap = any(
-                    tid != topic.id
-                    and act is not None and act <= upper
-                    and (lower is None or act > lower)
-                    and tid not in completed_ids
-                    for tid, act in active_topics
-                )
+            if activated_at is not None:
+                # (last_activated_at, activated_at] oralig'ida faollashgan mavzular
+                lo, hi = sequence.act_range(last_activated_at, activated_at)
+                first_open = open_by_act.find(lo) if lo < hi else hi
+                if first_open == act_rank.get(topic_id):
+                    # Joriy mavzuning o'zi hisobga kirmaydi
+                    first_open = open_by_act.find(first_open + 1)
+                has_gap = first_open < hi
             else:
-                has_gap = any(
-                    tid != topic.id and last_topic_id < tid < topic.id and tid not in completed_ids
-                    for tid, act in active_topics
-                )
+                # activated_at yo'q: id bo'yicha (last_topic_id, topic_id) oralig'idagi mavzular
+                lo, hi = sequence.id_range(last_topic_id, topic_id)
+                has_gap = lo < hi and open_by_id.find(lo) < hi
             new_streak = 1 if has_gap else current_streak + 1
 
+        yield new_streak
+        current_streak = new_streak
+        last_topic_id = topic_id
+        last_activated_at = activated_at
+
+
+def _replay_month_txs(txs, all_tasks, active_topics):
+    """
+    Pure-Python qayta hisoblash — hech qanday DB so'rovi yubormaydi.
+    txs: shu oy uchun CoinTransaction'lar ro'yxati (created_at bo'yicha tartiblangan, topic prefetch qilingan)
+    all_tasks: [(topic_id, submitted_at), ...] — shu student/kurs uchun barcha Task'lar
+    active_topics: CourseTopicSequence yoki [(topic_id, activated_at), ...] — shu kursdagi barcha FAOL mavzular
+    Returns: (period_coins, streak_at_end, longest_streak_in_period)
+    Streak'lar replay_streaks bilan (oy boshidan 1 dan) hisoblanadi.
+    """
+    if not txs:
+        return 0, 0, 0
+    sequence = (
+        active_topics if isinstance(active_topics, CourseTopicSequence)
+        else CourseTopicSequence(active_topics)
+    )
+    events = [(tx.topic.id, tx.topic.activated_at, tx.created_at) for tx in txs]
+
+    current_streak = 0
+    longest_streak = 0
+    period_coins = 0
+    for tx, new_streak in zip(txs, replay_streaks(events, all_tasks, sequence)):
         period_coins += tx.result_coins + new_streak
         current_streak = new_streak
         longest_streak = max(longest_streak, new_streak)
-        last_topic_id = topic.id
-        last_activated_at = topic.activated_at
 
     return period_coins, current_streak, longest_streak
 
@@ -80,7 +244,7 @@ def _compute_reset_month_coins(wallet, start, end):
     Ko'plab wallet'larni bir yo'la hisoblash uchun compute_month_leaderboard'dan
     foydalaning (u N+1 so'rovlarsiz, bulk ishlaydi).
     """
-    from .models import CoinTransaction, Task as TaskModel, Topic
+    from .models import CoinTransaction, Task as TaskModel
 
     txs = list(
         CoinTransaction.objects.filter(
@@ -94,10 +258,7 @@ def _compute_reset_month_coins(wallet, start, end):
         TaskModel.objects.filter(student=wallet.student, topic__course=wallet.course)
         .values_list('topic_id', 'submitted_at')
     )
-    active_topics = list(
-        Topic.objects.filter(course=wallet.course, is_active=True).values_list('id', 'activated_at')
-    )
-    return _replay_month_txs(txs, all_tasks, active_topics)
+    return _replay_month_txs(txs, all_tasks, course_topic_sequence(wallet.course))
 
 
 def compute_month_leaderboard(course_id, year, month, student_ids=None):
@@ -108,7 +269,7 @@ def compute_month_leaderboard(course_id, year, month, student_ids=None):
     yubormasdan — 600+ studentlik kursda ham tez ishlashi uchun).
     Returns: [(wallet, period_coins, streak, longest_streak), ...] kamayish tartibida.
     """
-    from .models import CoinWallet, CoinTransaction, Task as TaskModel, Topic
+    from .models import CoinWallet, CoinTransaction, Task as TaskModel
 
     start, end = _month_bounds(year, month)
 
@@ -120,9 +281,8 @@ def compute_month_leaderboard(course_id, year, month, student_ids=None):
         return []
 
     course = wallets[0].course
-    active_topics = list(
-        Topic.objects.filter(course=course, is_active=True).values_list('id', 'activated_at')
-    )
+    # Faollashish ketma-ketligi — barcha wallet'lar (va keyingi so'rovlar) uchun umumiy
+    active_topics = course_topic_sequence(course)
 
     wallet_ids = [w.id for w in wallets]
     txs_by_wallet = defaultdict(list)
@@ -164,17 +324,17 @@ def get_month_period_data(wallet, year, month):
     qiymatlar ishlatiladi.
     Returns dict: {period_coins, streak, longest_streak}
     """
-    from .models import CoinTransaction
-
-    start, end = _month_bounds(year, month)
+    from .models import CoinDailyRollup
 
     if is_monthly_streak_enabled(year, month):
+        start, end = _month_bounds(year, month)
         period_coins, streak, longest_streak = _compute_reset_month_coins(wallet, start, end)
         return {'period_coins': period_coins, 'streak': streak, 'longest_streak': longest_streak}
 
-    period_coins = CoinTransaction.objects.filter(
-        wallet=wallet, topic__activated_at__gte=start, topic__activated_at__lt=end
-    ).aggregate(s=Sum('total_coins'))['s'] or 0
+    first_day, next_first_day = _month_days(year, month)
+    period_coins = CoinDailyRollup.objects.filter(
+        wallet=wallet, day__gte=first_day, day__lt=next_first_day
+    ).aggregate(s=Sum('coins'))['s'] or 0
     return {
         'period_coins': period_coins,
         'streak': wallet.current_streak,
@@ -189,7 +349,7 @@ def get_monthly_rating_rows(course_id, year, month, student_ids=None):
     kamayish tartibida. MonthlyStreakSetting shu (year, month) uchun yoqilgan
     bo'lsa, summalar oy-reset streak mantig'i bilan (bulk, N+1 siz) qayta hisoblanadi.
     """
-    from .models import CoinWallet, CoinTransaction
+    from .models import CoinWallet, CoinDailyRollup
 
     if is_monthly_streak_enabled(year, month):
         computed = compute_month_leaderboard(course_id, year, month, student_ids)
@@ -209,16 +369,17 @@ def get_monthly_rating_rows(course_id, year, month, student_ids=None):
     if not all_wallets:
         return []
 
-    txn_qs = CoinTransaction.objects.filter(
-        wallet__course_id=course_id,
-        topic__activated_at__year=year, topic__activated_at__month=month,
+    # Kunlik rollup'lar — (course, day) indeksidagi bitta oy oralig'i
+    first_day, next_first_day = _month_days(year, month)
+    rollup_qs = CoinDailyRollup.objects.filter(
+        course_id=course_id, day__gte=first_day, day__lt=next_first_day,
     )
     if student_ids is not None:
-        txn_qs = txn_qs.filter(wallet__student_id__in=student_ids)
+        rollup_qs = rollup_qs.filter(wallet__student_id__in=student_ids)
     monthly = dict(
-        txn_qs.values('wallet__student_id')
-              .annotate(s=Sum('total_coins'))
-              .values_list('wallet__student_id', 's')
+        rollup_qs.values('wallet__student_id')
+                 .annotate(s=Sum('coins'))
+                 .values_list('wallet__student_id', 's')
     )
     rows = sorted(
         [{'wallet__student__full_name': w.student.full_name,
@@ -233,59 +394,57 @@ def award_task_coins(student, topic, grade, deadline_passed, task_type='test'):
     Student vazifa bajarganida tanga berish.
     grade: already deadline-adjusted grade value
     Returns dict {result_coins, streak_coins, new_streak, total, total_wallet} yoki None.
+
+    Odatiy holatda 4 ta so'rov: hamyon (qulf + oxirgi mavzu + "allaqachon berilgan"
+    belgisi), hamyon UPDATE, tranzaksiya INSERT va kunlik rollup UPDATE. Oraliq (gap) tekshiruvi
+    CourseTopicSequence dan olinadi; oraliqda mavzu bo'lsagina bitta qo'shimcha
+    so'rov bilan ularning bajarilgani olinadi.
     """
-    from .models import CoinWallet, CoinTransaction, Topic, Task as TaskModel
+    from django.db.models import Exists, OuterRef
+    from .coin_rollups import add_to_rollup, rollup_day
+    from .models import CoinWallet, CoinTransaction, Task as TaskModel
 
     course = topic.course
     if not course or grade is None:
         return None
 
-    with db_transaction.atomic():
-        wallet, _ = CoinWallet.objects.select_for_update().get_or_create(
-            student=student, course=course
+    with db_transaction.atomic(savepoint=False):
+        wallet_qs = (
+            CoinWallet.objects.select_for_update(of=('self',))
+            .select_related('last_topic')
+            .annotate(already_awarded=Exists(CoinTransaction.objects.filter(
+                wallet=OuterRef('pk'), topic=topic, task_type=task_type,
+            )))
+            .filter(student=student, course=course)
         )
+        wallet = wallet_qs.first()
+        if wallet is None:
+            CoinWallet.objects.get_or_create(student=student, course=course)
+            wallet = wallet_qs.first()
 
         # Bir mavzu uchun bir marta beriladi
-        if CoinTransaction.objects.filter(wallet=wallet, topic=topic, task_type=task_type).exists():
+        if wallet.already_awarded:
             return None
 
         result_coins = max(0, grade)
 
-        last_topic_id = wallet.last_topic_id
-        last_submitted_at = wallet.last_submitted_at
-
-        if last_topic_id is None:
+        if wallet.last_topic_id is None:
             new_streak = 1
         else:
-            completed_ids = list(TaskModel.objects.filter(
-                student=student, topic__course=course
-            ).values_list('topic_id', flat=True))
-
-            if topic.activated_at is not None:
-                # Faqat OXIRGI topshirilgan mavzu bilan hozirgisi orasida (oraliqda)
-                # topshirilmagan active topic bor-yo'qligini tekshiramiz — butun kurs
-                # tarixi emas. Aks holda bir marta o'tkazib yuborilgan mavzu abadiy
-                # "gap" bo'lib qolib, undan keyingi barcha topshiriqlar uchun streak
-                # har doim 1 ga tushib qolar edi.
-                last_activated_at = Topic.objects.filter(id=last_topic_id).values_list(
-                    'activated_at', flat=True
-                ).first()
-                gap_qs = Topic.objects.filter(
-                    course=course,
-                    is_active=True,
-                    activated_at__lte=topic.activated_at,
-                )
-                if last_activated_at is not None:
-                    gap_qs = gap_qs.filter(activated_at__gt=last_activated_at)
-                has_gap = gap_qs.exclude(id__in=completed_ids).exclude(id=topic.id).exists()
-            else:
-                # activated_at yo'q bo'lsa: id bo'yicha oradagi topiclarni tekshir
-                has_gap = Topic.objects.filter(
-                    course=course,
-                    is_active=True,
-                    id__gt=last_topic_id,
-                    id__lt=topic.id,
-                ).exclude(id__in=completed_ids).exists()
+            # Faqat OXIRGI topshirilgan mavzu bilan hozirgisi orasida (oraliqda)
+            # topshirilmagan active topic bor-yo'qligini tekshiramiz — butun kurs
+            # tarixi emas. Aks holda bir marta o'tkazib yuborilgan mavzu abadiy
+            # "gap" bo'lib qolib, undan keyingi barcha topshiriqlar uchun streak
+            # har doim 1 ga tushib qolar edi.
+            gap_args = (wallet.last_topic_id, wallet.last_topic.activated_at, topic.id, topic.activated_at)
+            sequence = course_topic_sequence(course)
+            between = sequence.between(*gap_args)
+            # Oraliqda mavzu bo'lsagina — ulardan qaysilari bajarilganini bitta so'rovda olamiz
+            completed = set(
+                TaskModel.objects.filter(student=student, topic_id__in=between)
+                .values_list('topic_id', flat=True)
+            ) if between else set()
+            has_gap = sequence.has_uncompleted_between(*gap_args, completed)
 
             new_streak = 1 if has_gap else wallet.current_streak + 1
 
@@ -298,7 +457,10 @@ def award_task_coins(student, topic, grade, deadline_passed, task_type='test'):
             wallet.longest_streak = new_streak
         wallet.last_topic = topic
         wallet.last_submitted_at = timezone.now()
-        wallet.save()
+        wallet.save(update_fields=[
+            'total_coins', 'current_streak', 'longest_streak',
+            'last_topic', 'last_submitted_at', 'updated_at',
+        ])
 
         CoinTransaction.objects.create(
             wallet=wallet,
@@ -310,6 +472,8 @@ def award_task_coins(student, topic, grade, deadline_passed, task_type='test'):
             streak_after=new_streak,
             deadline_penalty=deadline_passed,
         )
+        add_to_rollup(wallet, rollup_day(topic.activated_at), total, new_streak)
+        invalidate_course_on_commit(course.id)
 
         return {
             'result_coins': result_coins,
@@ -328,6 +492,7 @@ def reverse_task_coins(task):
     (delta olib tashlash o'rniga to'liq qayta hisoblash — streak/longest_streak
     ni to'g'ri holatda saqlab qolish uchun).
     """
+    from .coin_rollups import refresh_rollups, rollup_day
     from .models import CoinWallet, CoinTransaction
 
     topic = task.topic
@@ -367,3 +532,5 @@ def reverse_task_coins(task):
             wallet.last_submitted_at = None
 
         wallet.save()
+        refresh_rollups([wallet.id], [rollup_day(topic.activated_at)])
+        invalidate_course_on_commit(course.id)
@@ -0,0 +1,181 @@
+from collections import defaultdict
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Sum, Value, When
+
+
+def _apply_delta(student_id, course_id, task_type, count_delta, sum_delta, submitted_at=None):
+    """Bitta (student, kurs, task turi) GradeAggregate qatoriga delta qo'shadi (yo'q bo'lsa yaratadi)."""
+    from .models import GradeAggregate
+
+    if not count_delta and not sum_delta and submitted_at is None:
+        return
+
+    updates = {
+        'submitted_count': F('submitted_count') + count_delta,
+        'grade_sum': F('grade_sum') + sum_delta,
+    }
+    if submitted_at is not None:
+        updates['last_submitted_at'] = submitted_at
+    # Odatda qator bor — bitta UPDATE; yo'q bo'lsagina yaratiladi
+    if GradeAggregate.objects.filter(
+        student_id=student_id, course_id=course_id, task_type=task_type
+    ).update(**updates):
+        return
+
+    agg, created = GradeAggregate.objects.get_or_create(
+        student_id=student_id, course_id=course_id, task_type=task_type,
+        defaults={
+            'submitted_count': max(0, count_delta),
+            'grade_sum': max(0, sum_delta),
+            'last_submitted_at': submitted_at,
+        },
+    )
+    if not created:
+        GradeAggregate.objects.filter(pk=agg.pk).update(**updates)
+
+
+def apply_task_grade_change(task, old_grade):
+    """
+    Task topshirilganda yoki qayta baholanganda chaqiriladi.
+    old_grade: o'zgarishdan oldingi baho (yangi task yoki baholanmagan bo'lsa None).
+    """
+    course_id = task.topic.course_id
+    if not course_id or old_grade == task.grade:
+        return
+
+    if old_grade is None:
+        _apply_delta(task.student_id, course_id, task.task_type, 1, task.grade, task.submitted_at)
+    elif task.grade is None:
+        _apply_delta(task.student_id, course_id, task.task_type, -1, -old_grade)
+    else:
+        _apply_delta(task.student_id, course_id, task.task_type, 0, task.grade - old_grade)
+
+
+def apply_task_removal(task):
+    """Task o'chirilishidan oldin chaqiriladi — uning bahosini yig'indidan ayiradi."""
+    from .models import GradeAggregate, Task
+
+    course_id = task.topic.course_id
+    if not course_id or task.grade is None:
+        return
+
+    _apply_delta(task.student_id, course_id, task.task_type, -1, -task.grade)
+
+    # Oxirgi topshirish vaqti shu task bo'lgan bo'lishi mumkin — qolganlaridan qayta olamiz
+    last_submitted_at = (
+        Task.objects.filter(
+            student_id=task.student_id, topic__course_id=course_id, task_type=task.task_type, grade__isnull=False,
+        )
+        .exclude(pk=task.pk)
+        .aggregate(m=Max('submitted_at'))['m']
+    )
+    GradeAggregate.objects.filter(
+        student_id=task.student_id, course_id=course_id, task_type=task.task_type
+    ).update(last_submitted_at=last_submitted_at)
+
+
+def pk_delta_case(deltas):
+    """{pk: delta} -> CASE WHEN id=.. THEN delta ... ELSE 0 END (bitta UPDATE uchun)."""
+    return Case(
+        *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def apply_grade_deltas(changes):
+    """
+    Ko'p task bir yo'la qayta baholanganda (masalan, to'g'ri javoblar o'zgarganda).
+    changes: [(task, old_grade), ...] — task.grade allaqachon yangi qiymatda.
+    Mavjud qatorlar bitta UPDATE ... CASE bilan, yo'qlari bulk_create bilan yoziladi.
+    """
+    from .models import GradeAggregate
+
+    deltas = defaultdict(lambda: [0, 0])
+    for task, old_grade in changes:
+        course_id = task.topic.course_id
+        if not course_id or old_grade == task.grade:
+            continue
+        d = deltas[(task.student_id, course_id, task.task_type)]
+        if old_grade is None:
+            d[0] += 1
+            d[1] += task.grade
+        elif task.grade is None:
+            d[0] -= 1
+            d[1] -= old_grade
+        else:
+            d[1] += task.grade - old_grade
+
+    deltas = {key: d for key, d in deltas.items() if d[0] or d[1]}
+    if not deltas:
+        return
+
+    existing = {
+        (student_id, course_id, task_type): pk
+        for pk, student_id, course_id, task_type in GradeAggregate.objects.filter(
+            student_id__in={sid for sid, _, _ in deltas},
+            course_id__in={cid for _, cid, _ in deltas},
+        ).values_list('pk', 'student_id', 'course_id', 'task_type')
+    }
+
+    count_deltas = {}
+    sum_deltas = {}
+    new_rows = []
+    for key, (count_delta, sum_delta) in deltas.items():
+        pk = existing.get(key)
+        if pk is None:
+            new_rows.append(GradeAggregate(
+                student_id=key[0], course_id=key[1], task_type=key[2],
+                submitted_count=max(0, count_delta), grade_sum=max(0, sum_delta),
+            ))
+            continue
+        if count_delta:
+            count_deltas[pk] = count_delta
+        if sum_delta:
+            sum_deltas[pk] = sum_delta
+
+    if count_deltas or sum_deltas:
+        GradeAggregate.objects.filter(pk__in=set(count_deltas) | set(sum_deltas)).update(
+            submitted_count=F('submitted_count') + pk_delta_case(count_deltas),
+            grade_sum=F('grade_sum') + pk_delta_case(sum_deltas),
+        )
+    if new_rows:
+        GradeAggregate.objects.bulk_create(new_rows, batch_size=1000)
+
+
+def rebuild_grade_aggregates(course_id=None):
+    """
+    GradeAggregate jadvalini Task'lardan noldan quradi (bitta aggregate so'rov).
+    course_id berilsa — faqat shu kurs qayta quriladi.
+    Returns: yaratilgan qatorlar soni.
+    """
+    from .models import GradeAggregate, Task
+
+    tasks = Task.objects.filter(grade__isnull=False, topic__course__isnull=False)
+    existing = GradeAggregate.objects.all()
+    if course_id is not None:
+        tasks = tasks.filter(topic__course_id=course_id)
+        existing = existing.filter(course_id=course_id)
+
+    rows = (
+        tasks.values('student_id', 'topic__course_id', 'task_type')
+        .annotate(cnt=Count('id'), total=Sum('grade'), last=Max('submitted_at'))
+        .order_by()
+    )
+    objs = [
+        GradeAggregate(
+            student_id=r['student_id'],
+            course_id=r['topic__course_id'],
+            task_type=r['task_type'],
+            submitted_count=r['cnt'],
+            grade_sum=r['total'] or 0,
+            last_submitted_at=r['last'],
+        )
+        for r in rows
+    ]
+
+    with db_transaction.atomic():
+        existing.delete()
+        GradeAggregate.objects.bulk_create(objs, batch_size=1000)
+    return len(objs)
@@ -0,0 +1,240 @@
+"""
+Test javoblarini tekshirish (baholash) — API va bot uchun yagona modul.
+
+To'g'ri javoblar kaliti bir marta AnswerKey ga kompilyatsiya qilinadi: har savol
+uchun ruxsat etilgan harflar bitmask ko'rinishida saqlanadi (a=1, b=2, c=4, ...).
+Student javobi harfi ham bitga aylantiriladi — to'g'rilik `mask & bit != 0`.
+
+Kalit formatlari:
+  - "abc"          — har harf bitta savol
+  - "1a2b3c"       — raqam + harf
+  - "1ab2x3abcd"   — bir savolda bir nechta to'g'ri javob; "x" — savol bekor
+                     qilingan (har qanday javob to'g'ri hisoblanadi)
+
+grade_many() ko'p javobni bir o'tishda baholaydi (NumPy bo'lsa vektorlashtirilgan).
+"""
+import re
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # requirements.txt da bor; o'rnatilmagan muhitda oddiy Python yo'li ishlatiladi
+    np = None
+
+FAN_QUESTIONS = 35          # 1-35 savollar — Fan bloki
+BLOCK_TEST_QUESTIONS = 50   # Fan + Ped (36-50) bloklari bo'lgan test uzunligi
+POINTS_PER_QUESTION = 2
+
+_DIGIT_RE = re.compile(r'\d')
+_KEY_NUMBERED_RE = re.compile(r'\d+([a-zx]+)')
+_STUDENT_NUMBERED_RE = re.compile(r'\d+([a-zx])')
+_LETTERS_RE = re.compile(r'^[a-zx]+$')
+
+_ALL_LETTERS = (1 << 26) - 1
+VOID_MASK = _ALL_LETTERS
+
+
+def letter_bit(ch):
+    """'a' -> 1, 'b' -> 2, ... lotin harfi bo'lmasa 0."""
+    if len(ch) == 1 and 'a' <= ch <= 'z':
+        return 1 << (ord(ch) - 97)
+    return 0
+
+
+def parse_key(correct_str):
+    """
+    Admin kiritgan kalitni savollar ro'yxatiga aylantiradi:
+    "1ab2x3c" -> [['a', 'b'], ['x'], ['c']], "abc" -> [['a'], ['b'], ['c']]
+    """
+    correct = (correct_str or '').lower().strip()
+    if _DIGIT_RE.search(correct):
+        return [
+            ['x'] if letters == 'x' else list(letters)
+            for letters in _KEY_NUMBERED_RE.findall(correct)
+        ]
+    if _LETTERS_RE.match(correct):
+        return [[ch] for ch in correct]
+    return [[ch] for ch in correct if ch.isalpha()]
+
+
+def parse_answers(answer_str):
+    """
+    Student javoblarini ro'yxatga aylantiradi (har savolga bitta harf):
+    "abc" -> ['a', 'b', 'c'], "1a2b3c" -> ['a', 'b', 'c'].
+    Eski yozuvlardagi "12-abc" (test_kodi-javoblar) prefiksi olib tashlanadi.
+    """
+    answers = (answer_str or '').lower().strip()
+    if '-' in answers:
+        prefix, rest = answers.split('-', 1)
+        if prefix.replace('_', '').isdigit():
+            answers = rest
+    if _DIGIT_RE.search(answers):
+        return _STUDENT_NUMBERED_RE.findall(answers)
+    if _LETTERS_RE.match(answers):
+        return list(answers)
+    return [ch for ch in answers if ch.isalpha()]
+
+
+class AnswerKey:
+    """Bir marta kompilyatsiya qilingan to'g'ri javoblar kaliti."""
+
+    __slots__ = ('source', 'options', 'masks', 'void', '_np_masks')
+
+    def __init__(self, correct_str):
+        self.source = correct_str or ''
+        self.options = parse_key(self.source)
+        self.void = tuple(opts == ['x'] for opts in self.options)
+        self.masks = tuple(
+            VOID_MASK if is_void else sum(letter_bit(ch) for ch in set(opts))
+            for opts, is_void in zip(self.options, self.void)
+        )
+        self._np_masks = None
+
+    def __len__(self):
+        return len(self.masks)
+
+    @property
+    def n_questions(self):
+        return len(self.masks)
+
+    @property
+    def has_blocks(self):
+        """50 savollik (Fan + Ped) testmi"""
+        return len(self.masks) == BLOCK_TEST_QUESTIONS
+
+    def check(self, answers):
+        """Har savol uchun True/False ro'yxati. answers — parse_answers() natijasi."""
+        return [bool(mask & letter_bit(a)) for mask, a in zip(self.masks, answers)]
+
+    def score(self, answers, pad=False):
+        """
+        To'g'ri javoblar soni. Javoblar soni kalit bilan mos kelmasa None
+        (pad=True bo'lsa yetishmaganlari javobsiz deb hisoblanadi).
+        """
+        if len(answers) != len(self.masks) and not (pad and len(answers) < len(self.masks)):
+            return None
+        return sum(1 for mask, a in zip(self.masks, answers) if mask & letter_bit(a))
+
+    def fan_ped(self, answers, pad=True):
+        """
+        50 savollik test uchun (fan_ball, ped_ball): har to'g'ri javob 2 ball.
+        Kalit 50 savol bo'lmasa yoki javoblar mos kelmasa (None, None).
+        """
+        if not self.has_blocks:
+            return None, None
+        if len(answers) != len(self.masks) and not (pad and len(answers) < len(self.masks)):
+            return None, None
+        fan = ped = 0
+        for i, (mask, a) in enumerate(zip(self.masks, answers)):
+            if mask & letter_bit(a):
+                if i < FAN_QUESTIONS:
+                    fan += POINTS_PER_QUESTION
+                else:
+                    ped += POINTS_PER_QUESTION
+        return fan, ped
+
+    def valid_letters(self, index):
+        """Ko'rsatish uchun: savolning to'g'ri variantlari ('A/B' ko'rinishida)."""
+        return '/'.join(ch.upper() for ch in self.options[index])
+
+
+@lru_cache(maxsize=2048)
+def get_answer_key(correct_str):
+    """
+    Keshlangan AnswerKey — kalit satri bo'yicha: admin javoblarni o'zgartirsa satr
+    o'zgaradi va yangi kalit kompilyatsiya qilinadi.
+    """
+    return AnswerKey(correct_str or '')
+
+
+# --- Ommaviy baholash ---
+
+_bit_table = None
+
+
+def _encode(answers_list, width):
+    """Javoblar ro'yxatini (n, width) bitlar matritsasiga aylantiradi (NumPy)."""
+    global _bit_table
+    if _bit_table is None:
+        _bit_table = np.zeros(256, dtype=np.int64)
+        for i in range(26):
+            _bit_table[97 + i] = 1 << i
+    # Har qator width gacha to'ldiriladi/kesiladi va bitta buferga yig'iladi
+    buf = ''.join(''.join(answers[:width]).ljust(width, '\0') for answers in answers_list)
+    codes = np.frombuffer(buf.encode('latin-1', 'replace'), dtype=np.uint8)
+    return _bit_table[codes.reshape(len(answers_list), width)]
+
+
+def _correct_matrix(key, parsed, pad):
+    """
+    (to'g'rilik matritsasi, yaroqli qatorlar) — NumPy bo'lsa ndarray, aks holda ro'yxatlar.
+    Yaroqsiz qator: javoblar soni kalitga mos kelmaydi.
+    """
+    n_q = len(key.masks)
+    valid = [
+        len(a) == n_q or (pad and len(a) < n_q)
+        for a in parsed
+    ]
+    if np is not None and parsed and n_q:
+        if key._np_masks is None:
+            key._np_masks = np.array(key.masks, dtype=np.int64)
+        bits = _encode(parsed, n_q)
+        return (bits & key._np_masks) != 0, valid
+
+    masks = key.masks
+    matrix = [
+        [bool(m & letter_bit(a)) for m, a in zip(masks, answers)]
+        for answers in parsed
+    ]
+    return matrix, valid
+
+
+def _as_parsed(answers_list):
+    return [a if isinstance(a, list) else parse_answers(a) for a in answers_list]
+
+
+def grade_many(key, answers_list, pad=False):
+    """
+    Ko'p javobni bitta kalit bo'yicha baholaydi.
+    answers_list — xom satrlar yoki parse_answers() ro'yxatlari.
+    Qaytaradi: har javob uchun to'g'ri javoblar soni (mos kelmasa None).
+    """
+    parsed = _as_parsed(answers_list)
+    matrix, valid = _correct_matrix(key, parsed, pad)
+    if np is not None and isinstance(matrix, np.ndarray):
+        totals = matrix.sum(axis=1).tolist()
+    else:
+        totals = [sum(row) for row in matrix]
+    return [int(t) if ok else None for t, ok in zip(totals, valid)]
+
+
+def block_counts_many(key, answers_list, pad=False):
+    """
+    Har javob uchun (fan_togri, ped_togri) — 1-35 va 36+ savollardagi to'g'ri
+    javoblar soni (kalit uzunligidan qat'i nazar), mos kelmasa None.
+    """
+    parsed = _as_parsed(answers_list)
+    matrix, valid = _correct_matrix(key, parsed, pad)
+    if np is not None and isinstance(matrix, np.ndarray):
+        fan = matrix[:, :FAN_QUESTIONS].sum(axis=1).tolist()
+        ped = matrix[:, FAN_QUESTIONS:].sum(axis=1).tolist()
+    else:
+        fan = [sum(row[:FAN_QUESTIONS]) for row in matrix]
+        ped = [sum(row[FAN_QUESTIONS:]) for row in matrix]
+    return [
+        (int(f), int(p)) if ok else None
+        for f, p, ok in zip(fan, ped, valid)
+    ]
+
+
+def fan_ped_many(key, answers_list, pad=True):
+    """50 savollik test uchun har javobga (fan_ball, ped_ball) yoki (None, None)."""
+    if not key.has_blocks:
+        return [(None, None)] * len(answers_list)
+    result = []
+    for counts in block_counts_many(key, answers_list, pad):
+        if counts is None:
+            result.append((None, None))
+        else:
+            result.append((counts[0] * POINTS_PER_QUESTION, counts[1] * POINTS_PER_QUESTION))
+    return result
@@ -0,0 +1,187 @@
+"""
+Kurs reytingi (LeaderboardView) uchun tayyor snapshotlar.
+
+Har (kurs, davr, rejim) uchun reyting bir marta tartiblab quriladi va xotirada
+saqlanadi: top N — ro'yxat boshidan kesma, "mening o'rnim" — telegram_id → o'rin
+indeksi orqali O(1). Har "🏆 Reyting" bosilganda barcha wallet'larni qayta
+tartiblash (oy-reset rejimida esa compute_month_leaderboard) shart emas.
+
+Yangilanish:
+  - tanga berilganda / bekor qilinganda / qayta baholanganda invalidate_course()
+    kursning versiyasini oshiradi (tranzaksiya commit bo'lgach)
+  - boshqa jarayonlardagi (masalan, bot) o'zgarishlar SNAPSHOT_TTL ichida ko'rinadi
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.db.models import Count, FilteredRelation, Q, Sum
+from django.db.models.functions import Coalesce
+
+SNAPSHOT_TTL = 60  # sekund
+RANK_LIMIT = 600   # bundan keyingi o'rinlar my_rank da ko'rsatilmaydi
+
+MODE_ALL_TIME = 'all'
+MODE_PERIOD = 'period'
+MODE_MONTH_RESET = 'reset'
+
+_snapshots = {}                 # key -> LeaderboardSnapshot
+_versions = defaultdict(int)    # course_id -> versiya (invalidate_course oshiradi)
+_build_locks = {}               # key -> threading.Lock (bir vaqtda bitta qurish)
+_lock = threading.Lock()
+
+
+class LeaderboardSnapshot:
+    """Tartiblangan reyting qatorlari va telegram_id bo'yicha o'rin indeksi."""
+
+    __slots__ = ('rows', 'rank_index', 'version', 'built_at')
+
+    def __init__(self, rows, version):
+        self.rows = rows
+        self.rank_index = {row['telegram_id']: i for i, row in enumerate(rows)}
+        self.version = version
+        self.built_at = time.monotonic()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.built_at
+
+    def top(self, n=10):
+        return self.rows[:n]
+
+    def find(self, telegram_id):
+        """Studentning qatori (rank bilan) yoki None (bu kursda hamyoni yo'q)."""
+        i = self.rank_index.get(str(telegram_id))
+        return self.rows[i] if i is not None else None
+
+
+def _row(rank, telegram_id, full_name, coins, streak, longest):
+    return {
+        "rank": rank,
+        "telegram_id": telegram_id,
+        "full_name": full_name,
+        "total_coins": coins,
+        "current_streak": streak,
+        "longest_streak": longest,
+    }
+
+
+def _build_all_time(course_id):
+    from .models import CoinWallet
+
+    # id — teng qatorlar tartibi barqaror va all_time_ranks bilan bir xil bo'lishi uchun
+    qs = (
+        CoinWallet.objects.filter(course_id=course_id)
+        .order_by('-total_coins', '-longest_streak', 'id')
+        .values_list('student__telegram_id', 'student__full_name',
+                     'total_coins', 'current_streak', 'longest_streak')
+    )
+    return [_row(rank, *values) for rank, values in enumerate(qs, start=1)]
+
+
+def _build_period(course_id, year, month):
+    from .coins import _month_days
+    from .models import CoinWallet
+
+    # Kunlik rollup'lar JOIN sharti ichida — (wallet, day) indeksidan faqat shu oy qatorlari
+    first_day, next_first_day = _month_days(year, month)
+    qs = (
+        CoinWallet.objects.filter(course_id=course_id)
+        .annotate(month_rollups=FilteredRelation('daily_rollups', condition=Q(
+            daily_rollups__day__gte=first_day, daily_rollups__day__lt=next_first_day,
+        )))
+        .annotate(period_coins=Coalesce(Sum('month_rollups__coins'), 0))
+        .order_by('-period_coins', '-longest_streak')
+        .values_list('student__telegram_id', 'student__full_name',
+                     'period_coins', 'current_streak', 'longest_streak')
+    )
+    return [_row(rank, *values) for rank, values in enumerate(qs, start=1)]
+
+
+def _build_month_reset(course_id, year, month):
+    from .coins import compute_month_leaderboard
+
+    computed = compute_month_leaderboard(course_id, year, month)
+    return [
+        _row(rank, w.student.telegram_id, w.student.full_name, p_coins, p_streak, p_longest)
+        for rank, (w, p_coins, p_streak, p_longest) in enumerate(computed, start=1)
+    ]
+
+
+def get_leaderboard(course_id, year=None, month=None):
+    """
+    Kurs reytingi snapshoti. year/month berilsa — shu oy bo'yicha
+    (oylik streak rejimi yoqilgan bo'lsa oy-reset hisobida).
+    """
+    from .coins import is_monthly_streak_enabled
+
+    course_id = int(course_id)
+    if year and month:
+        mode = MODE_MONTH_RESET if is_monthly_streak_enabled(year, month) else MODE_PERIOD
+        key = (course_id, mode, year, month)
+    else:
+        mode = MODE_ALL_TIME
+        key = (course_id, mode)
+
+    snapshot = _snapshots.get(key)
+    if snapshot and snapshot.version == _versions[course_id] and snapshot.age < SNAPSHOT_TTL:
+        return snapshot
+
+    with _lock:
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    with build_lock:
+        # Kutib turgan paytda boshqa thread qurib qo'ygan bo'lishi mumkin
+        snapshot = _snapshots.get(key)
+        if snapshot and snapshot.version == _versions[course_id] and snapshot.age < SNAPSHOT_TTL:
+            return snapshot
+
+        # Versiya qurishdan OLDIN olinadi — qurish paytida kelgan invalidate yo'qolmaydi
+        version = _versions[course_id]
+        if mode == MODE_ALL_TIME:
+            rows = _build_all_time(course_id)
+        elif mode == MODE_PERIOD:
+            rows = _build_period(course_id, year, month)
+        else:
+            rows = _build_month_reset(course_id, year, month)
+        snapshot = LeaderboardSnapshot(rows, version)
+        _snapshots[key] = snapshot
+        return snapshot
+
+
+def invalidate_course(course_id):
+    """Kursning barcha reyting snapshotlarini eskirgan deb belgilaydi."""
+    if course_id is None:
+        return
+    _versions[int(course_id)] += 1
+
+
+def invalidate_course_on_commit(course_id):
+    """Tranzaksiya ichida chaqirilsa — commit bo'lgandan keyin invalidate qiladi."""
+    from django.db import transaction as db_transaction
+
+    db_transaction.on_commit(lambda: invalidate_course(course_id))
+
+
+def all_time_ranks(wallets):
+    """
+    Studentning har bir hamyoni uchun kursdagi o'rni (barcha vaqt) — bitta so'rovda:
+    o'rin = 1 + COUNT(kursda (total_coins, longest_streak) bo'yicha oldinda turganlar;
+    to'liq teng bo'lsa id kichigi oldinda) — _build_all_time tartibi bilan bir xil.
+    wallets: CoinWallet ro'yxati (bitta studentniki). Qaytaradi: {course_id: rank}.
+    """
+    from .models import CoinWallet
+
+    if not wallets:
+        return {}
+    aggregates = {
+        f"c{w.course_id}": Count('id', filter=Q(course_id=w.course_id) & (
+            Q(total_coins__gt=w.total_coins) |
+            Q(total_coins=w.total_coins, longest_streak__gt=w.longest_streak) |
+            Q(total_coins=w.total_coins, longest_streak=w.longest_streak, id__lt=w.id)
+        ))
+        for w in wallets
+    }
+    counts = CoinWallet.objects.filter(
+        course_id__in=[w.course_id for w in wallets]
+    ).aggregate(**aggregates)
+    return {w.course_id: counts[f"c{w.course_id}"] + 1 for w in wallets}
@@ -0,0 +1,110 @@
+"""
+Management command: bot ishlatadigan API endpointlari kechikishi (p50 / p99) —
+CONN_MAX_AGE=0 (har request'da yangi DB ulanish) va persistent ulanish
+(settings dagi CONN_MAX_AGE + CONN_HEALTH_CHECKS) solishtiriladi.
+
+Standart rejim: so'rovlar jarayon ichida (django.test.Client) yuboriladi, har
+so'rov atrofida close_old_connections() — haqiqiy request sikli bilan bir xil,
+shuning uchun ulanish ochish narxi o'lchovga kiradi.
+--base-url berilsa: ishlab turgan serverga HTTP orqali (rejimni o'sha server
+sozlamasi belgilaydi — deploydan oldin va keyin alohida ishga tushiriladi).
+"""
+import statistics
+import time
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+
+from base_app.models import Student
+
+
+def _percentile(sorted_values, p):
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "API kechikishi (p50/p99): CONN_MAX_AGE=0 va persistent ulanishlar solishtiriladi"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help="Har endpoint va rejim uchun so'rovlar soni")
+        parser.add_argument('--telegram-id', type=str, default=None,
+                            help="Qaysi student bilan o'lchash (standart: birinchi student)")
+        parser.add_argument('--path', action='append', default=None,
+                            help="Qo'shimcha/alternativ endpoint (masalan /api/courses/), bir necha marta berish mumkin")
+        parser.add_argument('--base-url', type=str, default=None,
+                            help="Ishlab turgan server (masalan http://127.0.0.1:8000) — HTTP orqali o'lchash")
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        paths = options['path'] or self._default_paths(options['telegram_id'])
+
+        if options['base_url']:
+            base_url = options['base_url'].rstrip('/')
+            self.stdout.write(f"🌐 {base_url}, har endpoint uchun {n} ta so'rov\n")
+            for path in paths:
+                self._report(path, self._measure_http(base_url + path, n))
+            return
+
+        configured = connection.settings_dict['CONN_MAX_AGE']
+        modes = [("CONN_MAX_AGE=0", 0)]
+        if configured != 0:
+            modes.append((f"CONN_MAX_AGE={configured}", configured))
+        self.stdout.write(f"🔬 Jarayon ichida, har endpoint va rejim uchun {n} ta so'rov\n")
+
+        client = Client()
+        try:
+            for label, max_age in modes:
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                for path in paths:
+                    self._report(path, self._measure_client(client, path, n))
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = configured
+            connection.close()
+
+    def _default_paths(self, telegram_id):
+        if telegram_id is None:
+            telegram_id = Student.objects.order_by('id').values_list('telegram_id', flat=True).first()
+        if telegram_id is None:
+            raise CommandError("Student topilmadi — --telegram-id yoki --path bering")
+        return [
+            f"/api/students/{telegram_id}/",
+            f"/api/topics/?student_id={telegram_id}",
+            "/api/courses/",
+        ]
+
+    def _measure_client(self, client, path, n):
+        # Isitish: URL resolver, import va h.k. birinchi so'rovda
+        client.get(path)
+        timings = []
+        for _ in range(n):
+            started = time.perf_counter()
+            close_old_connections()
+            response = client.get(path)
+            close_old_connections()
+            timings.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                raise CommandError(f"{path}: HTTP {response.status_code}")
+        return timings
+
+    def _measure_http(self, url, n):
+        urllib.request.urlopen(url).read()
+        timings = []
+        for _ in range(n):
+            started = time.perf_counter()
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def _report(self, path, timings):
+        timings.sort()
+        ms = lambda seconds: f"{seconds * 1000:7.2f} ms"
+        self.stdout.write(
+            f"  {path:<45} p50 {ms(statistics.median(timings))}   "
+            f"p99 {ms(_percentile(timings, 99))}   max {ms(timings[-1])}"
+        )
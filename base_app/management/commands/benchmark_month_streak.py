@@ -0,0 +1,136 @@
+"""
+Management command: oy-reset streak replay (_replay_month_txs) benchmarki —
+inkremental algoritm eski (har tranzaksiyada to'plamni qayta quradigan) usul bilan
+generatsiya qilingan kursda solishtiriladi. DB ishlatilmaydi.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from base_app.coins import CourseTopicSequence, _replay_month_txs
+
+
+def _replay_reference(txs, all_tasks, active_topics):
+    """Eski algoritm: O(txs × (tasks + topics)) — natijalarni tekshirish uchun."""
+    current_streak = 0
+    longest_streak = 0
+    last_topic_id = None
+    last_activated_at = None
+    period_coins = 0
+
+    for tx in txs:
+        topic = tx.topic
+        completed_ids = {
+            tid for tid, sub_at in all_tasks
+            if sub_at is not None and sub_at <= tx.created_at
+        }
+
+        if last_topic_id is None:
+            new_streak = 1
+        else:
+            if topic.activated_at is not None:
+                upper = topic.activated_at
+                lower = last_activated_at
+                has_gap = any(
+                    tid != topic.id
+                    and act is not None and act <= upper
+                    and (lower is None or act > lower)
+                    and tid not in completed_ids
+                    for tid, act in active_topics
+                )
+            else:
+                has_gap = any(
+                    tid != topic.id and last_topic_id < tid < topic.id and tid not in completed_ids
+                    for tid, act in active_topics
+                )
+            new_streak = 1 if has_gap else current_streak + 1
+
+        period_coins += tx.result_coins + new_streak
+        current_streak = new_streak
+        longest_streak = max(longest_streak, new_streak)
+        last_topic_id = topic.id
+        last_activated_at = topic.activated_at
+
+    return period_coins, current_streak, longest_streak
+
+
+def _generate_course(rng, n_wallets, n_topics, history_topics, skip_rate):
+    """
+    Kurs: history_topics ta o'tgan oylardagi mavzu + n_topics ta shu oydagi mavzu.
+    Har wallet uchun (txs, all_tasks) — mavzularning bir qismi o'tkazib yuboriladi.
+    """
+    month_start = datetime(2025, 3, 1)
+    topics = []
+    for i in range(history_topics + n_topics):
+        if i < history_topics:
+            activated_at = month_start - timedelta(days=history_topics - i)
+        else:
+            activated_at = month_start + timedelta(hours=12 * (i - history_topics))
+        # Ba'zi eski mavzularda activated_at yo'q (id bo'yicha tekshiruv yo'li)
+        if rng.random() < 0.05:
+            activated_at = None
+        topics.append(SimpleNamespace(id=i + 1, activated_at=activated_at))
+    active_topics = [(t.id, t.activated_at) for t in topics]
+
+    wallets = []
+    for _ in range(n_wallets):
+        all_tasks = []
+        txs = []
+        for t in topics:
+            if rng.random() < skip_rate:
+                continue
+            base = t.activated_at or month_start
+            submitted_at = base + timedelta(hours=rng.randint(1, 60))
+            all_tasks.append((t.id, submitted_at))
+            if t.activated_at is not None and t.activated_at >= month_start:
+                txs.append(SimpleNamespace(
+                    topic=t, created_at=submitted_at, result_coins=rng.randint(0, 10),
+                ))
+        txs.sort(key=lambda tx: tx.created_at)
+        rng.shuffle(all_tasks)
+        wallets.append((txs, all_tasks))
+    return active_topics, wallets
+
+
+class Command(BaseCommand):
+    help = "Oy-reset streak replay: inkremental va eski algoritmni generatsiya qilingan kursda solishtiradi"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallets', type=int, default=1000, help="Wallet'lar soni (default 1000)")
+        parser.add_argument('--topics', type=int, default=60, help="Shu oydagi mavzular soni")
+        parser.add_argument('--history', type=int, default=120, help="O'tgan oylardagi mavzular soni")
+        parser.add_argument('--skip-rate', type=float, default=0.15, help="Mavzuni o'tkazib yuborish ehtimoli")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        active_topics, wallets = _generate_course(
+            rng, options['wallets'], options['topics'], options['history'], options['skip_rate'],
+        )
+        n_txs = sum(len(txs) for txs, _ in wallets)
+        n_tasks = sum(len(tasks) for _, tasks in wallets)
+        self.stdout.write(
+            f"📦 {len(wallets)} wallet, {len(active_topics)} faol mavzu, "
+            f"{n_txs} tranzaksiya, {n_tasks} task"
+        )
+
+        t0 = time.perf_counter()
+        reference = [_replay_reference(txs, tasks, active_topics) for txs, tasks in wallets]
+        t_reference = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        sequence = CourseTopicSequence(active_topics)
+        incremental = [_replay_month_txs(txs, tasks, sequence) for txs, tasks in wallets]
+        t_incremental = time.perf_counter() - t0
+
+        mismatches = sum(1 for a, b in zip(reference, incremental) if a != b)
+        self.stdout.write(f"🐢 Eski algoritm:       {t_reference * 1000:.0f} ms")
+        self.stdout.write(f"⚡ Inkremental:        {t_incremental * 1000:.0f} ms "
+                          f"(x{t_reference / t_incremental:.1f})")
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f"❌ {mismatches} ta wallet natijasi mos kelmadi"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Natijalar bir xil"))
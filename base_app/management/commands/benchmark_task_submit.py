@@ -0,0 +1,272 @@
+"""
+Management command: test yuborish (POST /api/tasks/submit/) benchmarki — joriy
+tezkor yo'l (TaskSubmitView + award_task_coins) eski yo'l bilan parallel yuklama
+ostida solishtiriladi: o'tkazuvchanlik, p50/p99 kechikish va bitta yuborishdagi
+SQL so'rovlar soni.
+
+Vaqtinchalik kurs, guruh, mavzular va har rejim uchun alohida studentlar yaratiladi
+(nomi "bench_..."), oxirida o'chiriladi (--keep bo'lmasa). Mavzular "to'lqin"
+bo'lib yuboriladi — deadline oldidagi kabi barcha studentlar bir vaqtda.
+Haqiqiy qulflash/parallellik manzarasi uchun PostgreSQL da ishga tushiring.
+"""
+import queue
+import random
+import statistics
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction as db_transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from base_app.grade_stats import apply_task_grade_change
+from base_app.leaderboard import invalidate_course_on_commit
+from base_app.models import CoinTransaction, CoinWallet, Course, Group, Student, Task, Topic
+from base_app.serializers import TaskSerializer
+from base_app.views import TaskSubmitView
+
+
+def _reference_award_task_coins(student, topic, grade, deadline_passed, task_type='test'):
+    """Eski award_task_coins: har qadam alohida so'rov (taqqoslash uchun)."""
+    course = topic.course
+    if not course or grade is None:
+        return None
+
+    with db_transaction.atomic():
+        wallet, _ = CoinWallet.objects.select_for_update().get_or_create(student=student, course=course)
+        if CoinTransaction.objects.filter(wallet=wallet, topic=topic, task_type=task_type).exists():
+            return None
+
+        result_coins = max(0, grade)
+        if wallet.last_topic_id is None:
+            new_streak = 1
+        else:
+            completed_ids = list(Task.objects.filter(
+                student=student, topic__course=course
+            ).values_list('topic_id', flat=True))
+            if topic.activated_at is not None:
+                last_activated_at = Topic.objects.filter(id=wallet.last_topic_id).values_list(
+                    'activated_at', flat=True
+                ).first()
+                gap_qs = Topic.objects.filter(course=course, is_active=True, activated_at__lte=topic.activated_at)
+                if last_activated_at is not None:
+                    gap_qs = gap_qs.filter(activated_at__gt=last_activated_at)
+                has_gap = gap_qs.exclude(id__in=completed_ids).exclude(id=topic.id).exists()
+            else:
+                has_gap = Topic.objects.filter(
+                    course=course, is_active=True, id__gt=wallet.last_topic_id, id__lt=topic.id,
+                ).exclude(id__in=completed_ids).exists()
+            new_streak = 1 if has_gap else wallet.current_streak + 1
+
+        total = result_coins + new_streak
+        wallet.total_coins += total
+        wallet.current_streak = new_streak
+        wallet.longest_streak = max(wallet.longest_streak, new_streak)
+        wallet.last_topic = topic
+        wallet.last_submitted_at = timezone.now()
+        wallet.save()
+        CoinTransaction.objects.create(
+            wallet=wallet, topic=topic, task_type=task_type,
+            result_coins=result_coins, streak_coins=new_streak, total_coins=total,
+            streak_after=new_streak, deadline_penalty=deadline_passed,
+        )
+        invalidate_course_on_commit(course.id)
+        return {'result_coins': result_coins, 'streak_coins': new_streak, 'new_streak': new_streak,
+                'total': total, 'total_wallet': wallet.total_coins, 'longest_streak': wallet.longest_streak}
+
+
+class _ReferenceSubmitView(APIView):
+    """Eski TaskSubmitView: student/topic alohida, serializer PK va unique tekshiruvi bilan."""
+
+    def post(self, request):
+        try:
+            student = Student.objects.get(telegram_id=request.data.get("student_id"))
+            topic = Topic.objects.get(id=request.data.get("topic_id"))
+        except (Student.DoesNotExist, Topic.DoesNotExist):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        serializer = TaskSerializer(data={
+            "student_id": student.id,
+            "topic_id": topic.id,
+            "task_type": request.data.get("task_type", "test"),
+            "test_answers": request.data.get("test_answers"),
+            "grade": request.data.get("grade"),
+        })
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with db_transaction.atomic():
+            task = serializer.save()
+            apply_task_grade_change(task, None)
+            deadline_passed = bool(topic.deadline and timezone.now() > topic.deadline)
+            coin_info = _reference_award_task_coins(student, topic, task.grade, deadline_passed, 'test')
+        resp_data = TaskSerializer(task).data
+        if coin_info:
+            resp_data['coin_info'] = coin_info
+        return Response(resp_data, status=status.HTTP_201_CREATED)
+
+
+def _percentile(sorted_values, p):
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Test yuborish: tezkor va eski yo'lni parallel yuklama ostida solishtiradi (p50/p99, so'rovlar soni)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100, help="Har rejim uchun studentlar soni")
+        parser.add_argument('--topics', type=int, default=10, help="Mavzular (to'lqinlar) soni")
+        parser.add_argument('--workers', type=int, default=8, help="Parallel oqimlar soni")
+        parser.add_argument('--skip-rate', type=float, default=0.15,
+                            help="Mavzuni o'tkazib yuborish ehtimoli (streak uzilishi yo'li)")
+        parser.add_argument('--fields', type=str, default=None,
+                            help="Tezkor yo'l javobi uchun ?fields= (masalan id — bot test yuborishi kabi)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help="Yaratilgan ma'lumotlarni o'chirmaslik")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        tag = f"bench_{uuid.uuid4().hex[:8]}"
+        fast_path = '/api/tasks/submit/' + (f"?fields={options['fields']}" if options['fields'] else '')
+        modes = [
+            ("🐢 Eski yo'l", _ReferenceSubmitView.as_view(), '/api/tasks/submit/'),
+            ("⚡ Tezkor yo'l", TaskSubmitView.as_view(), fast_path),
+        ]
+
+        course, topics, students_by_mode = self._create_data(tag, len(modes), options)
+        self.stdout.write(
+            f"📦 {tag}: {len(topics)} mavzu, har rejimda {options['students']} student, "
+            f"{options['workers']} oqim ({connection.vendor})\n"
+        )
+        # Ikkala rejim uchun bir xil naqsh: har to'lqinda (student indeksi, baho), aralashtirilgan
+        pattern = []
+        for _ in topics:
+            wave = [(i, rng.randint(0, 30)) for i in range(options['students']) if rng.random() >= options['skip_rate']]
+            rng.shuffle(wave)
+            pattern.append(wave)
+        try:
+            for (label, view, path), students in zip(modes, students_by_mode):
+                waves = [
+                    [(students[i].telegram_id, topic.id, grade) for i, grade in wave]
+                    for topic, wave in zip(topics, pattern)
+                ]
+                # Birinchi to'lqin ketma-ket (hamyonlar yaratiladi), keyin ikkinchi to'lqindan
+                # hamyoni bor bitta student bilan so'rovlar soni o'lchanadi
+                self._run_waves(view, path, waves[:1], 1)
+                queries = None
+                if len(waves) > 1:
+                    warm = {job[0] for job in waves[0]}
+                    sample = next((job for job in waves[1] if job[0] in warm), None)
+                    if sample is not None:
+                        waves[1].remove(sample)
+                        queries = self._count_queries(view, path, sample)
+                timings, errors, elapsed = self._run_waves(view, path, waves[1:], options['workers'])
+                self._report(label, timings, errors, elapsed, queries)
+        finally:
+            if options['keep']:
+                self.stdout.write(f"💾 Ma'lumotlar saqlandi: {tag}")
+            else:
+                self._cleanup(course, students_by_mode)
+
+    def _create_data(self, tag, n_modes, options):
+        course = Course.objects.create(name=tag, code=tag)
+        group = Group.objects.create(name=tag, course=course, max_students=10 ** 6)
+        topics = [
+            Topic.objects.create(course=course, title=f"{tag}_{i}", is_active=True)
+            for i in range(options['topics'])
+        ]
+        students_by_mode = []
+        for mode in range(n_modes):
+            Student.objects.bulk_create([
+                Student(telegram_id=f"{tag}_{mode}_{i}", full_name=f"Bench {mode}-{i}")
+                for i in range(options['students'])
+            ])
+            students = list(Student.objects.filter(telegram_id__startswith=f"{tag}_{mode}_"))
+            Student.groups.through.objects.bulk_create([
+                Student.groups.through(student_id=s.id, group_id=group.id) for s in students
+            ])
+            students_by_mode.append(students)
+        return course, topics, students_by_mode
+
+    def _submit(self, factory, view, path, job):
+        telegram_id, topic_id, grade = job
+        request = factory.post(path, {
+            "student_id": telegram_id, "topic_id": topic_id, "task_type": "test",
+            "test_answers": "abcd", "grade": grade,
+        }, format='json')
+        return view(request).status_code
+
+    def _count_queries(self, view, path, job):
+        with CaptureQueriesContext(connection) as ctx:
+            self._submit(APIRequestFactory(), view, path, job)
+        return len(ctx.captured_queries)
+
+    def _run_waves(self, view, path, waves, workers):
+        """To'lqinlar ketma-ket, har to'lqin ichida yuborishlar workers ta oqimda."""
+        timings = []
+        errors = 0
+        lock = threading.Lock()
+
+        def worker(jobs):
+            nonlocal errors
+            factory = APIRequestFactory()
+            try:
+                while True:
+                    try:
+                        job = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    started = time.perf_counter()
+                    try:
+                        ok = self._submit(factory, view, path, job) == 201
+                    except Exception:
+                        ok = False
+                    spent = time.perf_counter() - started
+                    with lock:
+                        timings.append(spent)
+                        errors += not ok
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        for wave in waves:
+            jobs = queue.Queue()
+            for job in wave:
+                jobs.put(job)
+            threads = [threading.Thread(target=worker, args=(jobs,)) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return timings, errors, time.perf_counter() - started
+
+    def _report(self, label, timings, errors, elapsed, queries):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        if not timings:
+            self.stdout.write("  yuborish bo'lmadi")
+            return
+        timings.sort()
+        ms = lambda seconds: f"{seconds * 1000:.2f} ms"
+        self.stdout.write(
+            f"  {len(timings)} ta yuborish, {len(timings) / elapsed:.0f}/s   "
+            f"p50 {ms(statistics.median(timings))}   p99 {ms(_percentile(timings, 99))}   "
+            f"max {ms(timings[-1])}"
+        )
+        if queries is not None:
+            self.stdout.write(f"  SQL so'rovlar (bitta yuborish): {queries}")
+        if errors:
+            self.stdout.write(self.style.ERROR(f"  ❌ {errors} ta xato (201 emas)"))
+
+    def _cleanup(self, course, students_by_mode):
+        student_ids = [s.id for students in students_by_mode for s in students]
+        Student.objects.filter(id__in=student_ids).delete()
+        Topic.objects.filter(course=course).delete()
+        Group.objects.filter(course=course).delete()
+        course.delete()
+        self.stdout.write("🧹 Vaqtinchalik ma'lumotlar o'chirildi")
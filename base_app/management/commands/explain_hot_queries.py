@@ -0,0 +1,111 @@
+"""
+Management command: eng ko'p ishlatiladigan so'rov shakllari uchun EXPLAIN —
+indekslar (0044_hot_query_indexes) ishlatilayotganini tekshirish va regressiyalarni
+(to'liq jadval skanerlash) erta ko'rish uchun.
+
+Parametrlar DB dagi haqiqiy qiymatlardan olinadi. Kichik jadvallarda PostgreSQL
+indeks bo'lsa ham Seq Scan tanlashi normal — natijani production hajmidagi
+bazada baholang.
+"""
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from base_app.coins import _month_bounds
+from base_app.models import AttendanceSession, CoinDailyRollup, CoinTransaction, CoinWallet, Task, Topic
+
+SEQ_SCAN_PATTERNS = {
+    'postgresql': r'Seq Scan on {table}\b',
+    'sqlite': r'\bSCAN {table}\b(?! USING)',
+}
+
+
+def _sample():
+    """So'rovlar uchun haqiqiy qiymatlar (jadval bo'sh bo'lsa — o'rinbosar)."""
+    now = timezone.now()
+    test_code = (
+        Task.objects.filter(task_type='test').exclude(test_code__isnull=True).exclude(test_code='')
+        .values_list('test_code', flat=True).first()
+    ) or 'TEST'
+    topic = Topic.objects.filter(is_active=True, activated_at__isnull=False).order_by('-activated_at').first()
+    wallet_id = CoinWallet.objects.values_list('id', flat=True).first() or 0
+    session_code = AttendanceSession.objects.values_list('code', flat=True).first() or '0000'
+    local_now = timezone.localtime(now)
+    return {
+        'now': now,
+        'test_code': test_code,
+        'course_id': topic.course_id if topic else 0,
+        'topic_ids': list(
+            Topic.objects.filter(course_id=topic.course_id).order_by('-id').values_list('id', flat=True)[:10]
+        ) if topic else [0],
+        'activated_at': topic.activated_at if topic else now,
+        'wallet_id': wallet_id,
+        'session_code': session_code,
+        'month': _month_bounds(local_now.year, local_now.month),
+    }
+
+
+def hot_queries(p):
+    """[(nom, jadval, indeks kutiladimi, queryset), ...]"""
+    month_start, month_end = p['month']
+    return [
+        ("Test natijalari (TestResultsJSONView)", Task._meta.db_table, True,
+         Task.objects.filter(test_code=p['test_code'], task_type='test').select_related('student')),
+        ("Test statistikasi (TestStatsView)", Task._meta.db_table, False,
+         Task.objects.filter(task_type='test').exclude(test_code__isnull=True).exclude(test_code='')
+         .values('test_code').annotate(count=Count('student', distinct=True)).order_by('test_code')),
+        ("Guruh matritsasi, oy filtri", Task._meta.db_table, True,
+         Task.objects.filter(topic_id__in=p['topic_ids'], task_type='test',
+                             submitted_at__gte=month_start, submitted_at__lt=month_end)),
+        ("Streak gap tekshiruvi", Topic._meta.db_table, True,
+         Topic.objects.filter(course_id=p['course_id'], is_active=True,
+                              activated_at__lte=p['activated_at'],
+                              activated_at__gt=p['activated_at'] - timedelta(days=30))),
+        ("Oylik tanga tranzaksiyalari (wallet)", CoinTransaction._meta.db_table, True,
+         CoinTransaction.objects.filter(wallet_id=p['wallet_id'], topic__activated_at__gte=month_start,
+                                        topic__activated_at__lt=month_end).order_by('created_at')),
+        ("Davr reytingi (kunlik rollup'lar)", CoinDailyRollup._meta.db_table, True,
+         CoinDailyRollup.objects.filter(course_id=p['course_id'], day__gte=month_start.date(),
+                                        day__lt=month_end.date())
+         .values('wallet_id').annotate(s=Sum('coins')).order_by()),
+        ("Wallet ledger (created_at tartibida)", CoinTransaction._meta.db_table, True,
+         CoinTransaction.objects.filter(wallet_id=p['wallet_id']).order_by('created_at')),
+        ("Davomat sessiyasi (AttendanceMarkView)", AttendanceSession._meta.db_table, True,
+         AttendanceSession.objects.filter(code=p['session_code'], is_active=True, expires_at__gt=p['now'])[:1]),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Hot so'rovlar uchun EXPLAIN; indeks kutilgan joyda to'liq skanerlash bo'lsa ogohlantiradi"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true',
+                            help="EXPLAIN ANALYZE (faqat PostgreSQL, so'rovlar haqiqatan bajariladi)")
+        parser.add_argument('--strict', action='store_true',
+                            help="Indeks kutilgan so'rovda to'liq skanerlash bo'lsa xato bilan chiqish (CI uchun)")
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        explain_options = {'analyze': True} if options['analyze'] and vendor == 'postgresql' else {}
+        pattern = SEQ_SCAN_PATTERNS.get(vendor)
+
+        regressions = []
+        for name, table, expects_index, qs in hot_queries(_sample()):
+            plan = qs.explain(**explain_options)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"▶ {name}"))
+            self.stdout.write(plan)
+            if expects_index and pattern and re.search(pattern.format(table=re.escape(table)), plan):
+                regressions.append(name)
+                self.stdout.write(self.style.WARNING(f"⚠️ {table}: indeks o'rniga to'liq skanerlash"))
+            self.stdout.write("")
+
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("✅ Barcha hot so'rovlar indeks orqali bajariladi"))
+        elif options['strict']:
+            raise CommandError(f"To'liq skanerlash: {', '.join(regressions)}")
+        else:
+            self.stdout.write(self.style.WARNING(f"⚠️ To'liq skanerlash: {len(regressions)} ta so'rov"))
@@ -0,0 +1,142 @@
+"""
+Management command: kurs tanga ledger'ini qayta qurish va hamyonlar muvofiqligini tekshirish.
+
+1. Drift — hamyon total_coins / current_streak / longest_streak tranzaksiyalar bilan
+   solishtiriladi (bitta aggregate so'rov)
+2. Replay — kurs hamyonlari shard'lab oqimli o'qiladi, streak'lar --workers ta
+   jarayonda (ProcessPoolExecutor) qayta o'ynaladi, result_coins task bahosiga
+   tenglashtiriladi (masalan, admin qo'shgan/ayirgan balldan keyin)
+3. --fix — farqlar bulk_update bilan yoziladi (kurs hamyonlari qulflangan holda);
+   --dry-run — yoziladi, qayta tekshiriladi va rollback qilinadi
+
+Masalan: python manage.py rebuild_coin_ledger --course 3 --workers 4 --fix --dry-run
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from base_app.coin_ledger import SHARD_SIZE, apply_ledger_fixes, iter_wallet_shards, ledger_drift, replay_shard
+from base_app.models import CoinWallet, Course
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.0f} ms"
+
+
+class Command(BaseCommand):
+    help = "Tanga ledger'ini kurs bo'yicha qayta o'ynaydi va hamyonlar bilan solishtiradi (--fix — tuzatadi)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, default=None, help="Faqat shu kurs ID si uchun")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Replay jarayonlari soni (1 — shu jarayonning o'zida)")
+        parser.add_argument('--shard-size', type=int, default=SHARD_SIZE,
+                            help="Bitta worker vazifasidagi hamyonlar soni")
+        parser.add_argument('--fix', action='store_true', help="Farqlarni bazaga yozish")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="--fix ni bajarib, oxirida rollback qilish (hech narsa saqlanmaydi)")
+        parser.add_argument('--no-replay', action='store_true', help="Faqat drift tekshiruvi")
+        parser.add_argument('--limit', type=int, default=10, help="Ko'rsatiladigan drift qatorlari soni")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        course_id = options['course']
+
+        t = time.perf_counter()
+        drift = ledger_drift(course_id)
+        self._report_drift(drift, options['limit'], time.perf_counter() - t)
+        if options['no_replay']:
+            return
+
+        courses = Course.objects.filter(id__in=CoinWallet.objects.values('course_id')).order_by('id')
+        if course_id is not None:
+            courses = courses.filter(id=course_id)
+
+        workers = max(1, options['workers'])
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            for course in courses:
+                self._process_course(course, executor, workers, options)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        mode = "dry-run" if options['dry_run'] else ("fix" if options['fix'] else "tekshiruv")
+        self.stdout.write(self.style.SUCCESS(
+            f"⏱ Jami: {_ms(time.perf_counter() - started)} ({mode}, {workers} ta jarayon)"
+        ))
+
+    def _report_drift(self, drift, limit, elapsed):
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f"✅ Drift yo'q: hamyonlar ledger bilan mos ({_ms(elapsed)})"))
+            return
+        self.stdout.write(self.style.WARNING(f"⚠️ {len(drift)} ta hamyon ledger bilan mos emas ({_ms(elapsed)})"))
+        for row in drift[:limit]:
+            self.stdout.write(
+                f"  #{row['id']} kurs {row['course_id']} {row['full_name']} ({row['telegram_id']}): "
+                f"tanga {row['total_coins']}→{row['ledger_coins']}, "
+                f"streak {row['current_streak']}→{row['ledger_streak']}, "
+                f"eng uzun {row['longest_streak']}→{row['ledger_longest']}"
+            )
+        if len(drift) > limit:
+            self.stdout.write(f"  ... yana {len(drift) - limit} ta")
+
+    def _replay(self, shards, executor, workers):
+        """Shard natijalari; parallel rejimda bir vaqtda ko'pi bilan 2×workers shard xotirada."""
+        if executor is None:
+            yield from map(replay_shard, shards)
+            return
+        pending = deque()
+        for shard in shards:
+            pending.append(executor.submit(replay_shard, shard))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def _process_course(self, course, executor, workers, options):
+        fix = options['fix'] or options['dry_run']
+        with db_transaction.atomic():
+            if fix:
+                # Replay va yozish orasida shu kursda yangi tanga berilmasin
+                list(CoinWallet.objects.select_for_update().filter(course_id=course.id).values_list('id', flat=True))
+
+            t = time.perf_counter()
+            wallets = transactions = orphans = 0
+            tx_fixes = []
+            wallet_fixes = []
+            shards = iter_wallet_shards(course, options['shard_size'])
+            for result in self._replay(shards, executor, workers):
+                wallets += result.wallets
+                transactions += result.transactions
+                orphans += result.orphans
+                tx_fixes.extend(result.tx_fixes)
+                wallet_fixes.extend(result.wallet_fixes)
+            replay_time = time.perf_counter() - t
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"📚 {course.name} (#{course.id})"))
+            self.stdout.write(
+                f"  {wallets} hamyon, {transactions} tranzaksiya — replay {_ms(replay_time)}"
+                + (f" ({transactions / replay_time:.0f} tx/s)" if replay_time and transactions else "")
+            )
+            self.stdout.write(
+                f"  O'zgaradi: {len(tx_fixes)} ta tranzaksiya, {len(wallet_fixes)} ta hamyon"
+                + (f" (task'i yo'q tranzaksiyalar: {orphans})" if orphans else "")
+            )
+            if not fix or not (tx_fixes or wallet_fixes):
+                return
+
+            t = time.perf_counter()
+            apply_ledger_fixes(course.id, tx_fixes, wallet_fixes)
+            write_time = time.perf_counter() - t
+            remaining = len(ledger_drift(course.id))
+            self.stdout.write(
+                f"  ✍️ bulk_update {_ms(write_time)}, keyin drift: {remaining} ta hamyon"
+            )
+            if options['dry_run']:
+                db_transaction.set_rollback(True)
+                self.stdout.write(self.style.WARNING("  ↩️ dry-run: o'zgarishlar rollback qilindi"))
@@ -0,0 +1,19 @@
+"""
+Management command: CoinDailyRollup (hamyon + kun tanga yig'indisi) jadvalini CoinTransaction'lardan noldan qurish
+"""
+from django.core.management.base import BaseCommand
+
+from base_app.coin_rollups import rebuild_coin_rollups
+
+
+class Command(BaseCommand):
+    help = "CoinDailyRollup jadvalini tanga tranzaksiyalari asosida qayta quradi (ixtiyoriy --course)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, default=None, help="Faqat shu kurs ID si uchun")
+
+    def handle(self, *args, **options):
+        course_id = options['course']
+        count = rebuild_coin_rollups(course_id)
+        scope = f"kurs #{course_id}" if course_id else "barcha kurslar"
+        self.stdout.write(self.style.SUCCESS(f"✅ {scope}: {count} ta CoinDailyRollup qatori qayta qurildi"))
@@ -0,0 +1,19 @@
+"""
+Management command: GradeAggregate (student + kurs baholar yig'indisi) jadvalini Task'lardan noldan qurish
+"""
+from django.core.management.base import BaseCommand
+
+from base_app.grade_stats import rebuild_grade_aggregates
+
+
+class Command(BaseCommand):
+    help = "GradeAggregate jadvalini Task'lar asosida qayta quradi (ixtiyoriy --course)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, default=None, help="Faqat shu kurs ID si uchun")
+
+    def handle(self, *args, **options):
+        course_id = options['course']
+        count = rebuild_grade_aggregates(course_id)
+        scope = f"kurs #{course_id}" if course_id else "barcha kurslar"
+        self.stdout.write(self.style.SUCCESS(f"✅ {scope}: {count} ta GradeAggregate qatori qayta qurildi"))
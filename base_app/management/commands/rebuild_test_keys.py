@@ -0,0 +1,14 @@
+"""
+Management command: TestKey (test_code → mavzu) jadvalini Topic.correct_answers dan noldan qurish
+"""
+from django.core.management.base import BaseCommand
+
+from base_app.test_keys import rebuild_test_keys
+
+
+class Command(BaseCommand):
+    help = "TestKey jadvalini barcha mavzularning correct_answers maydonidan qayta quradi"
+
+    def handle(self, *args, **options):
+        count = rebuild_test_keys()
+        self.stdout.write(self.style.SUCCESS(f"✅ {count} ta TestKey qatori qayta qurildi"))
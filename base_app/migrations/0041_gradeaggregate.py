@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_grade_aggregates(apps, schema_editor):
+    Task = apps.get_model('base_app', 'Task')
+    GradeAggregate = apps.get_model('base_app', 'GradeAggregate')
+
+    rows = (
+        Task.objects.filter(grade__isnull=False, topic__course__isnull=False)
+        .values('student_id', 'topic__course_id')
+        .annotate(cnt=Count('id'), total=Sum('grade'), last=Max('submitted_at'))
+        .order_by()
+    )
+    GradeAggregate.objects.bulk_create([
+        GradeAggregate(
+            student_id=r['student_id'],
+            course_id=r['topic__course_id'],
+            submitted_count=r['cnt'],
+            grade_sum=r['total'] or 0,
+            last_submitted_at=r['last'],
+        )
+        for r in rows
+    ], batch_size=1000)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0040_backfill_registered_course'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submitted_count', models.PositiveIntegerField(default=0, help_text='Baholangan tasklar soni')),
+                ('grade_sum', models.PositiveIntegerField(default=0, help_text="Baholar yig'indisi")),
+                ('last_submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_aggregates', to='base_app.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_aggregates', to='base_app.student')),
+            ],
+            options={
+                'verbose_name': "Baholar yig'indisi",
+                'verbose_name_plural': "Baholar yig'indilari",
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.RunPython(backfill_grade_aggregates, noop_reverse),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0041_gradeaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Yuborilmoqda'), ('done', 'Tugagan'), ('cancelled', 'Bekor qilingan')], db_index=True, default='running', max_length=10)),
+                ('admin_telegram_id', models.BigIntegerField(help_text='Broadcastni boshlagan admin')),
+                ('from_chat_id', models.BigIntegerField()),
+                ('message_id', models.BigIntegerField()),
+                ('recipients', models.JSONField(default=list, help_text="Telegram ID lar ro'yxati (tartib saqlanadi)")),
+                ('position', models.PositiveIntegerField(default=0, help_text="Shu indeksgacha bo'lgan barcha qabul qiluvchilar qayta ishlangan")),
+                ('success_count', models.PositiveIntegerField(default=0)),
+                ('fail_count', models.PositiveIntegerField(default=0)),
+                ('summary', models.TextField(blank=True, default='', help_text='Tanlangan guruhlar / auditoriya haqida matn')),
+                ('progress_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Broadcast vazifasi',
+                'verbose_name_plural': 'Broadcast vazifalari',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
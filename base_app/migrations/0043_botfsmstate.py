@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0042_broadcastjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotFSMState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.BigIntegerField()),
+                ('user_id', models.BigIntegerField()),
+                ('state', models.CharField(blank=True, max_length=255, null=True)),
+                ('data', models.TextField(blank=True, default='', help_text='FSM data — ixcham JSON')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Bot FSM holati',
+                'verbose_name_plural': 'Bot FSM holatlari',
+                'unique_together': {('chat_id', 'user_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0043_botfsmstate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancesession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['code', 'expires_at'], name='attsession_active_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cointransaction',
+            index=models.Index(fields=['wallet', 'created_at'], name='cointx_wallet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['test_code', 'task_type'], name='task_testcode_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['topic', 'submitted_at'], name='task_topic_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['course', 'is_active', 'activated_at'], name='topic_course_active_act_idx'),
+        ),
+    ]
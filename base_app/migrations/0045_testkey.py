@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:05
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Migratsiya ilova kodiga bog'lanmasligi uchun base_app.grading.parse_key ning
+# shu paytdagi nusxasi
+_DIGIT_RE = re.compile(r'\d')
+_KEY_NUMBERED_RE = re.compile(r'\d+([a-zx]+)')
+_LETTERS_RE = re.compile(r'^[a-zx]+$')
+
+
+def _parse_key(correct_str):
+    correct = (correct_str or '').lower().strip()
+    if _DIGIT_RE.search(correct):
+        return [
+            ['x'] if letters == 'x' else list(letters)
+            for letters in _KEY_NUMBERED_RE.findall(correct)
+        ]
+    if _LETTERS_RE.match(correct):
+        return [[ch] for ch in correct]
+    return [[ch] for ch in correct if ch.isalpha()]
+
+
+def backfill_test_keys(apps, schema_editor):
+    Topic = apps.get_model('base_app', 'Topic')
+    TestKey = apps.get_model('base_app', 'TestKey')
+
+    rows = {}
+    for topic in Topic.objects.exclude(correct_answers__isnull=True).order_by('id'):
+        if not isinstance(topic.correct_answers, dict):
+            continue
+        for code, answer_key in topic.correct_answers.items():
+            code = str(code)
+            if not code or len(code) > 50:
+                continue
+            answer_key = str(answer_key or '')
+            parsed = _parse_key(answer_key)
+            # Bir xil kod bir nechta mavzuda bo'lsa — eng kichik id li mavzu
+            rows.setdefault(code, TestKey(
+                topic_id=topic.id, test_code=code, answer_key=answer_key,
+                question_count=len(parsed), parsed=parsed,
+            ))
+    TestKey.objects.bulk_create(rows.values(), batch_size=500)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0044_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_code', models.CharField(max_length=50, unique=True)),
+                ('answer_key', models.TextField(blank=True, default='', help_text='Admin kiritgan kalit satri')),
+                ('question_count', models.PositiveSmallIntegerField(default=0)),
+                ('parsed', models.JSONField(default=list, help_text="Savollar bo'yicha to'g'ri variantlar: [['a'], ['b', 'c'], ['x']]")),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='test_keys', to='base_app.topic')),
+            ],
+            options={
+                'verbose_name': 'Test kaliti',
+                'verbose_name_plural': 'Test kalitlari',
+            },
+        ),
+        migrations.RunPython(backfill_test_keys, noop_reverse),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0045_testkey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='topics_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Mavzu saqlanganda oshadi — keshlangan faollashish ketma-ketligi eskirganini bildiradi'),
+        ),
+    ]
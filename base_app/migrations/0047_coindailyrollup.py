@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:27
+
+import django.db.models.deletion
+import pytz
+from django.db import migrations, models
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_coin_rollups(apps, schema_editor):
+    CoinTransaction = apps.get_model('base_app', 'CoinTransaction')
+    CoinDailyRollup = apps.get_model('base_app', 'CoinDailyRollup')
+
+    rows = (
+        CoinTransaction.objects
+        .annotate(day=TruncDate('topic__activated_at', tzinfo=pytz.timezone('Asia/Tashkent')))
+        .values('wallet_id', 'wallet__course_id', 'day')
+        .annotate(coins_sum=Sum('total_coins'), streak_max=Max('streak_after'))
+        .order_by()
+    )
+    CoinDailyRollup.objects.bulk_create([
+        CoinDailyRollup(
+            wallet_id=r['wallet_id'],
+            course_id=r['wallet__course_id'],
+            day=r['day'],
+            coins=r['coins_sum'] or 0,
+            max_streak=r['streak_max'] or 0,
+        )
+        for r in rows
+    ], batch_size=1000)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0046_course_topics_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, help_text="NULL — activated_at yo'q mavzular", null=True)),
+                ('coins', models.PositiveIntegerField(default=0)),
+                ('max_streak', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coin_daily_rollups', to='base_app.course')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='base_app.coinwallet')),
+            ],
+            options={
+                'verbose_name': "Kunlik tanga yig'indisi",
+                'verbose_name_plural': "Kunlik tanga yig'indilari",
+                'indexes': [models.Index(fields=['course', 'day'], name='coinrollup_course_day_idx')],
+                'unique_together': {('wallet', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_coin_rollups, noop_reverse),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:39
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def rebuild_grade_aggregates(apps, schema_editor):
+    """Mavjud qatorlar ikkala task turini birga sanagan — (student, kurs, tur) bo'yicha qayta quriladi."""
+    Task = apps.get_model('base_app', 'Task')
+    GradeAggregate = apps.get_model('base_app', 'GradeAggregate')
+
+    rows = (
+        Task.objects.filter(grade__isnull=False, topic__course__isnull=False)
+        .values('student_id', 'topic__course_id', 'task_type')
+        .annotate(cnt=Count('id'), total=Sum('grade'), last=Max('submitted_at'))
+        .order_by()
+    )
+    GradeAggregate.objects.all().delete()
+    GradeAggregate.objects.bulk_create([
+        GradeAggregate(
+            student_id=r['student_id'],
+            course_id=r['topic__course_id'],
+            task_type=r['task_type'],
+            submitted_count=r['cnt'],
+            grade_sum=r['total'] or 0,
+            last_submitted_at=r['last'],
+        )
+        for r in rows
+    ], batch_size=1000)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0047_coindailyrollup'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='gradeaggregate',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='gradeaggregate',
+            name='task_type',
+            field=models.CharField(default='test', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='gradeaggregate',
+            name='grade_sum',
+            field=models.IntegerField(default=0, help_text="Baholar yig'indisi"),
+        ),
+        migrations.AlterField(
+            model_name='gradeaggregate',
+            name='submitted_count',
+            field=models.IntegerField(default=0, help_text='Baholangan tasklar soni'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='gradeaggregate',
+            unique_together={('student', 'course', 'task_type')},
+        ),
+        migrations.RunPython(rebuild_grade_aggregates, noop_reverse),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+import copy
 import uuid
 
 
@@ -45,6 +46,10 @@ class Course(models.Model):
         default='score_range',
         help_text="Ro'yxatdan o'tishda studentni qaysi guruhga biriktirish mantig'i"
     )
+    topics_version = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Mavzu saqlanganda oshadi — keshlangan faollashish ketma-ketligi eskirganini bildiradi"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -188,12 +193,70 @@ class Topic(models.Model):
         help_text="is_active=True bo'lgan vaqt (streak hisoblash uchun)"
     )
 
+    class Meta:
+        indexes = [
+            # Streak gap tekshiruvi, guruh matritsasi va oylik reyting:
+            # course + is_active bo'yicha, activated_at oralig'i bilan
+            models.Index(fields=['course', 'is_active', 'activated_at'], name='topic_course_active_act_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kurs almashtirilsa — eski kursning faollashish ketma-ketligi ham yangilanishi uchun
+        instance._loaded_course_id = instance.__dict__.get('course_id')
+        # activated_at o'zgarsa — tanga rollup'lari eski kundan yangisiga ko'chiriladi
+        if 'activated_at' in instance.__dict__:
+            instance._loaded_activated_at = instance.activated_at
+        # correct_answers o'zgargandagina TestKey sinxronlanadi (dict joyida o'zgartirilishi mumkin — nusxa)
+        if 'correct_answers' in instance.__dict__:
+            instance._loaded_correct_answers = copy.deepcopy(instance.correct_answers)
+        return instance
+
     def save(self, *args, **kwargs):
         if self.is_active and self.activated_at is None:
             from django.utils import timezone
             self.activated_at = timezone.now()
         super().save(*args, **kwargs)
 
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'is_active', 'activated_at', 'course'} & set(update_fields):
+            # Streak uchun CourseTopicSequence keshi (coins.py)
+            from .coins import invalidate_course_topics
+            invalidate_course_topics(self.course_id, getattr(self, '_loaded_course_id', None))
+            self._loaded_course_id = self.course_id
+        if (
+            hasattr(self, '_loaded_activated_at') and self._loaded_activated_at != self.activated_at
+            and (update_fields is None or 'activated_at' in update_fields)
+        ):
+            from .coin_rollups import refresh_topic_rollups, topic_wallet_ids
+            refresh_topic_rollups(topic_wallet_ids([self.pk]), self._loaded_activated_at, self.activated_at)
+            self._loaded_activated_at = self.activated_at
+        if (
+            (update_fields is None or 'correct_answers' in update_fields)
+            and getattr(self, '_loaded_correct_answers', None) != self.correct_answers
+        ):
+            from .test_keys import sync_topic_test_keys
+            sync_topic_test_keys(self)
+            self._loaded_correct_answers = copy.deepcopy(self.correct_answers)
+
+    def delete(self, *args, **kwargs):
+        from django.db import transaction as db_transaction
+        from .coin_rollups import refresh_topic_rollups, topic_wallet_ids
+        from .coins import invalidate_course_topics
+        from .test_keys import owned_test_codes, reassign_test_keys
+
+        course_id = self.course_id
+        with db_transaction.atomic():
+            # Tranzaksiyalar va TestKey'lar CASCADE bilan o'chadi — hamyonlar va kodlar oldindan olinadi
+            wallet_ids = topic_wallet_ids([self.pk])
+            codes = owned_test_codes([self.pk])
+            result = super().delete(*args, **kwargs)
+            reassign_test_keys(codes)
+        invalidate_course_topics(course_id)
+        refresh_topic_rollups(wallet_ids, self.activated_at)
+        return result
+
     def __str__(self):
         if self.course:
             return f"{self.title} ({self.course.name})"
@@ -234,11 +297,38 @@ class Task(models.Model):
 
     class Meta:
         unique_together = ("student", "topic", "task_type")
+        indexes = [
+            # TestResultsJSONView / CourseTopicsView: test_code=..., task_type='test'
+            models.Index(fields=['test_code', 'task_type'], name='task_testcode_type_idx'),
+            # Guruh matritsasi: topic_id IN (...) + submitted_at oy oralig'i
+            models.Index(fields=['topic', 'submitted_at'], name='task_topic_submitted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.full_name} → {self.topic.title} ({self.get_task_type_display()}) ({self.grade or 'Baholanmagan'})"
 
 
+class TestKey(models.Model):
+    """
+    Topic.correct_answers ning normallashtirilgan nusxasi: test_code → mavzu + kalit.
+    Test kodi bo'yicha qidiruv JSON has_key skanerlash o'rniga unique indeks orqali.
+    Topic.save() da sinxronlanadi (base_app/test_keys.py).
+    """
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name="test_keys")
+    test_code = models.CharField(max_length=50, unique=True)
+    answer_key = models.TextField(blank=True, default='', help_text="Admin kiritgan kalit satri")
+    question_count = models.PositiveSmallIntegerField(default=0)
+    parsed = models.JSONField(default=list, help_text="Savollar bo'yicha to'g'ri variantlar: [['a'], ['b', 'c'], ['x']]")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Test kaliti"
+        verbose_name_plural = "Test kalitlari"
+
+    def __str__(self):
+        return f"{self.test_code} → {self.topic.title} ({self.question_count} savol)"
+
+
 class AttendanceSession(models.Model):
     """Admin har dars uchun ochgan davomat sessiyasi"""
     code = models.CharField(max_length=20)
@@ -251,6 +341,14 @@ class AttendanceSession(models.Model):
         verbose_name = "Davomat sessiyasi"
         verbose_name_plural = "Davomat sessiyalari"
         ordering = ["-created_at"]
+        indexes = [
+            # AttendanceMarkView: code=..., is_active=True, expires_at > now — faqat faol
+            # sessiyalar indekslanadi (partial), yopilganlari indeksni kattalashtirmaydi
+            models.Index(
+                fields=['code', 'expires_at'], name='attsession_active_code_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
     def __str__(self):
         return f"Sessiya {self.code} ({self.created_at.strftime('%d.%m.%Y %H:%M')})"
@@ -390,11 +488,66 @@ class CoinTransaction(models.Model):
         verbose_name = "Tanga tranzaksiyasi"
         verbose_name_plural = "Tanga tranzaksiyalari"
         ordering = ["-created_at"]
+        indexes = [
+            # Streak replay / ledger: wallet bo'yicha created_at tartibida
+            models.Index(fields=['wallet', 'created_at'], name='cointx_wallet_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.wallet.student.full_name} +{self.total_coins} tanga ({self.topic.title})"
 
 
+class CoinDailyRollup(models.Model):
+    """
+    Hamyon + kun bo'yicha tanga yig'indisi (kun — mavzu faollashgan Toshkent sanasi) —
+    davr reytinglari va oylar menyusi ledger'ni har safar yig'maslik uchun.
+    base_app.coin_rollups orqali yangilanadi; `rebuild_coin_rollups` buyrug'i noldan quradi.
+    """
+    wallet = models.ForeignKey(CoinWallet, on_delete=models.CASCADE, related_name="daily_rollups")
+    # wallet.course nusxasi — kurs + sana oralig'i bo'yicha JOIN siz indeks skani
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="coin_daily_rollups")
+    day = models.DateField(null=True, blank=True, help_text="NULL — activated_at yo'q mavzular")
+    coins = models.PositiveIntegerField(default=0)
+    max_streak = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("wallet", "day")
+        verbose_name = "Kunlik tanga yig'indisi"
+        verbose_name_plural = "Kunlik tanga yig'indilari"
+        indexes = [
+            models.Index(fields=['course', 'day'], name='coinrollup_course_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} — {self.day}: {self.coins} tanga"
+
+
+class GradeAggregate(models.Model):
+    """
+    Student + kurs + task turi bo'yicha baholarning tayyor (materialized) yig'indisi —
+    o'rtacha ball va reytinglarni har safar Task'lardan qayta yig'maslik uchun.
+    Task topshirilganda / qayta baholanganda / o'chirilganda base_app.grade_stats
+    orqali inkremental yangilanadi; `rebuild_grade_aggregates` buyrug'i noldan quradi.
+    Hisoblagichlar F() deltalari bilan o'zgaradi, shuning uchun oddiy IntegerField:
+    vaqtinchalik manfiy qiymat IntegrityError bermaydi, rebuild bilan tuzatiladi.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="grade_aggregates")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="grade_aggregates")
+    task_type = models.CharField(max_length=20, default='test')
+    submitted_count = models.IntegerField(default=0, help_text="Baholangan tasklar soni")
+    grade_sum = models.IntegerField(default=0, help_text="Baholar yig'indisi")
+    last_submitted_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("student", "course", "task_type")
+        verbose_name = "Baholar yig'indisi"
+        verbose_name_plural = "Baholar yig'indilari"
+
+    def __str__(self):
+        return f"{self.student.full_name} — {self.course.name} ({self.task_type}): {self.grade_sum} ({self.submitted_count} ta)"
+
+
 class PaymentPlan(models.Model):
     """Har bir student uchun kurs bo'yicha jami to'lashi kerak summa"""
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='payment_plans')
@@ -527,3 +680,61 @@ class MonthlyStreakSetting(models.Model):
 
     def __str__(self):
         return f"{self.year}-{self.month:02d} ({'on' if self.enabled else 'off'})"
+
+
+class BroadcastJob(models.Model):
+    """
+    Bot orqali ommaviy xabar (broadcast) yuborish vazifasi.
+    Qabul qiluvchilar ro'yxati va progress saqlanadi — bot qayta ishga tushsa
+    to'xtagan joyidan (position) davom ettiriladi.
+    """
+    STATUS_CHOICES = [
+        ('running', 'Yuborilmoqda'),
+        ('done', 'Tugagan'),
+        ('cancelled', 'Bekor qilingan'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running', db_index=True)
+    admin_telegram_id = models.BigIntegerField(help_text="Broadcastni boshlagan admin")
+    from_chat_id = models.BigIntegerField()
+    message_id = models.BigIntegerField()
+    recipients = models.JSONField(default=list, help_text="Telegram ID lar ro'yxati (tartib saqlanadi)")
+    position = models.PositiveIntegerField(
+        default=0, help_text="Shu indeksgacha bo'lgan barcha qabul qiluvchilar qayta ishlangan"
+    )
+    success_count = models.PositiveIntegerField(default=0)
+    fail_count = models.PositiveIntegerField(default=0)
+    summary = models.TextField(blank=True, default='', help_text="Tanlangan guruhlar / auditoriya haqida matn")
+    progress_message_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Broadcast vazifasi"
+        verbose_name_plural = "Broadcast vazifalari"
+
+    def __str__(self):
+        return f"Broadcast #{self.pk} ({self.status}) {self.position}/{len(self.recipients)}"
+
+
+class BotFSMState(models.Model):
+    """
+    Bot FSM holati (aiogram storage) — bot qayta ishga tushganda yoki bir nechta
+    jarayonda ishlaganda ro'yxatdan o'tish / test topshirish jarayoni yo'qolmasligi uchun.
+    data ixcham JSON satr sifatida saqlanadi; bo'sh yozuvlar o'chiriladi.
+    """
+    chat_id = models.BigIntegerField()
+    user_id = models.BigIntegerField()
+    state = models.CharField(max_length=255, null=True, blank=True)
+    data = models.TextField(blank=True, default='', help_text="FSM data — ixcham JSON")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Bot FSM holati"
+        verbose_name_plural = "Bot FSM holatlari"
+        unique_together = ('chat_id', 'user_id')
+
+    def __str__(self):
+        return f"{self.chat_id}:{self.user_id} → {self.state or '-'}"
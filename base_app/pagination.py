@@ -0,0 +1,15 @@
+"""
+API ro'yxatlari uchun keyset (cursor) paginatsiya: "id > oxirgi id" sharti bilan
+o'qiladi — OFFSET dan farqli, sahifa narxi jadval o'sishi bilan oshmaydi.
+
+Javob: {"next": "<keyingi sahifa URL>" | null, "previous": ..., "results": [...]}
+So'rov: ?limit=100 (max 500), keyingi sahifa uchun next URL ning o'zi ishlatiladi.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = 500
@@ -0,0 +1,221 @@
+"""
+To'g'ri javoblar o'zgarganda test natijalarini ommaviy qayta baholash.
+
+Bosqichlar:
+  1. barcha tegishli Task'lar xotirada yangi kalit bo'yicha baholanadi (grade_many)
+  2. o'zgargan baholar bitta bulk_update bilan yoziladi (+ GradeAggregate deltalari)
+  3. tanga farqlari har bir hamyon bo'yicha yig'ilib, bitta UPDATE ... CASE bilan qo'llanadi
+     (kunlik CoinDailyRollup qatorlari shu hamyonlar uchun qayta hisoblanadi)
+  4. natija: o'zgarishlar ro'yxati va oshgan/kamaygan baholar soni
+
+Task bo'yicha alohida select_for_update().get() + wallet.save() o'rniga butun
+jarayon bir nechta so'rovda, qisqa tranzaksiya ichida bajariladi.
+"""
+from collections import defaultdict
+
+from django.db import transaction as db_transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .coin_rollups import refresh_rollups, rollup_day
+from .grade_stats import apply_grade_deltas, pk_delta_case
+from .grading import get_answer_key, grade_many
+from .leaderboard import invalidate_course_on_commit
+
+LATE_GRADE_FACTOR = 0.8  # deadline dan keyin topshirilgan test uchun 80% ball
+
+
+def grade_submissions(tasks, answer_key, deadline=None):
+    """
+    Task'larni xotirada baholaydi (DB ga yozmaydi).
+    Qaytaradi: (changes, graded_count, late_count)
+      changes — [(task, old_grade, new_grade, is_late), ...] faqat bahosi o'zgarganlar
+    Javoblar soni kalitga mos kelmaydigan task'lar o'tkazib yuboriladi.
+    """
+    scores = grade_many(answer_key, [task.test_answers for task in tasks])
+
+    changes = []
+    graded = 0
+    late = 0
+    for task, correct_count in zip(tasks, scores):
+        if correct_count is None:
+            continue
+        graded += 1
+
+        new_grade = correct_count
+        is_late = bool(deadline and task.submitted_at and task.submitted_at > deadline)
+        if is_late:
+            new_grade = int(new_grade * LATE_GRADE_FACTOR)
+            late += 1
+
+        if task.grade != new_grade:
+            changes.append((task, task.grade, new_grade, is_late))
+    return changes, graded, late
+
+
+def apply_coin_deltas(tasks, course_id, task_type='test'):
+    """
+    Bahosi o'zgargan task'lar uchun CoinTransaction.result_coins ni yangi bahoga
+    tenglashtiradi va farqni hamyonlarga qo'llaydi (streak_coins o'zgarmaydi).
+    CoinTransaction bo'lmasa — retroaktiv yaratiladi (result_coins, streak_coins=0).
+    Tranzaksiya ichida chaqirilishi kerak. Qaytaradi: {wallet_id: delta}.
+
+    Hamyonlar avval qulflanadi (award_task_coins ham hamyonni qulflaydi): shu paytda
+    parallel topshiriq tranzaksiya qo'sha olmaydi, shuning uchun o'qilgan tranzaksiyalar
+    yozishgacha o'zgarmaydi va bir tanga ikki marta berilmaydi.
+    """
+    from .models import CoinTransaction, CoinWallet, Topic
+
+    if not tasks or not course_id:
+        return {}
+
+    topic_ids = {task.topic_id for task in tasks}
+    student_ids = {task.student_id for task in tasks}
+
+    def lock_wallets(sids):
+        # id tartibida — parallel qayta baholashlar bilan deadlock bo'lmasligi uchun
+        return {
+            w.student_id: w
+            for w in CoinWallet.objects.select_for_update()
+            .filter(course_id=course_id, student_id__in=sids).order_by('id')
+        }
+
+    wallets = lock_wallets(student_ids)
+    no_wallet = student_ids - set(wallets)
+    if no_wallet:
+        # Avval tanga tizimi bo'lmagan — hamyon retroaktiv yaratiladi va qulflanadi
+        CoinWallet.objects.bulk_create(
+            [CoinWallet(student_id=sid, course_id=course_id) for sid in no_wallet],
+            ignore_conflicts=True,
+        )
+        wallets.update(lock_wallets(no_wallet))
+
+    txns = {
+        (txn.wallet_id, txn.topic_id): txn
+        for txn in CoinTransaction.objects.filter(
+            wallet_id__in=[w.id for w in wallets.values()],
+            topic_id__in=topic_ids,
+            task_type=task_type,
+        )
+    }
+
+    deltas = defaultdict(int)
+    txns_to_update = []
+    missing = []
+    for task in tasks:
+        new_result_coins = max(0, task.grade or 0)
+        wallet = wallets[task.student_id]
+        txn = txns.get((wallet.id, task.topic_id))
+        if txn is None:
+            missing.append((wallet, task, new_result_coins))
+            continue
+        coin_diff = new_result_coins - txn.result_coins
+        if coin_diff == 0:
+            continue
+        txn.result_coins = new_result_coins
+        txn.total_coins = new_result_coins + txn.streak_coins
+        txns_to_update.append(txn)
+        deltas[txn.wallet_id] += coin_diff
+
+    if txns_to_update:
+        CoinTransaction.objects.bulk_update(txns_to_update, ['result_coins', 'total_coins'], batch_size=500)
+
+    if missing:
+        # Tranzaksiyasi yo'q task'lar — retroaktiv yaratiladi (hamyonlar qulflangan:
+        # parallel yozuv yo'q, konflikt bo'lsa IntegrityError — jimgina ikki marta berilmaydi)
+        new_txns = []
+        for wallet, task, new_result_coins in missing:
+            new_txns.append(CoinTransaction(
+                wallet=wallet,
+                topic_id=task.topic_id,
+                task_type=task_type,
+                result_coins=new_result_coins,
+                streak_coins=0,
+                total_coins=new_result_coins,
+                streak_after=wallet.current_streak,
+                deadline_penalty=False,
+            ))
+            deltas[wallet.id] += new_result_coins
+        CoinTransaction.objects.bulk_create(new_txns, batch_size=500)
+
+    if deltas:
+        # Kunlik rollup'lar: tranzaksiyasi o'zgargan/yaratilgan hamyonlarning shu mavzu(lar)
+        # kunlari qayta hisoblanadi (0 tangali yangi tranzaksiya ham oy menyusida ko'rinadi)
+        refresh_rollups(deltas, {
+            rollup_day(activated_at)
+            for activated_at in Topic.objects.filter(id__in=topic_ids).values_list('activated_at', flat=True)
+        })
+
+    deltas = {wallet_id: d for wallet_id, d in deltas.items() if d}
+    if deltas:
+        # Bitta UPDATE: total_coins = GREATEST(0, total_coins + CASE ... END)
+        CoinWallet.objects.filter(pk__in=list(deltas)).update(
+            total_coins=Greatest(F('total_coins') + pk_delta_case(deltas), Value(0))
+        )
+        invalidate_course_on_commit(course_id)
+    return deltas
+
+
+def regrade_topic_answers(topic_id, test_code, correct_str):
+    """
+    Mavzuning test_code bo'yicha barcha test natijalarini yangi kalit bilan qayta baholaydi.
+    Qaytaradi:
+    {
+        'total': mavzu bo'yicha topshirilgan testlar soni,
+        'graded': baholangan (javoblar soni mos kelgan) testlar soni,
+        'late': deadline dan keyin topshirilganlar (80% ball),
+        'void_count': bekor qilingan savollar soni,
+        'n_questions': savollar soni,
+        'up': bahosi oshganlar, 'down': bahosi kamayganlar,
+        'changes': [{'student', 'telegram_id', 'old', 'new', 'diff', 'is_late'}, ...],
+    }
+    """
+    from .models import Task, Topic
+
+    topic = Topic.objects.only('id', 'deadline', 'course_id').get(pk=topic_id)
+    answer_key = get_answer_key(correct_str)
+
+    tasks = list(
+        Task.objects.filter(topic_id=topic_id, task_type='test', test_code=test_code)
+        .select_related('student', 'topic')
+        .only(
+            'id', 'grade', 'test_answers', 'submitted_at', 'student_id', 'topic_id',
+            'student__full_name', 'student__telegram_id', 'topic__course_id',
+        )
+    )
+    changes, graded, late = grade_submissions(tasks, answer_key, topic.deadline)
+
+    changed_tasks = []
+    old_grades = []
+    for task, old_grade, new_grade, _ in changes:
+        task.grade = new_grade
+        changed_tasks.append(task)
+        old_grades.append((task, old_grade))
+
+    if changed_tasks:
+        with db_transaction.atomic():
+            Task.objects.bulk_update(changed_tasks, ['grade'], batch_size=500)
+            apply_grade_deltas(old_grades)
+            apply_coin_deltas(changed_tasks, topic.course_id)
+
+    summary = [
+        {
+            'student': task.student.full_name,
+            'telegram_id': task.student.telegram_id,
+            'old': old_grade,
+            'new': new_grade,
+            'diff': new_grade - (old_grade or 0),
+            'is_late': is_late,
+        }
+        for task, old_grade, new_grade, is_late in changes
+    ]
+    return {
+        'total': len(tasks),
+        'graded': graded,
+        'late': late,
+        'void_count': sum(answer_key.void),
+        'n_questions': answer_key.n_questions,
+        'up': sum(1 for c in summary if c['diff'] > 0),
+        'down': sum(1 for c in summary if c['diff'] < 0),
+        'changes': summary,
+    }
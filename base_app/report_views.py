@@ -3,6 +3,8 @@ from django.shortcuts import render
 from django.core import signing
 from django.views.decorators.clickjacking import xframe_options_exempt
 
+from .coins import _month_bounds
+from .grading import BLOCK_TEST_QUESTIONS, FAN_QUESTIONS, block_counts_many, get_answer_key
 from .models import Topic, Task, Group, Student
 
 
@@ -48,16 +50,18 @@ def group_matrix_report(request, token):
     topics = list(Topic.objects.select_related('course').filter(id__in=topic_ids))
     topics = sorted(topics, key=lambda t: topic_ids.index(t.id))
 
+    task_qs = Task.objects.filter(topic_id__in=topic_ids, task_type='test')
+    if year and month:
+        # Oy filtri DB'da (topic + submitted_at indeksi), Toshkent vaqti bo'yicha
+        month_start, month_end = _month_bounds(year, month)
+        task_qs = task_qs.filter(submitted_at__gte=month_start, submitted_at__lt=month_end)
+
     if group_id == 0:
         tasks = list(
-            Task.objects.filter(topic_id__in=topic_ids, task_type='test')
-                .select_related('student')
+            task_qs.select_related('student')
                 .exclude(test_answers__isnull=True)
                 .exclude(test_answers='')
         )
-        if year and month:
-            tasks = [t for t in tasks if t.submitted_at and
-                     t.submitted_at.year == year and t.submitted_at.month == month]
         student_map = {t.student_id: t.student for t in tasks}
         students = sorted(student_map.values(), key=lambda s: s.full_name)
     else:
@@ -68,41 +72,49 @@ def group_matrix_report(request, token):
         students = list(group.enrolled_students.all().order_by('full_name'))
         student_ids = [s.id for s in students]
         tasks = list(
-            Task.objects.filter(
-                topic_id__in=topic_ids, task_type='test', student_id__in=student_ids
-            ).select_related('student')
+            task_qs.filter(student_id__in=student_ids)
+             .select_related('student')
              .exclude(test_answers__isnull=True)
              .exclude(test_answers='')
         )
-        if year and month:
-            tasks = [t for t in tasks if t.submitted_at and
-                     t.submitted_at.year == year and t.submitted_at.month == month]
 
     # tasks_map: {topic_id: {student_id: task}}
     tasks_map = {}
     for task in tasks:
         tasks_map.setdefault(task.topic_id, {})[task.student_id] = task
 
+    # Har mavzu bo'yicha barcha javoblar bitta o'tishda baholanadi:
+    # topic_counts: {topic_id: (savollar_soni, {student_id: (fan_togri, ped_togri) yoki None})}
+    topic_counts = {}
+    for topic in topics:
+        correct = topic.correct_answers or {}
+        test_code = next(iter(correct), None)
+        answer_key = get_answer_key(correct.get(test_code, ''))
+        topic_tasks = tasks_map.get(topic.id, {})
+        counts = block_counts_many(answer_key, [t.test_answers for t in topic_tasks.values()], pad=True)
+        topic_counts[topic.id] = (answer_key, dict(zip(topic_tasks.keys(), counts)))
+
     # Har bir student uchun qator ma'lumotlari
     def score_info(task, topic):
         if task is None:
             return {'text': '—', 'color': SCORE_COLORS['none'], 'val': -1, 'sub': None}
-        total_q = len(topic.correct_answers) if topic.correct_answers else 0
-        answers = task.test_answers or ''
-        correct = topic.correct_answers or {}
-        correct_str = next(iter(correct.values()), '') if correct else ''
-        if total_q == 50:
-            fan = score_50_fan(answers, correct_str)
-            ped = score_50_ped(answers, correct_str)
+        answer_key, counts_map = topic_counts[topic.id]
+        total_q = answer_key.n_questions
+        counts = counts_map.get(task.student_id)
+        if counts is None:
+            # Javoblar soni kalitdan ko'p — baholab bo'lmaydi
+            return {'text': '—', 'color': SCORE_COLORS['none'], 'val': -1, 'sub': None}
+        fan, ped = counts
+        if answer_key.has_blocks:
             pct = ((fan + ped) / 50 * 100)
             return {
-                'text': f"{fan}/35",
-                'sub':  f"Ped:{ped}/15",
+                'text': f"{fan}/{FAN_QUESTIONS}",
+                'sub':  f"Ped:{ped}/{BLOCK_TEST_QUESTIONS - FAN_QUESTIONS}",
                 'color': _grade_color(pct, 100),
                 'val': fan + ped,
             }
         else:
-            sc = sum(1 for i, ch in enumerate(answers) if i < len(correct_str) and ch == correct_str[i])
+            sc = fan + ped
             pct = (sc / total_q * 100) if total_q else 0
             return {
                 'text': f"{sc}/{total_q}",
@@ -149,14 +161,6 @@ def group_matrix_report(request, token):
     return render(request, 'report_matrix.html', context)
 
 
-def score_50_fan(answers, correct_str):
-    return sum(1 for i in range(min(35, len(answers))) if i < len(correct_str) and answers[i] == correct_str[i])
-
-
-def score_50_ped(answers, correct_str):
-    return sum(1 for i in range(35, min(50, len(answers))) if i < len(correct_str) and answers[i] == correct_str[i])
-
-
 def _grade_color(pct, max_val):
     if pct >= max_val * 0.7:
         return SCORE_COLORS['high']
@@ -2,6 +2,27 @@ from rest_framework import serializers
 from .models import Course, Group, Student, Topic, Task, InviteCode, AttendanceSession, Attendance
 
 
+class SparseFieldsMixin:
+    """
+    fields=[...] berilsa faqat shu maydonlar qaytariladi (?fields=id,grade uchun).
+    Noma'lum maydon nomlari ValueError beradi.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise ValueError(f"Noma'lum maydon(lar): {', '.join(sorted(unknown))}")
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def readable_fields(cls):
+        return [name for name, field in cls().fields.items() if not field.write_only]
+
+
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
@@ -28,7 +49,7 @@ class GroupSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "telegram_group_id", "invite_link", "course", "course_id", "course_type", "is_full"]
 
 
-class StudentSerializer(serializers.ModelSerializer):
+class StudentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Ko'p guruh (ManyToMany)
     groups = GroupSerializer(many=True, read_only=True)
     groups_ids = serializers.PrimaryKeyRelatedField(
@@ -82,22 +103,26 @@ class TopicSerializer(serializers.ModelSerializer):
         fields = ["id", "title", "is_active", "course", "course_id", "course_type", "correct_answers", "deadline", "show_detailed_results", "created_at"]
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     student = StudentSerializer(read_only=True)
     student_id = serializers.PrimaryKeyRelatedField(
         queryset=Student.objects.all(), source="student", write_only=True
     )
+    # O'qish uchun (?fields= bilan ichki obyektlarsiz) — student_id / topic_id yozish uchun qoladi
+    student_pk = serializers.IntegerField(source="student_id", read_only=True)
+    student_telegram_id = serializers.CharField(source="student.telegram_id", read_only=True)
     topic = TopicSerializer(read_only=True)
     topic_id = serializers.PrimaryKeyRelatedField(
         queryset=Topic.objects.all(), source="topic", write_only=True
     )
+    topic_pk = serializers.IntegerField(source="topic_id", read_only=True)
 
     class Meta:
         model = Task
         fields = [
             "id",
-            "student", "student_id",
-            "topic", "topic_id",
+            "student", "student_id", "student_pk", "student_telegram_id",
+            "topic", "topic_id", "topic_pk",
             "task_type",
             "file_link", "files",
             "test_code", "test_answers",
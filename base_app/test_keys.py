@@ -0,0 +1,124 @@
+"""
+TestKey jadvalini Topic.correct_answers bilan sinxron saqlash.
+
+Bitta test kodi faqat bitta mavzuga tegishli bo'ladi (unique indeks). Bir nechta
+mavzuda bir xil kod bo'lsa — avvalgi correct_answers__has_key=...first() bilan
+bir xil — eng kichik id li mavzu egasi hisoblanadi; egasi kodni olib tashlasa,
+keyingi mavzu egallaydi (mavzu o'chirilganda ham — reassign_test_keys).
+"""
+import logging
+
+from django.db import transaction as db_transaction
+
+from .grading import get_answer_key
+
+logger = logging.getLogger(__name__)
+
+TEST_CODE_MAX_LENGTH = 50  # Task.test_code bilan bir xil
+
+
+def key_fields(answer_key):
+    """Kalit satridan TestKey maydonlari: answer_key, question_count, parsed."""
+    answer_key = str(answer_key or '')
+    compiled = get_answer_key(answer_key)
+    return {
+        'answer_key': answer_key,
+        'question_count': compiled.n_questions,
+        'parsed': compiled.options,
+    }
+
+
+def topic_codes(correct_answers):
+    """correct_answers dan {test_code: kalit_satri} (yaroqsiz kodlar tashlab ketiladi)."""
+    if not isinstance(correct_answers, dict):
+        return {}
+    codes = {}
+    for code, answer_key in correct_answers.items():
+        code = str(code)
+        if not code or len(code) > TEST_CODE_MAX_LENGTH:
+            logger.warning(f"Test kodi TestKey ga sig'maydi, o'tkazib yuborildi: {code[:60]!r}")
+            continue
+        codes[code] = answer_key
+    return codes
+
+
+def _assign_next_owner(code):
+    """Kod egasiz qolganda — shu kodga ega keyingi (eng kichik id li) mavzuga beriladi."""
+    from .models import TestKey, Topic
+
+    topic = Topic.objects.filter(correct_answers__has_key=code).order_by('id').first()
+    if topic is not None:
+        TestKey.objects.create(topic=topic, test_code=code, **key_fields(topic.correct_answers[code]))
+
+
+def owned_test_codes(topic_ids):
+    """Mavzu(lar)ga tegishli test kodlari — mavzu o'chirilishidan OLDIN olinadi (TestKey CASCADE)."""
+    from .models import TestKey
+
+    return list(TestKey.objects.filter(topic_id__in=topic_ids).values_list('test_code', flat=True))
+
+
+def reassign_test_keys(codes):
+    """Mavzu o'chirilgandan keyin: egasiz qolgan kodlar shu kodga ega keyingi mavzuga o'tadi."""
+    for code in codes:
+        _assign_next_owner(code)
+
+
+def sync_topic_test_keys(topic):
+    """Mavzuning TestKey qatorlarini correct_answers ga moslaydi."""
+    from .models import TestKey
+
+    codes = topic_codes(topic.correct_answers)
+    with db_transaction.atomic():
+        existing = {
+            tk.test_code: tk
+            for tk in TestKey.objects.select_for_update().filter(test_code__in=codes)
+        }
+        removed = list(
+            TestKey.objects.filter(topic=topic).exclude(test_code__in=codes)
+            .values_list('test_code', flat=True)
+        )
+        if removed:
+            TestKey.objects.filter(topic=topic, test_code__in=removed).delete()
+
+        for code, answer_key in codes.items():
+            tk = existing.get(code)
+            if tk is None:
+                TestKey.objects.create(topic=topic, test_code=code, **key_fields(answer_key))
+                continue
+            if tk.topic_id != topic.pk:
+                if tk.topic_id < topic.pk:
+                    # Kod avvalroq yaratilgan mavzuga tegishli — o'sha egasi qoladi
+                    logger.warning(f"Test kodi {code} #{tk.topic_id} mavzuga tegishli, #{topic.pk} uchun e'tiborsiz")
+                    continue
+                tk.topic = topic
+            elif tk.answer_key == str(answer_key or ''):
+                continue
+            for field, value in key_fields(answer_key).items():
+                setattr(tk, field, value)
+            tk.save()
+
+        for code in removed:
+            _assign_next_owner(code)
+
+
+def rebuild_test_keys():
+    """TestKey jadvalini barcha mavzulardan noldan quradi. Qaytaradi: qatorlar soni."""
+    from .models import TestKey, Topic
+
+    rows = {}
+    for topic in Topic.objects.exclude(correct_answers__isnull=True).order_by('id').only('id', 'correct_answers'):
+        for code, answer_key in topic_codes(topic.correct_answers).items():
+            rows.setdefault(code, TestKey(topic_id=topic.id, test_code=code, **key_fields(answer_key)))
+
+    with db_transaction.atomic():
+        TestKey.objects.all().delete()
+        TestKey.objects.bulk_create(rows.values(), batch_size=500)
+    return len(rows)
+
+
+def resolve_test_code(test_code):
+    """test_code → TestKey (topic bilan) yoki None — unique indeks orqali bitta so'rov."""
+    from .models import TestKey
+
+    return TestKey.objects.select_related('topic').filter(test_code=test_code).first()
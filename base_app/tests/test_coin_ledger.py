@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from base_app.coin_ledger import (
+    LedgerTask, LedgerTx, LedgerWallet, TxFix, WalletFix, _replay_wallet, apply_ledger_fixes,
+    iter_wallet_shards, ledger_drift, replay_shard,
+)
+from base_app.coins import CourseTopicSequence, award_task_coins
+from base_app.models import CoinTransaction, CoinWallet, Course, Task
+
+from .utils import make_course, make_student, make_task, make_topic
+
+START = datetime(2025, 3, 1)
+
+
+def at(hours):
+    return START + timedelta(hours=hours)
+
+
+class ReplayWalletTests(SimpleTestCase):
+    sequence = CourseTopicSequence([(1, at(0)), (2, at(10)), (3, at(20))])
+    tasks = [
+        LedgerTask(1, 'test', 5, at(1)),
+        LedgerTask(2, 'test', 3, at(21)),
+        LedgerTask(3, 'test', 4, at(22)),
+    ]
+
+    def test_consistent_wallet(self):
+        txs = [
+            LedgerTx(10, 1, 'test', at(0), at(1), 5, 1, 6, 1),
+            LedgerTx(11, 2, 'test', at(10), at(21), 3, 2, 5, 2),
+            LedgerTx(12, 3, 'test', at(20), at(22), 4, 3, 7, 3),
+        ]
+        wallet = LedgerWallet(1, 7, 18, 3, 3)
+        self.assertEqual(_replay_wallet(wallet, txs, self.tasks, self.sequence), ([], None, 0))
+
+    def test_streaks_results_and_retroactive_rows(self):
+        txs = [
+            LedgerTx(10, 1, 'test', at(0), at(1), 5, 1, 6, 1),
+            # 2-mavzu 3-mavzudan oldin topshirilgan — streak 2 bo'lishi kerak
+            LedgerTx(12, 3, 'test', at(20), at(22), 4, 1, 5, 1),
+            # Retroaktiv (streak_coins=0) — zanjirda qatnashmaydi, natija bahoga tenglashadi
+            LedgerTx(11, 2, 'test', at(10), at(23), 2, 0, 2, 1),
+        ]
+        wallet = LedgerWallet(1, 7, 13, 1, 1)
+
+        tx_fixes, wallet_fix, orphans = _replay_wallet(wallet, txs, self.tasks, self.sequence)
+
+        self.assertEqual(tx_fixes, [TxFix(12, 4, 2, 6, 2), TxFix(11, 3, 0, 3, 2)])
+        self.assertEqual(wallet_fix, WalletFix(1, 15, 2, 2))
+        self.assertEqual(orphans, 0)
+
+    def test_transaction_without_task_keeps_result(self):
+        txs = [
+            LedgerTx(10, 1, 'test', at(0), at(1), 5, 1, 6, 1),
+            LedgerTx(13, 3, 'assignment', at(20), at(30), 9, 2, 11, 2),
+        ]
+        wallet = LedgerWallet(1, 7, 17, 2, 2)
+        self.assertEqual(_replay_wallet(wallet, txs, self.tasks, self.sequence), ([], None, 1))
+
+
+class LedgerRebuildTests(TestCase):
+    def setUp(self):
+        course = make_course()
+        topics = [make_topic(course, f"T{i}", days_ago=6 - i) for i in range(5)]
+        for s in range(4):
+            student = make_student(s)
+            for t, topic in enumerate(topics):
+                if (s + t) % 4:
+                    make_task(student, topic, grade=s + t)
+                    award_task_coins(student, topic, s + t, False)
+        self.course = Course.objects.get(pk=course.pk)
+
+    def replay(self, shard_size=2):
+        results = [replay_shard(shard) for shard in iter_wallet_shards(self.course, shard_size)]
+        return (
+            [fix for r in results for fix in r.tx_fixes],
+            [fix for r in results for fix in r.wallet_fixes],
+            sum(r.wallets for r in results),
+        )
+
+    def test_awarded_ledger_is_consistent(self):
+        self.assertEqual(ledger_drift(self.course.id), [])
+        self.assertEqual(self.replay(), ([], [], 4))
+
+    def test_fix_repairs_drift(self):
+        wallet = CoinWallet.objects.order_by('id').first()
+        CoinWallet.objects.filter(pk=wallet.pk).update(total_coins=0, longest_streak=9)
+        Task.objects.filter(student_id=wallet.student_id).update(grade=1)
+        self.assertEqual([row['id'] for row in ledger_drift(self.course.id)], [wallet.id])
+
+        tx_fixes, wallet_fixes, _ = self.replay()
+        self.assertEqual({fix.id for fix in tx_fixes}, set(
+            CoinTransaction.objects.filter(wallet=wallet).exclude(result_coins=1).values_list('id', flat=True)
+        ))
+        self.assertEqual([fix.id for fix in wallet_fixes], [wallet.id])
+
+        apply_ledger_fixes(self.course.id, tx_fixes, wallet_fixes)
+
+        self.assertEqual(ledger_drift(self.course.id), [])
+        self.assertEqual(self.replay()[:2], ([], []))
+        self.assertEqual(
+            set(CoinTransaction.objects.filter(wallet=wallet).values_list('result_coins', flat=True)), {1}
+        )
+
+    def test_command_dry_run_and_fix(self):
+        wallet = CoinWallet.objects.order_by('id').first()
+        CoinWallet.objects.filter(pk=wallet.pk).update(total_coins=0)
+
+        call_command('rebuild_coin_ledger', '--workers', '1', '--fix', '--dry-run', stdout=StringIO())
+        self.assertEqual(len(ledger_drift(self.course.id)), 1)
+
+        call_command('rebuild_coin_ledger', '--workers', '1', '--fix', stdout=StringIO())
+        self.assertEqual(ledger_drift(self.course.id), [])
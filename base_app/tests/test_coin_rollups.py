@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.test import TestCase
+
+from base_app.coin_rollups import rebuild_coin_rollups, refresh_rollups, rollup_day
+from base_app.coins import award_task_coins
+from base_app.models import CoinDailyRollup, CoinTransaction, CoinWallet, Topic
+
+from .utils import make_course, make_student, make_task, make_topic
+
+
+def rollup_rows(**filters):
+    return set(
+        CoinDailyRollup.objects.filter(**filters)
+        .values_list('wallet_id', 'course_id', 'day', 'coins', 'max_streak')
+    )
+
+
+class RefreshRollupsTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+        self.topics = [make_topic(self.course, f"T{i}", days_ago=5 - i) for i in range(3)]
+        # activated_at yo'q mavzu — day=NULL qator
+        self.undated = Topic.objects.create(course=self.course, title="Undated", is_active=False)
+        self.students = [make_student(i) for i in range(3)]
+        for s_index, student in enumerate(self.students):
+            for t_index, topic in enumerate(self.topics + [self.undated]):
+                if (s_index + t_index) % 3:
+                    make_task(student, topic, grade=t_index + 1)
+                    award_task_coins(student, topic, t_index + 1, False)
+        self.wallets = list(CoinWallet.objects.order_by('id'))
+
+    def test_incremental_rows_match_rebuild(self):
+        incremental = rollup_rows()
+        self.assertTrue(incremental)
+        self.assertIn(None, {row[2] for row in incremental})
+        rebuild_coin_rollups()
+        self.assertEqual(rollup_rows(), incremental)
+
+    def test_refresh_recomputes_only_given_wallets_and_days(self):
+        wallet, other = self.wallets[0], self.wallets[1]
+        day = rollup_day(self.topics[1].activated_at)
+        CoinTransaction.objects.filter(topic__in=self.topics + [self.undated]).update(total_coins=10)
+        before_other = rollup_rows(wallet=other)
+
+        refresh_rollups([wallet.id], {day, None})
+
+        for row in CoinDailyRollup.objects.filter(wallet=wallet):
+            txs = CoinTransaction.objects.filter(wallet=wallet, topic__in=[
+                t for t in self.topics + [self.undated] if rollup_day(t.activated_at) == row.day
+            ])
+            if row.day in (day, None):
+                self.assertEqual(row.coins, 10 * txs.count())
+            else:
+                self.assertNotEqual(row.coins, 10 * txs.count())
+        self.assertEqual(rollup_rows(wallet=other), before_other)
+
+    def test_refresh_removes_empty_day(self):
+        wallet = self.wallets[0]
+        tx = CoinTransaction.objects.filter(wallet=wallet, topic__activated_at__isnull=False).first()
+        day = rollup_day(tx.topic.activated_at)
+        tx.delete()
+
+        refresh_rollups([wallet.id], [day])
+
+        self.assertFalse(CoinDailyRollup.objects.filter(wallet=wallet, day=day).exists())
+
+    def test_activation_change_moves_rollup(self):
+        topic = self.topics[0]
+        old_day = rollup_day(topic.activated_at)
+        topic.activated_at = topic.activated_at - timedelta(days=30)
+        topic.save()
+
+        self.assertFalse(CoinDailyRollup.objects.filter(day=old_day).exists())
+        incremental = rollup_rows()
+        rebuild_coin_rollups()
+        self.assertEqual(rollup_rows(), incremental)
+
+    def test_empty_arguments(self):
+        before = rollup_rows()
+        refresh_rollups([], [None])
+        refresh_rollups([self.wallets[0].id], [])
+        self.assertEqual(rollup_rows(), before)
@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from base_app.csv_export import csv_rows, keyset_chunks, keyset_iter
+from base_app.models import Task
+
+from .utils import make_course, make_student, make_task, make_topic
+
+
+class KeysetIterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        course = make_course()
+        topics = [make_topic(course, f"T{i}", days_ago=i) for i in range(3)]
+        for i in range(12):
+            student = make_student(i)
+            for j, topic in enumerate(topics):
+                # Baholar ko'p takrorlanadi — DESC kalitda teng qiymatlar chunk chegarasiga tushadi
+                make_task(student, topic, grade=(i + j) % 3)
+
+    def test_ties_on_desc_key(self):
+        order = ('-grade', 'id')
+        expected = list(Task.objects.order_by(*order).values_list('id', flat=True))
+        for chunk_size in (1, 4, 5, 36, 100):
+            with self.subTest(chunk_size=chunk_size):
+                got = [task.id for task in keyset_iter(Task.objects.all(), order, chunk_size)]
+                self.assertEqual(got, expected)
+
+    def test_values_and_related_keys(self):
+        order = ('topic__title', '-grade', '-id')
+        qs = Task.objects.values('id', 'grade', 'topic__title')
+        self.assertEqual(list(keyset_iter(qs, order, 7)), list(qs.order_by(*order)))
+
+        objects = [t.id for t in keyset_iter(Task.objects.select_related('topic'), order, 7)]
+        self.assertEqual(objects, [row['id'] for row in qs.order_by(*order)])
+
+    def test_one_query_per_chunk(self):
+        qs = Task.objects.filter(grade=1)
+        total = qs.count()
+        with self.assertNumQueries(total // 5 + 1):
+            self.assertEqual(len(list(keyset_iter(qs, ('-grade', 'id'), 5))), total)
+
+    def test_chunks(self):
+        chunks = list(keyset_chunks(Task.objects.all(), ('id',), 10))
+        self.assertEqual([len(c) for c in chunks], [10, 10, 10, 6])
+
+
+class CsvRowsTests(TestCase):
+    def test_bom_header_and_rows(self):
+        text = ''.join(csv_rows(['a', 'b'], ([i, f"x,{i}"] for i in range(450))))
+        lines = text.splitlines()
+        self.assertTrue(text.startswith('\ufeffa,b'))
+        self.assertEqual(len(lines), 451)
+        self.assertEqual(lines[-1], '449,"x,449"')
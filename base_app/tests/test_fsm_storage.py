@@ -0,0 +1,165 @@
+"""
+Bot FSM storage (mukammal-bot-paid/utils/db_api/fsm_storage.py) — BotFSMState jadvali
+bilan. DB chaqiruvlari repository executor thread'larida bajariladi, shuning uchun
+TransactionTestCase.
+"""
+import asyncio
+import datetime
+import os
+import sys
+import threading
+from concurrent.futures import wait
+from unittest import mock
+
+from django.conf import settings
+from django.db import connections
+from django.test import TransactionTestCase
+
+from base_app.models import BotFSMState
+
+BOT_DIR = os.path.join(settings.BASE_DIR, 'mukammal-bot-paid')
+
+# data/config.py majburiy o'zgaruvchilari (bot .env siz ishga tushirilganda)
+for _name, _value in (
+    ('BOT_TOKEN', '123:test'), ('ADMINS', '1'), ('MILLIY_ADMIN', '1'),
+    ('ATTESTATSIYA_ADMIN', '1'), ('ip', 'localhost'), ('API_BASE_URL', 'http://localhost'),
+):
+    os.environ.setdefault(_name, _value)
+if BOT_DIR not in sys.path:
+    sys.path.append(BOT_DIR)
+
+from utils.db_api import fsm_storage, repository  # noqa: E402
+from utils.db_api.fsm_storage import DjangoFSMStorage  # noqa: E402
+
+
+def close_executor_connections():
+    """Executor'ning har thread'idagi ulanishni yopadi (test bazasi o'chirilishi uchun)."""
+    workers = repository._executor._max_workers
+    barrier = threading.Barrier(workers)
+
+    def close():
+        connections.close_all()
+        barrier.wait(timeout=5)
+
+    wait([repository._executor.submit(close) for _ in range(workers)])
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class DjangoFSMStorageTests(TransactionTestCase):
+    def tearDown(self):
+        close_executor_connections()
+
+    def test_round_trip_through_db(self):
+        async def scenario():
+            storage = DjangoFSMStorage()
+            await storage.set_state(chat=1, user=2, state='Reg:name')
+            await storage.update_data(chat=1, user=2, name='Ali', ids=[1, 2])
+            await storage.update_data(chat=1, user=2, data={'phone': '+998'})
+            # Yangi jarayon (bo'sh kesh) — hammasi DB dan o'qiladi
+            fresh = DjangoFSMStorage()
+            return await fresh.get_state(chat=1, user=2), await fresh.get_data(chat=1, user=2)
+
+        state, data = run(scenario())
+        self.assertEqual(state, 'Reg:name')
+        self.assertEqual(data, {'name': 'Ali', 'ids': [1, 2], 'phone': '+998'})
+        row = BotFSMState.objects.get(chat_id=1, user_id=2)
+        self.assertEqual(row.state, 'Reg:name')
+
+    def test_finish_deletes_row(self):
+        async def scenario():
+            storage = DjangoFSMStorage()
+            await storage.set_state(chat=1, user=1, state='S')
+            await storage.update_data(chat=1, user=1, x=1)
+            await storage.finish(chat=1, user=1)
+            return await storage.get_state(chat=1, user=1), await DjangoFSMStorage().get_data(chat=1, user=1)
+
+        self.assertEqual(run(scenario()), (None, {}))
+        self.assertFalse(BotFSMState.objects.exists())
+
+    def test_returned_data_is_a_copy(self):
+        async def scenario():
+            storage = DjangoFSMStorage()
+            await storage.set_data(chat=1, user=1, data={'items': [1]})
+            data = await storage.get_data(chat=1, user=1)
+            data['items'].append(2)
+            return await storage.get_data(chat=1, user=1)
+
+        self.assertEqual(run(scenario()), {'items': [1]})
+
+    def test_non_json_data_rejected(self):
+        async def scenario():
+            storage = DjangoFSMStorage()
+            await storage.update_data(chat=1, user=1, name='Ali')
+            with self.assertRaises(TypeError):
+                await storage.update_data(chat=1, user=1, when=datetime.datetime.now())
+            return await storage.get_data(chat=1, user=1), await DjangoFSMStorage().get_data(chat=1, user=1)
+
+        cached, stored = run(scenario())
+        self.assertEqual(cached, {'name': 'Ali'})
+        self.assertEqual(stored, {'name': 'Ali'})
+
+    def test_same_user_writes_keep_order(self):
+        async def scenario():
+            storage = DjangoFSMStorage()
+            await storage.get_state(chat=1, user=1)  # keshda — yozuvlar chaqiruv tartibida
+            await asyncio.gather(*(
+                storage.set_state(chat=1, user=1, state=f'S{i}') for i in range(20)
+            ))
+            return (
+                storage._key_locks, await storage.get_state(chat=1, user=1),
+                await DjangoFSMStorage().get_state(chat=1, user=1),
+            )
+
+        key_locks, cached, stored = run(scenario())
+        self.assertEqual((cached, stored), ('S19', 'S19'))
+        self.assertEqual(key_locks, {})
+
+    def test_different_users_write_in_parallel(self):
+        active = []
+        peak = []
+        saved = []
+
+        async def slow_save(*args):
+            # DB o'rniga — bir vaqtda nechta yozuv kutilayotganini o'lchaydi
+            active.append(args[:2])
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(args[:2])
+            saved.append(args)
+
+        async def scenario():
+            storage = DjangoFSMStorage()
+            with mock.patch.object(fsm_storage, '_db_save', slow_save):
+                await asyncio.gather(*(
+                    storage.set_state(chat=u, user=u, state='S') for u in range(1, 6)
+                ), storage.set_state(chat=1, user=1, state='T'))
+
+        run(scenario())
+        self.assertEqual(max(peak), 5)
+        self.assertEqual([args[2] for args in saved if args[:2] == (1, 1)], ['S', 'T'])
+        self.assertEqual(len(saved), 6)
+
+    def test_reset_all(self):
+        async def scenario():
+            storage = DjangoFSMStorage()
+            await storage.set_state(chat=1, user=1, state='A')
+            await storage.get_state(chat=2, user=2)
+            # B yozuvi reset_all dan oldin boshlangan — u ham o'chiriladi
+            await asyncio.gather(storage.set_state(chat=2, user=2, state='B'), storage.reset_all())
+            await storage.set_state(chat=3, user=3, state='C')
+            return await storage.get_state(chat=1, user=1), await storage.get_state(chat=2, user=2)
+
+        self.assertEqual(run(scenario()), (None, None))
+        self.assertEqual(list(BotFSMState.objects.values_list('state', flat=True)), ['C'])
+
+    def test_without_cache(self):
+        async def scenario():
+            storage = DjangoFSMStorage(cache_size=0)
+            await storage.set_state(chat=5, user=5, state='A')
+            await DjangoFSMStorage().set_state(chat=5, user=5, state='B')
+            return await storage.get_state(chat=5, user=5), len(storage._cache)
+
+        self.assertEqual(run(scenario()), ('B', 0))
@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from base_app import grading
+from base_app.grading import (
+    AnswerKey, block_counts_many, fan_ped_many, get_answer_key, grade_many, parse_answers, parse_key,
+)
+
+
+class ParseTests(SimpleTestCase):
+    def test_key_formats(self):
+        self.assertEqual(parse_key("abc"), [['a'], ['b'], ['c']])
+        self.assertEqual(parse_key("1ab2x3C"), [['a', 'b'], ['x'], ['c']])
+        self.assertEqual(parse_key(" A B "), [['a'], ['b']])
+        self.assertEqual(parse_key(None), [])
+
+    def test_answer_formats(self):
+        self.assertEqual(parse_answers("abc"), ['a', 'b', 'c'])
+        self.assertEqual(parse_answers("1a2b3c"), ['a', 'b', 'c'])
+        # Eski yozuvlardagi "test_kodi-javoblar" prefiksi
+        self.assertEqual(parse_answers("12-abc"), ['a', 'b', 'c'])
+        self.assertEqual(parse_answers("1_2-1a2b"), ['a', 'b'])
+
+
+class AnswerKeyTests(SimpleTestCase):
+    def test_void_question_accepts_any_letter(self):
+        key = AnswerKey("1a2x3c")
+        self.assertEqual(key.void, (False, True, False))
+        self.assertEqual(key.check(['a', 'd', 'c']), [True, True, True])
+        self.assertEqual(key.check(['a', 'x', 'b']), [True, True, False])
+        self.assertEqual(key.score(['b', 'z', 'c']), 2)
+
+    def test_x_answer_is_wrong_for_normal_question(self):
+        key = AnswerKey("1a2b")
+        self.assertEqual(key.score(['x', 'b']), 1)
+
+    def test_several_correct_letters(self):
+        key = AnswerKey("1ab2c")
+        self.assertEqual(key.score(['a', 'c']), 2)
+        self.assertEqual(key.score(['b', 'c']), 2)
+        self.assertEqual(key.score(['c', 'c']), 1)
+        self.assertEqual(key.valid_letters(0), 'A/B')
+
+    def test_length_mismatch(self):
+        key = AnswerKey("abcd")
+        self.assertIsNone(key.score(['a', 'b']))
+        self.assertIsNone(key.score(['a', 'b', 'c', 'd', 'a']))
+        self.assertEqual(key.score(['a', 'b'], pad=True), 2)
+
+    def test_fan_ped_blocks(self):
+        key = AnswerKey('a' * 50)
+        answers = ['a'] * 35 + ['b'] * 5 + ['a'] * 10
+        self.assertTrue(key.has_blocks)
+        self.assertEqual(key.fan_ped(answers), (70, 20))
+        self.assertEqual(AnswerKey('a' * 10).fan_ped(['a'] * 10), (None, None))
+
+    def test_cached_key(self):
+        self.assertIs(get_answer_key("1a2x"), get_answer_key("1a2x"))
+
+
+class GradeManyTests(SimpleTestCase):
+    KEY = "1ab2x3c4d5a"
+    ANSWERS = ["abcda", "bzcda", "1a2b3c4d5a", "aaaaa", "abc", "abcdaa", "", "12-babcd"]
+
+    def expected(self, key, pad=False):
+        return [key.score(parse_answers(a), pad=pad) for a in self.ANSWERS]
+
+    def grade_both(self, func, *args, **kwargs):
+        """NumPy va oddiy Python yo'llari bir xil natija berishi kerak."""
+        with_np = func(*args, **kwargs)
+        with mock.patch.object(grading, 'np', None):
+            without_np = func(*args, **kwargs)
+        self.assertEqual(with_np, without_np)
+        return with_np
+
+    def test_matches_single_score(self):
+        key = AnswerKey(self.KEY)
+        self.assertEqual(self.grade_both(grade_many, key, self.ANSWERS), self.expected(key))
+        self.assertEqual(self.grade_both(grade_many, key, self.ANSWERS, pad=True), self.expected(key, pad=True))
+
+    def test_parsed_lists_accepted(self):
+        key = AnswerKey(self.KEY)
+        parsed = [parse_answers(a) for a in self.ANSWERS]
+        self.assertEqual(self.grade_both(grade_many, key, parsed), self.expected(key))
+
+    def test_block_counts(self):
+        key = AnswerKey('x' + 'a' * 49)
+        answers = ['b' + 'a' * 34 + 'b' * 15, 'a' * 50, 'a' * 20]
+        self.assertEqual(
+            self.grade_both(block_counts_many, key, answers),
+            [(35, 0), (35, 15), None],
+        )
+        self.assertEqual(
+            self.grade_both(fan_ped_many, key, answers),
+            [(70, 0), (70, 30), (40, 0)],
+        )
+        self.assertEqual(fan_ped_many(AnswerKey('abc'), answers), [(None, None)] * 3)
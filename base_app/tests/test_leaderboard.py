@@ -0,0 +1,45 @@
+from django.test import TestCase
+
+from base_app.leaderboard import all_time_ranks, get_leaderboard, invalidate_course
+from base_app.models import CoinWallet
+
+from .utils import make_course, make_student
+
+
+class AllTimeRanksTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+        other = make_course("Boshqa")
+        # (tanga, eng uzun streak): teng qatorlar ko'p — o'rinlar id bo'yicha ajraladi
+        values = [(10, 2), (10, 2), (10, 3), (5, 1), (10, 2), (0, 0), (5, 1)]
+        self.wallets = []
+        for i, (coins, longest) in enumerate(values):
+            student = make_student(i)
+            self.wallets.append(CoinWallet.objects.create(
+                student=student, course=self.course, total_coins=coins, longest_streak=longest,
+            ))
+            CoinWallet.objects.create(student=student, course=other, total_coins=100 - coins)
+        invalidate_course(self.course.id)
+
+    def test_ranks_match_snapshot(self):
+        snapshot = get_leaderboard(self.course.id)
+        self.assertEqual([row['rank'] for row in snapshot.rows], list(range(1, len(self.wallets) + 1)))
+        for wallet in self.wallets:
+            with self.subTest(wallet=wallet.id):
+                row = snapshot.find(wallet.student.telegram_id)
+                self.assertEqual(all_time_ranks([wallet])[self.course.id], row['rank'])
+
+    def test_ties_ordered_by_id(self):
+        rows = get_leaderboard(self.course.id).rows
+        self.assertEqual(
+            [row['telegram_id'] for row in rows[:4]],
+            [self.wallets[i].student.telegram_id for i in (2, 0, 1, 4)],
+        )
+
+    def test_several_courses_in_one_query(self):
+        student = self.wallets[1].student
+        wallets = list(CoinWallet.objects.filter(student=student))
+        with self.assertNumQueries(1):
+            ranks = all_time_ranks(wallets)
+        self.assertEqual(ranks[self.course.id], 3)
+        self.assertEqual(len(ranks), 2)
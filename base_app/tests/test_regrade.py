@@ -0,0 +1,104 @@
+from django.test import TestCase
+
+from base_app.coins import award_task_coins
+from base_app.models import CoinDailyRollup, CoinTransaction, CoinWallet, Task
+from base_app.regrade import apply_coin_deltas, regrade_topic_answers
+
+from .utils import make_course, make_student, make_task, make_topic
+
+
+class ApplyCoinDeltasTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+        self.first = make_topic(self.course, "T1", days_ago=3)
+        self.topic = make_topic(self.course, "T2", days_ago=1)
+        self.awarded, self.no_wallet, self.no_tx = (make_student(i) for i in (1, 2, 3))
+
+        make_task(self.awarded, self.topic, grade=5)
+        award_task_coins(self.awarded, self.topic, 5, False)
+        make_task(self.no_wallet, self.topic, grade=3)
+        # Hamyoni bor, lekin shu mavzu uchun tranzaksiyasi yo'q
+        make_task(self.no_tx, self.first, grade=2)
+        award_task_coins(self.no_tx, self.first, 2, False)
+        make_task(self.no_tx, self.topic, grade=0)
+
+    def wallet(self, student):
+        return CoinWallet.objects.get(student=student, course=self.course)
+
+    def regrade(self, grades):
+        tasks = list(Task.objects.filter(topic=self.topic).order_by('student_id'))
+        for task in tasks:
+            task.grade = grades[task.student_id]
+            task.save(update_fields=['grade'])
+        return apply_coin_deltas(tasks, self.course.id)
+
+    def test_existing_transaction_updated(self):
+        deltas = self.regrade({self.awarded.id: 8, self.no_wallet.id: 3, self.no_tx.id: 0})
+
+        wallet = self.wallet(self.awarded)
+        tx = CoinTransaction.objects.get(wallet=wallet, topic=self.topic)
+        self.assertEqual((tx.result_coins, tx.streak_coins, tx.total_coins), (8, 1, 9))
+        self.assertEqual(wallet.total_coins, 9)
+        self.assertEqual(deltas[wallet.id], 3)
+        self.assertEqual(CoinDailyRollup.objects.get(wallet=wallet).coins, 9)
+
+    def test_missing_wallet_and_transaction_created(self):
+        deltas = self.regrade({self.awarded.id: 5, self.no_wallet.id: 4, self.no_tx.id: 0})
+
+        wallet = self.wallet(self.no_wallet)
+        tx = CoinTransaction.objects.get(wallet=wallet, topic=self.topic)
+        self.assertEqual((tx.result_coins, tx.streak_coins, tx.total_coins, tx.streak_after), (4, 0, 4, 0))
+        self.assertEqual(wallet.total_coins, 4)
+        self.assertEqual(deltas, {wallet.id: 4})
+
+        # 0 tangali retroaktiv tranzaksiya ham yaratiladi, hamyon o'zgarmaydi
+        wallet = self.wallet(self.no_tx)
+        tx = CoinTransaction.objects.get(wallet=wallet, topic=self.topic)
+        self.assertEqual((tx.total_coins, tx.streak_after), (0, wallet.current_streak))
+        self.assertEqual(wallet.total_coins, 3)
+        self.assertEqual(CoinTransaction.objects.filter(topic=self.topic).count(), 3)
+
+    def test_repeat_is_noop(self):
+        grades = {self.awarded.id: 2, self.no_wallet.id: 4, self.no_tx.id: 0}
+        self.regrade(grades)
+        totals = dict(CoinWallet.objects.values_list('id', 'total_coins'))
+
+        self.assertEqual(self.regrade(grades), {})
+        self.assertEqual(dict(CoinWallet.objects.values_list('id', 'total_coins')), totals)
+        self.assertEqual(CoinTransaction.objects.filter(topic=self.topic).count(), 3)
+
+    def test_wallet_total_not_negative(self):
+        wallet = self.wallet(self.awarded)
+        CoinWallet.objects.filter(pk=wallet.pk).update(total_coins=1)
+        self.regrade({self.awarded.id: 0, self.no_wallet.id: 3, self.no_tx.id: 0})
+        self.assertEqual(self.wallet(self.awarded).total_coins, 0)
+
+
+class RegradeTopicAnswersTests(TestCase):
+    def test_regrade_summary_and_coins(self):
+        course = make_course()
+        topic = make_topic(course, "T1", correct_answers={"C1": "abcd"})
+        answers = {1: "abcd", 2: "abca", 3: "dddd"}
+        for telegram_id, test_answers in answers.items():
+            student = make_student(telegram_id)
+            grade = sum(a == b for a, b in zip(test_answers, "abcd"))
+            make_task(student, topic, grade=grade, test_code="C1", test_answers=test_answers)
+            award_task_coins(student, topic, grade, False)
+
+        # 4-savol bekor qilinadi, 1-savolda "d" ham to'g'ri
+        result = regrade_topic_answers(topic.id, "C1", "1ad2b3c4x")
+
+        self.assertEqual((result['total'], result['graded'], result['void_count']), (3, 3, 1))
+        self.assertEqual(
+            {c['telegram_id']: (c['old'], c['new']) for c in result['changes']},
+            {'2': (3, 4), '3': (1, 2)},
+        )
+        self.assertEqual((result['up'], result['down']), (2, 0))
+        self.assertEqual(
+            dict(Task.objects.values_list('student__telegram_id', 'grade')),
+            {'1': 4, '2': 4, '3': 2},
+        )
+        self.assertEqual(
+            dict(CoinWallet.objects.values_list('student__telegram_id', 'total_coins')),
+            {'1': 5, '2': 5, '3': 3},
+        )
@@ -0,0 +1,72 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from base_app.coins import CourseTopicSequence, _replay_month_txs, replay_streaks
+from base_app.management.commands.benchmark_month_streak import _generate_course, _replay_reference
+
+START = datetime(2025, 3, 1)
+
+
+def at(hours):
+    return START + timedelta(hours=hours)
+
+
+class ReplayStreaksTests(SimpleTestCase):
+    def replay(self, events, tasks, topics):
+        return list(replay_streaks(events, tasks, CourseTopicSequence(topics)))
+
+    def test_consecutive_topics(self):
+        topics = [(1, at(0)), (2, at(10)), (3, at(20))]
+        tasks = [(1, at(1)), (2, at(11)), (3, at(21))]
+        events = [(tid, act, sub) for (tid, act), (_, sub) in zip(topics, tasks)]
+        self.assertEqual(self.replay(events, tasks, topics), [1, 2, 3])
+
+    def test_skipped_topic_breaks_streak(self):
+        topics = [(1, at(0)), (2, at(10)), (3, at(20)), (4, at(30))]
+        tasks = [(1, at(1)), (3, at(21)), (4, at(31))]
+        events = [(1, at(0), at(1)), (3, at(20), at(21)), (4, at(30), at(31))]
+        self.assertEqual(self.replay(events, tasks, topics), [1, 1, 2])
+
+    def test_late_submission_closes_gap(self):
+        topics = [(1, at(0)), (2, at(10)), (3, at(20))]
+        # 2-mavzu 3-mavzudan oldin (kech bo'lsa ham) topshirilgan — uzilish yo'q
+        tasks = [(1, at(1)), (2, at(22)), (3, at(23))]
+        events = [(1, at(0), at(1)), (3, at(20), at(23))]
+        self.assertEqual(self.replay(events, tasks, topics), [1, 2])
+        # 3-mavzudan keyin topshirilsa — uzilish
+        tasks = [(1, at(1)), (3, at(23)), (2, at(24))]
+        self.assertEqual(self.replay(events, tasks, topics), [1, 1])
+
+    def test_topics_without_activated_at_use_id_order(self):
+        topics = [(1, None), (2, None), (3, None)]
+        tasks = [(1, at(1)), (3, at(3))]
+        events = [(1, None, at(1)), (3, None, at(3))]
+        self.assertEqual(self.replay(events, tasks, topics), [1, 1])
+        tasks.append((2, at(2)))
+        self.assertEqual(self.replay(events, tasks, topics), [1, 2])
+
+    def test_matches_reference_on_generated_courses(self):
+        for seed in range(5):
+            rng = random.Random(seed)
+            active_topics, wallets = _generate_course(rng, 40, 30, 40, 0.2)
+            sequence = CourseTopicSequence(active_topics)
+            for txs, tasks in wallets:
+                self.assertEqual(
+                    _replay_month_txs(txs, tasks, sequence),
+                    _replay_reference(txs, tasks, active_topics),
+                )
+
+    def test_month_txs_totals(self):
+        topics = [SimpleNamespace(id=i, activated_at=at(i * 10)) for i in (1, 2, 3)]
+        txs = [
+            SimpleNamespace(topic=t, created_at=at(t.id * 10 + 1), result_coins=5)
+            for t in topics
+        ]
+        tasks = [(t.id, tx.created_at) for t, tx in zip(topics, txs)]
+        active = [(t.id, t.activated_at) for t in topics]
+        # 5*3 natija + 1+2+3 streak
+        self.assertEqual(_replay_month_txs(txs, tasks, active), (21, 3, 3))
+        self.assertEqual(_replay_month_txs([], tasks, active), (0, 0, 0))
@@ -0,0 +1,68 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from base_app.models import CoinTransaction, CoinWallet, GradeAggregate, Task
+from base_app.views import TaskSubmitView
+
+from .utils import make_course, make_student, make_topic
+
+
+class TaskSubmitViewTests(APITestCase):
+    url = reverse('task-submit')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = make_course()
+        cls.topic = make_topic(cls.course, "T1", correct_answers={"C1": "abc"})
+        cls.student = make_student(100)
+
+    def submit(self, grade=2, query='', **extra):
+        payload = {
+            'student_id': self.student.telegram_id, 'topic_id': self.topic.id, 'task_type': 'test',
+            'test_code': 'C1', 'test_answers': 'abd', 'grade': grade, **extra,
+        }
+        return self.client.post(self.url + query, payload, format='json')
+
+    def test_submit_awards_coins(self):
+        response = self.submit()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['grade'], 2)
+        self.assertEqual(response.data['coin_info']['total'], 3)
+        task = Task.objects.get()
+        self.assertEqual((task.student_id, task.topic_id, task.test_answers), (self.student.id, self.topic.id, 'abd'))
+        self.assertEqual(CoinWallet.objects.get().total_coins, 3)
+        aggregate = GradeAggregate.objects.get()
+        self.assertEqual((aggregate.submitted_count, aggregate.grade_sum), (1, 2))
+
+    def test_duplicate_rejected_without_side_effects(self):
+        self.assertEqual(self.submit().status_code, status.HTTP_201_CREATED)
+
+        response = self.submit(grade=3, test_answers='abc')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, TaskSubmitView.DUPLICATE_ERROR)
+        self.assertEqual(Task.objects.get().grade, 2)
+        self.assertEqual(CoinTransaction.objects.count(), 1)
+        self.assertEqual(CoinWallet.objects.get().total_coins, 3)
+        aggregate = GradeAggregate.objects.get()
+        self.assertEqual((aggregate.submitted_count, aggregate.grade_sum), (1, 2))
+
+    def test_other_task_type_is_not_duplicate(self):
+        self.assertEqual(self.submit().status_code, status.HTTP_201_CREATED)
+        response = self.submit(task_type='assignment', grade=None, file_link='file-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_sparse_fields(self):
+        response = self.submit(query='?fields=id,grade')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(set(response.data), {'id', 'grade', 'coin_info'})
+
+    def test_unknown_student_or_topic(self):
+        response = self.submit(student_id='missing')
+        self.assertEqual((response.status_code, response.data), (404, {"error": "Student topilmadi"}))
+        response = self.submit(topic_id=self.topic.id + 100)
+        self.assertEqual((response.status_code, response.data), (404, {"error": "Topic topilmadi"}))
+        self.assertFalse(Task.objects.exists())
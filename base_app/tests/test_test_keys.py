@@ -0,0 +1,59 @@
+from django.contrib import admin
+from django.test import TestCase
+
+from base_app.admin import TopicAdmin
+from base_app.models import TestKey, Topic
+from base_app.test_keys import rebuild_test_keys, resolve_test_code
+
+from .utils import make_course, make_topic
+
+
+def key_rows():
+    return set(TestKey.objects.values_list('test_code', 'topic_id', 'answer_key', 'question_count'))
+
+
+class TestKeySyncTests(TestCase):
+    def setUp(self):
+        course = make_course()
+        self.first = make_topic(course, "T1", correct_answers={"C1": "abc", "C2": "1ab2x"})
+        self.second = make_topic(course, "T2", correct_answers={"C1": "dd", "C3": "a"})
+        self.third = make_topic(course, "T3", correct_answers={"C1": "ccc"})
+
+    def assertMatchesRebuild(self):
+        rows = key_rows()
+        rebuild_test_keys()
+        self.assertEqual(key_rows(), rows)
+
+    def test_lowest_topic_id_owns_shared_code(self):
+        self.assertEqual(resolve_test_code("C1").topic_id, self.first.id)
+        self.assertEqual(resolve_test_code("C2").question_count, 2)
+        self.assertIsNone(resolve_test_code("C9"))
+        self.assertMatchesRebuild()
+
+    def test_removed_code_moves_to_next_topic(self):
+        self.first.correct_answers = {"C2": "1ab2x"}
+        self.first.save()
+        tk = resolve_test_code("C1")
+        self.assertEqual((tk.topic_id, tk.answer_key), (self.second.id, "dd"))
+        self.assertMatchesRebuild()
+
+    def test_deleted_topic_codes_move_to_next_topic(self):
+        self.first.delete()
+        tk = resolve_test_code("C1")
+        self.assertEqual((tk.topic_id, tk.answer_key), (self.second.id, "dd"))
+        self.assertIsNone(resolve_test_code("C2"))
+        self.assertMatchesRebuild()
+
+    def test_admin_bulk_delete_reassigns_codes(self):
+        TopicAdmin(Topic, admin.site).delete_queryset(None, Topic.objects.filter(pk__in=[self.first.pk, self.second.pk]))
+        self.assertEqual(resolve_test_code("C1").topic_id, self.third.id)
+        self.assertEqual(set(TestKey.objects.values_list('test_code', flat=True)), {"C1"})
+        self.assertMatchesRebuild()
+
+    def test_unchanged_answers_skip_sync(self):
+        topic = Topic.objects.get(pk=self.second.pk)
+        topic.title = "T2 yangi"
+        with self.assertNumQueries(1):
+            topic.save(update_fields=['title'])
+        with self.assertNumQueries(1):
+            topic.save(update_fields=['correct_answers'])
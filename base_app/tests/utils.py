@@ -0,0 +1,28 @@
+"""Testlar uchun umumiy yordamchilar: kurs, student, mavzu va topshiriq yaratish."""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from base_app.models import Course, Student, Task, Topic
+
+
+def make_course(name='Kurs'):
+    return Course.objects.create(name=name, code=name.lower())
+
+
+def make_student(telegram_id, full_name=None):
+    return Student.objects.create(telegram_id=str(telegram_id), full_name=full_name or f"Student {telegram_id}")
+
+
+def make_topic(course, title, days_ago=0, correct_answers=None, **kwargs):
+    """Faol mavzu; activated_at — hozirdan days_ago kun oldin."""
+    topic = Topic.objects.create(
+        course=course, title=title, is_active=True, correct_answers=correct_answers or {}, **kwargs
+    )
+    Topic.objects.filter(pk=topic.pk).update(activated_at=timezone.now() - timedelta(days=days_ago))
+    # from_db orqali — save() dagi o'zgarish kuzatuvi (_loaded_*) ishlashi uchun
+    return Topic.objects.get(pk=topic.pk)
+
+
+def make_task(student, topic, grade=None, task_type='test', **kwargs):
+    return Task.objects.create(student=student, topic=topic, task_type=task_type, grade=grade, **kwargs)
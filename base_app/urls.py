@@ -4,9 +4,9 @@ from .views import (
      StudentIsRegisteredView, GroupsListView, TopicsListView, TopicDetailView,
      TaskListView, TaskUpdateView, WeeklyReportPDFView, StudentListView,
      CreateInviteCodeView, ValidateInviteCodeView, StudentUpdateNameView, TopicCreateView,
-     StudentResultsView, CoursesListView, CourseTopicsView,
+     StudentResultsView, StudentPendingTopicsView, CoursesListView, CourseTopicsView,
      TestStatsView, TestResultsJSONView,
-     LeaderboardView, StudentWalletView, AdminLeaderboardView,
+     LeaderboardView, StudentWalletView, StudentCoinRanksView, AdminLeaderboardView,
      AttendanceSessionCreateView, AttendanceMarkView, AttendanceCSVView,
 )
 from .followup_views import followup_list, followup_mark, followup_unmark, followup_tg_link, followup_lock, followup_block, followup_unblock
@@ -19,6 +19,7 @@ urlpatterns = [
      path("students/<int:pk>/change-group/", StudentChangeGroupView.as_view(), name="student-change-group"),
      path("students/<str:telegram_id>/update_name/", StudentUpdateNameView.as_view(), name="student-update-name"),
      path("students/<str:telegram_id>/results/", StudentResultsView.as_view(), name="student-results"),
+     path("students/<str:telegram_id>/pending-topics/", StudentPendingTopicsView.as_view(), name="student-pending-topics"),
      path("students/", StudentListView.as_view(), name="student-list"),
 
      # Group and topic-related URLs
@@ -49,6 +50,7 @@ urlpatterns = [
      # Tanga tizimi
      path("coins/leaderboard/", LeaderboardView.as_view(), name="coin-leaderboard"),
      path("coins/my/", StudentWalletView.as_view(), name="coin-my-wallet"),
+     path("coins/my-ranks/", StudentCoinRanksView.as_view(), name="coin-my-ranks"),
      path("coins/admin-leaderboard/", AdminLeaderboardView.as_view(), name="coin-admin-leaderboard"),
 
      # Davomat
@@ -15,26 +15,118 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Student, Task, Group, Topic, CoinWallet, CoinTransaction, AttendanceSession, Attendance, WeeklyReportSetting
+from .models import Student, Task, Group, Topic, CoinWallet, CoinDailyRollup, AttendanceSession, Attendance, WeeklyReportSetting, TestKey
 from .serializers import StudentSerializer, TaskSerializer
-from .coins import award_task_coins
+from .coins import _month_bounds, award_task_coins
+from .grade_stats import apply_task_grade_change
+from .grading import POINTS_PER_QUESTION, block_counts_many, get_answer_key
+from .test_keys import resolve_test_code
 
 logger = logging.getLogger(__name__)
 
+class _BadParam(Exception):
+    pass
+
+
+def _sparse_fields(request, serializer_class):
+    """?fields=id,grade → ['id', 'grade'] (berilmasa None — barcha maydonlar)."""
+    raw = request.query_params.get("fields")
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(",") if name.strip()]
+    allowed = serializer_class.readable_fields()
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise _BadParam(f"Noma'lum maydon(lar): {', '.join(unknown)}. Mumkin: {', '.join(allowed)}")
+    return fields
+
+
+def _int_param(request, name):
+    value = request.query_params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise _BadParam(f"{name} butun son bo'lishi kerak")
+
+
+def _datetime_param(request, name):
+    """YYYY-MM-DD (Toshkent vaqti bilan kun boshi) yoki ISO datetime."""
+    from datetime import datetime
+
+    from django.utils import timezone
+    from django.utils.dateparse import parse_date, parse_datetime
+
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise _BadParam(f"{name}: YYYY-MM-DD yoki ISO datetime kerak")
+        parsed = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _task_window(request, prefix=""):
+    """topic_id / submitted_after / submitted_before → Task filtri (prefix bilan)."""
+    conditions = {}
+    topic_id = _int_param(request, "topic_id")
+    if topic_id is not None:
+        conditions[f"{prefix}topic_id"] = topic_id
+    submitted_after = _datetime_param(request, "submitted_after")
+    if submitted_after is not None:
+        conditions[f"{prefix}submitted_at__gte"] = submitted_after
+    submitted_before = _datetime_param(request, "submitted_before")
+    if submitted_before is not None:
+        conditions[f"{prefix}submitted_at__lt"] = submitted_before
+    return conditions
+
+
 class StudentListView(APIView):
     """
-    Studentlar ro'yxati (group_id bo'yicha filter)
-    GET /api/students/?group_id=1
+    Studentlar ro'yxati — keyset paginatsiya (id bo'yicha, 100 ta/sahifa, ?limit= max 500)
+    GET /api/students/?course_id=1&group_id=2&fields=id,telegram_id,full_name
+    GET /api/students/?topic_id=5&submitted_after=2026-05-01  (shu oraliqda vazifa topshirganlar)
+
+    Response: {"next": "...?cursor=..." | null, "previous": ..., "results": [...]}
     """
+
     def get(self, request):
-        group_id = request.query_params.get("group_id")
-        if group_id:
-            students = Student.objects.filter(group_id=group_id)
-        else:
-            students = Student.objects.all()
-        from .serializers import StudentSerializer
-        serializer = StudentSerializer(students, many=True)
-        return Response(serializer.data)
+        from django.db.models import Exists, OuterRef
+
+        from .pagination import IdCursorPagination
+
+        try:
+            fields = _sparse_fields(request, StudentSerializer)
+            course_id = _int_param(request, "course_id")
+            group_id = _int_param(request, "group_id")
+            task_conditions = _task_window(request)
+        except _BadParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # M2M / Task bo'yicha filtrlar EXISTS orqali — JOIN + DISTINCT keyset tartibini buzmaydi
+        students = Student.objects.all()
+        memberships = Student.groups.through.objects.filter(student_id=OuterRef("pk"))
+        if group_id is not None:
+            students = students.filter(Exists(memberships.filter(group_id=group_id)))
+        if course_id is not None:
+            students = students.filter(Exists(memberships.filter(group__course_id=course_id)))
+        if task_conditions:
+            students = students.filter(
+                Exists(Task.objects.filter(student_id=OuterRef("pk"), **task_conditions))
+            )
+
+        if fields is None or {"groups", "all_groups"} & set(fields):
+            students = students.prefetch_related("groups__course")
+
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(students, request, view=self)
+        return paginator.get_paginated_response(StudentSerializer(page, many=True, fields=fields).data)
 
 class StudentIsRegisteredView(APIView):
     """
@@ -151,99 +243,6 @@ class StudentUpdateNameView(APIView):
             return Response({"error": "Student topilmadi"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class StudentResultsView(APIView):
-    """
-    Student natijalarini mavzular bo'yicha olish
-    GET /api/students/{telegram_id}/results/
-    
-    Natija:
-    {
-        "full_name": "Student Nomi",
-        "total_score": 100,
-        "results": [
-            {
-                "topic_id": 1,
-                "topic_title": "Mavzu nomi",
-                "course_type": "milliy_sert",
-                "tasks": [
-                    {
-                        "task_type": "test",
-                        "grade": 45,
-                        "submitted_at": "2026-01-15T10:30:00Z"
-                    },
-                    {
-                        "task_type": "assignment",
-                        "grade": 50,
-                        "submitted_at": "2026-01-16T14:20:00Z"
-                    }
-                ],
-                "average_score": 47.5
-            }
-        ]
-    }
-    """
-
-    def get(self, request, pk):
-        telegram_id = pk
-        
-        try:
-            student = Student.objects.get(telegram_id=telegram_id)
-        except Student.DoesNotExist:
-            return Response({"error": "Student topilmadi"}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Studentning barcha vazifalarini mavzular bo'yicha guruhlash
-        tasks = Task.objects.filter(
-            student=student
-        ).select_related('topic', 'topic__course').order_by('submitted_at')
-        
-        # Mavzular bo'yicha guruhlash
-        results_by_topic = {}
-        total_score = 0
-        task_count = 0
-        
-        for task in tasks:
-            topic_id = task.topic.id
-            
-            if topic_id not in results_by_topic:
-                results_by_topic[topic_id] = {
-                    "topic_id": topic_id,
-                    "topic_title": task.topic.title,
-                    "course_type": task.topic.course.code if task.topic.course else None,
-                    "tasks": []
-                }
-            
-            # Vazifa ma'lumotlarini qo'shish
-            task_info = {
-                "task_type": task.task_type,
-                "task_type_display": "📝 Test" if task.task_type == "test" else "📋 Maxsus topshiriq",
-                "grade": task.grade if task.grade else 0,
-                "submitted_at": task.submitted_at.isoformat() if task.submitted_at else None
-            }
-            
-            results_by_topic[topic_id]["tasks"].append(task_info)
-            
-            if task.grade:
-                total_score += task.grade
-                task_count += 1
-        
-        # O'rtacha ballni hisoblash har bir mavzu uchun
-        for topic_data in results_by_topic.values():
-            if topic_data["tasks"]:
-                avg_score = sum(t["grade"] for t in topic_data["tasks"]) / len(topic_data["tasks"])
-                topic_data["average_score"] = round(avg_score, 2)
-            else:
-                topic_data["average_score"] = 0
-        
-        # Natijani qaytarish
-        return Response({
-            "full_name": student.full_name,
-            "total_score": total_score,
-            "total_tasks": task_count,
-            "average_score": round(total_score / task_count, 2) if task_count > 0 else 0,
-            "results": list(results_by_topic.values())
-        }, status=status.HTTP_200_OK)
-
-
 class GroupsListView(APIView):
     """
     Guruhlar ro‘yxatini qaytaradi
@@ -335,9 +334,21 @@ class TaskSubmitView(APIView):
     """
     Student vazifa yuboradi (telegram_id, topic_id, task_type, file_link/test_code/test_answers, grade)
     course_type avtomatik topic.course dan olinadi
+
+    Student va topic bitta so'rovda aniqlanadi; takroriy yuborish oldindan
+    tekshirilmaydi — unique (student, topic, task_type) indeksi IntegrityError bilan
+    ushlaydi. ?fields=id,grade — javobda faqat shu maydonlar (ichki student/topic
+    obyektlari kerak bo'lmasa qo'shimcha so'rovlarsiz).
     """
 
+    # Kiruvchi maydonlar (student/topic PK'lari serializerda qayta tekshirilmaydi)
+    INPUT_FIELDS = ["task_type", "file_link", "files", "test_code", "test_answers", "grade"]
+    DUPLICATE_ERROR = {"non_field_errors": ["The fields student_id, topic_id, task_type must make a unique set."]}
+
     def post(self, request):
+        from django.db import IntegrityError
+        from django.db.models import Subquery, prefetch_related_objects
+
         telegram_id = request.data.get("student_id")   # bu aslida telegram_id
         topic_id = request.data.get("topic_id")
         task_type = request.data.get("task_type", "test")
@@ -347,24 +358,34 @@ class TaskSubmitView(APIView):
         test_answers = request.data.get("test_answers")
         grade = request.data.get("grade")
 
-        # Studentni telegram_id orqali topamiz
         try:
-            student = Student.objects.get(telegram_id=telegram_id)
-        except Student.DoesNotExist:
-            logger.error(f"Student topilmadi: telegram_id={telegram_id}")
-            return Response({"error": "Student topilmadi"}, status=status.HTTP_404_NOT_FOUND)
+            fields = _sparse_fields(request, TaskSerializer)
+        except _BadParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Topic'ni topib, course_type ni aniqlaymiz
+        # Student va topic (kursi bilan) — bitta so'rov
+        student_qs = Student.objects.filter(telegram_id=telegram_id)
         try:
-            topic = Topic.objects.get(id=topic_id)
-        except Topic.DoesNotExist:
+            topic = Topic.objects.select_related("course").annotate(
+                student_pk=Subquery(student_qs.values("pk")[:1]),
+                student_full_name=Subquery(student_qs.values("full_name")[:1]),
+            ).filter(id=topic_id).first()
+        except (TypeError, ValueError):
+            topic = None
+
+        if topic is None:
+            # Xato holatida qaysi biri topilmaganini aniqlash (avvalgidek student birinchi)
+            if not Student.objects.filter(telegram_id=telegram_id).exists():
+                logger.error(f"Student topilmadi: telegram_id={telegram_id}")
+                return Response({"error": "Student topilmadi"}, status=status.HTTP_404_NOT_FOUND)
             logger.error(f"Topic topilmadi: topic_id={topic_id}")
             return Response({"error": "Topic topilmadi"}, status=status.HTTP_404_NOT_FOUND)
+        if topic.student_pk is None:
+            logger.error(f"Student topilmadi: telegram_id={telegram_id}")
+            return Response({"error": "Student topilmadi"}, status=status.HTTP_404_NOT_FOUND)
+        student = Student(pk=topic.student_pk, telegram_id=str(telegram_id), full_name=topic.student_full_name)
 
-        # Serializerga model PKlarini beramiz
         data = {
-            "student_id": student.id,   # PK kerak
-            "topic_id": topic_id,
             "task_type": task_type,
             # course_type yubormaslik - u deprecated va validatsiya muammosi keltirib chiqaradi
             # Backend topicdan kerak bo'lsa oladi
@@ -383,16 +404,18 @@ class TaskSubmitView(APIView):
         if grade is not None:
             data["grade"] = grade
         
-        logger.info(f"TaskSubmitView payload: {data}")
+        logger.info(f"TaskSubmitView payload: student={student.pk}, topic={topic.pk}, {data}")
         
-        serializer = TaskSerializer(data=data)
+        serializer = TaskSerializer(data=data, fields=self.INPUT_FIELDS)
 
         if serializer.is_valid():
+            task = None
             coin_info = None
             try:
                 with db_transaction.atomic():
-                    task = serializer.save()
+                    task = serializer.save(student=student, topic=topic)
                     logger.info(f"Task saqlandi: task_id={task.id}, student={student.full_name}, topic={topic.title}")
+                    apply_task_grade_change(task, None)
 
                     # Test uchun tanga berish (grade set bo'lsa) — Task saqlash bilan
                     # bitta tranzaksiyada, aks holda Task yozilib, tanga berish
@@ -401,6 +424,16 @@ class TaskSubmitView(APIView):
                         from django.utils import timezone as tz
                         deadline_passed = bool(topic.deadline and tz.now() > topic.deadline)
                         coin_info = award_task_coins(student, topic, task.grade, deadline_passed, 'test')
+            except IntegrityError as e:
+                if task is None:
+                    # Task INSERT'i unique indeksga urildi — avval yuborilgan
+                    logger.error(f"Takroriy yuborish: telegram_id={telegram_id}, topic_id={topic_id}, task_type={task_type}")
+                    return Response(self.DUPLICATE_ERROR, status=status.HTTP_400_BAD_REQUEST)
+                logger.error(f"Task saqlash/tanga berish xatoligi: {e}")
+                return Response(
+                    {"error": "Ichki xatolik, qayta urinib ko'ring"},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
             except Exception as e:
                 logger.error(f"Task saqlash/tanga berish xatoligi: {e}")
                 return Response(
@@ -408,7 +441,9 @@ class TaskSubmitView(APIView):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
 
-            resp_data = TaskSerializer(task).data
+            if fields is None or "student" in fields:
+                prefetch_related_objects([student], "groups__course")
+            resp_data = TaskSerializer(task, fields=fields).data
             if coin_info:
                 resp_data['coin_info'] = coin_info
             return Response(resp_data, status=status.HTTP_201_CREATED)
@@ -419,14 +454,29 @@ class TaskSubmitView(APIView):
 
 class TaskListView(APIView):
     """
-    Student vazifalari ro'yxati (hamma yoki faqat student_id bo'yicha)
-    GET /api/tasks/
-    GET /api/tasks/?student_id=123456
+    Vazifalar ro'yxati — keyset paginatsiya (id bo'yicha, 100 ta/sahifa, ?limit= max 500)
+    GET /api/tasks/?student_id=123456                    (telegram_id)
+    GET /api/tasks/?course_id=1&group_id=2&topic_id=5&task_type=test
+    GET /api/tasks/?submitted_after=2026-05-01&submitted_before=2026-06-01
+    GET /api/tasks/?fields=id,topic_pk,task_type,grade   (faqat kerakli maydonlar)
+
+    Response: {"next": "...?cursor=..." | null, "previous": ..., "results": [...]}
     """
 
     def get(self, request):
-        student_id = request.query_params.get("student_id")
+        from .pagination import IdCursorPagination
+
+        try:
+            fields = _sparse_fields(request, TaskSerializer)
+            course_id = _int_param(request, "course_id")
+            group_id = _int_param(request, "group_id")
+            task_conditions = _task_window(request)
+        except _BadParam as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        tasks = Task.objects.filter(**task_conditions)
 
+        student_id = request.query_params.get("student_id")
         if student_id:
             try:
                 student = Student.objects.get(telegram_id=student_id)
@@ -435,12 +485,26 @@ class TaskListView(APIView):
                     {"error": "Student topilmadi"},
                     status=status.HTTP_404_NOT_FOUND
                 )
-            tasks = Task.objects.filter(student=student)
-        else:
-            tasks = Task.objects.all()
-
-        serializer = TaskSerializer(tasks, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+            tasks = tasks.filter(student=student)
+        if course_id is not None:
+            tasks = tasks.filter(topic__course_id=course_id)
+        if group_id is not None:
+            tasks = tasks.filter(student__groups__id=group_id)
+        task_type = request.query_params.get("task_type")
+        if task_type:
+            tasks = tasks.filter(task_type=task_type)
+
+        # Faqat so'ralgan ichki obyektlar yuklanadi
+        if fields is None or "student" in fields:
+            tasks = tasks.select_related("student").prefetch_related("student__groups__course")
+        elif "student_telegram_id" in fields:
+            tasks = tasks.select_related("student")
+        if fields is None or "topic" in fields:
+            tasks = tasks.select_related("topic__course")
+
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(tasks, request, view=self)
+        return paginator.get_paginated_response(TaskSerializer(page, many=True, fields=fields).data)
 
 
 class TaskUpdateView(APIView):
@@ -461,8 +525,10 @@ class TaskUpdateView(APIView):
 
         try:
             with db_transaction.atomic():
+                old_grade = task.grade
                 task.grade = grade
                 task.save()
+                apply_task_grade_change(task, old_grade)
                 # Assignment uchun tanga berish (bir marta) — grade saqlash bilan
                 # bitta tranzaksiyada, aks holda "grade bor-u, tanga yo'q" holati paydo bo'ladi.
                 award_task_coins(task.student, task.topic, task.grade, False, 'assignment')
@@ -499,6 +565,27 @@ class RotatedText(Flowable):
         return self.width, self.height
 
 
+def load_grade_matrix(student_ids, topics):
+    """
+    Studentlar × mavzular baholar matritsasini BITTA so'rov bilan yuklaydi.
+    Har bir mavzu uchun faqat o'z turidagi task hisobga olinadi
+    (correct_answers bor — 'test', yo'q — 'assignment').
+    Returns: {(student_id, topic_id): grade} — topshirilmagan/baholanmagan kataklar yo'q.
+    """
+    expected_type = {t.id: ('test' if t.correct_answers else 'assignment') for t in topics}
+    if not student_ids or not expected_type:
+        return {}
+
+    matrix = {}
+    rows = Task.objects.filter(
+        student_id__in=student_ids, topic_id__in=list(expected_type),
+    ).values_list('student_id', 'topic_id', 'task_type', 'grade')
+    for student_id, topic_id, task_type, grade in rows:
+        if grade is not None and expected_type[topic_id] == task_type:
+            matrix[(student_id, topic_id)] = grade
+    return matrix
+
+
 class WeeklyReportPDFView(APIView):
     def get(self, request, group_id):
         try:
@@ -524,19 +611,19 @@ class WeeklyReportPDFView(APIView):
         if group_course:
             if month_mode:
                 # Faqat shu oyda faollashtirilgan (activated_at) mavzular
-                all_topics = Topic.objects.filter(
+                month_start, month_end = _month_bounds(report_year, report_month)
+                all_topics = list(Topic.objects.filter(
                     is_active=True, course=group.course, course__is_active=True,
-                    activated_at__year=report_year, activated_at__month=report_month,
-                ).order_by('id')
-                topics = list(all_topics)
+                    activated_at__gte=month_start, activated_at__lt=month_end,
+                ).order_by('id'))
+                topics = all_topics
             else:
                 # Barcha active topiclarni olamiz (id bo'yicha tartibda), oxirgi 10 tasi ko'rsatiladi
-                all_topics = Topic.objects.filter(is_active=True, course=group.course, course__is_active=True).order_by('id')
-                topics_list = list(all_topics)
-                topics = topics_list[-10:] if len(topics_list) >= 10 else topics_list
+                all_topics = list(Topic.objects.filter(is_active=True, course=group.course, course__is_active=True).order_by('id'))
+                topics = all_topics[-10:]
         else:
             topics = []
-            all_topics = Topic.objects.none()
+            all_topics = []
 
         # Agar active mavzu yo'q bo'lsa, PDF yaratmaymiz
         if not topics:
@@ -617,51 +704,30 @@ class WeeklyReportPDFView(APIView):
         header.append(RotatedText("Umumiy o'rtacha", font_name_bold, 6))
         data = [header]
 
+        # Butun matritsa (student × mavzu) bitta so'rov bilan olinadi —
+        # ko'rinadigan ustunlar ham, umumiy o'rtacha ham shundan hisoblanadi
+        students = list(students)
+        student_ids = [s.id for s in students]
+        total_topics_count = len(all_topics)
+        grade_matrix = load_grade_matrix(student_ids, all_topics)
+        grade_sums = {
+            sid: sum(grade_matrix.get((sid, t.id), 0) for t in all_topics)
+            for sid in student_ids
+        }
+
         # Studentlar uchun qatordan-qatordan to'ldirish
         student_rows = []
         for student in students:
             # Ismni Paragraph sifatida qo'shamiz - avtomatik word wrap
             row = [Paragraph(student.full_name, name_style)]
-            grades_10 = []  # Oxirgi 10 ta topic uchun
-            
-            for topic in topics:
-                task_type = 'test' if topic.correct_answers else 'assignment'
-
-                # Faqat shu kurs uchun taskni olamiz
-                task = Task.objects.filter(
-                    student=student,
-                    topic=topic,
-                    task_type=task_type,
-                    topic__course=group.course
-                ).first()
-
-                if task and task.grade is not None:
-                    grade = task.grade
-                else:
-                    grade = 0
 
+            for topic in topics:
+                grade = grade_matrix.get((student.id, topic.id), 0)
                 row.append(str(grade) if grade > 0 else "—")
-                grades_10.append(grade)
-            
-            # Umumiy o'rtacha bahoni hisoblash (barcha active topiclar bo'yicha)
-            # Bajarmagan mavzular ham 0 ball sifatida hisobga olinadi
-            total_topics_count = all_topics.count()
-            all_grades_sum = 0
-            for topic in all_topics:
-                task_type = 'test' if topic.correct_answers else 'assignment'
-                task = Task.objects.filter(
-                    student=student,
-                    topic=topic,
-                    task_type=task_type,
-                    topic__course=group.course
-                ).first()
-                
-                if task and task.grade is not None:
-                    all_grades_sum += task.grade
-            
+
             # Umumiy o'rtacha (barcha active topiclar soniga bo'linadi, bajarmagan = 0)
             if total_topics_count > 0:
-                overall_avg = all_grades_sum / total_topics_count
+                overall_avg = grade_sums.get(student.id, 0) / total_topics_count
                 row.append(f"{overall_avg:.1f}")
                 student_rows.append((row, overall_avg))
             else:
@@ -897,96 +963,216 @@ class TopicCreateView(APIView):
 
 class StudentResultsView(APIView):
     """
-    Studentning barcha mavzulardagi natijalarini qaytaradi
+    Studentning faol kurslaridagi natijalari — kurslar bo'yicha guruhlangan
     GET /api/student/<telegram_id>/results/
-    
+
+    Baholar bitta so'rovda (Topic + Task subquery annotatsiyasi) olinadi. Mavzuda
+    ham test, ham maxsus topshiriq bo'lsa — kurs task_type'idagi baho olinadi.
+
     Javob formati:
     {
         "telegram_id": "123456",
         "full_name": "Ali Valiyev",
-        "results": [
-            {
-                "topic_id": 1,
-                "topic_title": "1-mavzu",
-                "grade": 35
-            },
+        "results": [                       # barcha mavzular (id bo'yicha), eski format
+            {"topic_id": 1, "topic_title": "1-mavzu", "grade": 35},
+            {"topic_id": 5, "topic_title": "5-mavzu", "grade": 0}
+        ],
+        "courses": [
             {
-                "topic_id": 2,
-                "topic_title": "2-mavzu", 
-                "grade": 34
-            },
-            {
-                "topic_id": 5,
-                "topic_title": "5-mavzu",
-                "grade": 0
+                "course_id": 1,
+                "course_name": "Milliy sertifikat",
+                "topic_count": 2,
+                "submitted_count": 1,
+                "average_grade": 35.0,     # topshirilgan mavzular bo'yicha
+                "total_coins": 12,
+                "current_streak": 1,
+                "longest_streak": 3,
+                "topics": [
+                    {"topic_id": 1, "topic_title": "1-mavzu", "grade": 35, "submitted": true},
+                    {"topic_id": 5, "topic_title": "5-mavzu", "grade": 0, "submitted": false}
+                ]
             }
         ]
     }
     """
-    
+
     def get(self, request, telegram_id):
+        from django.db.models import Exists, F, FilteredRelation, OuterRef, Q, Subquery
+        from django.db.models.functions import Coalesce
+        from .models import Course
+
+        memberships = Student.groups.through.objects.filter(student_id=OuterRef("pk"))
         try:
-            student = Student.objects.get(telegram_id=telegram_id)
+            student = Student.objects.annotate(has_groups=Exists(memberships)).only(
+                "id", "telegram_id", "full_name"
+            ).get(telegram_id=telegram_id)
         except Student.DoesNotExist:
             return Response(
                 {"error": "Student not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        # Studentning guruhlarini olish
-        student_groups = student.groups.all()
-        if not student_groups.exists():
+
+        if not student.has_groups:
             return Response(
                 {"error": "Student has no groups"},
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        # Studentning faqat faol kurslarini olish
-        student_courses = []
-        for group in student_groups:
-            if group.course and group.course.is_active:
-                student_courses.append(group.course)
-
-        # Agar faol kurs bo'lmasa, bo'sh javob qaytaramiz
-        if not student_courses:
-            response_data = {
-                "telegram_id": student.telegram_id,
-                "full_name": student.full_name,
-                "results": []
-            }
-            return Response(response_data, status=status.HTTP_200_OK)
 
-        # Faqat student tegishli faol kurslar bo'yicha mavzularni olish
-        all_topics = Topic.objects.filter(
+        # Faol kurslar + shu studentning hamyoni (LEFT JOIN) — bitta so'rov
+        courses = list(
+            Course.objects.filter(
+                is_active=True,
+                id__in=Group.objects.filter(enrolled_students=student).values("course_id"),
+            ).annotate(
+                wallet=FilteredRelation("coin_wallets", condition=Q(coin_wallets__student=student)),
+            ).values(
+                "id", "name",
+                "wallet__total_coins", "wallet__current_streak", "wallet__longest_streak",
+            ).order_by("id")
+        )
+
+        # Mavzu + studentning shu mavzudagi bahosi — bitta so'rov
+        own_tasks = Task.objects.filter(student=student, topic=OuterRef("pk"))
+        topics = Topic.objects.filter(
             is_active=True,
-            course__in=student_courses
-        ).order_by('id')
-        
+            course_id__in=[course["id"] for course in courses],
+        ).annotate(
+            grade_value=Coalesce(
+                Subquery(own_tasks.filter(task_type=OuterRef("course__task_type")).values("grade")[:1]),
+                # Eng yuqori baho; bahosiz task'lar olinmaydi (PostgreSQL DESC da NULL birinchi turadi)
+                Subquery(
+                    own_tasks.filter(grade__isnull=False)
+                    .order_by(F("grade").desc(nulls_last=True)).values("grade")[:1]
+                ),
+            ),
+            submitted=Exists(own_tasks),
+        ).values("id", "title", "course_id", "grade_value", "submitted").order_by("id")
+
+        by_course = {
+            course["id"]: {
+                "course_id": course["id"],
+                "course_name": course["name"],
+                "topic_count": 0,
+                "submitted_count": 0,
+                "average_grade": 0,
+                "total_coins": course["wallet__total_coins"] or 0,
+                "current_streak": course["wallet__current_streak"] or 0,
+                "longest_streak": course["wallet__longest_streak"] or 0,
+                "topics": [],
+            }
+            for course in courses
+        }
+        grade_sums = dict.fromkeys(by_course, 0)
+
         results = []
-        for topic in all_topics:
-            # Ushbu mavzudan studentning vazifasini qidirish
-            try:
-                task = Task.objects.get(student=student, topic=topic)
-                grade = task.grade if task.grade is not None else 0
-            except Task.DoesNotExist:
-                # Agar student bu mavzuda topshirmagan bo'lsa
-                grade = 0
-            
+        for topic in topics:
+            grade = topic["grade_value"] or 0
             results.append({
-                "topic_id": topic.id,
-                "topic_title": topic.title,
+                "topic_id": topic["id"],
+                "topic_title": topic["title"],
                 "grade": grade
             })
-        
+            course_data = by_course[topic["course_id"]]
+            course_data["topics"].append({
+                "topic_id": topic["id"],
+                "topic_title": topic["title"],
+                "grade": grade,
+                "submitted": topic["submitted"],
+            })
+            course_data["topic_count"] += 1
+            if topic["submitted"]:
+                course_data["submitted_count"] += 1
+                grade_sums[topic["course_id"]] += grade
+
+        for course_id, course_data in by_course.items():
+            if course_data["submitted_count"]:
+                course_data["average_grade"] = round(grade_sums[course_id] / course_data["submitted_count"], 2)
+
         response_data = {
             "telegram_id": student.telegram_id,
             "full_name": student.full_name,
-            "results": results
+            "results": results,
+            "courses": list(by_course.values()),
         }
-        
+
         return Response(response_data, status=status.HTTP_200_OK)
 
 
+class StudentPendingTopicsView(APIView):
+    """
+    Student hali topshirmagan faol mavzular (bot mavzu tanlash menyusi uchun)
+    GET /api/students/<telegram_id>/pending-topics/?task_type=test|assignment
+
+    task_type berilmasa — hech qanday vazifa yuborilmagan mavzular. Ro'yxat bitta
+    anti-join (NOT EXISTS) so'rovida hisoblanadi. Javobda ETag bor: klient
+    If-None-Match yuborsa va ro'yxat o'zgarmagan bo'lsa — 304, tanasiz.
+
+    Javob formati:
+    {
+        "task_type": "test",
+        "courses": [{"id": 1, "code": "milliy_sert", "name": "Milliy sertifikat"}],
+        "topics": [{"id": 7, "title": "7-mavzu", "deadline": "2026-01-20T18:00:00+05:00", "course_id": 1}]
+    }
+    """
+
+    TASK_TYPES = ("test", "assignment")
+
+    def get(self, request, telegram_id):
+        import hashlib
+        import json
+        from django.db.models import Exists, OuterRef
+        from django.utils import timezone
+        from django.utils.http import parse_etags, quote_etag
+
+        task_type = request.query_params.get("task_type") or None
+        if task_type is not None and task_type not in self.TASK_TYPES:
+            return Response(
+                {"error": f"task_type: {' yoki '.join(self.TASK_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        submitted = Task.objects.filter(student__telegram_id=telegram_id, topic=OuterRef("pk"))
+        if task_type is not None:
+            submitted = submitted.filter(task_type=task_type)
+        rows = list(
+            Topic.objects.filter(
+                is_active=True,
+                course__is_active=True,
+                course_id__in=Group.objects.filter(enrolled_students__telegram_id=telegram_id).values("course_id"),
+            ).filter(~Exists(submitted)).values(
+                "id", "title", "deadline", "course_id", "course__code", "course__name",
+            ).order_by("id")
+        )
+        # Bo'sh ro'yxat — student umuman yo'qligini ajratish uchun qo'shimcha so'rov faqat shu holatda
+        if not rows and not Student.objects.filter(telegram_id=telegram_id).exists():
+            return Response({"error": "Student topilmadi"}, status=status.HTTP_404_NOT_FOUND)
+
+        courses = {}
+        topics = []
+        for row in rows:
+            courses.setdefault(row["course_id"], {
+                "id": row["course_id"],
+                "code": row["course__code"],
+                "name": row["course__name"],
+            })
+            topics.append({
+                "id": row["id"],
+                "title": row["title"],
+                "deadline": timezone.localtime(row["deadline"]).isoformat() if row["deadline"] else None,
+                "course_id": row["course_id"],
+            })
+        data = {"task_type": task_type, "courses": list(courses.values()), "topics": topics}
+
+        etag = quote_etag(hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest())
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data, status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        return response
+
+
 class CoursesListView(APIView):
     """Barcha kurslar ro'yxati. ?all=1 — nofaol kurslar ham (admin uchun)"""
     def get(self, request):
@@ -1059,37 +1245,37 @@ class TestStatsView(APIView):
 
     def get(self, request):
         from django.core.paginator import Paginator
-        from django.db.models import Count
+        from django.db.models import Count, OuterRef, Subquery
 
         try:
             page_num = max(1, int(request.query_params.get("page", 1)))
         except (ValueError, TypeError):
             page_num = 1
 
-        # Har bir test_code uchun distinct studentlar soni
+        # Har bir test_code uchun distinct studentlar soni + mavzu nomi (TestKey unique
+        # indeksi orqali) — sahifa bitta so'rovda
+        topic_title = TestKey.objects.filter(test_code=OuterRef('test_code')).values('topic__title')[:1]
         test_stats = (
             Task.objects
             .filter(task_type='test')
             .exclude(test_code__isnull=True)
             .exclude(test_code='')
             .values('test_code')
-            .annotate(count=Count('student', distinct=True))
+            .annotate(count=Count('student', distinct=True), name=Subquery(topic_title))
             .order_by('test_code')
         )
 
         paginator = Paginator(test_stats, self.PAGE_SIZE)
         page = paginator.get_page(page_num)
 
-        results = []
-        for item in page.object_list:
-            tc = item['test_code']
-            topic = Topic.objects.filter(correct_answers__has_key=tc).first()
-            name = topic.title if topic else tc
-            results.append({
-                "code": tc,
-                "name": name,
+        results = [
+            {
+                "code": item['test_code'],
+                "name": item['name'] or item['test_code'],
                 "count": item['count'],
-            })
+            }
+            for item in page.object_list
+        ]
 
         return Response({
             "results": results,
@@ -1116,72 +1302,37 @@ class TestResultsJSONView(APIView):
     }
     """
 
-    def _parse_correct(self, correct_str):
-        """Admin to'g'ri javoblar satrini listga aylantirish"""
-        import re
-        correct = correct_str.lower().strip()
-        result = []
-        has_numbers = bool(re.search(r'\d', correct))
-        if has_numbers:
-            for match in re.finditer(r'\d+([a-zx]+)', correct):
-                letters = match.group(1)
-                result.append(['x'] if letters == 'x' else list(letters))
-        elif re.match(r'^[a-zx]+$', correct):
-            result = [[ch] for ch in correct]
-        else:
-            filtered = ''.join(ch for ch in correct if ch.isalpha() or ch == 'x')
-            result = [[ch] for ch in filtered]
-        return result
-
-    def _parse_student(self, answer_str):
-        """Student javoblar satrini listga aylantirish"""
-        import re
-        user = answer_str.lower().strip()
-        has_numbers = bool(re.search(r'\d', user))
-        if has_numbers:
-            return [m.group(1) for m in re.finditer(r'\d+([a-zx])', user)]
-        filtered = ''.join(ch for ch in user if ch.isalpha() or ch == 'x')
-        return list(filtered)
-
     def get(self, request, test_code):
-        # Bu test_code ga ega topic ni topish
-        topic = Topic.objects.filter(correct_answers__has_key=test_code).first()
-        if not topic:
+        # Bu test_code ga ega topic ni topish (TestKey unique indeksi)
+        test_key = resolve_test_code(test_code)
+        if not test_key:
             return Response({"error": "Test topilmadi"}, status=status.HTTP_404_NOT_FOUND)
 
-        correct_str = topic.correct_answers.get(test_code, "")
-        correct_list = self._parse_correct(correct_str) if correct_str else []
-        total_questions = len(correct_list)
+        topic = test_key.topic
+        answer_key = get_answer_key(test_key.answer_key)
+        total_questions = answer_key.n_questions
 
-        tasks = (
+        tasks = list(
             Task.objects
             .filter(test_code=test_code, task_type='test')
             .select_related('student')
         )
+        # Barcha javoblar bitta o'tishda: (fan, ped) to'g'ri javoblar soni yoki None
+        block_counts = block_counts_many(answer_key, [task.test_answers for task in tasks])
 
         results = []
-        for task in tasks:
+        for task, counts in zip(tasks, block_counts):
             name_parts = (task.student.full_name or "").strip().split()
             first_name = name_parts[0] if name_parts else "-"
             last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else "-"
 
-            fan_ball = 0
-            ped_ball = 0
-
-            if task.test_answers and correct_list:
-                student_list = self._parse_student(task.test_answers)
-                if len(student_list) == len(correct_list):
-                    for i, (s_ans, c_ans) in enumerate(zip(student_list, correct_list)):
-                        if s_ans in c_ans:
-                            if i < 35:      # 1-35 → Fan bloki
-                                fan_ball += 2
-                            else:           # 36-50 → Ped bloki
-                                ped_ball += 2
-                else:
-                    # Javoblar soni mos kelmasa — grade dan foydalanamiz
-                    fan_ball = (task.grade or 0) * 2
+            if task.test_answers and total_questions and counts is not None:
+                fan_ball = counts[0] * POINTS_PER_QUESTION   # 1-35 → Fan bloki
+                ped_ball = counts[1] * POINTS_PER_QUESTION   # 36-50 → Ped bloki
             else:
+                # Javoblar soni mos kelmasa — grade dan foydalanamiz
                 fan_ball = (task.grade or 0) * 2
+                ped_ball = 0
 
             results.append({
                 "first_name": first_name,
@@ -1216,14 +1367,13 @@ class LeaderboardView(APIView):
         "my_rank": 15,          # null if >600 or not found
         "my_coins": 123,
         "my_streak": 2,
-        "my_longest_streak": 5
+        "my_longest_streak": 5,
+        "snapshot_age": 12.3    # reyting snapshoti necha sekund oldin qurilgan
     }
     """
 
     def get(self, request):
-        from django.db.models import Sum, Q
-        from django.db.models.functions import Coalesce
-        from .coins import _month_bounds, is_monthly_streak_enabled, _compute_reset_month_coins, compute_month_leaderboard
+        from .leaderboard import RANK_LIMIT, get_leaderboard
 
         course_id = request.query_params.get('course_id')
         telegram_id = request.query_params.get('telegram_id')
@@ -1232,73 +1382,15 @@ class LeaderboardView(APIView):
 
         if not course_id:
             return Response({"error": "course_id kerak"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            course_id = int(course_id)
+            year, month = (int(year), int(month)) if year and month else (None, None)
+        except ValueError:
+            return Response({"error": "course_id, year, month butun son bo'lishi kerak"},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        period = None
-        monthly_reset = False
-        if year and month:
-            year, month = int(year), int(month)
-            start, end = _month_bounds(year, month)
-            period = (start, end)
-            monthly_reset = is_monthly_streak_enabled(year, month)
-
-        if period and monthly_reset:
-            # Oylik streak rejimi yoqilgan — bulk (N+1 siz) qayta hisoblanadi
-            computed = compute_month_leaderboard(course_id, year, month)
-
-            ranked = []
-            for rank, (w, p_coins, p_streak, p_longest) in enumerate(computed, start=1):
-                if rank <= 600:
-                    ranked.append({
-                        "rank": rank,
-                        "telegram_id": w.student.telegram_id,
-                        "full_name": w.student.full_name,
-                        "total_coins": p_coins,
-                        "current_streak": p_streak,
-                        "longest_streak": p_longest,
-                    })
-        elif period:
-            start, end = period
-            wallets = (
-                CoinWallet.objects
-                .filter(course_id=course_id)
-                .select_related('student', 'course')
-                .annotate(period_coins=Coalesce(Sum(
-                    'transactions__total_coins',
-                    filter=Q(transactions__topic__activated_at__gte=start, transactions__topic__activated_at__lt=end)
-                ), 0))
-                .order_by('-period_coins', '-longest_streak')
-            )
-            ranked = []
-            for rank, w in enumerate(wallets, start=1):
-                if rank <= 600:
-                    ranked.append({
-                        "rank": rank,
-                        "telegram_id": w.student.telegram_id,
-                        "full_name": w.student.full_name,
-                        "total_coins": w.period_coins,
-                        "current_streak": w.current_streak,
-                        "longest_streak": w.longest_streak,
-                    })
-        else:
-            wallets = (
-                CoinWallet.objects
-                .filter(course_id=course_id)
-                .select_related('student', 'course')
-                .order_by('-total_coins', '-longest_streak')
-            )
-            ranked = []
-            for rank, w in enumerate(wallets, start=1):
-                if rank <= 600:
-                    ranked.append({
-                        "rank": rank,
-                        "telegram_id": w.student.telegram_id,
-                        "full_name": w.student.full_name,
-                        "total_coins": w.total_coins,
-                        "current_streak": w.current_streak,
-                        "longest_streak": w.longest_streak,
-                    })
-
-        top10 = ranked[:10]
+        # Tayyor snapshot (tanga o'zgarganda yoki TTL tugaganda qayta quriladi)
+        snapshot = get_leaderboard(course_id, year, month)
 
         my_rank = None
         my_coins = 0
@@ -1306,42 +1398,21 @@ class LeaderboardView(APIView):
         my_longest = 0
 
         if telegram_id:
-            for entry in ranked:
-                if entry["telegram_id"] == telegram_id:
-                    my_rank = entry["rank"]
-                    my_coins = entry["total_coins"]
-                    my_streak = entry["current_streak"]
-                    my_longest = entry["longest_streak"]
-                    break
-            # Agar >600 bo'lsa, tangalarini topib qaytaramiz
-            if my_rank is None:
-                try:
-                    student = Student.objects.get(telegram_id=telegram_id)
-                    w = CoinWallet.objects.filter(student=student, course_id=course_id).first()
-                    if w:
-                        if period and monthly_reset:
-                            start, end = period
-                            my_coins, my_streak, my_longest = _compute_reset_month_coins(w, start, end)
-                        elif period:
-                            start, end = period
-                            my_coins = CoinTransaction.objects.filter(
-                                wallet=w, topic__activated_at__gte=start, topic__activated_at__lt=end
-                            ).aggregate(s=Sum('total_coins'))['s'] or 0
-                            my_streak = w.current_streak
-                            my_longest = w.longest_streak
-                        else:
-                            my_coins = w.total_coins
-                            my_streak = w.current_streak
-                            my_longest = w.longest_streak
-                except Student.DoesNotExist:
-                    pass
+            entry = snapshot.find(telegram_id)
+            if entry:
+                # >600 bo'lsa o'rin ko'rsatilmaydi, lekin tangalar qaytariladi
+                my_rank = entry["rank"] if entry["rank"] <= RANK_LIMIT else None
+                my_coins = entry["total_coins"]
+                my_streak = entry["current_streak"]
+                my_longest = entry["longest_streak"]
 
         return Response({
-            "top10": top10,
+            "top10": snapshot.top(10),
             "my_rank": my_rank,
             "my_coins": my_coins,
             "my_streak": my_streak,
             "my_longest_streak": my_longest,
+            "snapshot_age": round(snapshot.age, 1),
         })
 
 
@@ -1398,6 +1469,72 @@ class StudentWalletView(APIView):
         return Response(response)
 
 
+class StudentCoinRanksView(APIView):
+    """
+    Student barcha kurslar bo'yicha hamyonlari + har kursdagi reyting o'rni — bitta so'rovda
+    ("🪙 Tangalarim" uchun; har kurs uchun alohida /coins/leaderboard/ chaqirmaslik uchun)
+    GET /api/coins/my-ranks/?telegram_id=xxx
+    GET /api/coins/my-ranks/?telegram_id=xxx&year=2026&month=6  (shu oy bo'yicha tanga va o'rin)
+
+    Response: StudentWalletView javobi + har hamyonda "rank" (600 dan keyin — null)
+    """
+
+    def get(self, request):
+        from .coins import is_monthly_streak_enabled
+        from .leaderboard import RANK_LIMIT, all_time_ranks, get_leaderboard
+
+        telegram_id = request.query_params.get('telegram_id')
+        if not telegram_id:
+            return Response({"error": "telegram_id kerak"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            student = Student.objects.get(telegram_id=telegram_id)
+        except Student.DoesNotExist:
+            return Response({"error": "Student topilmadi"}, status=status.HTTP_404_NOT_FOUND)
+
+        year = request.query_params.get('year')
+        month = request.query_params.get('month')
+        try:
+            year, month = (int(year), int(month)) if year and month else (None, None)
+        except ValueError:
+            return Response({"error": "year, month butun son bo'lishi kerak"}, status=status.HTTP_400_BAD_REQUEST)
+
+        wallets = list(CoinWallet.objects.filter(student=student).select_related('course'))
+        # Barcha vaqt: COUNT(...) bilan bitta so'rov; oy bo'yicha: reyting snapshotidagi o'rin indeksi
+        ranks = all_time_ranks(wallets) if not year else {}
+
+        result = []
+        period_total = 0
+        for w in wallets:
+            entry = {
+                "course_id": w.course.id,
+                "course_name": w.course.name,
+                "total_coins": w.total_coins,
+                "current_streak": w.current_streak,
+                "longest_streak": w.longest_streak,
+            }
+            if year:
+                row = get_leaderboard(w.course_id, year, month).find(student.telegram_id)
+                rank = row["rank"] if row else None
+                entry["period_coins"] = row["total_coins"] if row else 0
+                entry["period_streak"] = row["current_streak"] if row else 0
+                entry["period_longest_streak"] = row["longest_streak"] if row else 0
+                period_total += entry["period_coins"]
+            else:
+                rank = ranks.get(w.course_id)
+            entry["rank"] = rank if rank is not None and rank <= RANK_LIMIT else None
+            result.append(entry)
+
+        response = {
+            "full_name": student.full_name,
+            "wallets": result,
+        }
+        if year:
+            response["period_total"] = period_total
+            response["monthly_reset_enabled"] = is_monthly_streak_enabled(year, month)
+        return Response(response)
+
+
 class AdminLeaderboardView(APIView):
     """
     Admin uchun filtrlangan reyting
@@ -1407,7 +1544,6 @@ class AdminLeaderboardView(APIView):
     def get(self, request):
         from django.db.models import Sum, Max
         from django.utils.dateparse import parse_date
-        import pytz
 
         course_id = request.query_params.get('course_id')
         sort_by = request.query_params.get('sort', 'coins')  # coins | streak
@@ -1417,24 +1553,17 @@ class AdminLeaderboardView(APIView):
         if not course_id:
             return Response({"error": "course_id kerak"}, status=status.HTTP_400_BAD_REQUEST)
 
-        local_tz = pytz.timezone('Asia/Tashkent')
-
-        # Sana filtri (mavzu qachon faollashtirilgani bo'yicha)
-        tx_filter = {'wallet__course_id': course_id}
+        # Sana filtri (mavzu qachon faollashtirilgani bo'yicha) — rollup kuni shu sananing
+        # Toshkent vaqtidagi kuni, shuning uchun oraliq (course, day) indeksida o'qiladi
+        rollup_filter = {'course_id': course_id}
         if from_date_str:
             fd = parse_date(from_date_str)
             if fd:
-                from datetime import datetime
-                tx_filter['topic__activated_at__gte'] = local_tz.localize(
-                    datetime.combine(fd, datetime.min.time())
-                )
+                rollup_filter['day__gte'] = fd
         if to_date_str:
             td = parse_date(to_date_str)
             if td:
-                from datetime import datetime
-                tx_filter['topic__activated_at__lte'] = local_tz.localize(
-                    datetime.combine(td, datetime.max.time())
-                )
+                rollup_filter['day__lte'] = td
 
         # Sana oralig'idagi yig'ilgan tanga yoki streak bo'yicha saralash
         if sort_by == 'streak':
@@ -1459,10 +1588,10 @@ class AdminLeaderboardView(APIView):
             # Tanlangan davr ichida eng ko'p tanga
             from django.db.models import Sum
             tx_agg = (
-                CoinTransaction.objects
-                .filter(**tx_filter)
+                CoinDailyRollup.objects
+                .filter(**rollup_filter)
                 .values('wallet__student__telegram_id', 'wallet__student__full_name', 'wallet__id')
-                .annotate(period_coins=Sum('total_coins'), max_streak=Max('streak_after'))
+                .annotate(period_coins=Sum('coins'), streak_max=Max('max_streak'))
                 .order_by('-period_coins')
             )
             results = []
@@ -1472,7 +1601,7 @@ class AdminLeaderboardView(APIView):
                     "telegram_id": row['wallet__student__telegram_id'],
                     "full_name": row['wallet__student__full_name'],
                     "period_coins": row['period_coins'],
-                    "max_streak_in_period": row['max_streak'],
+                    "max_streak_in_period": row['streak_max'],
                 })
 
         return Response({"results": results, "sort_by": sort_by})
@@ -1556,10 +1685,9 @@ class AttendanceCSVView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        import csv
-        from django.utils import timezone
         from datetime import datetime
-        import io
+
+        from .csv_export import csv_response, keyset_chunks
 
         from_str = request.query_params.get("from")
         to_str = request.query_params.get("to")
@@ -1578,40 +1706,37 @@ class AttendanceCSVView(APIView):
                 created_at__lte=to_dt,
             ).order_by("created_at")
         )
+        session_ids = [s.id for s in sessions]
 
-        # Barcha davomatlarni bir so'rovda olish
-        attendances = Attendance.objects.filter(
-            session__in=sessions
-        ).select_related("student").values("student_id", "session_id")
-
-        # (student_id, session_id) set
-        marked_set = {(a["student_id"], a["session_id"]) for a in attendances}
-
-        # Guruhi bor barcha studentlar (kelgan-kelmaganidan qatʼi nazar)
-        students = list(Student.objects.filter(groups__isnull=False).distinct().order_by("full_name"))
+        # Guruhi bor barcha studentlar (kelgan-kelmaganidan qatʼi nazar) — chunk'lab
+        students = (
+            Student.objects.filter(groups__isnull=False).distinct()
+            .only("id", "full_name", "phone")
+        )
 
-        output = io.StringIO()
-        # UTF-8 BOM — Excel uchun
-        output.write("﻿")
-        writer = csv.writer(output)
+        def rows():
+            for chunk in keyset_chunks(students, ("full_name", "id")):
+                # Faqat shu chunk studentlarining davomatlari: (student_id, session_id)
+                marked_set = set(
+                    Attendance.objects.filter(
+                        session_id__in=session_ids, student_id__in=[st.id for st in chunk]
+                    ).values_list("student_id", "session_id")
+                )
+                for student in chunk:
+                    row = [student.full_name, student.phone or "—"]
+                    count = 0
+                    for s in sessions:
+                        if (student.id, s.id) in marked_set:
+                            row.append("✅")
+                            count += 1
+                        else:
+                            row.append("❌")
+                    row.append(f"{count}/{len(sessions)}")
+                    yield row
 
-        # Sarlavha
         session_labels = [s.created_at.astimezone(tz).strftime("%d.%m") for s in sessions]
-        writer.writerow(["Ism Familya", "Telefon"] + session_labels + ["Jami"])
-
-        for student in students:
-            row = [student.full_name, student.phone or "—"]
-            count = 0
-            for s in sessions:
-                if (student.id, s.id) in marked_set:
-                    row.append("✅")
-                    count += 1
-                else:
-                    row.append("❌")
-            row.append(f"{count}/{len(sessions)}")
-            writer.writerow(row)
-
-        csv_bytes = output.getvalue().encode("utf-8")
-        response = HttpResponse(csv_bytes, content_type="text/csv; charset=utf-8")
-        response["Content-Disposition"] = f'attachment; filename="davomat_{from_str}_{to_str}.csv"'
-        return response
+        return csv_response(
+            f"davomat_{from_str}_{to_str}.csv",
+            ["Ism Familya", "Telefon"] + session_labels + ["Jami"],
+            rows(),
+        )
@@ -96,7 +96,13 @@ DATABASES = {
         "PASSWORD": env.str("DB_PASSWORD", default="vazifa_bot_2025"),
         "HOST": env.str("DB_HOST", default="localhost"),  # PgBouncer orqali
         "PORT": env.str("DB_PORT", default="6432"),  # PgBouncer port (PostgreSQL 5432 emas)
-        "CONN_MAX_AGE": 0,  # Har bir request uchun yangi connection (bot uchun xavfsiz)
+        # Persistent ulanish: har request'da PgBouncer'ga yangi ulanish + handshake o'rniga
+        # shu thread'dagi ulanish CONN_MAX_AGE soniya qayta ishlatiladi (0 — eski xatti-harakat).
+        # PgBouncer transaction pooling bilan xavfsiz: server ulanishlarini baribir PgBouncer taqsimlaydi.
+        "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", default=60),
+        # Qayta ishlatishdan oldin ulanish tirikligi tekshiriladi (PgBouncer/Postgres restart,
+        # idle timeout) — uzilgan ulanish request boshida jimgina yangilanadi
+        "CONN_HEALTH_CHECKS": True,
         "DISABLE_SERVER_SIDE_CURSORS": True,  # PgBouncer transaction pooling bilan named cursor ishlamaydi (InvalidCursorName oldini oladi)
         "OPTIONS": {
             "connect_timeout": 10,  # Connection timeout: 10 soniya
@@ -1,11 +1,13 @@
 from aiogram import executor
 
+from data import config
 from loader import dp, bot
 import middlewares, filters, handlers
 from utils.notify_admins import on_startup_notify
 from utils.set_bot_commands import set_default_commands
 from utils.scheduler_instance import scheduler, apply_job, DEFAULT_SCHEDULE
-from asgiref.sync import sync_to_async
+from utils.api_client import api
+from utils.db_api import repository as repo
 import logging
 
 import os
@@ -30,18 +32,11 @@ logger = logging.getLogger(__name__)
 
 
 async def on_startup(dispatcher):
+    await api.start()
     await set_default_commands(dispatcher)
     await on_startup_notify(dispatcher)
 
-    # Webhookni o'chirish (polling rejimi uchun)
-    await bot.delete_webhook(drop_pending_updates=True)
-    logger.info("🤖 Polling rejimi ishga tushdi")
-
-    from base_app.models import ScheduleConfig
-    from django.db import close_old_connections
-    close_old_connections()
-    configs = await sync_to_async(list)(ScheduleConfig.objects.all())
-    config_map = {c.job_key: c for c in configs}
+    config_map = await repo.schedule_configs()
 
     for job_key, defaults in DEFAULT_SCHEDULE.items():
         cfg = config_map.get(job_key)
@@ -59,16 +54,71 @@ async def on_startup(dispatcher):
     scheduler.start()
     logger.info("🚀 Scheduler ishga tushdi")
 
+    # Uzilib qolgan broadcastlarni davom ettirish
+    from utils.broadcast import resume_pending_broadcasts
+    resumed = await resume_pending_broadcasts()
+    if resumed:
+        logger.info(f"♻️ {resumed} ta tugallanmagan broadcast davom ettirildi")
+
+
+async def on_startup_polling(dispatcher):
+    # Webhookni o'chirish (polling rejimi uchun)
+    await bot.delete_webhook(drop_pending_updates=True)
+    logger.info("🤖 Polling rejimi ishga tushdi")
+    await on_startup(dispatcher)
+
 
 async def on_shutdown(dispatcher):
     logger.warning("🔴 Bot o'chirilmoqda...")
+    await api.close()
+
+
+def start_webhook():
+    """Webhook rejimi: aiohttp server + update navbati (utils/update_queue.py)."""
+    from aiohttp import web
+    from utils.update_queue import UpdateWorkerPool, build_webhook_app
+
+    if not config.WEBHOOK_SECRET:
+        raise RuntimeError(
+            "BOT_MODE=webhook uchun WEBHOOK_SECRET majburiy: usiz webhook manzilini bilgan "
+            "har kim soxta update yuborishi mumkin"
+        )
+
+    pool = UpdateWorkerPool(dp, workers=config.UPDATE_WORKERS, queue_size=config.UPDATE_QUEUE_SIZE)
+    app = build_webhook_app(pool, config.WEBHOOK_PATH, config.WEBHOOK_SECRET)
+
+    async def _startup(_app):
+        pool.start()
+        await on_startup(dp)
+        await bot.set_webhook(
+            config.WEBHOOK_HOST + config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+        )
+        logger.info(f"🌐 Webhook rejimi ishga tushdi ({config.UPDATE_WORKERS} worker)")
+
+    async def _shutdown(_app):
+        # Webhook o'chirilmaydi — to'xtab turgan paytdagi update'larni Telegram saqlab turadi
+        await pool.drain(timeout=config.UPDATE_DRAIN_TIMEOUT)
+        await on_shutdown(dp)
+        await dp.storage.close()
+        await dp.storage.wait_closed()
+        session = await bot.get_session()
+        await session.close()
+
+    app.on_startup.append(_startup)
+    app.on_shutdown.append(_shutdown)
+    web.run_app(app, host=config.WEBAPP_HOST, port=config.WEBAPP_PORT)
 
 
 if __name__ == '__main__':
-    executor.start_polling(
-        dispatcher=dp,
-        on_startup=on_startup,
-        on_shutdown=on_shutdown,
-        skip_updates=True,
-
-    )
+    if config.BOT_MODE == "webhook":
+        start_webhook()
+    else:
+        executor.start_polling(
+            dispatcher=dp,
+            on_startup=on_startup_polling,
+            on_shutdown=on_shutdown,
+            skip_updates=True,
+
+        )
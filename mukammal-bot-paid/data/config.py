@@ -10,4 +10,21 @@ ADMINS = env.list("ADMINS")  # adminlar ro'yxati
 MILLIY_ADMIN = env.str("MILLIY_ADMIN")  # Milliy Sertifikat admin
 ATTESTATSIYA_ADMIN = env.str("ATTESTATSIYA_ADMIN")  # Attestatsiya admin
 IP = env.str("ip")  # Xosting ip manzili
-API_BASE_URL = env.str("API_BASE_URL").rstrip("/")  # API bazaviy URL (oxiridagi / ni olib tashlash)
\ No newline at end of file
+API_BASE_URL = env.str("API_BASE_URL").rstrip("/")  # API bazaviy URL (oxiridagi / ni olib tashlash)
+FSM_STORAGE = env.str("FSM_STORAGE", "db")  # "db" — BotFSMState jadvali, "memory" — faqat xotirada
+FSM_CACHE_SIZE = env.int("FSM_CACHE_SIZE", 10000)  # LRU kesh hajmi (0 — keshsiz)
+FSM_CACHE_TTL = env.float("FSM_CACHE_TTL", None)  # bir nechta bot jarayoni bo'lsa: masalan 2 (sek)
+
+# Update qabul qilish rejimi: "polling" yoki "webhook"
+BOT_MODE = env.str("BOT_MODE", "polling")
+WEBHOOK_HOST = env.str("WEBHOOK_HOST", "").rstrip("/")  # masalan https://bot.example.uz
+WEBHOOK_PATH = env.str("WEBHOOK_PATH", "/bot/webhook")
+WEBHOOK_SECRET = env.str("WEBHOOK_SECRET", "")  # X-Telegram-Bot-Api-Secret-Token (webhook rejimida majburiy)
+WEBHOOK_MAX_CONNECTIONS = env.int("WEBHOOK_MAX_CONNECTIONS", 40)
+WEBAPP_HOST = env.str("WEBAPP_HOST", "127.0.0.1")
+WEBAPP_PORT = env.int("WEBAPP_PORT", 8081)
+UPDATE_WORKERS = env.int("UPDATE_WORKERS", 8)  # webhook rejimida parallel workerlar
+UPDATE_QUEUE_SIZE = env.int("UPDATE_QUEUE_SIZE", 1000)  # har worker navbati hajmi
+UPDATE_DRAIN_TIMEOUT = env.int("UPDATE_DRAIN_TIMEOUT", 30)  # to'xtashda navbatni tugatish (sek)
+
+DB_THREADS = env.int("DB_THREADS", 4)  # bot DB chaqiruvlari uchun threadlar (har biri o'z ulanishi bilan)
@@ -2,14 +2,16 @@
 Admin-specific handlers: topic management, grading
 """
 from aiogram import types
-import aiohttp
-from django.db.models import F as models_F
 from aiogram.dispatcher import FSMContext
-from data.config import ADMINS, API_BASE_URL, MILLIY_ADMIN, ATTESTATSIYA_ADMIN
+from data.config import ADMINS, MILLIY_ADMIN, ATTESTATSIYA_ADMIN
+from utils.api_client import api
+from utils.catalog_cache import catalog
+from base_app.grading import get_answer_key
 from loader import dp, bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from asgiref.sync import sync_to_async
+from utils.db_api import repository as repo
 from utils.safe_send_message import safe_send_message
+from utils.broadcast import start_broadcast_job, stop_broadcast_job
 from states.broadcast_state import BroadcastState
 from states.update_answers_state import UpdateAnswersState
 from states.add_topic_state import AddTopicState
@@ -29,24 +31,6 @@ MONTH_NAMES_UZ = {
 }
 
 
-async def _get_coin_months(course_id: int, student_ids=None):
-    from base_app.models import CoinTransaction
-    qs = CoinTransaction.objects.filter(wallet__course_id=course_id)
-    if student_ids:
-        qs = qs.filter(wallet__student_id__in=student_ids)
-    return await sync_to_async(list)(qs.dates('topic__activated_at', 'month', order='DESC'))
-
-
-async def _get_task_months(topic_ids: list, student_ids=None):
-    from base_app.models import Task
-    qs = Task.objects.filter(
-        topic_id__in=topic_ids, task_type='test'
-    ).exclude(test_answers='').exclude(test_answers__isnull=True)
-    if student_ids:
-        qs = qs.filter(student_id__in=student_ids)
-    return await sync_to_async(list)(qs.dates('submitted_at', 'month', order='DESC'))
-
-
 def _build_month_kb(months: list, gen_prefix: str, back_cb: str) -> InlineKeyboardMarkup:
     kb = InlineKeyboardMarkup(row_width=2)
     kb.add(InlineKeyboardButton("📋 Barcha vaqt", callback_data=f"{gen_prefix}_0_0"))
@@ -68,12 +52,11 @@ async def set_grade(callback: types.CallbackQuery):
     _, task_id, grade = callback.data.split("_")
     
     # Taskni olish
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/tasks/{task_id}/") as resp_task:
-            if resp_task.status != 200:
-                await callback.answer("❌ Task topilmadi!", show_alert=True)
-                return
-            task_data = await resp_task.json()
+    async with api.get_task(task_id) as resp_task:
+        if resp_task.status != 200:
+            await callback.answer("❌ Task topilmadi!", show_alert=True)
+            return
+        task_data = await resp_task.json()
     
     # Kurs adminini tekshiramiz
     topic_data = task_data.get("topic", {})
@@ -93,65 +76,60 @@ async def set_grade(callback: types.CallbackQuery):
     
     payload = {"grade": int(grade)}
 
-    async with aiohttp.ClientSession() as session:
-        async with session.patch(f"{API_BASE_URL}/tasks/{task_id}/", json=payload) as resp:
-            if resp.status == 200:
-                task = await resp.json()
-                student_id = task["student"]["telegram_id"]
-                student_name = task["student"]["full_name"]
-                
-                # Birinchi guruhni olish
-                all_groups = task["student"].get("all_groups", [])
-                group_name = all_groups[0]["name"] if all_groups else "N/A"
-                
-                topic_title = task["topic"]["title"]
-
-                # ✅ Studentga yuborish
-                await safe_send_message(
-                    student_id,
-                    f"📊 Sizning vazifangiz {grade} bahoga baholandi ✅"
-                )
+    async with api.update_task(task_id, payload) as resp:
+        if resp.status == 200:
+            task = await resp.json()
+            student_id = task["student"]["telegram_id"]
+            student_name = task["student"]["full_name"]
+            
+            # Birinchi guruhni olish
+            all_groups = task["student"].get("all_groups", [])
+            group_name = all_groups[0]["name"] if all_groups else "N/A"
+            
+            topic_title = task["topic"]["title"]
+
+            # ✅ Studentga yuborish
+            await safe_send_message(
+                student_id,
+                f"📊 Sizning vazifangiz {grade} bahoga baholandi ✅"
+            )
 
-                # ✅ Admin tarafida captionni yangilash
-                new_caption = (
-                    f"📥 Vazifa baholandi!\n\n"
-                    f"👤 Student: {student_name}\n"
-                    f"👥 Guruh: {group_name}\n"
-                    f"📚 Mavzu: {topic_title}\n"
-                    f"📊 Baho: {grade} ✅"
-                )
+            # ✅ Admin tarafida captionni yangilash
+            new_caption = (
+                f"📥 Vazifa baholandi!\n\n"
+                f"👤 Student: {student_name}\n"
+                f"👥 Guruh: {group_name}\n"
+                f"📚 Mavzu: {topic_title}\n"
+                f"📊 Baho: {grade} ✅"
+            )
 
-                try:
-                    await callback.message.edit_caption(
-                        caption=new_caption,
-                        reply_markup=None  # baholash tugmalari olib tashlanadi
-                    )
-                except Exception as e:
-                    print("❌ Caption o'zgartirishda xato:", e)
+            try:
+                await callback.message.edit_caption(
+                    caption=new_caption,
+                    reply_markup=None  # baholash tugmalari olib tashlanadi
+                )
+            except Exception as e:
+                print("❌ Caption o'zgartirishda xato:", e)
 
-                await callback.answer("✅ Baho qo'yildi", show_alert=True)
+            await callback.answer("✅ Baho qo'yildi", show_alert=True)
 
-            else:
-                await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
+        else:
+            await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
 
 
 @dp.message_handler(IsPrivate(), commands=["topics"], user_id=ADMINS)
 async def show_all_topics(message: types.Message):
     import html
-    from base_app.models import Topic
-    topics = await sync_to_async(list)(Topic.objects.all())
+    topics = await repo.all_topics()
 
     if not topics:
         await message.answer("❌ Hozircha mavzular mavjud emas.")
         return
 
-    def get_course_code(topic):
-        return topic.course.code if topic.course else None
-    
     # Kurslar bo'yicha guruhlash
     topics_by_course = {}
     for t in topics:
-        course_code = get_course_code(t)
+        course_code = t["course_code"]
         if course_code not in topics_by_course:
             topics_by_course[course_code] = []
         topics_by_course[course_code].append(t)
@@ -165,12 +143,12 @@ async def show_all_topics(message: types.Message):
     }
     
     for course_code, course_topics in topics_by_course.items():
-        course_name = course_names.get(course_code, course_code.title())
+        course_name = course_names.get(course_code, (course_code or "Kurssiz").title())
         text += f"🔹 <b>{course_name}</b>:\n"
         for t in course_topics:
-            status = "✅ Active" if t.is_active else "❌ Inactive"
-            title = html.escape(t.title)
-            text += f"  <b>{t.id}.</b> {title} — {status}\n"
+            status = "✅ Active" if t["is_active"] else "❌ Inactive"
+            title = html.escape(t["title"])
+            text += f"  <b>{t['id']}.</b> {title} — {status}\n"
         text += "\n"
 
     text += "🔹 Biror mavzuni active qilish uchun: <code>/activate &lt;id&gt;</code>"
@@ -180,8 +158,6 @@ async def show_all_topics(message: types.Message):
 
 @dp.message_handler(IsPrivate(), commands=["activate"], user_id=ADMINS)
 async def activate_topic(message: types.Message):
-    from base_app.models import Topic, Student, Group
-
     args = message.get_args()
     if not args.isdigit():
         await message.answer(
@@ -192,68 +168,50 @@ async def activate_topic(message: types.Message):
 
     topic_id = int(args)
 
-    # Mavzuni topamiz
-    try:
-        topic = await sync_to_async(Topic.objects.select_related('course').get)(id=topic_id)
-    except Topic.DoesNotExist:
+    # Faollashtirish + kurs studentlari (takrorlanmaydi) — bitta chaqiruvda
+    topic = await repo.activate_topic(topic_id)
+    if topic is None:
         await message.answer("❌ Bunday ID li mavzu topilmadi.")
         return
 
     # Nofaol kurs mavzusini activate qilib bo'lmaydi
-    if topic.course and not topic.course.is_active:
+    if not topic["activated"]:
         await message.answer(
-            f"❌ <b>{topic.course.name}</b> kursi yakunlangan.\n"
+            f"❌ <b>{topic['course_name']}</b> kursi yakunlangan.\n"
             f"Nofaol kurs mavzusini active qilib bo'lmaydi.",
             parse_mode="HTML"
         )
         return
+    catalog.invalidate_topics()
 
-    # Agar allaqachon active bo'lsa
-    if topic.is_active:
+    # Agar allaqachon active bo'lgan bo'lsa — davom etamiz, qayta xabar yuboriladi
+    if topic["was_active"]:
         await message.answer(
-            f"⚠️ <b>{topic.title}</b> mavzu allaqachon active!\n"
+            f"⚠️ <b>{topic['title']}</b> mavzu allaqachon active!\n"
             f"Studentlarga qayta xabar yuborishni xohlaysizmi?",
             parse_mode="HTML"
         )
-        # Davom etamiz - qayta xabar yuboriladi
-
-    # ✅ is_active = True qilamiz
-    topic.is_active = True
-    await sync_to_async(topic.save)()
 
     # Topic kursini aniqlaymiz (backward compatibility)
-    if not topic.course:
+    if not topic["course_name"]:
         await message.answer("❌ Bu mavzuga kurs biriktirilmagan. Admin paneldan kurs belgilang.")
         return
 
-    topic_course_code = topic.course.code
-    topic_course_name = topic.course.name
+    topic_course_name = topic["course_name"]
 
     await message.answer(
-        f"✅ <b>{topic.title}</b> mavzu <b>Active</b> qilindi!\n"
+        f"✅ <b>{topic['title']}</b> mavzu <b>Active</b> qilindi!\n"
         f"📚 Kurs: {topic_course_name}\n"
         f"👥 Faqat {topic_course_name} kursidagi studentlarga xabar yuboriladi.",
         parse_mode="HTML"
     )
 
-    groups = await sync_to_async(list)(
-        Group.objects.filter(course=topic.course).prefetch_related('enrolled_students')
-    )
-    
-    # Unique studentlarni to'playmiz (bir student bir nechta guruhda bo'lishi mumkin)
-    notified_students = set()
-    notify_text = f"📚 Yangi mavzu active qilindi:\n<b>{topic.title}</b>\n\n" \
+    notify_text = f"📚 Yangi mavzu active qilindi:\n<b>{topic['title']}</b>\n\n" \
                   "📤 Vazifani yuborishingiz mumkin!"
-    
-    for group in groups:
-        students = await sync_to_async(list)(group.enrolled_students.all())
-        for student in students:
-            # Agar bu studentga xabar yuborilmagan bo'lsa
-            if student.telegram_id not in notified_students:
-                await safe_send_message(student.telegram_id, notify_text)
-                notified_students.add(student.telegram_id)
-    
-    await message.answer(f"✅ {len(notified_students)} ta studentga xabar yuborildi.", parse_mode="HTML")
+    for telegram_id in topic["recipients"]:
+        await safe_send_message(telegram_id, notify_text)
+
+    await message.answer(f"✅ {len(topic['recipients'])} ta studentga xabar yuborildi.", parse_mode="HTML")
 
 
 # --- Barcha userlarga xabar yuborish ---
@@ -281,23 +239,26 @@ async def start_broadcast(message: types.Message, state: FSMContext):
     await BroadcastState.waiting_for_audience_type.set()
 
 
-async def _build_group_selection_keyboard(groups, selected_groups):
-    """Guruh tanlash (multiselect) keyboardini quradi — 'hammaga' va 'davomat' oqimlari uchun umumiy"""
+def _selected_student_count(groups, selected_groups):
+    return sum(g["count"] for g in groups if g["id"] in selected_groups)
+
+
+def _build_group_selection_keyboard(groups, selected_groups):
+    """Guruh tanlash (multiselect) keyboardini quradi — 'hammaga' va 'davomat' oqimlari uchun umumiy.
+    groups — repo.broadcast_group_menu() natijasi (studentlar soni bilan)"""
     keyboard = InlineKeyboardMarkup(row_width=1)
 
     for group in groups:
-        student_count = await sync_to_async(group.enrolled_students.count)()
-        course_name = group.course.name if group.course else "N/A"
-        checkbox = "✅" if group.id in selected_groups else "☐"
+        checkbox = "✅" if group["id"] in selected_groups else "☐"
         keyboard.add(
             InlineKeyboardButton(
-                text=f"{checkbox} {course_name} - {group.name} ({student_count} ta)",
-                callback_data=f"broadcast_toggle_{group.id}"
+                text=f"{checkbox} {group['label']} ({group['count']} ta)",
+                callback_data=f"broadcast_toggle_{group['id']}"
             )
         )
 
-    total_students = sum([await sync_to_async(g.enrolled_students.count)() for g in groups])
-    all_group_ids = [g.id for g in groups]
+    total_students = sum(g["count"] for g in groups)
+    all_group_ids = [g["id"] for g in groups]
     all_selected = bool(all_group_ids) and set(selected_groups) == set(all_group_ids)
 
     keyboard.add(
@@ -307,10 +268,7 @@ async def _build_group_selection_keyboard(groups, selected_groups):
         )
     )
 
-    selected_student_count = 0
-    for group in groups:
-        if group.id in selected_groups:
-            selected_student_count += await sync_to_async(group.enrolled_students.count)()
+    selected_student_count = _selected_student_count(groups, selected_groups)
 
     keyboard.add(
         InlineKeyboardButton(
@@ -328,19 +286,15 @@ async def broadcast_audience_all(callback: types.CallbackQuery, state: FSMContex
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Group
-
     await state.update_data(audience_mode='all', session_id=None)
 
-    groups = await sync_to_async(list)(
-        Group.objects.select_related('course').prefetch_related('enrolled_students').all()
-    )
+    groups, _ = await repo.broadcast_group_menu()
     if not groups:
         await callback.message.edit_text("❌ Hech qanday guruh topilmadi.")
         await state.finish()
         return
 
-    keyboard = await _build_group_selection_keyboard(groups, [])
+    keyboard = _build_group_selection_keyboard(groups, [])
     await callback.message.edit_text(
         "👥 Guruh(lar)ni tanlang:\n"
         "☐ - tanlanmagan\n"
@@ -357,22 +311,13 @@ SESSIONS_PAGE_SIZE = 8
 
 async def _build_sessions_page(page: int):
     """Davomat sessiyalari ro'yxatini sahifalab ko'rsatadi (page 1-based)"""
-    from base_app.models import AttendanceSession
     from django.utils import timezone as dj_timezone
 
-    sessions = await sync_to_async(list)(
-        AttendanceSession.objects.order_by('-created_at')
-    )
-    if not sessions:
+    # Faqat shu sahifa o'qiladi (COUNT + LIMIT/OFFSET)
+    page_items, page, total_pages, total = await repo.attendance_sessions_page(page, SESSIONS_PAGE_SIZE)
+    if not total:
         return None, None
 
-    total = len(sessions)
-    total_pages = max(1, (total + SESSIONS_PAGE_SIZE - 1) // SESSIONS_PAGE_SIZE)
-    page = max(1, min(page, total_pages))
-
-    start = (page - 1) * SESSIONS_PAGE_SIZE
-    page_items = sessions[start:start + SESSIONS_PAGE_SIZE]
-
     now = dj_timezone.now()
     keyboard = InlineKeyboardMarkup(row_width=1)
     for session in page_items:
@@ -448,27 +393,22 @@ async def broadcast_session_select(callback: types.CallbackQuery, state: FSMCont
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Group, AttendanceSession
-
     session_id = int(callback.data.split("_")[2])
-    session = await sync_to_async(AttendanceSession.objects.filter(id=session_id).first)()
-    if not session:
+    groups, session_code = await repo.broadcast_group_menu(session_id)
+    if not session_code:
         await callback.answer("❌ Sessiya topilmadi.", show_alert=True)
         return
 
     await state.update_data(audience_mode='absent', session_id=session_id)
 
-    groups = await sync_to_async(list)(
-        Group.objects.select_related('course').prefetch_related('enrolled_students').all()
-    )
     if not groups:
         await callback.message.edit_text("❌ Hech qanday guruh topilmadi.")
         await state.finish()
         return
 
-    keyboard = await _build_group_selection_keyboard(groups, [])
+    keyboard = _build_group_selection_keyboard(groups, [])
     await callback.message.edit_text(
-        f"📵 Sessiya: <b>{session.code}</b>\n\n"
+        f"📵 Sessiya: <b>{session_code}</b>\n\n"
         "👥 Ushbu darsga qaysi guruh talabalari qatnashishi kerak edi? Guruh(lar)ni tanlang:\n"
         "☐ - tanlanmagan\n"
         "✅ - tanlangan\n\n"
@@ -486,8 +426,6 @@ async def toggle_group_selection(callback: types.CallbackQuery, state: FSMContex
     if str(callback.from_user.id) not in ADMINS:
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
-    
-    from base_app.models import Group, AttendanceSession
 
     # Qaysi guruh bosilganini aniqlaymiz
     group_id = int(callback.data.split("_")[2])
@@ -505,22 +443,15 @@ async def toggle_group_selection(callback: types.CallbackQuery, state: FSMContex
     # State ni yangilaymiz
     await state.update_data(selected_groups=selected_groups)
 
-    groups = await sync_to_async(list)(
-        Group.objects.select_related('course').prefetch_related('enrolled_students').all()
-    )
-    keyboard = await _build_group_selection_keyboard(groups, selected_groups)
-
-    selected_student_count = 0
-    for group in groups:
-        if group.id in selected_groups:
-            selected_student_count += await sync_to_async(group.enrolled_students.count)()
+    session_id = data.get('session_id') if data.get('audience_mode') == 'absent' else None
+    groups, session_code = await repo.broadcast_group_menu(session_id)
+    keyboard = _build_group_selection_keyboard(groups, selected_groups)
+    selected_student_count = _selected_student_count(groups, selected_groups)
 
     # Xabar matnini ham yangilaymiz - tanlangan guruhlar ko'rinsin
     message_text = ""
-    if data.get('audience_mode') == 'absent' and data.get('session_id'):
-        session = await sync_to_async(AttendanceSession.objects.filter(id=data['session_id']).first)()
-        if session:
-            message_text += f"📵 Sessiya: {session.code}\n\n"
+    if session_code:
+        message_text += f"📵 Sessiya: {session_code}\n\n"
     message_text += (
         "👥 Guruh(lar)ni tanlang:\n"
         "☐ - tanlanmagan\n"
@@ -549,19 +480,16 @@ async def select_all_groups(callback: types.CallbackQuery, state: FSMContext):
     if str(callback.from_user.id) not in ADMINS:
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
-    
-    from base_app.models import Group, AttendanceSession
 
     # State dan tanlangan guruhlarni olamiz
     data = await state.get_data()
     selected_groups = data.get('selected_groups', [])
 
-    # Barcha guruhlarni olamiz
-    groups = await sync_to_async(list)(
-        Group.objects.select_related('course').prefetch_related('enrolled_students').all()
-    )
+    # Barcha guruhlar (studentlar soni bilan) va sessiya kodi
+    session_id = data.get('session_id') if data.get('audience_mode') == 'absent' else None
+    groups, session_code = await repo.broadcast_group_menu(session_id)
 
-    all_group_ids = [g.id for g in groups]
+    all_group_ids = [g["id"] for g in groups]
 
     # Agar barcha tanlangan bo'lsa - barchasini bekor qilamiz, aks holda barchasini tanlaymiz
     if set(selected_groups) == set(all_group_ids):
@@ -572,20 +500,14 @@ async def select_all_groups(callback: types.CallbackQuery, state: FSMContext):
     # State ni yangilaymiz
     await state.update_data(selected_groups=selected_groups)
 
-    keyboard = await _build_group_selection_keyboard(groups, selected_groups)
+    keyboard = _build_group_selection_keyboard(groups, selected_groups)
     all_selected = len(selected_groups) == len(all_group_ids)
-
-    selected_student_count = 0
-    for group in groups:
-        if group.id in selected_groups:
-            selected_student_count += await sync_to_async(group.enrolled_students.count)()
+    selected_student_count = _selected_student_count(groups, selected_groups)
 
     # Xabar matnini ham yangilaymiz
     message_text = ""
-    if data.get('audience_mode') == 'absent' and data.get('session_id'):
-        session = await sync_to_async(AttendanceSession.objects.filter(id=data['session_id']).first)()
-        if session:
-            message_text += f"📵 Sessiya: {session.code}\n\n"
+    if session_code:
+        message_text += f"📵 Sessiya: {session_code}\n\n"
     message_text += (
         "👥 Guruh(lar)ni tanlang:\n"
         "☐ - tanlanmagan\n"
@@ -611,52 +533,30 @@ async def select_all_groups(callback: types.CallbackQuery, state: FSMContext):
 async def _resolve_broadcast_targets(data):
     """State ma'lumotlari asosida (guruhlar + auditoriya rejimi) yuboriladigan studentlar ro'yxatini hisoblaydi.
 
-    Qaytaradi: (students_list, group_names, session_label) yoki xatolik bo'lsa (None, error_text, None)
+    Qaytaradi: (telegram_ids, group_names, session_label) yoki xatolik bo'lsa (None, error_text, None)
     """
-    from base_app.models import Group, Attendance, AttendanceSession
-
     selected_groups = data.get('selected_groups', [])
     audience_mode = data.get('audience_mode', 'all')
-    session_id = data.get('session_id')
+    session_id = data.get('session_id') if audience_mode == 'absent' else None
 
     if not selected_groups:
         return None, "❌ Hech qanday guruh tanlanmagan!", None
 
-    groups = await sync_to_async(list)(
-        Group.objects.filter(id__in=selected_groups).select_related('course').prefetch_related('enrolled_students')
-    )
-    if not groups:
+    # Guruhlar, studentlar (takrorlanmaydi) va davomat qo'yganlarni chiqarish — bitta chaqiruvda
+    targets = await repo.broadcast_targets(selected_groups, session_id)
+    if not targets["group_names"]:
         return None, "❌ Guruhlar topilmadi!", None
 
-    group_names = [f"{group.course.name if group.course else 'N/A'} - {group.name}" for group in groups]
-
-    unique_students = {}
-    for group in groups:
-        students = await sync_to_async(list)(group.enrolled_students.all())
-        for student in students:
-            unique_students[student.id] = student
-
-    students_list = list(unique_students.values())
-
     session_label = ""
-    if audience_mode == 'absent' and session_id:
-        session = await sync_to_async(AttendanceSession.objects.filter(id=session_id).first)()
-        if not session:
+    if session_id:
+        if targets["session_code"] is None:
             return None, "❌ Sessiya topilmadi!", None
-        session_label = f"📵 Sessiya: {session.code}\n"
+        session_label = f"📵 Sessiya: {targets['session_code']}\n"
 
-        attended_ids = set(await sync_to_async(list)(
-            Attendance.objects.filter(
-                session_id=session_id,
-                student_id__in=list(unique_students.keys())
-            ).values_list('student_id', flat=True)
-        ))
-        students_list = [s for s in students_list if s.id not in attended_ids]
-
-    if not students_list:
+    if not targets["telegram_ids"]:
         return None, "❌ Yuboriladigan student qolmadi (barchasi davomat qo'ygan yoki guruhda studentlar yo'q)!", None
 
-    return students_list, group_names, session_label
+    return targets["telegram_ids"], targets["group_names"], session_label
 
 
 @dp.callback_query_handler(lambda c: c.data == "broadcast_groups_confirm", state=BroadcastState.waiting_for_group_selection)
@@ -667,9 +567,9 @@ async def broadcast_groups_confirm(callback: types.CallbackQuery, state: FSMCont
         return
 
     data = await state.get_data()
-    students_list, group_names_or_error, session_label = await _resolve_broadcast_targets(data)
+    recipients, group_names_or_error, session_label = await _resolve_broadcast_targets(data)
 
-    if students_list is None:
+    if recipients is None:
         await callback.answer(group_names_or_error, show_alert=True)
         return
 
@@ -680,7 +580,7 @@ async def broadcast_groups_confirm(callback: types.CallbackQuery, state: FSMCont
         f"👥 Tanlangan guruhlar ({len(group_names)} ta):\n" +
         "\n".join([f"  • {name}" for name in group_names[:5]]) +
         (f"\n  • ... va yana {len(group_names) - 5} ta" if len(group_names) > 5 else "") +
-        f"\n📝 Yuboriladigan studentlar: {len(students_list)} ta\n\n"
+        f"\n📝 Yuboriladigan studentlar: {len(recipients)} ta\n\n"
         "✍️ Endi yubormoqchi bo'lgan xabaringizni yuboring:\n"
         "⚠️ Xabar matn, rasm, video yoki hujjat bo'lishi mumkin.\n"
         "❌ Bekor qilish uchun: /cancel"
@@ -693,58 +593,52 @@ async def broadcast_groups_confirm(callback: types.CallbackQuery, state: FSMCont
 async def process_broadcast_message(message: types.Message, state: FSMContext):
     """Xabar qabul qilindi — avval tanlangan auditoriyaga yuboradi"""
     data = await state.get_data()
-    students_list, group_names_or_error, session_label = await _resolve_broadcast_targets(data)
+    recipients, group_names_or_error, session_label = await _resolve_broadcast_targets(data)
 
-    if students_list is None:
+    if recipients is None:
         await message.answer(group_names_or_error)
         await state.finish()
         return
 
     group_names = group_names_or_error
-    message_id = message.message_id
-    from_chat_id = message.chat.id
-
-    await message.answer(
-        f"📤 Xabar yuborilmoqda...\n\n" +
+    summary = (
         (session_label or "") +
         f"👥 Tanlangan guruhlar ({len(group_names)} ta):\n" +
         "\n".join([f"  • {name}" for name in group_names[:5]]) +
-        (f"\n  • ... va yana {len(group_names) - 5} ta" if len(group_names) > 5 else "") +
-        f"\n\n📝 Yuboriladigan studentlar: {len(students_list)} ta"
+        (f"\n  • ... va yana {len(group_names) - 5} ta" if len(group_names) > 5 else "")
     )
 
-    success_count = 0
-    fail_count = 0
-
-    # Xabarni copy qilish
-    for student in students_list:
-        try:
-            await bot.copy_message(
-                chat_id=student.telegram_id,
-                from_chat_id=from_chat_id,
-                message_id=message_id
-            )
-            success_count += 1
-        except Exception as e:
-            fail_count += 1
-            print(f"Failed to send to {student.telegram_id}: {e}")
-
-    # Natijani ko'rsatish
-    result_text = (
-        f"✅ Xabar yuborish tugadi!\n\n" +
-        (session_label or "") +
-        f"👥 Tanlangan guruhlar: {len(group_names)} ta\n"
-        f"📋 Guruhlar:\n" +
-        "\n".join([f"  • {name}" for name in group_names[:5]]) +
-        (f"\n  • ... va yana {len(group_names) - 5} ta" if len(group_names) > 5 else "") +
-        f"\n\n📊 Natija:\n"
-        f"✅ Muvaffaqiyatli: {success_count}\n"
-        f"❌ Xato: {fail_count}\n"
-        f"📝 Jami: {len(students_list)}"
+    progress_msg = await message.answer(
+        f"📤 Xabar yuborilmoqda...\n\n" +
+        summary +
+        f"\n\n📝 Yuboriladigan studentlar: {len(recipients)} ta"
     )
 
-    await message.answer(result_text)
+    # Job DB ga yoziladi — bot qayta ishga tushsa ham yuborish davom etadi
+    job_id = await repo.create_broadcast_job(
+        admin_telegram_id=message.from_user.id,
+        from_chat_id=message.chat.id,
+        message_id=message.message_id,
+        recipients=recipients,
+        summary=summary,
+        progress_message_id=progress_msg.message_id,
+    )
     await state.finish()
+    start_broadcast_job(job_id)
+
+
+@dp.callback_query_handler(lambda c: c.data.startswith("broadcast_stop_"), state="*")
+async def broadcast_stop(callback: types.CallbackQuery):
+    """Progress xabaridagi "⛔ To'xtatish" — yuborilayotgan broadcastni bekor qiladi"""
+    if str(callback.from_user.id) not in ADMINS:
+        await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
+        return
+
+    job_id = int(callback.data.split("_")[-1])
+    if await stop_broadcast_job(job_id):
+        await callback.answer("⛔ Broadcast to'xtatilmoqda...")
+    else:
+        await callback.answer("ℹ️ Bu broadcast allaqachon tugagan.", show_alert=True)
 
 
 @dp.message_handler(IsPrivate(), commands=["cancel"], state="*", user_id=ADMINS)
@@ -762,6 +656,26 @@ async def cancel_broadcast(message: types.Message, state: FSMContext):
     await message.answer("✅ Jarayon bekor qilindi.")
 
 
+@dp.message_handler(IsPrivate(), commands=["cache_stats"], user_id=ADMINS)
+async def cache_stats(message: types.Message):
+    """Katalog keshi statistikasi. `/cache_stats clear` — keshni tozalash"""
+    if message.get_args().strip() == "clear":
+        catalog.invalidate()
+        await message.answer("🧹 Katalog keshi tozalandi.")
+        return
+
+    stats = catalog.stats()
+    await message.answer(
+        f"🗂 <b>Katalog keshi</b>\n\n"
+        f"✅ Hit: {stats['hits']}\n"
+        f"❌ Miss: {stats['misses']}\n"
+        f"📈 Hit rate: {stats['hit_rate'] * 100:.1f}%\n"
+        f"🔑 Kalitlar: {', '.join(stats['keys']) or '—'}\n"
+        f"⏱ TTL: {catalog.ttl} sek",
+        parse_mode="HTML",
+    )
+
+
 # --- ADMIN PANEL ---
 @dp.message_handler(IsPrivate(), commands=["admin"], user_id=ADMINS)
 async def admin_panel(message: types.Message):
@@ -868,27 +782,8 @@ PAGE_SIZE = 8
 
 async def _build_stats_message(page: int, course_filter: str):
     """Statistika xabari va keyboardini yaratadi. (page 1-based, course_filter: 'all' yoki course.id)"""
-    from base_app.models import Task, Course
-    from django.db.models import Count
-
-    # Kurslarni olamiz (filter tugmalari uchun — faol va nofaol)
-    courses = await sync_to_async(list)(Course.objects.all().order_by('-is_active', 'name'))
-
-    # Asosiy query
-    qs = Task.objects.filter(task_type='test').exclude(test_code__isnull=True).exclude(test_code='')
-
-    if course_filter != 'all':
-        try:
-            qs = qs.filter(topic__course__id=int(course_filter))
-        except (ValueError, TypeError):
-            pass
-
-    # test_code bo'yicha guruhlab, unique studentlar sonini hisoblaymiz
-    stats = await sync_to_async(list)(
-        qs.values('test_code', 'topic__title', 'topic__course__name')
-          .annotate(count=Count('student', distinct=True))
-          .order_by('-topic__id')
-    )
+    # Kurslar (filter tugmalari uchun — faol va nofaol) va test_code bo'yicha unique studentlar soni
+    courses, stats = await repo.test_stats(course_filter)
 
     total = len(stats)
     total_pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
@@ -1022,8 +917,7 @@ async def reports_dispatch(callback: types.CallbackQuery):
 # ── GURUH NATIJALARI PDF ─────────────────────────────────────────────────────
 
 async def grp_test_select_course(callback: types.CallbackQuery):
-    from base_app.models import Course
-    courses = await sync_to_async(list)(Course.objects.all().order_by('-is_active', 'name'))
+    courses = await repo.courses()
     if not courses:
         await callback.answer("❌ Kurslar yo'q.", show_alert=True)
         return
@@ -1045,18 +939,14 @@ async def grp_test_select_group(callback: types.CallbackQuery):
         await callback.answer("❌ Ruxsat yo'q.", show_alert=True)
         return
     course_id = int(callback.data.split("_")[3])
-    from base_app.models import Group
-    groups = await sync_to_async(list)(
-        Group.objects.filter(course_id=course_id).prefetch_related('enrolled_students').order_by('name')
-    )
+    groups = await repo.course_groups(course_id)
     if not groups:
         await callback.answer("❌ Bu kursda guruhlar yo'q.", show_alert=True)
         return
     kb = InlineKeyboardMarkup(row_width=1)
     kb.add(InlineKeyboardButton("📋 Barcha guruhlar", callback_data=f"grp_test_grp_{course_id}_0"))
     for g in groups:
-        count = await sync_to_async(g.enrolled_students.count)()
-        kb.add(InlineKeyboardButton(f"{g.name} ({count} ta)", callback_data=f"grp_test_grp_{course_id}_{g.id}"))
+        kb.add(InlineKeyboardButton(f"{g.name} ({g.student_count} ta)", callback_data=f"grp_test_grp_{course_id}_{g.id}"))
     kb.add(InlineKeyboardButton("🔙 Orqaga", callback_data="reports_group_test"))
     await callback.message.edit_text(
         "👥 <b>Guruh natijalari PDF</b>\n\nGuruhni tanlang:",
@@ -1075,20 +965,11 @@ async def grp_test_init_topic_select(callback: types.CallbackQuery, state: FSMCo
     course_id = int(parts[3])
     group_id = int(parts[4])
 
-    from base_app.models import Topic, Group
-    topics = await sync_to_async(list)(
-        Topic.objects.filter(course_id=course_id, correct_answers__isnull=False).order_by('-id')
-    )
-    topics = [t for t in topics if t.correct_answers]
+    topics, group_name = await repo.course_test_topics(course_id, group_id)
     if not topics:
         await callback.answer("❌ Bu kursda mavzular yo'q.", show_alert=True)
         return
 
-    group_name = None
-    if group_id != 0:
-        group = await sync_to_async(Group.objects.get)(id=group_id)
-        group_name = group.name
-
     all_topic_ids = [t.id for t in topics]
     await state.update_data(
         course_id=course_id,
@@ -1141,11 +1022,7 @@ async def _grp_refresh_topic_msg(callback: types.CallbackQuery, state: FSMContex
     course_id = data.get('course_id')
     group_name = data.get('group_name')
 
-    from base_app.models import Topic
-    topics = await sync_to_async(list)(
-        Topic.objects.filter(id__in=all_ids).order_by('-id')
-    )
-    topics = sorted(topics, key=lambda t: all_ids.index(t.id))
+    topics = await repo.topics_by_ids(all_ids)
 
     kb = _build_grp_topic_kb(topics, selected, course_id)
     n = len(selected)
@@ -1210,15 +1087,7 @@ async def grp_go_to_month(callback: types.CallbackQuery, state: FSMContext):
     group_id = data.get('group_id', 0)
     group_name = data.get('group_name')
 
-    student_ids = None
-    if group_id != 0:
-        from base_app.models import Group
-        grp = await sync_to_async(Group.objects.prefetch_related('enrolled_students').get)(id=group_id)
-        student_ids = await sync_to_async(
-            lambda: list(grp.enrolled_students.values_list('id', flat=True))
-        )()
-
-    months = await _get_task_months(selected, student_ids)
+    months = await repo.task_report_months(selected, group_id)
     if not months:
         # Ma'lumot bor, lekin oy yo'q — to'g'ridan generate
         import asyncio
@@ -1275,40 +1144,11 @@ async def _generate_and_send_group_matrix_pdf(
     topic_ids: list, group_id: int, group_name: str,
     year: int = 0, month: int = 0
 ):
-    from base_app.models import Topic, Task, Group
+    import asyncio
     from utils.pdf_report import generate_group_matrix_pdf
     from aiogram.types import InputFile
     try:
-        topics = await sync_to_async(list)(
-            Topic.objects.select_related('course').filter(id__in=topic_ids)
-        )
-        topics = sorted(topics, key=lambda t: topic_ids.index(t.id))
-
-        def _task_qs(base_qs):
-            if year and month:
-                base_qs = base_qs.filter(submitted_at__year=year, submitted_at__month=month)
-            return base_qs.exclude(test_answers__isnull=True).exclude(test_answers='')
-
-        if group_id == 0:
-            tasks = await sync_to_async(list)(
-                _task_qs(Task.objects.filter(topic_id__in=topic_ids, task_type='test'))
-                    .select_related('student')
-            )
-            student_map = {t.student_id: t.student for t in tasks}
-            students = sorted(student_map.values(), key=lambda s: s.full_name)
-        else:
-            group = await sync_to_async(
-                Group.objects.prefetch_related('enrolled_students').get
-            )(id=group_id)
-            students = await sync_to_async(list)(
-                group.enrolled_students.all().order_by('full_name')
-            )
-            student_ids = [s.id for s in students]
-            tasks = await sync_to_async(list)(
-                _task_qs(Task.objects.filter(
-                    topic_id__in=topic_ids, task_type='test', student_id__in=student_ids
-                )).select_related('student')
-            )
+        topics, students, tasks = await repo.group_matrix_data(topic_ids, group_id, year, month)
 
         if not tasks:
             no_data = "❌ Bu oyda test topshiruvchilar yo'q." if (year and month) else "❌ Bu bo'yicha hali test topshiruvchilar yo'q."
@@ -1334,15 +1174,15 @@ async def _generate_and_send_group_matrix_pdf(
 
         # Web havola (har doim yuboriladi)
         from base_app.report_views import generate_matrix_token
-        token = await sync_to_async(generate_matrix_token)(
-            group_id, topic_ids, year, month, group_name
-        )
+        token = generate_matrix_token(group_id, topic_ids, year, month, group_name)
         web_url = f"http://vazifa.matematikapro.uz/report/matrix/{token}/"
         web_caption = base_caption + f"\n\n🌐 <a href=\"{web_url}\">Brauzerda ko'rish</a> (7 kun)"
 
         # 10 ta va undan kam mavzu → PDF ham yuboriladi
         if len(topics) <= 10:
-            pdf_buffer = await sync_to_async(generate_group_matrix_pdf)(
+            # PDF chizish DB ga tegmaydi (hammasi oldindan yuklangan) — DB pool band qilinmaydi
+            pdf_buffer = await asyncio.to_thread(
+                generate_group_matrix_pdf,
                 group_name=group_name,
                 topics=topics,
                 tasks_map=tasks_map,
@@ -1376,8 +1216,7 @@ async def _generate_and_send_group_matrix_pdf(
 # ── TANGA REYTINGI GURUH BO'YICHA ───────────────────────────────────────────
 
 async def coin_grp_select_course(callback: types.CallbackQuery):
-    from base_app.models import Course
-    courses = await sync_to_async(list)(Course.objects.all().order_by('-is_active', 'name'))
+    courses = await repo.courses()
     if not courses:
         await callback.answer("❌ Kurslar yo'q.", show_alert=True)
         return
@@ -1399,18 +1238,14 @@ async def coin_grp_select_group(callback: types.CallbackQuery):
         await callback.answer("❌ Ruxsat yo'q.", show_alert=True)
         return
     course_id = int(callback.data.split("_")[3])
-    from base_app.models import Group
-    groups = await sync_to_async(list)(
-        Group.objects.filter(course_id=course_id).prefetch_related('enrolled_students').order_by('name')
-    )
+    groups = await repo.course_groups(course_id)
     if not groups:
         await callback.answer("❌ Bu kursda guruhlar yo'q.", show_alert=True)
         return
     kb = InlineKeyboardMarkup(row_width=1)
     kb.add(InlineKeyboardButton("📋 Barcha guruhlar (umumiy)", callback_data=f"coin_grp_gen_{course_id}_0"))
     for g in groups:
-        count = await sync_to_async(g.enrolled_students.count)()
-        kb.add(InlineKeyboardButton(f"{g.name} ({count} ta)", callback_data=f"coin_grp_gen_{course_id}_{g.id}"))
+        kb.add(InlineKeyboardButton(f"{g.name} ({g.student_count} ta)", callback_data=f"coin_grp_gen_{course_id}_{g.id}"))
     kb.add(InlineKeyboardButton("🔙 Orqaga", callback_data="reports_coin_group"))
     await callback.message.edit_text(
         "🏆 <b>Reyting PDF</b>\n\nGuruhni tanlang:",
@@ -1428,17 +1263,8 @@ async def coin_grp_select_month(callback: types.CallbackQuery):
     parts = callback.data.split("_")
     course_id, group_id = int(parts[3]), int(parts[4])
 
-    student_ids = None
-    group_name = None
-    if group_id != 0:
-        from base_app.models import Group
-        grp = await sync_to_async(Group.objects.prefetch_related('enrolled_students').get)(id=group_id)
-        student_ids = await sync_to_async(
-            lambda: list(grp.enrolled_students.values_list('id', flat=True))
-        )()
-        group_name = grp.name
-
-    months = await _get_coin_months(course_id, student_ids)
+    # Kunlik rollup'lar (course, day) indeksidan — ledger + Topic JOIN siz
+    group_name, months = await repo.coin_report_months(course_id, group_id)
     if not months:
         status_msg = await callback.message.edit_text("⏳ Reyting PDF tayyorlanmoqda...")
         await callback.answer()
@@ -1479,28 +1305,15 @@ async def _generate_and_send_coin_grp_pdf(
     user_id: int, chat_id: int, status_msg_id: int,
     course_id: int, group_id: int, year: int = 0, month: int = 0
 ):
-    from base_app.models import Course, CoinWallet, CoinTransaction, Group
+    import asyncio
     from utils.pdf_report import generate_coin_rating_pdf, generate_coin_monthly_pdf
-    from django.db.models import Sum
     from aiogram.types import InputFile
     try:
-        course = await sync_to_async(Course.objects.get)(id=course_id)
-
-        # Guruh student IDlari
-        student_ids = None
-        group_name = None
-        if group_id != 0:
-            group = await sync_to_async(Group.objects.prefetch_related('enrolled_students').get)(id=group_id)
-            student_ids = await sync_to_async(
-                lambda: list(group.enrolled_students.values_list('id', flat=True))
-            )()
-            group_name = group.name
-
+        # Oy tanlangan bo'lsa oylik reyting qatorlari, aks holda hamyonlar (streak bilan)
+        course, group_name, rows = await repo.coin_rating_data(course_id, group_id, year, month)
         scope = group_name or "Umumiy"
 
         if year and month:
-            from base_app.coins import get_monthly_rating_rows
-            rows = await sync_to_async(get_monthly_rating_rows)(course_id, year, month, student_ids)
             if not rows:
                 await bot.edit_message_text(
                     "❌ Bu bo'yicha hali tanga reyting yo'q.",
@@ -1508,7 +1321,8 @@ async def _generate_and_send_coin_grp_pdf(
                 )
                 return
             month_label = f"{MONTH_NAMES_UZ[month]} {year}"
-            pdf_buffer = await sync_to_async(generate_coin_monthly_pdf)(course, rows, group_name, month_label)
+            # PDF chizish DB ga tegmaydi — DB pool band qilinmaydi
+            pdf_buffer = await asyncio.to_thread(generate_coin_monthly_pdf, course, rows, group_name, month_label)
             safe_name = course.name.replace('/', '-')[:30]
             safe_scope = scope.replace('/', '-')[:15]
             await bot.send_document(
@@ -1526,11 +1340,7 @@ async def _generate_and_send_coin_grp_pdf(
             return
 
         # Barcha vaqt — CoinWallet (streak bilan)
-        qs_w = CoinWallet.objects.filter(course_id=course_id).select_related('student')
-        if student_ids:
-            qs_w = qs_w.filter(student_id__in=student_ids)
-        wallets = await sync_to_async(list)(qs_w.order_by('-total_coins', '-longest_streak'))
-
+        wallets = rows
         if not wallets:
             await bot.edit_message_text(
                 "❌ Bu bo'yicha hali tanga reyting yo'q.",
@@ -1538,7 +1348,7 @@ async def _generate_and_send_coin_grp_pdf(
             )
             return
 
-        pdf_buffer = await sync_to_async(generate_coin_rating_pdf)(course, wallets, group_name)
+        pdf_buffer = await asyncio.to_thread(generate_coin_rating_pdf, course, wallets, group_name)
         safe_name = course.name.replace('/', '-')[:35]
         safe_scope = scope.replace('/', '-')[:20]
         await bot.send_document(
@@ -1569,8 +1379,7 @@ async def pdf_select_course(callback: types.CallbackQuery):
         await callback.answer("❌ Ruxsat yo'q.", show_alert=True)
         return
 
-    from base_app.models import Course
-    courses = await sync_to_async(list)(Course.objects.all().order_by('-is_active', 'name'))
+    courses = await repo.courses()
 
     if not courses:
         await callback.answer("❌ Kurslar yo'q.", show_alert=True)
@@ -1599,21 +1408,14 @@ async def pdf_select_topic(callback: types.CallbackQuery):
     course_id = int(parts[2])
     page = int(parts[3]) if len(parts) > 3 else 1
 
-    from base_app.models import Topic
-    from utils.pdf_report import _parse_answers
-
-    all_topics = await sync_to_async(list)(
-        Topic.objects.filter(course_id=course_id, correct_answers__isnull=False).order_by('-id')
-    )
+    all_topics, _ = await repo.course_test_topics(course_id)
 
     fifty_topics = []
     for t in all_topics:
-        if not t.correct_answers:
-            continue
         code = next(iter(t.correct_answers), None)
         if not code:
             continue
-        if len(_parse_answers(t.correct_answers[code])) == 50:
+        if get_answer_key(t.correct_answers[code]).has_blocks:
             fifty_topics.append(t)
 
     if not fifty_topics:
@@ -1652,21 +1454,12 @@ async def pdf_select_topic(callback: types.CallbackQuery):
 
 async def _generate_and_send_pdf(user_id: int, chat_id: int, status_msg_id: int, topic_id: int):
     """Background task: PDF generatsiya qiladi va yuboradi."""
-    from base_app.models import Topic, Task
+    import asyncio
     from utils.pdf_report import generate_topic_pdf
     from aiogram.types import InputFile
 
     try:
-        topic = await sync_to_async(
-            Topic.objects.select_related('course').get
-        )(id=topic_id)
-
-        tasks = await sync_to_async(list)(
-            Task.objects.filter(topic_id=topic_id, task_type='test')
-                .select_related('student')
-                .exclude(test_answers__isnull=True)
-                .exclude(test_answers='')
-        )
+        topic, tasks = await repo.topic_pdf_data(topic_id)
 
         if not tasks:
             await bot.edit_message_text(
@@ -1675,7 +1468,8 @@ async def _generate_and_send_pdf(user_id: int, chat_id: int, status_msg_id: int,
             )
             return
 
-        pdf_buffer = await sync_to_async(generate_topic_pdf)(topic, tasks)
+        # PDF chizish DB ga tegmaydi — DB pool band qilinmaydi
+        pdf_buffer = await asyncio.to_thread(generate_topic_pdf, topic, tasks)
 
         safe_title = topic.title.replace('/', '-').replace('\\', '-')[:40]
         await bot.send_document(
@@ -1726,8 +1520,7 @@ async def coin_pdf_select_course(callback: types.CallbackQuery):
         await callback.answer("❌ Ruxsat yo'q.", show_alert=True)
         return
 
-    from base_app.models import Course
-    courses = await sync_to_async(list)(Course.objects.all().order_by('-is_active', 'name'))
+    courses = await repo.courses()
 
     if not courses:
         await callback.answer("❌ Kurslar yo'q.", show_alert=True)
@@ -1752,7 +1545,7 @@ async def coin_pdf_select_month(callback: types.CallbackQuery):
         await callback.answer("❌ Ruxsat yo'q.", show_alert=True)
         return
     course_id = int(callback.data.split("_")[3])
-    months = await _get_coin_months(course_id)
+    _, months = await repo.coin_report_months(course_id)
     if not months:
         status_msg = await callback.message.edit_text("⏳ Reyting PDF tayyorlanmoqda...")
         await callback.answer()
@@ -1789,17 +1582,15 @@ async def _generate_and_send_coin_pdf(
     user_id: int, chat_id: int, status_msg_id: int,
     course_id: int, year: int = 0, month: int = 0
 ):
-    from base_app.models import Course, CoinWallet, CoinTransaction
+    import asyncio
     from utils.pdf_report import generate_coin_rating_pdf, generate_coin_monthly_pdf
-    from django.db.models import Sum
     from aiogram.types import InputFile
 
     try:
-        course = await sync_to_async(Course.objects.get)(id=course_id)
+        # Umumiy reyting PDF — eng ko'pi 600 ta hamyon
+        course, _, rows = await repo.coin_rating_data(course_id, 0, year, month, limit=600)
 
         if year and month:
-            from base_app.coins import get_monthly_rating_rows
-            rows = await sync_to_async(get_monthly_rating_rows)(course_id, year, month, None)
             if not rows:
                 await bot.edit_message_text(
                     "❌ Bu kursda hali tanga reyting yo'q.",
@@ -1807,7 +1598,7 @@ async def _generate_and_send_coin_pdf(
                 )
                 return
             month_label = f"{MONTH_NAMES_UZ[month]} {year}"
-            pdf_buffer = await sync_to_async(generate_coin_monthly_pdf)(course, rows, None, month_label)
+            pdf_buffer = await asyncio.to_thread(generate_coin_monthly_pdf, course, rows, None, month_label)
             safe_name = course.name.replace('/', '-')[:30]
             await bot.send_document(
                 user_id,
@@ -1818,12 +1609,7 @@ async def _generate_and_send_coin_pdf(
             await bot.delete_message(chat_id=chat_id, message_id=status_msg_id)
             return
 
-        wallets = await sync_to_async(list)(
-            CoinWallet.objects.filter(course_id=course_id)
-            .select_related('student')
-            .order_by('-total_coins', '-longest_streak')[:600]
-        )
-
+        wallets = rows
         if not wallets:
             await bot.edit_message_text(
                 "❌ Bu kursda hali tanga reyting yo'q.",
@@ -1831,7 +1617,7 @@ async def _generate_and_send_coin_pdf(
             )
             return
 
-        pdf_buffer = await sync_to_async(generate_coin_rating_pdf)(course, wallets)
+        pdf_buffer = await asyncio.to_thread(generate_coin_rating_pdf, course, wallets)
 
         safe_name = course.name.replace('/', '-').replace('\\', '-')[:40]
         await bot.send_document(
@@ -1852,80 +1638,12 @@ async def _generate_and_send_coin_pdf(
             pass
 
 
-def _recalculate_coins_for_tasks(tasks_to_update):
-    """
-    Grade o'zgargan tasklar uchun CoinTransaction va CoinWallet ni yangilaydi.
-    Faqat result_coins (= grade) o'zgaradi; streak_coins o'zgarmaydi.
-    CoinTransaction bo'lmasa — retroaktiv yaratiladi (result_coins, streak_coins=0).
-    """
-    import logging
-    from django.db import transaction as db_transaction
-    from base_app.models import CoinTransaction, CoinWallet
-
-    logger = logging.getLogger(__name__)
-
-    with db_transaction.atomic():
-        for task in tasks_to_update:
-            new_result_coins = max(0, task.grade)
-            course = task.topic.course
-            if not course:
-                continue
-
-            try:
-                txn = CoinTransaction.objects.select_for_update().get(
-                    wallet__student=task.student,
-                    topic=task.topic,
-                    task_type='test',
-                )
-            except CoinTransaction.DoesNotExist:
-                # Avval tanga tizimi bo'lmagan — retroaktiv yaratamiz
-                try:
-                    wallet, _ = CoinWallet.objects.select_for_update().get_or_create(
-                        student=task.student, course=course
-                    )
-                    CoinTransaction.objects.create(
-                        wallet=wallet,
-                        topic=task.topic,
-                        task_type='test',
-                        result_coins=new_result_coins,
-                        streak_coins=0,
-                        total_coins=new_result_coins,
-                        streak_after=wallet.current_streak,
-                        deadline_penalty=False,
-                    )
-                    CoinWallet.objects.filter(pk=wallet.pk).update(
-                        total_coins=models_F('total_coins') + new_result_coins
-                    )
-                except Exception as e:
-                    logger.error(f"Retroaktiv CoinTransaction yaratishda xato: {e}")
-                continue
-
-            old_result_coins = txn.result_coins
-            coin_diff = new_result_coins - old_result_coins
-            if coin_diff == 0:
-                continue
-
-            txn.result_coins = new_result_coins
-            txn.total_coins = new_result_coins + txn.streak_coins
-            txn.save(update_fields=['result_coins', 'total_coins'])
-
-            # total_coins manfiy bo'lib ketmasligi uchun
-            wallet = CoinWallet.objects.select_for_update().get(pk=txn.wallet_id)
-            new_total = max(0, wallet.total_coins + coin_diff)
-            wallet.total_coins = new_total
-            wallet.save(update_fields=['total_coins'])
-
-
 # --- TEST JAVOBLARINI O'ZGARTIRISH ---
 @dp.message_handler(IsPrivate(), lambda msg: msg.text == "🔧 Test javoblarini o'zgartirish", user_id=ADMINS)
 async def update_test_answers_start(message: types.Message):
     """Admin test javoblarini o'zgartirish jarayonini boshlaydi"""
-    from base_app.models import Topic
-    
     # Faqat test mavzularini olamiz (correct_answers mavjud bo'lganlar)
-    topics = await sync_to_async(list)(
-        Topic.objects.filter(correct_answers__isnull=False, is_active=True).order_by('-id')
-    )
+    topics = await repo.active_test_topics()
     
     if not topics:
         await message.answer("❌ Hozircha test mavzulari mavjud emas.")
@@ -1958,9 +1676,7 @@ async def topic_selected_for_update(callback: types.CallbackQuery, state: FSMCon
         return
     
     topic_id = int(callback.data.split("_")[2])
-    
-    from base_app.models import Topic
-    topic = await sync_to_async(Topic.objects.get)(id=topic_id)
+    topic = await repo.topic(topic_id)
     
     # Hozirgi javoblarni ko'rsatamiz
     current_code = list(topic.correct_answers.keys())[0]
@@ -2057,15 +1773,9 @@ async def process_new_answers(message: types.Message, state: FSMContext):
         )
         return
     
-    from base_app.models import Topic, Task
-    
-    # Topic ni yangilaymiz
-    topic = await sync_to_async(Topic.objects.get)(id=topic_id)
-    old_answers = topic.correct_answers[test_code]
-    
     # Faqat tanlangan test kodini yangilaymiz, boshqalarini saqlaymiz
-    topic.correct_answers[test_code] = new_answers
-    await sync_to_async(topic.save)()
+    old_answers = await repo.set_topic_answers(topic_id, test_code, new_answers)
+    catalog.invalidate_topics()
     
     await message.answer(
         f"⏳ Javoblar yangilandi, testlar qayta hisoblanmoqda...\n\n"
@@ -2074,123 +1784,31 @@ async def process_new_answers(message: types.Message, state: FSMContext):
         f"✅ Yangi: {new_answers}"
     )
     
-    # Yangi javoblarni parse qilish (uch formatni qo'llab-quvvatlash)
-    import re
-    
-    # Raqam bor-yo'qligini tekshirish
-    has_numbers = bool(re.search(r'\d', new_answers))
-    
-    if has_numbers:
-        # Format 2: raqam+harf(lar) (1a2b3c yoki 1ab2x3cd)
-        # Har bir savolning to'g'ri javoblarini list qilib olamiz
-        correct_answers_list = []
-        for match in re.finditer(r'\d+([a-zx]+)', new_answers):
-            answers = match.group(1)
-            if answers == 'x':
-                # 'x' = hech biri to'g'ri emas
-                correct_answers_list.append(['x'])
-            else:
-                # Ko'p variant (ab, abcd, ...)
-                correct_answers_list.append(list(answers))
-    elif re.match(r'^[a-zx]+$', new_answers):
-        # Format 1: faqat harflar (abc) -> har biri bitta to'g'ri javob
-        correct_answers_list = [[ch] for ch in new_answers]
-    else:
-        # Noma'lum format - barcha kichik harflarni olamiz
-        filtered = ''.join(ch for ch in new_answers if ch.isalpha() or ch == 'x')
-        correct_answers_list = [[ch] for ch in filtered]
-    
     import asyncio
 
-    # Barcha bu mavzu bo'yicha test topshirgan studentlarning natijasini qayta hisoblaymiz
-    tasks = await sync_to_async(list)(
-        Task.objects.filter(topic_id=topic_id, task_type='test', test_code=test_code).select_related('student')
-    )
-
-    topic_deadline = topic.deadline
+    # Barcha bu mavzu bo'yicha test topshirgan studentlarning natijasini qayta hisoblaymiz:
+    # xotirada baholash → bulk_update → hamyonlarga yig'ilgan tanga farqlari (bitta UPDATE)
+    result = await repo.regrade_topic(topic_id, test_code, new_answers)
 
-    tasks_to_update = []
+    bekor_count = result['void_count']
+    grade_changes = result['changes']
     notifications = []
-    deadline_penalty_count = 0
-    grade_changes = []
-
-    for task in tasks:
-        student_answers = task.test_answers.lower().strip()
-
-        if '-' in student_answers:
-            parts = student_answers.split('-', 1)
-            if len(parts) == 2 and parts[0].replace('_', '').isdigit():
-                student_answers = parts[1]
-
-        has_numbers = bool(re.search(r'\d', student_answers))
-
-        if has_numbers:
-            student_answers_list = [m.group(1) for m in re.finditer(r'\d+([a-zx])', student_answers)]
-        elif re.match(r'^[a-zx]+$', student_answers):
-            student_answers_list = list(student_answers)
-        else:
-            student_answers_list = [ch for ch in student_answers if ch.isalpha() or ch == 'x']
-
-        if not student_answers_list or len(student_answers_list) != answer_count:
-            continue
-
-        old_grade = task.grade
-        correct_count = 0
-        bekor_count = 0
-
-        for i in range(answer_count):
-            correct_ans_list = correct_answers_list[i]
-            if correct_ans_list == ['x']:
-                correct_count += 1
-                bekor_count += 1
-            elif student_answers_list[i] in correct_ans_list:
-                correct_count += 1
-
-        new_grade = correct_count
-
-        is_late = False
-        if topic_deadline and task.submitted_at and task.submitted_at > topic_deadline:
-            is_late = True
-            new_grade = int(new_grade * 0.8)
-            deadline_penalty_count += 1
-
-        if old_grade == new_grade:
-            continue
-
-        task.grade = new_grade
-        tasks_to_update.append(task)
-
-        diff = new_grade - old_grade
-        grade_changes.append({
-            'student': task.student.full_name,
-            'old': old_grade,
-            'new': new_grade,
-            'diff': diff,
-            'is_late': is_late,
-        })
-
+    for change in grade_changes:
+        diff = change['diff']
         change_symbol = "📈" if diff > 0 else "📉"
         bekor_msg = f"\n\n🎁 {bekor_count} ta savol bekor qilindi (test xatosi tuzatildi)" if bekor_count > 0 else ""
-        deadline_msg = "\n\n⚠️ Siz testni deadline dan keyin topshirgansiz, shuning uchun 80% ball berildi" if is_late else ""
+        deadline_msg = "\n\n⚠️ Siz testni deadline dan keyin topshirgansiz, shuning uchun 80% ball berildi" if change['is_late'] else ""
 
         notifications.append((
-            task.student.telegram_id,
+            change['telegram_id'],
             f"{change_symbol} Test natijangiz o'zgardi!\n\n"
             f"📚 Mavzu: {topic_title}\n"
-            f"❌ Eski baho: {old_grade}/{answer_count}\n"
-            f"✅ Yangi baho: {new_grade}/{answer_count}\n"
+            f"❌ Eski baho: {change['old']}/{answer_count}\n"
+            f"✅ Yangi baho: {change['new']}/{answer_count}\n"
             f"{'➕' if diff > 0 else '➖'} Farq: {abs(diff)} ball"
             f"{bekor_msg}{deadline_msg}"
         ))
 
-    # 1 ta bulk UPDATE — N ta save() o'rniga
-    if tasks_to_update:
-        await sync_to_async(Task.objects.bulk_update)(tasks_to_update, ['grade'])
-
-    # Tangalarni qayta hisoblash: grade o'zgargan har bir task uchun
-    if tasks_to_update:
-        await sync_to_async(_recalculate_coins_for_tasks)(tasks_to_update)
-
     # Parallel xabar yuborish (semaphore bilan Telegram rate limit himoya)
     if notifications:
         sem = asyncio.Semaphore(20)
@@ -2204,13 +1822,13 @@ async def process_new_answers(message: types.Message, state: FSMContext):
 
         await asyncio.gather(*[_send(tid, txt) for tid, txt in notifications])
 
-    updated_count = len(tasks_to_update)
-
     stats_text = "✅ Yangilash tugadi!\n\n📊 Statistika:\n"
-    stats_text += f"• Qayta hisoblangan testlar: {updated_count} ta\n"
-    stats_text += f"• Jami baholangan testlar: {len(tasks)} ta\n"
-    if deadline_penalty_count > 0:
-        stats_text += f"• ⚠️ Deadline dan keyin (80% ball): {deadline_penalty_count} ta\n"
+    stats_text += f"• Qayta hisoblangan testlar: {len(grade_changes)} ta\n"
+    stats_text += f"• Jami baholangan testlar: {result['total']} ta\n"
+    if grade_changes:
+        stats_text += f"• 📈 Oshgan: {result['up']} ta, 📉 Kamaygan: {result['down']} ta\n"
+    if result['late'] > 0:
+        stats_text += f"• ⚠️ Deadline dan keyin (80% ball): {result['late']} ta\n"
     stats_text += "\n"
 
     if grade_changes:
@@ -2227,20 +1845,6 @@ async def process_new_answers(message: types.Message, state: FSMContext):
 
 
 # --- YANGI KURS YARATISH ---
-def _generate_unique_course_code(name: str) -> str:
-    """Kurs nomidan (masalan 'Ingliz tili') unikal kod (masalan 'ingliz_tili') yasaydi"""
-    import re
-    from base_app.models import Course
-
-    base = re.sub(r"[^a-z0-9]+", "_", name.strip().lower()).strip("_") or "kurs"
-    code = base
-    i = 2
-    while Course.objects.filter(code=code).exists():
-        code = f"{base}_{i}"
-        i += 1
-    return code
-
-
 REGISTRATION_STRATEGY_LABELS = {
     'score_range': "📊 Ball oralig'i bo'yicha",
     'capacity': "🔢 Sig'im bo'yicha ketma-ket",
@@ -2297,13 +1901,12 @@ async def process_course_name(message: types.Message, state: FSMContext):
         await message.answer("❌ Kurs nomi bo'sh bo'lishi mumkin emas. Qaytadan yuboring yoki /cancel")
         return
 
-    from base_app.models import Course
-
-    if await sync_to_async(Course.objects.filter(name=name).exists)():
+    # Nom bandligi va nomdan yasalgan unikal kod (masalan 'Ingliz tili' → 'ingliz_tili')
+    code = await repo.new_course_code(name)
+    if code is None:
         await message.answer("❌ Bu nomli kurs allaqachon mavjud. Boshqa nom kiriting yoki /cancel")
         return
 
-    code = await sync_to_async(_generate_unique_course_code)(name)
     await state.update_data(name=name, code=code)
 
     keyboard = InlineKeyboardMarkup(row_width=1)
@@ -2360,12 +1963,11 @@ async def process_course_registration_strategy(callback: types.CallbackQuery, st
     data = await state.get_data()
     task_type = data.get("task_type", "test")
 
-    from base_app.models import Course
-
-    course = await sync_to_async(Course.objects.create)(
+    course = await repo.create_course(
         name=data.get("name"), code=data.get("code"), task_type=task_type,
-        registration_strategy=strategy, is_active=True,
+        registration_strategy=strategy,
     )
+    catalog.invalidate_courses()
 
     await callback.message.edit_text(
         f"✅ Yangi kurs yaratildi!\n\n"
@@ -2382,9 +1984,7 @@ async def process_course_registration_strategy(callback: types.CallbackQuery, st
 
 # --- KURSLARNI BOSHQARISH (nomini o'zgartirish / faollashtirish / o'chirish) ---
 async def _render_course_list(target):
-    from base_app.models import Course
-
-    courses = await sync_to_async(list)(Course.objects.all().order_by('name'))
+    courses = await repo.courses(order_by=('name',))
     if not courses:
         await target.answer("❌ Hozircha kurslar mavjud emas.")
         return
@@ -2431,10 +2031,8 @@ async def course_strategy_menu(callback: types.CallbackQuery, state: FSMContext)
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Course
-
     course_id = int(callback.data.split("_")[-1])
-    course = await sync_to_async(Course.objects.get)(id=course_id)
+    course = await repo.course(course_id)
 
     keyboard = InlineKeyboardMarkup(row_width=1)
     for key, label in REGISTRATION_STRATEGY_LABELS.items():
@@ -2459,13 +2057,10 @@ async def course_strategy_set(callback: types.CallbackQuery, state: FSMContext):
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Course
-
     payload = callback.data[len("course_strategy_set_"):]
     course_id_str, strategy = payload.split(":", 1)
-    course = await sync_to_async(Course.objects.get)(id=int(course_id_str))
-    course.registration_strategy = strategy
-    await sync_to_async(course.save)()
+    course = await repo.update_course(int(course_id_str), registration_strategy=strategy)
+    catalog.invalidate_courses()
 
     await _render_course_detail(callback.message, course)
     await callback.answer("✅ Ro'yxatdan o'tish tartibi o'zgartirildi")
@@ -2481,7 +2076,7 @@ async def course_manage_detail(callback: types.CallbackQuery, state: FSMContext)
 
     course_id = int(callback.data.split("_")[-1])
     try:
-        course = await sync_to_async(Course.objects.get)(id=course_id)
+        course = await repo.course(course_id)
     except Course.DoesNotExist:
         await callback.answer("❌ Kurs topilmadi.", show_alert=True)
         return
@@ -2506,12 +2101,9 @@ async def course_toggle_active(callback: types.CallbackQuery, state: FSMContext)
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Course
-
     course_id = int(callback.data.split("_")[-1])
-    course = await sync_to_async(Course.objects.get)(id=course_id)
-    course.is_active = not course.is_active
-    await sync_to_async(course.save)()
+    course = await repo.toggle_course_active(course_id)
+    catalog.invalidate_courses()
 
     await _render_course_detail(callback.message, course)
     await callback.answer("✅ Holat o'zgartirildi")
@@ -2540,19 +2132,14 @@ async def course_rename_finish(message: types.Message, state: FSMContext):
         await message.answer("❌ Kurs nomi bo'sh bo'lishi mumkin emas. Qaytadan yuboring yoki /cancel")
         return
 
-    from base_app.models import Course
-
     data = await state.get_data()
     course_id = data.get("rename_course_id")
 
-    if await sync_to_async(Course.objects.filter(name=new_name).exclude(id=course_id).exists)():
+    old_name = await repo.rename_course(course_id, new_name)
+    if old_name is None:
         await message.answer("❌ Bu nomli kurs allaqachon mavjud. Boshqa nom kiriting yoki /cancel")
         return
-
-    course = await sync_to_async(Course.objects.get)(id=course_id)
-    old_name = course.name
-    course.name = new_name
-    await sync_to_async(course.save)()
+    catalog.invalidate_courses()
 
     await state.finish()
     await message.answer(f"✅ Kurs nomi o'zgartirildi: {old_name} → {new_name}")
@@ -2565,9 +2152,7 @@ async def course_delete_confirm(callback: types.CallbackQuery, state: FSMContext
         return
 
     course_id = int(callback.data.split("_")[-1])
-    from base_app.models import Course
-
-    course = await sync_to_async(Course.objects.get)(id=course_id)
+    course = await repo.course(course_id)
 
     keyboard = InlineKeyboardMarkup(row_width=2)
     keyboard.add(
@@ -2589,18 +2174,11 @@ async def course_delete_execute(callback: types.CallbackQuery, state: FSMContext
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from django.db.models import ProtectedError
-    from base_app.models import Course, Group, Topic
-
     course_id = int(callback.data.split("_")[-1])
-    course = await sync_to_async(Course.objects.get)(id=course_id)
-    course_name = course.name
+    course_name, blockers = await repo.delete_course(course_id)
 
-    try:
-        await sync_to_async(course.delete)()
-    except ProtectedError:
-        groups_count = await sync_to_async(Group.objects.filter(course_id=course_id).count)()
-        topics_count = await sync_to_async(Topic.objects.filter(course_id=course_id).count)()
+    if blockers:
+        groups_count, topics_count = blockers
         await callback.message.edit_text(
             f"❌ <b>{course_name}</b> kursini o'chirib bo'lmadi.\n\n"
             f"Unga {groups_count} ta guruh va {topics_count} ta mavzu bog'langan.\n"
@@ -2611,6 +2189,7 @@ async def course_delete_execute(callback: types.CallbackQuery, state: FSMContext
         await callback.answer()
         return
 
+    catalog.invalidate_courses()
     await callback.message.edit_text(f"✅ <b>{course_name}</b> kursi o'chirildi.", parse_mode="HTML")
     await callback.answer()
 
@@ -2619,10 +2198,8 @@ async def course_delete_execute(callback: types.CallbackQuery, state: FSMContext
 @dp.message_handler(IsPrivate(), lambda msg: msg.text == "➕ Mavzu qo'shish", user_id=ADMINS)
 async def add_topic_start(message: types.Message):
     """Admin yangi mavzu qo'shish jarayonini boshlaydi"""
-    from base_app.models import Course
-    
-    # Barcha kurslarni olamiz
-    courses = await sync_to_async(list)(Course.objects.filter(is_active=True).order_by('name'))
+    # Faol kurslarni olamiz
+    courses = await repo.courses(active_only=True, order_by=('name',))
 
     if not courses:
         keyboard = InlineKeyboardMarkup(row_width=1)
@@ -2661,9 +2238,7 @@ async def course_selected_for_topic(callback: types.CallbackQuery, state: FSMCon
         return
     
     course_id = int(callback.data.split("_")[3])
-    
-    from base_app.models import Course
-    course = await sync_to_async(Course.objects.get)(id=course_id)
+    course = await repo.course(course_id)
     
     await callback.message.edit_text(
         f"✅ Kurs tanlandi: {course.name}\n\n"
@@ -2838,26 +2413,26 @@ async def process_detailed_results(callback: types.CallbackQuery, state: FSMCont
         payload["deadline"] = deadline_iso
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{API_BASE_URL}/topics/create/", json=payload) as resp:
-                if resp.status == 201:
-                    topic_data = await resp.json()
-                    topic_id = topic_data['id']
-                    detailed_label = "✅ Ha" if show_detailed else "❌ Yo'q"
-
-                    await callback.message.edit_text(
-                        f"✅ Yangi mavzu muvaffaqiyatli yaratildi!\n\n"
-                        f"📚 Kurs: {course_name}\n"
-                        f"📝 Mavzu: {title}\n"
-                        f"🆔 ID: {topic_id}\n"
-                        f"📅 Deadline: {deadline_readable}\n"
-                        f"📊 Batafsil natijalar: {detailed_label}\n"
-                        f"🔴 Status: Inactive\n\n"
-                        f"Mavzuni active qilish uchun: /activate {topic_id}"
-                    )
-                else:
-                    error_text = await resp.text()
-                    await callback.message.edit_text(f"❌ Xatolik yuz berdi (status {resp.status}):\n{error_text[:300]}")
+        async with api.create_topic(payload) as resp:
+            if resp.status == 201:
+                catalog.invalidate_topics()
+                topic_data = await resp.json()
+                topic_id = topic_data['id']
+                detailed_label = "✅ Ha" if show_detailed else "❌ Yo'q"
+
+                await callback.message.edit_text(
+                    f"✅ Yangi mavzu muvaffaqiyatli yaratildi!\n\n"
+                    f"📚 Kurs: {course_name}\n"
+                    f"📝 Mavzu: {title}\n"
+                    f"🆔 ID: {topic_id}\n"
+                    f"📅 Deadline: {deadline_readable}\n"
+                    f"📊 Batafsil natijalar: {detailed_label}\n"
+                    f"🔴 Status: Inactive\n\n"
+                    f"Mavzuni active qilish uchun: /activate {topic_id}"
+                )
+            else:
+                error_text = await resp.text()
+                await callback.message.edit_text(f"❌ Xatolik yuz berdi (status {resp.status}):\n{error_text[:300]}")
     except Exception as e:
         await callback.message.answer(f"❌ Xatolik: {e}")
     finally:
@@ -2882,10 +2457,8 @@ async def settings_menu(callback: types.CallbackQuery):
         await callback.answer("❌ Ruxsat yo'q.", show_alert=True)
         return
 
-    from base_app.models import ScheduleConfig, WeeklyReportSetting
-    configs = await sync_to_async(list)(ScheduleConfig.objects.all())
-    config_map = {c.job_key: c for c in configs}
-    weekly_setting = await sync_to_async(WeeklyReportSetting.objects.first)()
+    config_map = await repo.schedule_configs()
+    weekly_setting = await repo.weekly_report_setting()
 
     kb = InlineKeyboardMarkup(row_width=1)
     for job_key, label in JOB_LABELS.items():
@@ -2911,8 +2484,7 @@ async def settings_menu(callback: types.CallbackQuery):
 
 
 async def _render_job_detail(callback: types.CallbackQuery, job_key: str):
-    from base_app.models import ScheduleConfig
-    cfg = await sync_to_async(ScheduleConfig.objects.filter(job_key=job_key).first)()
+    cfg = await repo.schedule_config(job_key)
     if cfg:
         enabled, weekdays, hour, minute = cfg.enabled, cfg.weekdays, cfg.hour, cfg.minute
     else:
@@ -2949,15 +2521,7 @@ async def settings_job_detail(callback: types.CallbackQuery, state: FSMContext):
 
 
 async def _get_or_default_cfg(job_key):
-    from base_app.models import ScheduleConfig
-    d = DEFAULT_SCHEDULE[job_key]
-
-    def _get():
-        cfg, _ = ScheduleConfig.objects.get_or_create(job_key=job_key, defaults={
-            'enabled': True, 'weekdays': d['weekdays'], 'hour': d['hour'], 'minute': d['minute'],
-        })
-        return cfg
-    return await sync_to_async(_get)()
+    return await repo.schedule_config(job_key, defaults=DEFAULT_SCHEDULE[job_key])
 
 
 # --- Yoqish/o'chirish ---
@@ -2998,15 +2562,7 @@ async def settings_toggle_apply(callback: types.CallbackQuery):
         await callback.answer("❌ Ruxsat yo'q.", show_alert=True)
         return
     job_key = callback.data.split(":", 1)[1]
-    cfg = await _get_or_default_cfg(job_key)
-
-    def _flip():
-        from django.db import close_old_connections
-        close_old_connections()
-        cfg.enabled = not cfg.enabled
-        cfg.save(update_fields=['enabled'])
-        return cfg
-    cfg = await sync_to_async(_flip)()
+    cfg = await repo.update_schedule_config(job_key, DEFAULT_SCHEDULE[job_key], toggle=True)
 
     if cfg.enabled:
         apply_job(job_key, cfg.weekdays, cfg.hour, cfg.minute)
@@ -3097,15 +2653,7 @@ async def settings_days_apply(callback: types.CallbackQuery, state: FSMContext):
     job_key = data.get('settings_job_key')
     new_days_str = data.get('settings_new_days', '')
 
-    cfg = await _get_or_default_cfg(job_key)
-
-    def _save():
-        from django.db import close_old_connections
-        close_old_connections()
-        cfg.weekdays = new_days_str
-        cfg.save(update_fields=['weekdays'])
-        return cfg
-    cfg = await sync_to_async(_save)()
+    cfg = await repo.update_schedule_config(job_key, DEFAULT_SCHEDULE[job_key], weekdays=new_days_str)
 
     if cfg.enabled:
         apply_job(job_key, cfg.weekdays, cfg.hour, cfg.minute)
@@ -3177,16 +2725,7 @@ async def settings_time_apply(callback: types.CallbackQuery, state: FSMContext):
     hour = data.get('settings_new_hour')
     minute = data.get('settings_new_minute')
 
-    cfg = await _get_or_default_cfg(job_key)
-
-    def _save():
-        from django.db import close_old_connections
-        close_old_connections()
-        cfg.hour = hour
-        cfg.minute = minute
-        cfg.save(update_fields=['hour', 'minute'])
-        return cfg
-    cfg = await sync_to_async(_save)()
+    cfg = await repo.update_schedule_config(job_key, DEFAULT_SCHEDULE[job_key], hour=hour, minute=minute)
 
     if cfg.enabled:
         apply_job(job_key, cfg.weekdays, cfg.hour, cfg.minute)
@@ -3211,8 +2750,7 @@ async def settings_pdf_menu(callback: types.CallbackQuery):
     if str(callback.from_user.id) not in ADMINS:
         await callback.answer("❌ Ruxsat yo'q.", show_alert=True)
         return
-    from base_app.models import WeeklyReportSetting
-    setting = await sync_to_async(WeeklyReportSetting.objects.first)()
+    setting = await repo.weekly_report_setting()
     current_lbl = _pdf_setting_label(setting)
 
     from datetime import date
@@ -3249,8 +2787,7 @@ async def settings_pdf_menu(callback: types.CallbackQuery):
 
 
 async def _show_pdf_confirm(callback: types.CallbackQuery, mode: str, year: int, month: int):
-    from base_app.models import WeeklyReportSetting
-    setting = await sync_to_async(WeeklyReportSetting.objects.first)()
+    setting = await repo.weekly_report_setting()
     old_lbl = _pdf_setting_label(setting)
 
     if mode == 'last10':
@@ -3295,10 +2832,7 @@ async def settings_pdf_mode(callback: types.CallbackQuery):
     mode = callback.data.split(":", 1)[1]
 
     if mode == 'pick':
-        from base_app.models import Topic
-        months = await sync_to_async(list)(
-            Topic.objects.filter(activated_at__isnull=False).dates('activated_at', 'month', order='DESC')
-        )
+        months = await repo.topic_activation_months()
         if not months:
             await callback.answer("❌ Hali faollashtirilgan mavzular yo'q.", show_alert=True)
             return
@@ -3347,17 +2881,7 @@ async def settings_pdf_apply(callback: types.CallbackQuery):
     _, mode, year, month = callback.data.split(":")
     year, month = int(year), int(month)
 
-    from base_app.models import WeeklyReportSetting
-
-    def _save():
-        from django.db import close_old_connections
-        close_old_connections()
-        setting, _ = WeeklyReportSetting.objects.get_or_create(id=1, defaults={'mode': 'last10'})
-        setting.mode = mode
-        setting.year = year if mode == 'month' else None
-        setting.month = month if mode == 'month' else None
-        setting.save(update_fields=['mode', 'year', 'month'])
-    await sync_to_async(_save)()
+    await repo.save_weekly_report_setting(mode, year, month)
 
     await callback.answer("✅ Saqlandi")
     await settings_pdf_menu(callback)
@@ -3380,18 +2904,11 @@ async def settings_streak_menu(callback: types.CallbackQuery):
         await callback.answer("❌ Ruxsat yo'q.", show_alert=True)
         return
 
-    from base_app.models import Topic, MonthlyStreakSetting
-    months = await sync_to_async(list)(
-        Topic.objects.filter(activated_at__isnull=False).dates('activated_at', 'month', order='DESC')
-    )
+    months, enabled_pairs = await repo.monthly_streak_menu()
     if not months:
         await callback.answer("❌ Hali faollashtirilgan mavzular yo'q.", show_alert=True)
         return
 
-    enabled_pairs = await sync_to_async(lambda: set(
-        MonthlyStreakSetting.objects.filter(enabled=True).values_list('year', 'month')
-    ))()
-
     kb = InlineKeyboardMarkup(row_width=1)
     for d in months:
         status = "✅" if (d.year, d.month) in enabled_pairs else "🚫"
@@ -3416,16 +2933,7 @@ async def settings_streak_toggle(callback: types.CallbackQuery):
     _, year, month = callback.data.split(":")
     year, month = int(year), int(month)
 
-    from base_app.models import MonthlyStreakSetting
-
-    def _toggle():
-        from django.db import close_old_connections
-        close_old_connections()
-        setting, _ = MonthlyStreakSetting.objects.get_or_create(year=year, month=month)
-        setting.enabled = not setting.enabled
-        setting.save(update_fields=['enabled'])
-        return setting.enabled
-    new_state = await sync_to_async(_toggle)()
+    new_state = await repo.toggle_monthly_streak(year, month)
 
     await callback.answer("✅ Yoqildi" if new_state else "🚫 O'chirildi")
     await settings_streak_menu(callback)
@@ -4,12 +4,12 @@ Davomat tizimi handlerlari — admin va talaba
 import logging
 from datetime import datetime, timedelta
 
-import aiohttp
 import pytz
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 
-from data.config import ADMINS, API_BASE_URL
+from data.config import ADMINS
+from utils.db_api import repository as repo
 from loader import dp, bot
 from states.attendance_state import AttendanceSessionState, AttendanceMarkState
 from utils.safe_send_message import safe_send_message
@@ -104,29 +104,20 @@ async def attendance_session_duration(message: types.Message, state: FSMContext)
 
     now_local = datetime.now(TZ)
     expires_at = now_local + timedelta(hours=hours)
-    expires_at_iso = expires_at.isoformat()
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            f"{API_BASE_URL}/attendance/session/",
-            json={
-                "code": code,
-                "expires_at": expires_at_iso,
-                "created_by": str(message.from_user.id),
-            },
-        ) as resp:
-            if resp.status == 201:
-                await message.answer(
-                    f"✅ Davomat sessiyasi ochildi!\n\n"
-                    f"🔑 Kod: <b>{code}</b>\n"
-                    f"⏱ Tugaydi: <b>{expires_at.strftime('%d.%m.%Y %H:%M')}</b> ({label})",
-                    parse_mode="HTML",
-                )
-                logger.info(f"Admin {message.from_user.id} sessiya ochdi: kod={code}, {label}")
-            else:
-                body = await resp.text()
-                logger.error(f"Sessiya ochishda xatolik: status={resp.status}, body={body[:200]}")
-                await message.answer("❌ Sessiya ochishda xatolik yuz berdi. Qayta urinib ko'ring.")
+
+    try:
+        await repo.open_attendance_session(code, expires_at, str(message.from_user.id))
+    except Exception as e:
+        logger.error(f"Sessiya ochishda xatolik: {e}")
+        await message.answer("❌ Sessiya ochishda xatolik yuz berdi. Qayta urinib ko'ring.")
+    else:
+        await message.answer(
+            f"✅ Davomat sessiyasi ochildi!\n\n"
+            f"🔑 Kod: <b>{code}</b>\n"
+            f"⏱ Tugaydi: <b>{expires_at.strftime('%d.%m.%Y %H:%M')}</b> ({label})",
+            parse_mode="HTML",
+        )
+        logger.info(f"Admin {message.from_user.id} sessiya ochdi: kod={code}, {label}")
 
     await state.finish()
 
@@ -153,21 +144,14 @@ async def attendance_mark_code(message: types.Message, state: FSMContext):
     code = message.text.strip()
     telegram_id = str(message.from_user.id)
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            f"{API_BASE_URL}/attendance/mark/",
-            json={"telegram_id": telegram_id, "code": code},
-        ) as resp:
-            if resp.status == 201:
-                data = await resp.json()
-                await message.answer(
-                    f"✅ Davomat qo'yildi!\n📅 Sana: {data.get('session_date', '')}"
-                )
-            elif resp.status == 409:
-                await message.answer("ℹ️ Siz bugungi darsda allaqachon davomat qo'ygansiz.")
-            elif resp.status == 404:
-                await message.answer("❌ Siz ro'yxatdan o'tmagansiz.")
-            else:
-                await message.answer("❌ Kod noto'g'ri yoki muddati tugagan.")
+    status, session_date = await repo.mark_attendance(telegram_id, code)
+    if status == 'marked':
+        await message.answer(f"✅ Davomat qo'yildi!\n📅 Sana: {session_date}")
+    elif status == 'already':
+        await message.answer("ℹ️ Siz bugungi darsda allaqachon davomat qo'ygansiz.")
+    elif status == 'no_student':
+        await message.answer("❌ Siz ro'yxatdan o'tmagansiz.")
+    else:
+        await message.answer("❌ Kod noto'g'ri yoki muddati tugagan.")
 
     await state.finish()
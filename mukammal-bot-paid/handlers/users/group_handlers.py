@@ -6,7 +6,8 @@ guruhdan so'raladigan maydonlar farq qiladi (score_min/max, max_students, target
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from asgiref.sync import sync_to_async
+from utils.catalog_cache import catalog
+from utils.db_api import repository as repo
 
 from data.config import ADMINS
 from loader import dp, bot
@@ -27,9 +28,7 @@ def _is_admin(user_id) -> bool:
 # ─── Guruh uchun kurs tanlash ──────────────────────────────────────────────
 
 async def _render_course_list(target):
-    from base_app.models import Course
-
-    courses = await sync_to_async(list)(Course.objects.all().order_by('name'))
+    courses = await repo.courses(order_by=('name',))
     if not courses:
         keyboard = InlineKeyboardMarkup(row_width=1)
         keyboard.add(InlineKeyboardButton("➕ Yangi kurs yaratish", callback_data="goto_add_course"))
@@ -55,11 +54,8 @@ async def manage_groups_start(message: types.Message):
 # ─── Bitta kursning guruhlar ro'yxati ──────────────────────────────────────
 
 async def _render_group_list(callback_message, course):
-    from base_app.models import Group
-
-    groups = await sync_to_async(list)(
-        Group.objects.filter(course=course).order_by('id')
-    )
+    # student_count — bitta so'rovda annotate qilingan
+    groups = await repo.course_groups(course.id, order_by='id')
 
     keyboard = InlineKeyboardMarkup(row_width=1)
     keyboard.add(InlineKeyboardButton("➕ Guruh qo'shish", callback_data=f"groupmgmt_add_{course.id}"))
@@ -71,9 +67,8 @@ async def _render_group_list(callback_message, course):
         lines.append("Hozircha guruh yo'q.")
     else:
         for g in groups:
-            count = await sync_to_async(g.enrolled_students.count)()
             link_mark = "🔗" if g.telegram_group_id else "❌ ulanmagan"
-            keyboard.add(InlineKeyboardButton(f"{g.name} ({count} ta) {link_mark}", callback_data=f"groupmgmt_detail_{g.id}"))
+            keyboard.add(InlineKeyboardButton(f"{g.name} ({g.student_count} ta) {link_mark}", callback_data=f"groupmgmt_detail_{g.id}"))
 
     keyboard.add(InlineKeyboardButton("⬅️ Orqaga", callback_data="groupmgmt_backcourses"))
 
@@ -86,10 +81,8 @@ async def group_course_selected(callback: types.CallbackQuery, state: FSMContext
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Course
-
     course_id = int(callback.data.split("_")[-1])
-    course = await sync_to_async(Course.objects.get)(id=course_id)
+    course = await repo.course(course_id)
     await callback.message.delete()
     await _render_group_list(callback.message, course)
     await callback.answer()
@@ -111,10 +104,8 @@ async def group_back_to_list(callback: types.CallbackQuery, state: FSMContext):
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Course
-
     course_id = int(callback.data.split("_")[-1])
-    course = await sync_to_async(Course.objects.get)(id=course_id)
+    course = await repo.course(course_id)
     await callback.message.delete()
     await _render_group_list(callback.message, course)
     await callback.answer()
@@ -144,9 +135,7 @@ async def group_add_name(message: types.Message, state: FSMContext):
         await message.answer("❌ Guruh nomi bo'sh bo'lishi mumkin emas. Qaytadan yuboring yoki /cancel")
         return
 
-    from base_app.models import Group
-
-    if await sync_to_async(Group.objects.filter(name=name).exists)():
+    if await repo.group_name_taken(name):
         await message.answer("❌ Bu nomli guruh allaqachon mavjud. Boshqa nom kiriting yoki /cancel")
         return
 
@@ -191,10 +180,8 @@ async def group_add_telegram_id(message: types.Message, state: FSMContext):
 
 async def _ask_strategy_fields(target, state: FSMContext):
     """Kurs strategiyasiga qarab keyingi qadamni so'raydi (score/capacity/role)."""
-    from base_app.models import Course
-
     data = await state.get_data()
-    course = await sync_to_async(Course.objects.get)(id=data["course_id"])
+    course = await repo.course(data["course_id"])
 
     if course.registration_strategy == 'score_range':
         await target.answer(
@@ -273,13 +260,9 @@ async def group_add_max_students(message: types.Message, state: FSMContext):
 
 
 async def _create_group_from_state(target, state: FSMContext):
-    from base_app.models import Group, Course
-
     data = await state.get_data()
-    course = await sync_to_async(Course.objects.get)(id=data["course_id"])
-
-    group = await sync_to_async(Group.objects.create)(
-        course=course,
+    group = await repo.create_group(
+        data["course_id"],
         name=data["name"],
         telegram_group_id=data.get("telegram_group_id"),
         score_min=data.get("score_min"),
@@ -287,12 +270,13 @@ async def _create_group_from_state(target, state: FSMContext):
         max_students=data.get("max_students") or 30,
         target_role=data.get("target_role"),
     )
+    catalog.invalidate_groups()
 
     link_status = "🔗 Telegram guruhiga ulandi" if group.telegram_group_id else "❌ Telegram guruhiga hali ulanmagan"
     await target.answer(
         f"✅ Guruh yaratildi!\n\n"
         f"👥 Nomi: {group.name}\n"
-        f"📚 Kurs: {course.name}\n"
+        f"📚 Kurs: {group.course.name}\n"
         f"{link_status}\n\n"
         f"👥 Guruhlarni boshqarish orqali keyinroq ham tahrirlashingiz mumkin.",
     )
@@ -302,13 +286,13 @@ async def _create_group_from_state(target, state: FSMContext):
 # ─── Guruh tafsiloti / tahrirlash ──────────────────────────────────────────
 
 async def _render_group_detail(target, group):
-    course = await sync_to_async(lambda: group.course)()
-    count = await sync_to_async(group.enrolled_students.count)()
+    """group — repo dan (kurs va student_count oldindan yuklangan), DB ga murojaat yo'q."""
+    course = group.course
 
     lines = [
         f"👥 <b>{group.name}</b>\n",
         f"📚 Kurs: {course.name}",
-        f"👤 Studentlar: {count} ta",
+        f"👤 Studentlar: {group.student_count} ta",
         f"🔗 Telegram ID: {group.telegram_group_id or '— ulanmagan'}",
     ]
 
@@ -342,10 +326,8 @@ async def group_detail(callback: types.CallbackQuery, state: FSMContext):
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Group
-
     group_id = int(callback.data.split("_")[-1])
-    group = await sync_to_async(Group.objects.select_related('course').get)(id=group_id)
+    group = await repo.group(group_id)
     await callback.message.delete()
     await _render_group_detail(callback.message, group)
     await callback.answer()
@@ -370,19 +352,16 @@ async def group_rename_finish(message: types.Message, state: FSMContext):
         await message.answer("❌ Guruh nomi bo'sh bo'lishi mumkin emas. Qaytadan yuboring yoki /cancel")
         return
 
-    from base_app.models import Group
-
     data = await state.get_data()
     group_id = data["edit_group_id"]
 
-    if await sync_to_async(Group.objects.filter(name=new_name).exclude(id=group_id).exists)():
+    if await repo.group_name_taken(new_name, exclude_id=group_id):
         await message.answer("❌ Bu nomli guruh allaqachon mavjud. Boshqa nom kiriting yoki /cancel")
         return
 
-    group = await sync_to_async(Group.objects.select_related('course').get)(id=group_id)
-    old_name = group.name
-    group.name = new_name
-    await sync_to_async(group.save)()
+    old_name = (await repo.group(group_id)).name
+    group = await repo.update_group(group_id, name=new_name)
+    catalog.invalidate_groups()
 
     await state.finish()
     await message.answer(f"✅ Guruh nomi o'zgartirildi: {old_name} → {new_name}")
@@ -415,12 +394,9 @@ async def group_link_finish(message: types.Message, state: FSMContext):
         await message.answer("❌ Noto'g'ri format. Guruh ID raqam bo'lishi kerak. Qaytadan yuboring yoki /cancel")
         return
 
-    from base_app.models import Group
-
     data = await state.get_data()
-    group = await sync_to_async(Group.objects.select_related('course').get)(id=data["edit_group_id"])
-    group.telegram_group_id = text
-    await sync_to_async(group.save)()
+    group = await repo.update_group(data["edit_group_id"], telegram_group_id=text)
+    catalog.invalidate_groups()
 
     await state.finish()
     await message.answer(f"✅ <b>{group.name}</b> Telegram guruhiga ulandi.", parse_mode="HTML")
@@ -446,13 +422,9 @@ async def group_edit_max_finish(message: types.Message, state: FSMContext):
         await message.answer("❌ Musbat raqam kiriting:")
         return
 
-    from base_app.models import Group
-
     data = await state.get_data()
-    group = await sync_to_async(Group.objects.select_related('course').get)(id=data["edit_group_id"])
-    group.max_students = int(text)
-    group.is_full = False
-    await sync_to_async(group.save)()
+    group = await repo.update_group(data["edit_group_id"], max_students=int(text), is_full=False)
+    catalog.invalidate_groups()
 
     await state.finish()
     await message.answer(f"✅ Sig'im yangilandi: {group.max_students}")
@@ -500,13 +472,11 @@ async def group_edit_score_max_finish(message: types.Message, state: FSMContext)
         await message.answer("❌ Faqat raqam yoki <code>-</code> yuboring:", parse_mode="HTML")
         return
 
-    from base_app.models import Group
-
     data = await state.get_data()
-    group = await sync_to_async(Group.objects.select_related('course').get)(id=data["edit_group_id"])
-    group.score_min = data.get("new_score_min")
-    group.score_max = score_max
-    await sync_to_async(group.save)()
+    group = await repo.update_group(
+        data["edit_group_id"], score_min=data.get("new_score_min"), score_max=score_max,
+    )
+    catalog.invalidate_groups()
 
     await state.finish()
     await message.answer(f"✅ Ball oralig'i yangilandi: {group.score_min if group.score_min is not None else '—'} – {group.score_max if group.score_max is not None else '—'}")
@@ -534,13 +504,10 @@ async def group_edit_role_finish(callback: types.CallbackQuery, state: FSMContex
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Group
-
     payload = callback.data[len("groupmgmt_setrole_"):]
     group_id_str, role = payload.split(":", 1)
-    group = await sync_to_async(Group.objects.select_related('course').get)(id=int(group_id_str))
-    group.target_role = role
-    await sync_to_async(group.save)()
+    group = await repo.update_group(int(group_id_str), target_role=role)
+    catalog.invalidate_groups()
 
     await callback.answer(f"✅ Rol o'zgartirildi: {TARGET_ROLE_LABELS[role]}")
     await _render_group_detail(callback.message, group)
@@ -552,11 +519,9 @@ async def group_delete_confirm(callback: types.CallbackQuery, state: FSMContext)
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Group
-
     group_id = int(callback.data.split("_")[-1])
-    group = await sync_to_async(Group.objects.get)(id=group_id)
-    count = await sync_to_async(group.enrolled_students.count)()
+    group = await repo.group(group_id)
+    count = group.student_count
 
     keyboard = InlineKeyboardMarkup(row_width=2)
     keyboard.add(
@@ -579,13 +544,9 @@ async def group_delete_execute(callback: types.CallbackQuery, state: FSMContext)
         await callback.answer("❌ Sizda bu huquq yo'q.", show_alert=True)
         return
 
-    from base_app.models import Group
-
     group_id = int(callback.data.split("_")[-1])
-    group = await sync_to_async(Group.objects.select_related('course').get)(id=group_id)
-    group_name = group.name
-
-    await sync_to_async(group.delete)()
+    group_name = await repo.delete_group(group_id)
+    catalog.invalidate_groups()
 
     await callback.message.edit_text(f"✅ <b>{group_name}</b> guruhi o'chirildi.", parse_mode="HTML")
     await callback.answer()
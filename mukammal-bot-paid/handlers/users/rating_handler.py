@@ -1,12 +1,13 @@
 """
 Reyting (tanga) handler: 🏆 Reyting tugmasi
 """
-import aiohttp
 from aiogram import types
 from aiogram.dispatcher import FSMContext
-from data.config import ADMINS, API_BASE_URL
+from data.config import ADMINS
+from utils.api_client import api
+from utils.catalog_cache import catalog
 from loader import dp, bot
-from asgiref.sync import sync_to_async
+from utils.db_api import repository as repo
 from filters.is_private import IsPrivate
 from handlers.users.admin_handlers import MONTH_NAMES_UZ
 
@@ -59,23 +60,13 @@ async def show_rating_menu(message: types.Message):
         await _show_admin_rating_menu(message)
         return
 
-    # Student kurslarini olish
-    from base_app.models import Student
-    try:
-        student = await sync_to_async(Student.objects.select_related().get)(telegram_id=str(telegram_id))
-    except Exception:
+    # Student kurslarini olish (bitta chaqiruvda)
+    student = await repo.student_profile(telegram_id)
+    if not student["exists"]:
         await message.answer("❌ Siz ro'yxatdan o'tmagansiz!")
         return
 
-    @sync_to_async
-    def get_courses(st):
-        courses = {}
-        for grp in st.groups.select_related('course').all():
-            if grp.course and grp.course.is_active:
-                courses[grp.course.id] = grp.course.name
-        return courses
-
-    courses = await get_courses(student)
+    courses = student["active_courses"]
 
     if not courses:
         await message.answer(
@@ -102,26 +93,22 @@ async def rating_course_selected(callback: types.CallbackQuery):
     course_id = int(callback.data.split("_")[2])
     telegram_id = str(callback.from_user.id)
 
-    from base_app.models import Course
-    try:
-        course = await sync_to_async(Course.objects.get)(id=course_id)
-        course_name = course.name
-    except Exception:
+    course = await catalog.course(course_id)
+    if course is None:
         await callback.answer("❌ Kurs topilmadi", show_alert=True)
         return
+    course_name = course.name
 
     await callback.answer()
     await _send_leaderboard(callback.message, course_id, course_name, telegram_id, edit=True)
 
 
 async def _send_leaderboard(message, course_id, course_name, telegram_id, edit=False):
-    async with aiohttp.ClientSession() as session:
-        url = f"{API_BASE_URL}/coins/leaderboard/?course_id={course_id}&telegram_id={telegram_id}"
-        async with session.get(url) as resp:
-            if resp.status != 200:
-                await message.answer("❌ Reyting ma'lumotlarini olishda xatolik!")
-                return
-            data = await resp.json()
+    async with api.coin_leaderboard(course_id, telegram_id) as resp:
+        if resp.status != 200:
+            await message.answer("❌ Reyting ma'lumotlarini olishda xatolik!")
+            return
+        data = await resp.json()
 
     text = _build_leaderboard_text(data, course_name)
     if edit:
@@ -135,14 +122,6 @@ async def _send_leaderboard(message, course_id, course_name, telegram_id, edit=F
 
 # ── Tangalarim ────────────────────────────────────────────────────────────
 
-async def _get_my_coin_months(telegram_id: str):
-    from base_app.models import CoinTransaction
-    qs = CoinTransaction.objects.filter(
-        wallet__student__telegram_id=telegram_id
-    ).dates('topic__activated_at', 'month', order='DESC')
-    return await sync_to_async(list)(qs)
-
-
 def _build_my_coins_kb(months: list) -> types.InlineKeyboardMarkup:
     kb = types.InlineKeyboardMarkup(row_width=2)
     kb.add(types.InlineKeyboardButton("📋 Barcha vaqt", callback_data="mycoins_all"))
@@ -154,36 +133,31 @@ def _build_my_coins_kb(months: list) -> types.InlineKeyboardMarkup:
     return kb
 
 
-async def _build_all_time_coins_text(telegram_id: str, full_name: str, wallets: list) -> str:
+def _build_all_time_coins_text(full_name: str, wallets: list) -> str:
     lines = [f"🪙 <b>Tangalarim — {full_name}</b>\n"]
 
-    # Har bir kurs uchun rank ham olamiz
-    async with aiohttp.ClientSession() as session:
-        for w in wallets:
-            url = f"{API_BASE_URL}/coins/leaderboard/?course_id={w['course_id']}&telegram_id={telegram_id}"
-            async with session.get(url) as resp2:
-                lb = await resp2.json() if resp2.status == 200 else {}
-
-            my_rank = lb.get("my_rank")
-            rank_text = f"#{my_rank}" if my_rank else "600+"
+    # O'rinlar /coins/my-ranks/ javobida har hamyon bilan birga keladi
+    for w in wallets:
+        my_rank = w.get("rank")
+        rank_text = f"#{my_rank}" if my_rank else "600+"
 
-            streak_bar = "🔥" * min(w["current_streak"], 10)
-            if w["current_streak"] > 10:
-                streak_bar += f"+{w['current_streak'] - 10}"
+        streak_bar = "🔥" * min(w["current_streak"], 10)
+        if w["current_streak"] > 10:
+            streak_bar += f"+{w['current_streak'] - 10}"
 
-            lines.append(
-                f"📚 <b>{w['course_name']}</b>\n"
-                f"  💰 Jami: <b>{w['total_coins']}</b> 🪙\n"
-                f"  🔥 Streak: <b>{w['current_streak']}</b>  |  Rekord: <b>{w['longest_streak']}</b>\n"
-                f"  {streak_bar}\n"
-                f"  📍 Reyting o'rni: <b>{rank_text}</b>"
-            )
+        lines.append(
+            f"📚 <b>{w['course_name']}</b>\n"
+            f"  💰 Jami: <b>{w['total_coins']}</b> 🪙\n"
+            f"  🔥 Streak: <b>{w['current_streak']}</b>  |  Rekord: <b>{w['longest_streak']}</b>\n"
+            f"  {streak_bar}\n"
+            f"  📍 Reyting o'rni: <b>{rank_text}</b>"
+        )
 
     return "\n\n".join(lines)
 
 
-async def _build_month_coins_text(
-    telegram_id: str, full_name: str, wallets: list, year: int, month: int,
+def _build_month_coins_text(
+    full_name: str, wallets: list, year: int, month: int,
     monthly_reset_enabled: bool = False,
 ) -> str:
     month_label = f"{MONTH_NAMES_UZ[month]} {year}"
@@ -195,26 +169,18 @@ async def _build_month_coins_text(
         )
 
     period_total = 0
-    async with aiohttp.ClientSession() as session:
-        for w in wallets:
-            period_coins = w.get("period_coins", 0)
-            period_total += period_coins
-
-            url = (
-                f"{API_BASE_URL}/coins/leaderboard/?course_id={w['course_id']}"
-                f"&telegram_id={telegram_id}&year={year}&month={month}"
-            )
-            async with session.get(url) as resp2:
-                lb = await resp2.json() if resp2.status == 200 else {}
+    for w in wallets:
+        period_coins = w.get("period_coins", 0)
+        period_total += period_coins
 
-            my_rank = lb.get("my_rank")
-            rank_text = f"#{my_rank}" if my_rank else "600+"
+        my_rank = w.get("rank")
+        rank_text = f"#{my_rank}" if my_rank else "600+"
 
-            lines.append(
-                f"📚 <b>{w['course_name']}</b>\n"
-                f"  💰 Shu oyda: <b>{period_coins}</b> 🪙\n"
-                f"  📍 Reyting o'rni (shu oy): <b>{rank_text}</b>"
-            )
+        lines.append(
+            f"📚 <b>{w['course_name']}</b>\n"
+            f"  💰 Shu oyda: <b>{period_coins}</b> 🪙\n"
+            f"  📍 Reyting o'rni (shu oy): <b>{rank_text}</b>"
+        )
 
     lines.append(f"\n💰 Jami (barcha kurslar): <b>{period_total}</b> 🪙")
     return "\n\n".join(lines)
@@ -224,15 +190,14 @@ async def _build_month_coins_text(
 async def show_my_coins(message: types.Message):
     telegram_id = str(message.from_user.id)
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/coins/my/?telegram_id={telegram_id}") as resp:
-            if resp.status == 404:
-                await message.answer("❌ Siz ro'yxatdan o'tmagansiz. /start ni bosing.")
-                return
-            elif resp.status != 200:
-                await message.answer("❌ Ma'lumot olishda xatolik.")
-                return
-            data = await resp.json()
+    async with api.my_coin_ranks(telegram_id) as resp:
+        if resp.status == 404:
+            await message.answer("❌ Siz ro'yxatdan o'tmagansiz. /start ni bosing.")
+            return
+        elif resp.status != 200:
+            await message.answer("❌ Ma'lumot olishda xatolik.")
+            return
+        data = await resp.json()
 
     wallets = data.get("wallets", [])
     full_name = data.get("full_name", "")
@@ -244,8 +209,8 @@ async def show_my_coins(message: types.Message):
         )
         return
 
-    text = await _build_all_time_coins_text(telegram_id, full_name, wallets)
-    months = await _get_my_coin_months(telegram_id)
+    text = _build_all_time_coins_text(full_name, wallets)
+    months = await repo.coin_months(telegram_id)
     await message.answer(text, parse_mode="HTML", reply_markup=_build_my_coins_kb(months))
 
 
@@ -254,17 +219,16 @@ async def mycoins_all_time(callback: types.CallbackQuery):
     telegram_id = str(callback.from_user.id)
     await callback.answer("⏳ Yuklanmoqda...")
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/coins/my/?telegram_id={telegram_id}") as resp:
-            if resp.status != 200:
-                await callback.message.answer("❌ Ma'lumot olishda xatolik.")
-                return
-            data = await resp.json()
+    async with api.my_coin_ranks(telegram_id) as resp:
+        if resp.status != 200:
+            await callback.message.answer("❌ Ma'lumot olishda xatolik.")
+            return
+        data = await resp.json()
 
     wallets = data.get("wallets", [])
     full_name = data.get("full_name", "")
-    text = await _build_all_time_coins_text(telegram_id, full_name, wallets)
-    months = await _get_my_coin_months(telegram_id)
+    text = _build_all_time_coins_text(full_name, wallets)
+    months = await repo.coin_months(telegram_id)
     try:
         await callback.message.edit_text(text, parse_mode="HTML", reply_markup=_build_my_coins_kb(months))
     except Exception:
@@ -278,19 +242,17 @@ async def mycoins_month_filter(callback: types.CallbackQuery):
     telegram_id = str(callback.from_user.id)
     await callback.answer("⏳ Yuklanmoqda...")
 
-    async with aiohttp.ClientSession() as session:
-        url = f"{API_BASE_URL}/coins/my/?telegram_id={telegram_id}&year={year}&month={month}"
-        async with session.get(url) as resp:
-            if resp.status != 200:
-                await callback.message.answer("❌ Ma'lumot olishda xatolik.")
-                return
-            data = await resp.json()
+    async with api.my_coin_ranks(telegram_id, year=year, month=month) as resp:
+        if resp.status != 200:
+            await callback.message.answer("❌ Ma'lumot olishda xatolik.")
+            return
+        data = await resp.json()
 
     wallets = data.get("wallets", [])
     full_name = data.get("full_name", "")
     monthly_reset_enabled = data.get("monthly_reset_enabled", False)
-    text = await _build_month_coins_text(telegram_id, full_name, wallets, year, month, monthly_reset_enabled)
-    months = await _get_my_coin_months(telegram_id)
+    text = _build_month_coins_text(full_name, wallets, year, month, monthly_reset_enabled)
+    months = await repo.coin_months(telegram_id)
     try:
         await callback.message.edit_text(text, parse_mode="HTML", reply_markup=_build_my_coins_kb(months))
     except Exception:
@@ -300,8 +262,7 @@ async def mycoins_month_filter(callback: types.CallbackQuery):
 # ── Admin reyting menyusi ──────────────────────────────────────────────────
 
 async def _show_admin_rating_menu(message: types.Message):
-    from base_app.models import Course
-    courses = await sync_to_async(list)(Course.objects.filter(is_active=True))
+    courses = await catalog.courses(active_only=True)
 
     kb = types.InlineKeyboardMarkup()
     for c in courses:
@@ -316,10 +277,8 @@ async def _show_admin_rating_menu(message: types.Message):
 async def adm_rating_course(callback: types.CallbackQuery):
     course_id = int(callback.data.split("_")[3])
 
-    from base_app.models import Course
-    try:
-        course = await sync_to_async(Course.objects.get)(id=course_id)
-    except Exception:
+    course = await catalog.course(course_id)
+    if course is None:
         await callback.answer("❌ Kurs topilmadi", show_alert=True)
         return
 
@@ -346,10 +305,8 @@ async def adm_rating_course(callback: types.CallbackQuery):
 async def adm_top_coins(callback: types.CallbackQuery):
     course_id = int(callback.data.split("_")[3])
     await callback.answer("⏳ Yuklanmoqda...")
-    async with aiohttp.ClientSession() as session:
-        url = f"{API_BASE_URL}/coins/admin-leaderboard/?course_id={course_id}&sort=coins"
-        async with session.get(url) as resp:
-            data = await resp.json()
+    async with api.admin_coin_leaderboard(course_id, sort="coins") as resp:
+        data = await resp.json()
     await _send_admin_top(callback.message, data, "🪙 Tanga bo'yicha Top 50", edit=True)
 
 
@@ -357,10 +314,8 @@ async def adm_top_coins(callback: types.CallbackQuery):
 async def adm_top_streak(callback: types.CallbackQuery):
     course_id = int(callback.data.split("_")[3])
     await callback.answer("⏳ Yuklanmoqda...")
-    async with aiohttp.ClientSession() as session:
-        url = f"{API_BASE_URL}/coins/admin-leaderboard/?course_id={course_id}&sort=streak"
-        async with session.get(url) as resp:
-            data = await resp.json()
+    async with api.admin_coin_leaderboard(course_id, sort="streak") as resp:
+        data = await resp.json()
     await _send_admin_top(callback.message, data, "🔥 Streak bo'yicha Top 50", edit=True)
 
 
@@ -392,17 +347,14 @@ async def adm_top_period_filter(message: types.Message, state: FSMContext):
     data = await state.get_data()
     course_id = data.get('rating_course_id')
 
-    async with aiohttp.ClientSession() as session:
-        url = (
-            f"{API_BASE_URL}/coins/admin-leaderboard/"
-            f"?course_id={course_id}&sort=coins&from={from_date}&to={to_date}"
-        )
-        async with session.get(url) as resp:
-            if resp.status != 200:
-                await message.answer("❌ Ma'lumot olishda xatolik!")
-                await state.finish()
-                return
-            result = await resp.json()
+    async with api.admin_coin_leaderboard(
+        course_id, sort="coins", **{"from": from_date, "to": to_date}
+    ) as resp:
+        if resp.status != 200:
+            await message.answer("❌ Ma'lumot olishda xatolik!")
+            await state.finish()
+            return
+        result = await resp.json()
 
     await _send_admin_top(
         message, result,
@@ -1,8 +1,8 @@
 from aiogram import types
-import aiohttp
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Text
-from data.config import ADMINS, API_BASE_URL
+from data.config import ADMINS
+from utils.api_client import api
 from loader import dp, bot
 from asgiref.sync import sync_to_async
 from utils.safe_send_message import safe_send_message
@@ -24,156 +24,145 @@ async def send_task_deprecated(message: types.Message):
     telegram_id = message.from_user.id
 
     # Studentni tekshirish
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/students/{telegram_id}/") as resp:
-            if resp.status != 200:
-                await message.answer("❌ Siz ro'yxatdan o'tmagansiz. /start ni bosing.")
-                return
-            student_data = await resp.json()
-            
-            # Birinchi guruhni olish (all_groups dan)
-            all_groups = student_data.get("all_groups", [])
-            group_id = all_groups[0]["id"] if all_groups else None
-            
-        # Guruh ma'lumotlarini olish
-        async with session.get(f"{API_BASE_URL}/groups/") as resp:
-            groups = await resp.json()
-            
-        group_obj = next((g for g in groups if g["id"] == group_id), None)
-        GENERAL_GROUP_ID = "-1003295943458"
+    async with api.get_student(telegram_id) as resp:
+        if resp.status != 200:
+            await message.answer("❌ Siz ro'yxatdan o'tmagansiz. /start ni bosing.")
+            return
+        student_data = await resp.json()
         
-        # Guruhlarga qo'shilganligini tekshirish
-        group_not_joined = False
-        general_not_joined = False
+        # Birinchi guruhni olish (all_groups dan)
+        all_groups = student_data.get("all_groups", [])
+        group_id = all_groups[0]["id"] if all_groups else None
         
-        # O'z guruhiga qo'shilganmi tekshirish
-        if group_obj and group_obj.get("telegram_group_id"):
-            try:
-                group_member = await bot.get_chat_member(group_obj.get("telegram_group_id"), telegram_id)
-                if group_member.status in ["left", "kicked"]:
-                    group_not_joined = True
-            except Exception as e:
-                # Guruhni tekshira olmasa, link beramiz (bot admin emas)
-                print(f"⚠️ O'z guruhini tekshirib bo'lmadi (bot admin emasligidan): {e}")
-                # Guruh linki bormi tekshirish, agar bor bo'lsa beramiz
-                group_not_joined = bool(group_obj.get("invite_link"))
-        else:
-            # telegram_group_id bo'sh bo'lsa, link bermaslik
-            group_not_joined = False
-            
-        # Umumiy guruh uchun tekshiruvni qayta yoqish
+    # Guruh ma'lumotlarini olish
+    async with api.list_groups() as resp:
+        groups = await resp.json()
+        
+    group_obj = next((g for g in groups if g["id"] == group_id), None)
+    GENERAL_GROUP_ID = "-1003295943458"
+    
+    # Guruhlarga qo'shilganligini tekshirish
+    group_not_joined = False
+    general_not_joined = False
+    
+    # O'z guruhiga qo'shilganmi tekshirish
+    if group_obj and group_obj.get("telegram_group_id"):
         try:
-            # Umumiy guruhga qo'shilganmi
-            general_member = await bot.get_chat_member(GENERAL_GROUP_ID, telegram_id)
-            if general_member.status in ["left", "kicked"]:
-                general_not_joined = True
+            group_member = await bot.get_chat_member(group_obj.get("telegram_group_id"), telegram_id)
+            if group_member.status in ["left", "kicked"]:
+                group_not_joined = True
         except Exception as e:
-            # Umumiy guruhga qo'shilmagan
-            print(f"⚠️ Umumiy guruhni tekshirib bo'lmadi: {e}")
+            # Guruhni tekshira olmasa, link beramiz (bot admin emas)
+            print(f"⚠️ O'z guruhini tekshirib bo'lmadi (bot admin emasligidan): {e}")
+            # Guruh linki bormi tekshirish, agar bor bo'lsa beramiz
+            group_not_joined = bool(group_obj.get("invite_link"))
+    else:
+        # telegram_group_id bo'sh bo'lsa, link bermaslik
+        group_not_joined = False
+        
+    # Umumiy guruh uchun tekshiruvni qayta yoqish
+    try:
+        # Umumiy guruhga qo'shilganmi
+        general_member = await bot.get_chat_member(GENERAL_GROUP_ID, telegram_id)
+        if general_member.status in ["left", "kicked"]:
             general_not_joined = True
+    except Exception as e:
+        # Umumiy guruhga qo'shilmagan
+        print(f"⚠️ Umumiy guruhni tekshirib bo'lmadi: {e}")
+        general_not_joined = True
+    
+    # Agar qo'shilmagan bo'lsa, yangi 1 martalik linklar yaratamiz
+    if group_not_joined or general_not_joined:
+        msg = "❌ Siz quyidagi guruhlarga qo'shilmagansiz:\n\n"
         
-        # Agar qo'shilmagan bo'lsa, yangi 1 martalik linklar yaratamiz
-        if group_not_joined or general_not_joined:
-            msg = "❌ Siz quyidagi guruhlarga qo'shilmagansiz:\n\n"
-            
-            if group_not_joined and group_obj and group_obj.get("telegram_group_id"):
-                try:
-                    # Avval guruh a'zolari sonini tekshiramiz
-                    chat_members_count = await bot.get_chat_member_count(group_obj.get("telegram_group_id"))
-                    admins = await bot.get_chat_administrators(group_obj.get("telegram_group_id"))
-                    admin_count = len(admins)
-                    regular_members = chat_members_count - admin_count
-                    
-                    print(f"📊 Guruh '{group_obj.get('name')}' statistikasi: Jami={chat_members_count}, Adminlar={admin_count}, Oddiy a'zolar={regular_members}")
+        if group_not_joined and group_obj and group_obj.get("telegram_group_id"):
+            try:
+                # Avval guruh a'zolari sonini tekshiramiz
+                chat_members_count = await bot.get_chat_member_count(group_obj.get("telegram_group_id"))
+                admins = await bot.get_chat_administrators(group_obj.get("telegram_group_id"))
+                admin_count = len(admins)
+                regular_members = chat_members_count - admin_count
+                
+                print(f"📊 Guruh '{group_obj.get('name')}' statistikasi: Jami={chat_members_count}, Adminlar={admin_count}, Oddiy a'zolar={regular_members}")
+                
+                # Agar 50 dan oshgan bo'lsa, keyingi guruhni topamiz
+                if regular_members >= 50:
+                    print(f"⚠️ Guruh to'lgan ({regular_members}/50), keyingi guruhni qidiryapmiz...")
+                    msg += f"⚠️ Guruh '{group_obj.get('name')}' to'lgan ({regular_members}/50)!\n\n"
                     
-                    # Agar 50 dan oshgan bo'lsa, keyingi guruhni topamiz
-                    if regular_members >= 50:
-                        print(f"⚠️ Guruh to'lgan ({regular_members}/50), keyingi guruhni qidiryapmiz...")
-                        msg += f"⚠️ Guruh '{group_obj.get('name')}' to'lgan ({regular_members}/50)!\n\n"
-                        
-                        # Barcha guruhlarni tekshirib, bo'sh guruhni topamiz
-                        next_group = None
-                        for grp in groups:
-                            if grp["id"] != group_obj["id"] and grp.get("telegram_group_id"):
-                                try:
-                                    grp_count = await bot.get_chat_member_count(grp["telegram_group_id"])
-                                    grp_admins = await bot.get_chat_administrators(grp["telegram_group_id"])
-                                    grp_regular = grp_count - len(grp_admins)
-                                    
-                                    print(f"  Guruh '{grp['name']}': {grp_regular}/50")
-                                    
-                                    if grp_regular < 50:
-                                        next_group = grp
-                                        print(f"✅ Bo'sh guruh topildi: {grp['name']}")
-                                        break
-                                except Exception as e:
-                                    print(f"  Guruh '{grp['name']}' tekshiruvida xatolik: {e}")
-                                    continue
-                        
-                        if next_group:
-                            # Keyingi guruhga link beramiz
+                    # Barcha guruhlarni tekshirib, bo'sh guruhni topamiz
+                    next_group = None
+                    for grp in groups:
+                        if grp["id"] != group_obj["id"] and grp.get("telegram_group_id"):
                             try:
-                                next_invite = await bot.create_chat_invite_link(
-                                    chat_id=next_group["telegram_group_id"],
-                                    member_limit=1
-                                )
-                                msg += f"✅ Bo'sh guruh topildi: '{next_group['name']}'\n"
-                                msg += f"🔹 Yangi guruh linki: {next_invite.invite_link}\n"
-                                msg += f"   (Ushbu guruhga o'tib, vazifa yuborishingiz mumkin)\n\n"
+                                grp_count = await bot.get_chat_member_count(grp["telegram_group_id"])
+                                grp_admins = await bot.get_chat_administrators(grp["telegram_group_id"])
+                                grp_regular = grp_count - len(grp_admins)
+                                
+                                print(f"  Guruh '{grp['name']}': {grp_regular}/50")
+                                
+                                if grp_regular < 50:
+                                    next_group = grp
+                                    print(f"✅ Bo'sh guruh topildi: {grp['name']}")
+                                    break
                             except Exception as e:
-                                print(f"Keyingi guruh uchun link yaratishda xatolik: {e}")
-                                msg += f"❌ Keyingi guruh uchun link yaratib bo'lmadi.\n\n"
-                        else:
-                            msg += f"❌ Barcha guruhlar to'lgan! Admin bilan bog'laning.\n\n"
-                    else:
-                        # Guruh to'lmagan bo'lsa, 1 martalik link yaratamiz
-                        group_invite = await bot.create_chat_invite_link(
-                            chat_id=group_obj.get("telegram_group_id"),
-                            member_limit=1
-                        )
-                        msg += f"🔹 O'z guruhingiz ({regular_members}/50): {group_invite.invite_link}\n"
-                except Exception as e:
-                    print(f"O'z guruhi uchun link yaratishda xatolik (chat_id={group_obj.get('telegram_group_id')}): {e}")
-                    if group_obj.get("invite_link"):
-                        msg += f"🔹 O'z guruhingiz: {group_obj.get('invite_link')}\n"
+                                print(f"  Guruh '{grp['name']}' tekshiruvida xatolik: {e}")
+                                continue
+                    
+                    if next_group:
+                        # Keyingi guruhga link beramiz
+                        try:
+                            next_invite = await bot.create_chat_invite_link(
+                                chat_id=next_group["telegram_group_id"],
+                                member_limit=1
+                            )
+                            msg += f"✅ Bo'sh guruh topildi: '{next_group['name']}'\n"
+                            msg += f"🔹 Yangi guruh linki: {next_invite.invite_link}\n"
+                            msg += f"   (Ushbu guruhga o'tib, vazifa yuborishingiz mumkin)\n\n"
+                        except Exception as e:
+                            print(f"Keyingi guruh uchun link yaratishda xatolik: {e}")
+                            msg += f"❌ Keyingi guruh uchun link yaratib bo'lmadi.\n\n"
                     else:
-                        print(f"⚠️ Guruh {group_obj.get('name')} uchun zaxira link ham yo'q!")
-            elif group_not_joined and group_obj:
-                # telegram_group_id bo'sh, lekin eski link bor bo'lsa
-                if group_obj.get("invite_link"):
-                    msg += f"🔹 O'z guruhingiz: {group_obj.get('invite_link')}\n"
-            
-            if general_not_joined:
-                try:
-                    # Yangi 1 martalik link yaratish
-                    general_invite = await bot.create_chat_invite_link(
-                        chat_id=GENERAL_GROUP_ID,
+                        msg += f"❌ Barcha guruhlar to'lgan! Admin bilan bog'laning.\n\n"
+                else:
+                    # Guruh to'lmagan bo'lsa, 1 martalik link yaratamiz
+                    group_invite = await bot.create_chat_invite_link(
+                        chat_id=group_obj.get("telegram_group_id"),
                         member_limit=1
                     )
-                    msg += f"🔹 Umumiy guruh: {general_invite.invite_link}\n"
-                except Exception as e:
-                    print(f"❌ XATOLIK: Umumiy guruh linki yaratib bo'lmadi (chat_id={GENERAL_GROUP_ID}): {e}")
-                    msg += f"❌ Umumiy guruh linki yaratib bo'lmadi. Admin bilan bog'laning.\n"
-            
-            msg += "\n⚠️ Har bir link FAQAT 1 MARTA ishlatiladi!\n"
-            msg += "⚠️ Iltimos, guruhlarga qo'shiling va qayta urinib ko'ring."
-            
-            await message.answer(msg)
-            return
-
-    async with aiohttp.ClientSession() as session:
-        # 1️⃣ Barcha mavzular
-        async with session.get(f"{API_BASE_URL}/topics/") as resp:
-            topics = await resp.json()
-
-        # 2️⃣ Student yuborgan vazifalar
-        async with session.get(f"{API_BASE_URL}/tasks/?student_id={telegram_id}") as resp:
-            submitted_tasks = await resp.json()
-
-    submitted_topic_ids = {task["topic"]["id"] for task in submitted_tasks}
+                    msg += f"🔹 O'z guruhingiz ({regular_members}/50): {group_invite.invite_link}\n"
+            except Exception as e:
+                print(f"O'z guruhi uchun link yaratishda xatolik (chat_id={group_obj.get('telegram_group_id')}): {e}")
+                if group_obj.get("invite_link"):
+                    msg += f"🔹 O'z guruhingiz: {group_obj.get('invite_link')}\n"
+                else:
+                    print(f"⚠️ Guruh {group_obj.get('name')} uchun zaxira link ham yo'q!")
+        elif group_not_joined and group_obj:
+            # telegram_group_id bo'sh, lekin eski link bor bo'lsa
+            if group_obj.get("invite_link"):
+                msg += f"🔹 O'z guruhingiz: {group_obj.get('invite_link')}\n"
+        
+        if general_not_joined:
+            try:
+                # Yangi 1 martalik link yaratish
+                general_invite = await bot.create_chat_invite_link(
+                    chat_id=GENERAL_GROUP_ID,
+                    member_limit=1
+                )
+                msg += f"🔹 Umumiy guruh: {general_invite.invite_link}\n"
+            except Exception as e:
+                print(f"❌ XATOLIK: Umumiy guruh linki yaratib bo'lmadi (chat_id={GENERAL_GROUP_ID}): {e}")
+                msg += f"❌ Umumiy guruh linki yaratib bo'lmadi. Admin bilan bog'laning.\n"
+        
+        msg += "\n⚠️ Har bir link FAQAT 1 MARTA ishlatiladi!\n"
+        msg += "⚠️ Iltimos, guruhlarga qo'shiling va qayta urinib ko'ring."
+        
+        await message.answer(msg)
+        return
 
-    # 3️⃣ Faqat yubormagan mavzularni filter qilamiz
-    available_topics = [t for t in topics if t["id"] not in submitted_topic_ids]
+    # Faqat yubormagan faol mavzular (server hisoblaydi)
+    pending = await api.pending_topics(telegram_id)
+    available_topics = pending["topics"] if pending else []
 
     if not available_topics:
         await message.answer("✅ Siz barcha mavzular uchun vazifa yuborgansiz!")
@@ -216,45 +205,44 @@ async def process_file(message: types.Message, state: FSMContext):
         "file_link": file_id
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{API_BASE_URL}/tasks/submit/", json=payload) as resp:
-            if resp.status == 201:
-                data = await resp.json()
-                task_id = data["id"]
-                student_name = data["student"]["full_name"]
-                
-                # Birinchi guruhni olish
-                all_groups = data["student"].get("all_groups", [])
-                group_name = all_groups[0]["name"] if all_groups else "N/A"
-                
-                topic_title = data["topic"]["title"]
-
-                # ✅ Studenta javob
-                await message.answer("✅ Vazifangiz yuborildi!", reply_markup=vazifa_key)
-
-                # ✅ Admin uchun inline keyboard
-                kb = InlineKeyboardMarkup(row_width=3)
-                kb.add(
-                    InlineKeyboardButton("3️⃣", callback_data=f"grade_{task_id}_3"),
-                    InlineKeyboardButton("4️⃣", callback_data=f"grade_{task_id}_4"),
-                    InlineKeyboardButton("5️⃣", callback_data=f"grade_{task_id}_5"),
-                )
-
-                caption = (
-                    f"📥 Yangi vazifa!\n\n"
-                    f"👤 Student: {student_name}\n"
-                    f"👥 Guruh: {group_name}\n"
-                    f"📚 Mavzu: {topic_title}\n"
-                )
+    async with api.submit_task(payload) as resp:
+        if resp.status == 201:
+            data = await resp.json()
+            task_id = data["id"]
+            student_name = data["student"]["full_name"]
+            
+            # Birinchi guruhni olish
+            all_groups = data["student"].get("all_groups", [])
+            group_name = all_groups[0]["name"] if all_groups else "N/A"
+            
+            topic_title = data["topic"]["title"]
+
+            # ✅ Studenta javob
+            await message.answer("✅ Vazifangiz yuborildi!", reply_markup=vazifa_key)
+
+            # ✅ Admin uchun inline keyboard
+            kb = InlineKeyboardMarkup(row_width=3)
+            kb.add(
+                InlineKeyboardButton("3️⃣", callback_data=f"grade_{task_id}_3"),
+                InlineKeyboardButton("4️⃣", callback_data=f"grade_{task_id}_4"),
+                InlineKeyboardButton("5️⃣", callback_data=f"grade_{task_id}_5"),
+            )
+
+            caption = (
+                f"📥 Yangi vazifa!\n\n"
+                f"👤 Student: {student_name}\n"
+                f"👥 Guruh: {group_name}\n"
+                f"📚 Mavzu: {topic_title}\n"
+            )
 
     
-                if file_type == "document":
-                    await bot.send_document(ADMINS[0], file_id, caption=caption, reply_markup=kb)
-                else:
-                    await bot.send_photo(ADMINS[0], file_id, caption=caption, reply_markup=kb)
-
+            if file_type == "document":
+                await bot.send_document(ADMINS[0], file_id, caption=caption, reply_markup=kb)
             else:
-                await message.answer("❌ Vazifa yuborishda xatolik bo‘ldi.")
+                await bot.send_photo(ADMINS[0], file_id, caption=caption, reply_markup=kb)
+
+        else:
+            await message.answer("❌ Vazifa yuborishda xatolik bo‘ldi.")
 
     await state.finish()
     
@@ -266,70 +254,68 @@ async def set_grade(callback: types.CallbackQuery):
     _, task_id, grade = callback.data.split("_")
     payload = {"grade": int(grade)}
 
-    async with aiohttp.ClientSession() as session:
-        async with session.patch(f"{API_BASE_URL}/tasks/{task_id}/", json=payload) as resp:
-            if resp.status == 200:
-                task = await resp.json()
-                student_id = task["student"]["telegram_id"]
-                student_name = task["student"]["full_name"]
-                
-                # Birinchi guruhni olish
-                all_groups = task["student"].get("all_groups", [])
-                group_name = all_groups[0]["name"] if all_groups else "N/A"
-                
-                topic_title = task["topic"]["title"]
-
-                # ✅ Studentga yuborish
-                await safe_send_message(
-                    student_id,
-                    f"📊 Sizning vazifangiz {grade} bahoga baholandi ✅"
-                )
+    async with api.update_task(task_id, payload) as resp:
+        if resp.status == 200:
+            task = await resp.json()
+            student_id = task["student"]["telegram_id"]
+            student_name = task["student"]["full_name"]
+            
+            # Birinchi guruhni olish
+            all_groups = task["student"].get("all_groups", [])
+            group_name = all_groups[0]["name"] if all_groups else "N/A"
+            
+            topic_title = task["topic"]["title"]
+
+            # ✅ Studentga yuborish
+            await safe_send_message(
+                student_id,
+                f"📊 Sizning vazifangiz {grade} bahoga baholandi ✅"
+            )
+
+            # ✅ Admin tarafida captionni yangilash
+            new_caption = (
+                f"📥 Vazifa baholandi!\n\n"
+                f"👤 Student: {student_name}\n"
+                f"👥 Guruh: {group_name}\n"
+                f"📚 Mavzu: {topic_title}\n"
+                f"📊 Baho: {grade} ✅"
+            )
 
-                # ✅ Admin tarafida captionni yangilash
-                new_caption = (
-                    f"📥 Vazifa baholandi!\n\n"
-                    f"👤 Student: {student_name}\n"
-                    f"👥 Guruh: {group_name}\n"
-                    f"📚 Mavzu: {topic_title}\n"
-                    f"📊 Baho: {grade} ✅"
+            try:
+                await callback.message.edit_caption(
+                    caption=new_caption,
+                    reply_markup=None  # baholash tugmalari olib tashlanadi
                 )
+            except Exception as e:
+                print("❌ Caption o‘zgartirishda xato:", e)
 
-                try:
-                    await callback.message.edit_caption(
-                        caption=new_caption,
-                        reply_markup=None  # baholash tugmalari olib tashlanadi
-                    )
-                except Exception as e:
-                    print("❌ Caption o‘zgartirishda xato:", e)
-
-                await callback.answer("✅ Baho qo‘yildi", show_alert=True)
+            await callback.answer("✅ Baho qo‘yildi", show_alert=True)
 
-            else:
-                await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
+        else:
+            await callback.answer("❌ Xatolik yuz berdi", show_alert=True)
 
 # --- Haftalik report ---
 async def send_weekly_reports():
-    async with aiohttp.ClientSession() as session:
-        # Guruhlarni olib kelamiz
-        async with session.get(f"{API_BASE_URL}/groups/") as resp:
-            groups = await resp.json()
-        for g in groups:
-            chat_id = g.get("telegram_group_id")
-            group_id = g["id"]
-
-            if not chat_id:
-                continue  # telegram_group_id yo‘q bo‘lsa tashlab ketamiz
-
-            # PDF reportni olib kelamiz
-            async with session.get(f"{API_BASE_URL}/reports/{group_id}/weekly/pdf/") as resp:
-                if resp.status == 200:
-                    pdf_bytes = await resp.read()
-                    await bot.send_document(
-                        chat_id,
-                        ("weekly_report.pdf", pdf_bytes),
-                        caption=f"📊 {g['name']} guruhining haftalik hisobot"
-                    )
-                # 404 yoki xatolik bo'lsa, guruhga hech narsa yubormaymiz
+    # Guruhlarni olib kelamiz
+    async with api.list_groups() as resp:
+        groups = await resp.json()
+    for g in groups:
+        chat_id = g.get("telegram_group_id")
+        group_id = g["id"]
+
+        if not chat_id:
+            continue  # telegram_group_id yo‘q bo‘lsa tashlab ketamiz
+
+        # PDF reportni olib kelamiz
+        async with api.weekly_report_pdf(group_id) as resp:
+            if resp.status == 200:
+                pdf_bytes = await resp.read()
+                await bot.send_document(
+                    chat_id,
+                    ("weekly_report.pdf", pdf_bytes),
+                    caption=f"📊 {g['name']} guruhining haftalik hisobot"
+                )
+            # 404 yoki xatolik bo'lsa, guruhga hech narsa yubormaymiz
                     
 
 #--- Vazifa topshirmaganlarga eslatma ---
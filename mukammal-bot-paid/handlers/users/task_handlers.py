@@ -3,12 +3,14 @@ Task submission handlers: task sending, topic selection, file upload
 Single group with approval link (200 user limit, excluding admins/owners/bots)
 """
 from aiogram import types
-import aiohttp
-import re
 import json
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Text, Command
-from data.config import ADMINS, API_BASE_URL, MILLIY_ADMIN, ATTESTATSIYA_ADMIN
+from data.config import ADMINS, MILLIY_ADMIN, ATTESTATSIYA_ADMIN
+from utils.api_client import api
+from utils.catalog_cache import catalog
+from utils.db_api import repository as repo
+from base_app.grading import get_answer_key, parse_answers
 from loader import dp, bot
 from states.task_state import TaskState
 from keyboards.default.vazifa_keyboard import build_vazifa_keyboard
@@ -46,62 +48,37 @@ async def _ask_course_type(message: types.Message, state: FSMContext, task_name:
         await message.answer(guard_msg)
         return
 
-    # Studentni tekshirish
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/students/{telegram_id}/") as resp:
-            if resp.status != 200:
-                await message.answer(
-                    "❌ Siz ro'yxatdan o'tmagansiz!\n\n"
-                    "📝 /start ni bosib ro'yxatdan o'ting."
-                )
-                return
-            student_data = await resp.json()
-            
-            # ✨ YANGI: Studentning barcha guruhlarini olamiz
-            from base_app.models import Student
-            from asgiref.sync import sync_to_async
-            
-            @sync_to_async
-            def get_student_groups_and_courses(telegram_id):
-                """Student guruh va kurslarini olish (async-safe)"""
-                student_obj = Student.objects.get(telegram_id=telegram_id)
-                if student_obj.is_blocked:
-                    return 'blocked', None
-                all_groups = student_obj.get_all_groups()
-
-                if not all_groups:
-                    return None, None
+    # Studentni tekshirish — profil, guruhlar va kurslar bitta chaqiruvda
+    student = await repo.student_profile(telegram_id)
+    if not student["exists"]:
+        await message.answer(
+            "❌ Siz ro'yxatdan o'tmagansiz!\n\n"
+            "📝 /start ni bosib ro'yxatdan o'ting."
+        )
+        return
 
-                student_courses = set()
-                for grp in all_groups:
-                    if grp.course and grp.course.is_active:
-                        student_courses.add(grp.course.code)
+    if student["is_blocked"]:
+        await message.answer(
+            "🚫 Sizning akkauntingiz bloklangan.\n\n"
+            "Qo'shimcha ma'lumot uchun admin bilan bog'laning."
+        )
+        return
 
-                return list(all_groups), list(student_courses)
+    all_groups = student["groups"]
+    if not all_groups:
+        await message.answer(
+            "❌ Sizga guruh biriktirilmagan!\n\n"
+            "📝 /start ni bosib qayta ro'yxatdan o'ting."
+        )
+        return
 
-            all_groups, student_courses = await get_student_groups_and_courses(telegram_id)
+    student_courses = list({g["course_code"] for g in all_groups if g["course_active"]})
+    if not student_courses:
+        await message.answer("❌ Sizning kurs turi aniqlanmadi!")
+        return
 
-            if all_groups == 'blocked':
-                await message.answer(
-                    "🚫 Sizning akkauntingiz bloklangan.\n\n"
-                    "Qo'shimcha ma'lumot uchun admin bilan bog'laning."
-                )
-                return
-            
-            if all_groups is None:
-                await message.answer(
-                    "❌ Sizga guruh biriktirilmagan!\n\n"
-                    "📝 /start ni bosib qayta ro'yxatdan o'ting."
-                )
-                return
-            
-            if not student_courses:
-                await message.answer("❌ Sizning kurs turi aniqlanmadi!")
-                return
-    
     # Student ma'lumotlarini saqla va davom et
     await state.update_data(
-        student_data=student_data,
         student_courses=student_courses,  # Ko'p kurs
         all_groups=all_groups
     )
@@ -114,24 +91,22 @@ async def _check_group_and_send_topics(message: types.Message, state: FSMContext
     telegram_id = message.from_user.id
     data = await state.get_data()
     
-    student_data = data.get("student_data", {})
     all_groups = data.get("all_groups", [])
-    student_courses = data.get("student_courses", [])
     
     # ✨ YANGI: Har bir guruhga qo'shilganligini tekshirish
     not_joined_groups = []
     kicked_from_groups = []
     
     for group_obj in all_groups:
-        if not group_obj.telegram_group_id:
+        if not group_obj["telegram_group_id"]:
             continue
             
         try:
             bot_info = await bot.get_me()
-            bot_member = await bot.get_chat_member(group_obj.telegram_group_id, bot_info.id)
+            bot_member = await bot.get_chat_member(group_obj["telegram_group_id"], bot_info.id)
             
             if bot_member.status in ["administrator", "creator"]:
-                group_member = await bot.get_chat_member(group_obj.telegram_group_id, telegram_id)
+                group_member = await bot.get_chat_member(group_obj["telegram_group_id"], telegram_id)
                 
                 if group_member.status == "kicked":
                     kicked_from_groups.append(group_obj)
@@ -140,7 +115,7 @@ async def _check_group_and_send_topics(message: types.Message, state: FSMContext
             else:
                 not_joined_groups.append(group_obj)
         except Exception as e:
-            print(f"❌ Guruh {group_obj.name} membership tekshiruvida xatolik: {e}")
+            print(f"❌ Guruh {group_obj['name']} membership tekshiruvida xatolik: {e}")
             not_joined_groups.append(group_obj)
     
     # Agar hech bo'lmasa bitta guruhga qo'shilmagan bo'lsa
@@ -148,15 +123,15 @@ async def _check_group_and_send_topics(message: types.Message, state: FSMContext
         msg = "⚠️ Siz ba'zi guruhlarga qo'shilmagansiz:\n\n"
         
         for grp in not_joined_groups:
-            msg += f"❌ {grp.name}"
-            if grp.invite_link:
-                msg += f"\n   🔗 {grp.invite_link}"
+            msg += f"❌ {grp['name']}"
+            if grp["invite_link"]:
+                msg += f"\n   🔗 {grp['invite_link']}"
             msg += "\n"
         
         if kicked_from_groups:
             msg += "\n🚫 Quyidagi guruhlardan chiqarilgansiz:\n"
             for grp in kicked_from_groups:
-                msg += f"   • {grp.name}\n"
+                msg += f"   • {grp['name']}\n"
             msg += "\n📞 Admin bilan bog'lanib, qayta qo'shilishni so'rang.\n"
             
             # Adminlarga xabar
@@ -168,7 +143,7 @@ async def _check_group_and_send_topics(message: types.Message, state: FSMContext
                 f"🔗 Guruhlar:\n"
             )
             for grp in kicked_from_groups:
-                admin_msg += f"   • {grp.name}\n"
+                admin_msg += f"   • {grp['name']}\n"
             admin_msg += "\n⚠️ Iltimos, userni guruhlarga qayta qo'shing (unban + invite)."
             
             for admin_id in ADMINS:
@@ -181,53 +156,29 @@ async def _check_group_and_send_topics(message: types.Message, state: FSMContext
         await message.answer(msg)
         return
     
-    # 1️⃣ Mavzularni olish (barcha kurslar uchun)
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/topics/?student_id={telegram_id}") as resp:
-            active_topics = await resp.json()
-        if not active_topics:
-            await message.answer(f"❌ Hozirda siz uchun active mavzu yo'q!")
-            return
-
-        # 2️⃣ Student yuborgan vazifalar
-        async with session.get(f"{API_BASE_URL}/tasks/?student_id={telegram_id}") as resp:
-            submitted_tasks = await resp.json()
-    
     # Hozirgi vazifa turini olamiz
     task_type = data.get("task_type", "test")
 
-    # 3️⃣ Faqat shu task_type uchun yuborilgan mavzularni filter qilamiz
-    # ✨ YANGI: Barcha kurslar uchun
-    submitted_topic_ids = {
-        task["topic"]["id"] 
-        for task in submitted_tasks 
-        if task.get("task_type") == task_type
-    }
-
-    # 4️⃣ Faqat yubormagan active mavzularni filter qilamiz (barcha kurslar uchun)
-    available_topics = []
-    for t in active_topics:
-        if t["id"] in submitted_topic_ids:
-            continue
-        
-        # Mavzuning kursini aniqlaymiz
-        topic_course_code = t["course"]["code"] if t.get("course") else None
-        
-        # Agar topic student kurslarida bo'lsa, qo'shamiz
-        if topic_course_code in student_courses:
-            available_topics.append(t)
+    # Student kurslaridagi, shu task_type bo'yicha hali yuborilmagan faol mavzular (server hisoblaydi)
+    pending = await api.pending_topics(telegram_id, task_type)
+    if pending is None:
+        await message.answer("❌ Mavzularni olishda xatolik. Qayta urinib ko'ring.")
+        return
 
+    available_topics = pending["topics"]
     if not available_topics:
         task_name_lower = "test" if task_type == "test" else "maxsus topshiriq"
         await message.answer(f"✅ Siz barcha active mavzular uchun {task_name_lower} yuborgansiz!")
         return
 
     # ✨ YANGI: Kurs bo'yicha grouping qilamiz
+    courses = {c["id"]: c for c in pending["courses"]}
     topics_by_course = {}
     for t in available_topics:
-        course_code = t["course"]["code"] if t.get("course") else None
-        course_name = t.get("course", {}).get("name") if t.get("course") else ("Milliy Sertifikat" if course_code == "milliy_sert" else "Attestatsiya")
-        
+        course = courses.get(t["course_id"], {})
+        course_code = course.get("code")
+        course_name = course.get("name") or ("Milliy Sertifikat" if course_code == "milliy_sert" else "Attestatsiya")
+
         if course_code not in topics_by_course:
             topics_by_course[course_code] = {
                 "name": course_name,
@@ -265,18 +216,15 @@ async def process_topic(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     task_type = data.get("task_type", "test")
     
-    # Topic dan correct_answers borligini tekshirish
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/topics/{topic_id}/") as resp:
-            if resp.status != 200:
-                await callback.message.answer("❌ Mavzu topilmadi!")
-                await callback.answer()
-                return
-            
-            topic = await resp.json()
-            
-            # Mavzuning turi (correct_answers bor bo'lsa test, yo'q bo'lsa maxsus topshiriq)
-            topic_has_answers = bool(topic.get('correct_answers'))
+    # Topic dan correct_answers borligini tekshirish (katalog keshidan)
+    topic = await catalog.get_topic(topic_id)
+    if topic is None:
+        await callback.message.answer("❌ Mavzu topilmadi!")
+        await callback.answer()
+        return
+
+    # Mavzuning turi (correct_answers bor bo'lsa test, yo'q bo'lsa maxsus topshiriq)
+    topic_has_answers = bool(topic.get('correct_answers'))
     
     # Agar user test yubormoqchi, lekin mavzu maxsus topshiriq uchun (correct_answers yo'q)
     if task_type == "test" and not topic_has_answers:
@@ -368,15 +316,12 @@ async def process_test_answers(message: types.Message, state: FSMContext):
         )
         return
     
-    # Topic dan to'g'ri javoblarni olish
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/topics/{topic_id}/") as resp_topics:
-            if resp_topics.status != 200:
-                await message.answer("❌ Mavzu topilmadi!")
-                return
-            
-            current_topic = await resp_topics.json()
-            correct_answers = current_topic.get('correct_answers') or {}
+    # Topic dan to'g'ri javoblarni olish (katalog keshidan)
+    current_topic = await catalog.get_topic(topic_id)
+    if current_topic is None:
+        await message.answer("❌ Mavzu topilmadi!")
+        return
+    correct_answers = current_topic.get('correct_answers') or {}
     
     # ✨ YANGI: Agar correct_answers mavjud bo'lsa, test kodi tekshiriladi
     if correct_answers:
@@ -398,57 +343,15 @@ async def process_test_answers(message: types.Message, state: FSMContext):
     
     # Test javoblarini tekshirish
     if correct_answers and test_code in correct_answers:
-        import re
-        
-        correct = correct_answers[test_code].lower().strip()
-        user_answer = test_answers.lower().strip()
-        
-        # Parse admin correct answers (supports multi-correct: 1ab2x3abcd)
-        correct_answers_list = []
-        
-        # Raqam bor-yo'qligini tekshirish
-        has_numbers = bool(re.search(r'\d', correct))
-        
-        if has_numbers:
-            # Format 2: 1a2b3c or 1ab2x3abcd -> [[a], [b], [c]] or [[a,b], [x], [a,b,c,d]]
-            for match in re.finditer(r'\d+([a-zx]+)', correct):
-                answers = match.group(1)
-                if answers == 'x':
-                    correct_answers_list.append(['x'])
-                else:
-                    correct_answers_list.append(list(answers))
-        elif re.match(r'^[a-zx]+$', correct):
-            # Format 1: abc -> [[a], [b], [c]]
-            correct_answers_list = [[ch] for ch in correct]
-        else:
-            # Noma'lum format - barcha kichik harflarni olamiz
-            filtered = ''.join(ch for ch in correct if ch.isalpha() or ch == 'x')
-            correct_answers_list = [[ch] for ch in filtered]
-        
-        # Parse student answers (single answer per question)
-        student_answers_list = []
-        
-        # Raqam bor-yo'qligini tekshirish
-        has_numbers_student = bool(re.search(r'\d', user_answer))
-        
-        if has_numbers_student:
-            # Format 2: 1a2b3c -> [a, b, c]
-            # Raqamlar bor - formatli parse qilamiz: 1a2b3c
-            for match in re.finditer(r'\d+([a-zx])', user_answer):
-                student_answers_list.append(match.group(1))
-        elif re.match(r'^[a-zx]+$', user_answer):
-            # Format 1: abc -> [a, b, c]
-            student_answers_list = list(user_answer)
-        else:
-            # Noma'lum format - barcha kichik harflarni olamiz
-            filtered = ''.join(ch for ch in user_answer if ch.isalpha() or ch == 'x')
-            student_answers_list = list(filtered)
+        # Kalit bir marta kompilyatsiya qilinadi va keshlanadi (multi-correct: 1ab2x3abcd)
+        answer_key = get_answer_key(correct_answers[test_code])
+        student_answers_list = parse_answers(test_answers)
         
         # Savol sonini tekshirish
-        if len(correct_answers_list) != len(student_answers_list):
+        if answer_key.n_questions != len(student_answers_list):
             await message.answer(
                 f"❌ Javoblar soni noto'g'ri!\n\n"
-                f"Kerakli javoblar soni: {len(correct_answers_list)}\n"
+                f"Kerakli javoblar soni: {answer_key.n_questions}\n"
                 f"Sizning javoblaringiz: {len(student_answers_list)}\n\n"
                 f"Iltimos, to'g'ri formatda qayta yuboring.",
                 reply_markup=await build_vazifa_keyboard(message.from_user.id)
@@ -457,8 +360,9 @@ async def process_test_answers(message: types.Message, state: FSMContext):
             return
         
         # Har bir javobni tekshirish (multi-correct support)
-        correct_count = 0
-        total_count = len(correct_answers_list)
+        checks = answer_key.check(student_answers_list)
+        correct_count = sum(checks)
+        total_count = answer_key.n_questions
         
         # Deadline tekshiruvi va show_detailed_results maydonini tekshirish
         deadline_passed = False
@@ -483,27 +387,16 @@ async def process_test_answers(message: types.Message, state: FSMContext):
             # Batafsil natijalarni ko'rsatish (har bir savol uchun)
             result_text = "📊 Test natijalari:\n\n"
             
-            for i in range(total_count):
-                student_ans = student_answers_list[i]
-                correct_ans_list = correct_answers_list[i]
-                
-                if student_ans in correct_ans_list:
+            for i, (student_ans, is_correct) in enumerate(zip(student_answers_list, checks)):
+                if is_correct:
                     result_text += f"{i+1}. ✅ {student_ans.upper()}\n"
-                    correct_count += 1
                 else:
                     # Show all valid answers
-                    valid_answers = '/'.join([a.upper() for a in correct_ans_list])
+                    valid_answers = answer_key.valid_letters(i)
                     result_text += f"{i+1}. ❌ {student_ans.upper()} (To'g'ri: {valid_answers})\n"
         else:
             # Faqat umumiy natijani ko'rsatish (batafsil emas)
             result_text = "📊 Test natijalari:\n\n"
-            
-            for i in range(total_count):
-                student_ans = student_answers_list[i]
-                correct_ans_list = correct_answers_list[i]
-                
-                if student_ans in correct_ans_list:
-                    correct_count += 1
         
         # Foiz hisoblab userga ko'rsatish (baho ko'rsatmaslik)
         percentage = (correct_count / total_count * 100) if total_count > 0 else 0
@@ -543,43 +436,42 @@ async def process_test_answers(message: types.Message, state: FSMContext):
             "test_answers": test_answers
         }
     
-    # DBga saqlash
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{API_BASE_URL}/tasks/submit/", json=payload) as resp:
-            if resp.status != 201:
-                error_text = await resp.text()
-                print(f"❌ Test saqlashda xatolik. Status: {resp.status}, Error: {error_text}")
-                print(f"Payload: {payload}")
+    # DBga saqlash (javobdan faqat coin_info kerak)
+    async with api.submit_task(payload, fields="id") as resp:
+        if resp.status != 201:
+            error_text = await resp.text()
+            print(f"❌ Test saqlashda xatolik. Status: {resp.status}, Error: {error_text}")
+            print(f"Payload: {payload}")
 
-                try:
-                    import json
-                    error_data = json.loads(error_text)
-                    error_detail = str(error_data)
-                except:
-                    error_detail = error_text[:200]
+            try:
+                import json
+                error_data = json.loads(error_text)
+                error_detail = str(error_data)
+            except:
+                error_detail = error_text[:200]
 
-                await message.answer(
-                    f"❌ Test javoblarini saqlashda xatolik!\n\n"
-                    f"Status: {resp.status}\n"
-                    f"Xato: {error_detail}\n\n"
-                    f"Iltimos, admin bilan bog'laning.",
-                    reply_markup=await build_vazifa_keyboard(message.from_user.id)
+            await message.answer(
+                f"❌ Test javoblarini saqlashda xatolik!\n\n"
+                f"Status: {resp.status}\n"
+                f"Xato: {error_detail}\n\n"
+                f"Iltimos, admin bilan bog'laning.",
+                reply_markup=await build_vazifa_keyboard(message.from_user.id)
+            )
+        else:
+            resp_data = await resp.json()
+            coin_info = resp_data.get("coin_info")
+            if coin_info:
+                coin_text = (
+                    f"\n\n🪙 <b>Tanga hisoblash:</b>\n"
+                    f"  📚 Natija tangasi: +{coin_info['result_coins']}\n"
+                    f"  🔥 Streak tangasi: +{coin_info['streak_coins']} "
+                    f"(ketma-ket {coin_info['new_streak']}-chi)\n"
+                    f"  ━━━━━━━━━━━━━━\n"
+                    f"  💰 Jami: +{coin_info['total']} tanga\n"
+                    f"  💼 Hamyon: {coin_info['total_wallet']} 🪙  "
+                    f"🔥Rekord: {coin_info['longest_streak']}"
                 )
-            else:
-                resp_data = await resp.json()
-                coin_info = resp_data.get("coin_info")
-                if coin_info:
-                    coin_text = (
-                        f"\n\n🪙 <b>Tanga hisoblash:</b>\n"
-                        f"  📚 Natija tangasi: +{coin_info['result_coins']}\n"
-                        f"  🔥 Streak tangasi: +{coin_info['streak_coins']} "
-                        f"(ketma-ket {coin_info['new_streak']}-chi)\n"
-                        f"  ━━━━━━━━━━━━━━\n"
-                        f"  💰 Jami: +{coin_info['total']} tanga\n"
-                        f"  💼 Hamyon: {coin_info['total_wallet']} 🪙  "
-                        f"🔥Rekord: {coin_info['longest_streak']}"
-                    )
-                    await message.answer(coin_text, parse_mode="HTML")
+                await message.answer(coin_text, parse_mode="HTML")
 
     await state.finish()
 
@@ -656,94 +548,93 @@ async def finish_assignment(callback: types.CallbackQuery, state: FSMContext):
         "files": collected,
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{API_BASE_URL}/tasks/submit/", json=payload) as resp:
-            if resp.status == 201:
-                resp_data = await resp.json()
-                task_id = resp_data["id"]
-                student_name = resp_data["student"]["full_name"]
+    async with api.submit_task(payload) as resp:
+        if resp.status == 201:
+            resp_data = await resp.json()
+            task_id = resp_data["id"]
+            student_name = resp_data["student"]["full_name"]
 
-                # Birinchi guruhni olish
-                all_groups = resp_data["student"].get("all_groups", [])
-                group_name = all_groups[0]["name"] if all_groups else "N/A"
+            # Birinchi guruhni olish
+            all_groups = resp_data["student"].get("all_groups", [])
+            group_name = all_groups[0]["name"] if all_groups else "N/A"
 
-                topic_title = resp_data["topic"]["title"]
+            topic_title = resp_data["topic"]["title"]
 
-                # ✅ Studentga javob
-                await callback.message.answer(
-                    f"✅ 📋 Maxsus topshiriq yuborildi! ({len(collected)} ta fayl)",
-                    reply_markup=await build_vazifa_keyboard(callback.from_user.id)
-                )
+            # ✅ Studentga javob
+            await callback.message.answer(
+                f"✅ 📋 Maxsus topshiriq yuborildi! ({len(collected)} ta fayl)",
+                reply_markup=await build_vazifa_keyboard(callback.from_user.id)
+            )
 
-                # ✅ Admin uchun inline keyboard (faqat maxsus topshiriq uchun)
-                kb = InlineKeyboardMarkup(row_width=3)
-                kb.add(
-                    InlineKeyboardButton("3️⃣", callback_data=f"grade_{task_id}_3"),
-                    InlineKeyboardButton("4️⃣", callback_data=f"grade_{task_id}_4"),
-                    InlineKeyboardButton("5️⃣", callback_data=f"grade_{task_id}_5"),
-                )
+            # ✅ Admin uchun inline keyboard (faqat maxsus topshiriq uchun)
+            kb = InlineKeyboardMarkup(row_width=3)
+            kb.add(
+                InlineKeyboardButton("3️⃣", callback_data=f"grade_{task_id}_3"),
+                InlineKeyboardButton("4️⃣", callback_data=f"grade_{task_id}_4"),
+                InlineKeyboardButton("5️⃣", callback_data=f"grade_{task_id}_5"),
+            )
 
-                caption = (
-                    f"📋 Yangi maxsus topshiriq!\n\n"
-                    f"👤 Student: {student_name}\n"
-                    f"👥 Guruh: {group_name}\n"
-                    f"📚 Mavzu: {topic_title}\n"
-                    f"📎 Fayllar soni: {len(collected)}\n"
-                )
+            caption = (
+                f"📋 Yangi maxsus topshiriq!\n\n"
+                f"👤 Student: {student_name}\n"
+                f"👥 Guruh: {group_name}\n"
+                f"📚 Mavzu: {topic_title}\n"
+                f"📎 Fayllar soni: {len(collected)}\n"
+            )
 
-                # ✨ Topic'dan course ma'lumotlarini olamiz va course adminiga yuboramiz
-                topic_data = resp_data["topic"]
-                course_admin_id = None
+            # ✨ Topic'dan course ma'lumotlarini olamiz va course adminiga yuboramiz
+            topic_data = resp_data["topic"]
+            course_admin_id = None
 
-                # Agar topic.course mavjud bo'lsa, course adminini olamiz
-                if topic_data.get("course"):
-                    course_admin_id = topic_data["course"].get("admin_telegram_id")
+            # Agar topic.course mavjud bo'lsa, course adminini olamiz
+            if topic_data.get("course"):
+                course_admin_id = topic_data["course"].get("admin_telegram_id")
 
-                if not course_admin_id:
-                    course_admin_id = ATTESTATSIYA_ADMIN
+            if not course_admin_id:
+                course_admin_id = ATTESTATSIYA_ADMIN
 
-                # Adminlarga ham yuboramiz (barcha adminlar ko'rishi uchun)
-                admins_to_notify = [course_admin_id] + ADMINS
-                admins_to_notify = list(set(admins_to_notify))  # Dublikatlarni olib tashlash
+            # Adminlarga ham yuboramiz (barcha adminlar ko'rishi uchun)
+            admins_to_notify = [course_admin_id] + ADMINS
+            admins_to_notify = list(set(admins_to_notify))  # Dublikatlarni olib tashlash
 
-                photos = [f for f in collected if f["type"] == "photo"]
-                documents = [f for f in collected if f["type"] == "document"]
+            photos = [f for f in collected if f["type"] == "photo"]
+            documents = [f for f in collected if f["type"] == "document"]
 
-                for admin_id in admins_to_notify:
-                    try:
-                        if len(photos) == 1:
-                            await bot.send_photo(admin_id, photos[0]["file_id"])
-                        elif len(photos) >= 2:
-                            media = [types.InputMediaPhoto(p["file_id"]) for p in photos[:10]]
-                            await bot.send_media_group(admin_id, media)
+            for admin_id in admins_to_notify:
+                try:
+                    if len(photos) == 1:
+                        await bot.send_photo(admin_id, photos[0]["file_id"])
+                    elif len(photos) >= 2:
+                        media = [types.InputMediaPhoto(p["file_id"]) for p in photos[:10]]
+                        await bot.send_media_group(admin_id, media)
 
-                        for doc in documents:
-                            await bot.send_document(admin_id, doc["file_id"])
+                    for doc in documents:
+                        await bot.send_document(admin_id, doc["file_id"])
 
-                        # Bitta yagona xabar - izoh + baholash tugmalari
-                        await bot.send_message(admin_id, caption, reply_markup=kb)
-                    except Exception as e:
-                        print(f"❌ Admin {admin_id} ga yuborishda xato: {e}")
+                    # Bitta yagona xabar - izoh + baholash tugmalari
+                    await bot.send_message(admin_id, caption, reply_markup=kb)
+                except Exception as e:
+                    print(f"❌ Admin {admin_id} ga yuborishda xato: {e}")
 
-            else:
-                error_text = await resp.text()
-                print(f"❌ Vazifa saqlashda xatolik. Status: {resp.status}, Error: {error_text}")
-                print(f"Payload: {payload}")
+        else:
+            error_text = await resp.text()
+            print(f"❌ Vazifa saqlashda xatolik. Status: {resp.status}, Error: {error_text}")
+            print(f"Payload: {payload}")
 
-                # Parse JSON error if possible
-                try:
-                    error_data = json.loads(error_text)
-                    error_detail = str(error_data)
-                except Exception:
-                    error_detail = error_text[:200]
-
-                await callback.message.answer(
-                    f"❌ Vazifa yuborishda xatolik bo'ldi!\n\n"
-                    f"Status: {resp.status}\n"
-                    f"Xato: {error_detail}\n\n"
-                    f"Iltimos, admin bilan bog'laning.",
-                    reply_markup=await build_vazifa_keyboard(callback.from_user.id)
-                )
+            # Parse JSON error if possible
+            try:
+                error_data = json.loads(error_text)
+                error_detail = str(error_data)
+            except Exception:
+                error_detail = error_text[:200]
+
+            await callback.message.answer(
+                f"❌ Vazifa yuborishda xatolik bo'ldi!\n\n"
+                f"Status: {resp.status}\n"
+                f"Xato: {error_detail}\n\n"
+                f"Iltimos, admin bilan bog'laning.",
+                reply_markup=await build_vazifa_keyboard(callback.from_user.id)
+            )
 
     try:
         await state.finish()
@@ -758,9 +649,8 @@ async def admin_add_test_start(message: types.Message, state: FSMContext):
         await state.finish()
     except Exception:
         pass
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/courses/") as resp:
-            courses = await resp.json()
+    async with api.list_courses() as resp:
+        courses = await resp.json()
     if not courses:
         await message.answer("❌ Kurslar topilmadi.")
         return
@@ -774,9 +664,8 @@ async def admin_add_test_start(message: types.Message, state: FSMContext):
 async def admin_add_test_course(callback: types.CallbackQuery, state: FSMContext):
     course_id = int(callback.data.split("_")[-1])
     await state.update_data(course_id=course_id)
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/topics/?all=1&course_id={course_id}") as resp:
-            topics = await resp.json()
+    async with api.list_topics(course_id=course_id, all_topics=True) as resp:
+        topics = await resp.json()
     if not topics:
         await callback.message.answer("❌ Bu kursda mavzu topilmadi.")
         await callback.answer()
@@ -804,30 +693,29 @@ async def admin_add_test_code(message: types.Message, state: FSMContext):
     topic_id = data["topic_id"]
     
     # Avval mavzudan eski testlarni tekshiramiz
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/topics/{topic_id}/") as resp:
-            if resp.status != 200:
-                await message.answer("❌ Mavzu topilmadi!")
-                try:
-                    await state.finish()
-                except KeyError:
-                    pass
-                return
-            topic = await resp.json()
-        
-        correct_answers = topic.get("correct_answers") or {}
-        
-        # Agar bu test kodi allaqachon mavjud bo'lsa, ogohlantirish
-        if test_code in correct_answers:
-            await state.update_data(test_code=test_code, overwrite_warning=True)
-            await message.answer(
-                f"⚠️ Diqqat! Bu mavzuda '{test_code}' test kodi allaqachon mavjud:\n"
-                f"Eski javob: {correct_answers[test_code]}\n\n"
-                f"Yangi javobni kiritishda davom etsangiz, eski test o'chiriladi va yangi test qo'shiladi.\n\n"
-                f"Yangi javobni kiriting yoki /cancel ni bosib bekor qiling:"
-            )
-            await state.set_state("addtest_answer")
+    async with api.get_topic(topic_id) as resp:
+        if resp.status != 200:
+            await message.answer("❌ Mavzu topilmadi!")
+            try:
+                await state.finish()
+            except KeyError:
+                pass
             return
+        topic = await resp.json()
+    
+    correct_answers = topic.get("correct_answers") or {}
+    
+    # Agar bu test kodi allaqachon mavjud bo'lsa, ogohlantirish
+    if test_code in correct_answers:
+        await state.update_data(test_code=test_code, overwrite_warning=True)
+        await message.answer(
+            f"⚠️ Diqqat! Bu mavzuda '{test_code}' test kodi allaqachon mavjud:\n"
+            f"Eski javob: {correct_answers[test_code]}\n\n"
+            f"Yangi javobni kiritishda davom etsangiz, eski test o'chiriladi va yangi test qo'shiladi.\n\n"
+            f"Yangi javobni kiriting yoki /cancel ni bosib bekor qiling:"
+        )
+        await state.set_state("addtest_answer")
+        return
     
     await state.update_data(test_code=test_code)
     await message.answer(
@@ -862,46 +750,47 @@ async def admin_add_test_answer(message: types.Message, state: FSMContext):
     overwrite_warning = data.get("overwrite_warning", False)
     
     # API orqali correct_answers ni yangilash
-    async with aiohttp.ClientSession() as session:
-        # Avval eski correct_answers ni olish
-        async with session.get(f"{API_BASE_URL}/topics/{topic_id}/") as resp:
-            if resp.status != 200:
-                await message.answer("❌ Mavzu topilmadi!")
-                try:
-                    await state.finish()
-                except KeyError:
-                    pass
-                return
-            topic = await resp.json()
-        
-        correct_answers = topic.get("correct_answers") or {}
+    # Avval eski correct_answers ni olish
+    async with api.get_topic(topic_id) as resp:
+        if resp.status != 200:
+            await message.answer("❌ Mavzu topilmadi!")
+            try:
+                await state.finish()
+            except KeyError:
+                pass
+            return
+        topic = await resp.json()
+    
+    correct_answers = topic.get("correct_answers") or {}
+    
+    # Agar overwrite_warning bo'lsa, eski testni o'chiramiz
+    if overwrite_warning:
+        old_answer = correct_answers.get(test_code, "N/A")
+        correct_answers[test_code] = correct_answer
         
-        # Agar overwrite_warning bo'lsa, eski testni o'chiramiz
-        if overwrite_warning:
-            old_answer = correct_answers.get(test_code, "N/A")
-            correct_answers[test_code] = correct_answer
-            
-            # PATCH request
-            async with session.patch(f"{API_BASE_URL}/topics/{topic_id}/", json={"correct_answers": correct_answers}) as resp2:
-                if resp2.status == 200:
-                    await message.answer(
-                        f"✅ Test yangilandi!\n\n"
-                        f"Test kodi: {test_code}\n"
-                        f"Eski javob: {old_answer}\n"
-                        f"Yangi javob: {correct_answer}"
-                    )
-                else:
-                    await message.answer("❌ Test qo'shishda xatolik!")
-        else:
-            # Oddiy qo'shish
-            correct_answers[test_code] = correct_answer
-            
-            # PATCH request
-            async with session.patch(f"{API_BASE_URL}/topics/{topic_id}/", json={"correct_answers": correct_answers}) as resp2:
-                if resp2.status == 200:
-                    await message.answer(f"✅ Test qo'shildi: {test_code} → {correct_answer}")
-                else:
-                    await message.answer("❌ Test qo'shishda xatolik!")
+        # PATCH request
+        async with api.update_topic(topic_id, {"correct_answers": correct_answers}) as resp2:
+            if resp2.status == 200:
+                catalog.invalidate_topics()
+                await message.answer(
+                    f"✅ Test yangilandi!\n\n"
+                    f"Test kodi: {test_code}\n"
+                    f"Eski javob: {old_answer}\n"
+                    f"Yangi javob: {correct_answer}"
+                )
+            else:
+                await message.answer("❌ Test qo'shishda xatolik!")
+    else:
+        # Oddiy qo'shish
+        correct_answers[test_code] = correct_answer
+        
+        # PATCH request
+        async with api.update_topic(topic_id, {"correct_answers": correct_answers}) as resp2:
+            if resp2.status == 200:
+                catalog.invalidate_topics()
+                await message.answer(f"✅ Test qo'shildi: {test_code} → {correct_answer}")
+            else:
+                await message.answer("❌ Test qo'shishda xatolik!")
     
     try:
         await state.finish()
@@ -924,12 +813,11 @@ async def admin_send_past_results(message: types.Message, state: FSMContext):
     await message.answer("⏳ Deadline tugagan mavzularni qidiryapman...")
     
     # Deadline tugagan mavzularni topish
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/topics/") as resp:
-            if resp.status != 200:
-                await message.answer("❌ Mavzularni olishda xatolik!")
-                return
-            all_topics = await resp.json()
+    async with api.list_topics() as resp:
+        if resp.status != 200:
+            await message.answer("❌ Mavzularni olishda xatolik!")
+            return
+        all_topics = await resp.json()
     
     from datetime import datetime
     import pytz
@@ -950,91 +838,49 @@ async def admin_send_past_results(message: types.Message, state: FSMContext):
         if current_dt <= deadline_dt:
             continue
         
-        # Bu mavzu uchun deadline tugashidan oldin test yechgan userlarni topish
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{API_BASE_URL}/tasks/") as resp:
-                if resp.status != 200:
-                    continue
-                all_tasks = await resp.json()
-        
-        # Bu mavzu uchun test task'larni filter
         topic_id = topic['id']
         topic_title = topic['title']
         correct_answers = topic['correct_answers']
+
+        # Bu mavzu uchun deadline tugashidan oldin test yechgan userlar (deadline dan keyin
+        # yuborganlar batafsil natijani avval ko'rgan) — filtr API tomonida
+        topic_tasks = await api.list_tasks(
+            topic_id=topic_id, task_type='test', submitted_before=deadline_dt.isoformat(),
+            fields="student_telegram_id,test_code,test_answers",
+        )
+        if topic_tasks is None:
+            continue
         
-        for task in all_tasks:
-            if task['topic']['id'] != topic_id:
-                continue
-            if task['task_type'] != 'test':
-                continue
+        for task in topic_tasks:
             if not task.get('test_code') or not task.get('test_answers'):
                 continue
             
-            # Task deadline tugashidan oldin yuboriganligini tekshirish
-            task_created = datetime.fromisoformat(task['created_at'].replace('Z', '+00:00'))
-            if task_created > deadline_dt:
-                continue  # Deadline tugagandan keyin yuborilgan - avval batafsil ko'rgan
-            
             # Userga batafsil natijalarni hisoblash
-            student_telegram_id = task['student']['telegram_id']
+            student_telegram_id = task['student_telegram_id']
             test_code = task['test_code']
             test_answers = task['test_answers']
             
             if test_code not in correct_answers:
                 continue
             
-            # Parse answers (oldingi koddan copy)
-            correct = correct_answers[test_code].lower().strip()
-            user_answer = test_answers.lower().strip()
+            answer_key = get_answer_key(correct_answers[test_code])
+            student_answers_list = parse_answers(test_answers)
             
-            # Parse admin correct answers
-            correct_answers_list = []
-            has_numbers = bool(re.search(r'\d', correct))
-            
-            if has_numbers:
-                for match in re.finditer(r'\d+([a-zx]+)', correct):
-                    answers = match.group(1)
-                    if answers == 'x':
-                        correct_answers_list.append(['x'])
-                    else:
-                        correct_answers_list.append(list(answers))
-            elif re.match(r'^[a-zx]+$', correct):
-                correct_answers_list = [[ch] for ch in correct]
-            else:
-                filtered = ''.join(ch for ch in correct if ch.isalpha() or ch == 'x')
-                correct_answers_list = [[ch] for ch in filtered]
-            
-            # Parse student answers
-            student_answers_list = []
-            has_numbers_student = bool(re.search(r'\d', user_answer))
-            
-            if has_numbers_student:
-                for match in re.finditer(r'\d+([a-zx])', user_answer):
-                    student_answers_list.append(match.group(1))
-            elif re.match(r'^[a-zx]+$', user_answer):
-                student_answers_list = list(user_answer)
-            else:
-                filtered = ''.join(ch for ch in user_answer if ch.isalpha() or ch == 'x')
-                student_answers_list = list(filtered)
-            
-            if len(correct_answers_list) != len(student_answers_list):
+            if answer_key.n_questions != len(student_answers_list):
                 continue
             
             # Batafsil natijalarni tayyorlash
-            correct_count = 0
-            total_count = len(correct_answers_list)
+            checks = answer_key.check(student_answers_list)
+            correct_count = sum(checks)
+            total_count = answer_key.n_questions
             result_text = f"📊 {topic_title} - Batafsil natijalar:\n\n"
             result_text += f"🗓 Deadline tugadi. Sizning natijalaringiz:\n\n"
             
-            for i in range(total_count):
-                student_ans = student_answers_list[i]
-                correct_ans_list = correct_answers_list[i]
-                
-                if student_ans in correct_ans_list:
+            for i, (student_ans, is_correct) in enumerate(zip(student_answers_list, checks)):
+                if is_correct:
                     result_text += f"{i+1}. ✅ {student_ans.upper()}\n"
-                    correct_count += 1
                 else:
-                    valid_answers = '/'.join([a.upper() for a in correct_ans_list])
+                    valid_answers = answer_key.valid_letters(i)
                     result_text += f"{i+1}. ❌ {student_ans.upper()} (To'g'ri: {valid_answers})\n"
             
             percentage = (correct_count / total_count * 100) if total_count > 0 else 0
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import os
 import sys
@@ -20,13 +19,11 @@ sys.path.insert(0, '/var/www/vazifa_bot')
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
-from base_app.models import Group, Student
-from django.db import close_old_connections
-from asgiref.sync import sync_to_async
-
 from data.config import ADMINS, ATTESTATSIYA_ADMIN
 from keyboards.default.vazifa_keyboard import admin_key, cancel_key, build_vazifa_keyboard
 from loader import dp, bot
+from utils.catalog_cache import catalog
+from utils.db_api import repository as repo
 from states.register_state import RegisterState
 from filters.is_private import IsPrivate
 
@@ -111,37 +108,9 @@ ADMIN_CONTACT = "@A_Fayziev"
 
 
 # ---------------------------------------------------------------------------
-# DB yordamchi funksiyalar
+# Guruh tanlash
 # ---------------------------------------------------------------------------
 
-async def get_student(telegram_id: int) -> dict:
-    def _get():
-        close_old_connections()
-        try:
-            s = Student.objects.select_related('registered_course').get(telegram_id=str(telegram_id))
-            return {
-                "exists": True,
-                "full_name": s.full_name,
-                "viloyat": s.viloyat,
-                "tuman": s.tuman,
-                "phone": s.phone,
-                "math_score": s.math_score,
-                "groups": [{"id": g.id, "name": g.name} for g in s.groups.all()],
-                "registered_course_id": s.registered_course_id,
-                "registered_course_name": s.registered_course.name if s.registered_course_id else None,
-                "role": s.role,
-            }
-        except Student.DoesNotExist:
-            return {"exists": False}
-
-    return await asyncio.to_thread(_get)
-
-
-def _mark_group_full(group_id: int):
-    close_old_connections()
-    Group.objects.filter(id=group_id).update(is_full=True)
-
-
 async def _pick_available_group(candidates: list) -> dict | None:
     """
     Har bir nomzod guruhning jonli Telegram a'zolar sonini tekshiradi
@@ -174,7 +143,7 @@ async def _pick_available_group(candidates: list) -> dict | None:
                     "count": regular_members,
                 }
             elif g.get("mark_full"):
-                await asyncio.to_thread(_mark_group_full, g["id"])
+                await repo.mark_group_full(g["id"])
         except Exception as e:
             logging.warning(f"Guruh '{g['name']}' tekshirishda xatolik: {e}")
             continue
@@ -190,109 +159,14 @@ async def find_available_group(course_id: int, score: int = None, role: str = No
       - capacity:    guruhlar ketma-ket to'ldiriladi (max_students yetguncha)
       - role:        student/o'qituvchi (target_role) ga mos guruh
     """
-    from base_app.models import Course
-
-    def _get_course():
-        close_old_connections()
-        try:
-            return Course.objects.get(id=course_id)
-        except Course.DoesNotExist:
-            return None
-
-    course = await asyncio.to_thread(_get_course)
-    if course is None:
+    candidates = await repo.registration_candidates(
+        course_id, score=score, role=role, default_limit=GROUP_MEMBER_LIMIT,
+    )
+    if candidates is None:
         return None
-
-    strategy = course.registration_strategy
-
-    if strategy == 'capacity':
-        def _get_candidates():
-            close_old_connections()
-            qs = Group.objects.filter(
-                course_id=course_id,
-                is_full=False,
-                telegram_group_id__isnull=False,
-            ).exclude(telegram_group_id='').order_by('id')
-            return [
-                {"id": g.id, "name": g.name, "tgid": g.telegram_group_id, "limit": g.max_students, "mark_full": True}
-                for g in qs
-            ]
-        candidates = await asyncio.to_thread(_get_candidates)
-        return await _pick_available_group(candidates)
-
-    if strategy == 'role':
-        def _get_candidates():
-            close_old_connections()
-            qs = Group.objects.filter(
-                course_id=course_id,
-                target_role=role,
-                is_full=False,
-                telegram_group_id__isnull=False,
-            ).exclude(telegram_group_id='').order_by('id')
-            return [
-                {"id": g.id, "name": g.name, "tgid": g.telegram_group_id, "limit": g.max_students, "mark_full": True}
-                for g in qs
-            ]
-        candidates = await asyncio.to_thread(_get_candidates)
-        return await _pick_available_group(candidates)
-
-    # score_range (default) — eski, ishlab turgan mantiq: faqat course bo'yicha filtr qo'shildi
-    def _get_candidates():
-        close_old_connections()
-        if score is not None and score > 26:
-            qs = Group.objects.filter(
-                course_id=course_id,
-                score_min__gte=27,
-                telegram_group_id__isnull=False,
-            ).exclude(telegram_group_id='').order_by('id')
-        else:
-            qs = Group.objects.filter(
-                course_id=course_id,
-                score_max__lte=26,
-                telegram_group_id__isnull=False,
-            ).exclude(telegram_group_id='').order_by('id')
-        return [
-            {"id": g.id, "name": g.name, "tgid": g.telegram_group_id, "limit": GROUP_MEMBER_LIMIT, "mark_full": False}
-            for g in qs
-        ]
-    candidates = await asyncio.to_thread(_get_candidates)
     return await _pick_available_group(candidates)
 
 
-async def save_student(telegram_id: int, data: dict, group_id: int):
-    def _save():
-        close_old_connections()
-        student, _ = Student.objects.get_or_create(telegram_id=str(telegram_id))
-        student.full_name  = data["full_name"]
-        student.viloyat    = data["viloyat"]
-        student.tuman      = data["tuman"]
-        student.phone      = data["phone"]
-        student.math_score = data.get("math_score")
-        student.registered_course_id = data.get("course_id")
-        student.role = data.get("role")
-        student.save()
-        group = Group.objects.get(id=group_id)
-        student.groups.add(group)
-
-    await asyncio.to_thread(_save)
-
-
-async def update_student_extra(telegram_id: int, data: dict):
-    """Mavjud student uchun qo'shimcha ma'lumotlarni yangilash."""
-    def _upd():
-        close_old_connections()
-        Student.objects.filter(telegram_id=str(telegram_id)).update(
-            viloyat=data["viloyat"],
-            tuman=data["tuman"],
-            phone=data["phone"],
-            math_score=data.get("math_score"),
-            registered_course_id=data.get("course_id"),
-            role=data.get("role"),
-        )
-
-    await asyncio.to_thread(_upd)
-
-
 # ---------------------------------------------------------------------------
 # Inline keyboard yordamchilari
 # ---------------------------------------------------------------------------
@@ -344,9 +218,7 @@ async def _ask_course(target, state: FSMContext):
     Faol kurslar ro'yxatini ko'rsatadi. Faqat bitta faol kurs bo'lsa, savol
     berilmay avtomatik tanlanadi (bitta-kursli serverlarda oqim o'zgarmaydi).
     """
-    from base_app.models import Course
-
-    courses = await sync_to_async(list)(Course.objects.filter(is_active=True).order_by('name'))
+    courses = await catalog.courses(active_only=True)
 
     if not courses:
         await target.answer(
@@ -382,10 +254,9 @@ async def _after_course_chosen(target, state: FSMContext, course):
 @dp.callback_query_handler(lambda c: c.data.startswith("regcourse_"), state=RegisterState.course)
 async def step_course(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
-    from base_app.models import Course
 
     course_id = int(callback.data.split("_")[-1])
-    course = await sync_to_async(Course.objects.get)(id=course_id)
+    course = await catalog.course(course_id)
     await state.update_data(course_id=course_id)
     await _after_course_chosen(callback.message, state, course)
 
@@ -417,23 +288,12 @@ async def _finalize_registration(send_msg, user_id: int, state: FSMContext, scor
             reply_markup=ReplyKeyboardRemove(),
         )
         if data.get("is_existing"):
-            await update_student_extra(user_id, data)
+            await repo.save_registration(user_id, data, existing=True)
         await state.finish()
         return
 
     try:
-        if data.get("is_existing"):
-            await update_student_extra(user_id, data)
-
-            def _add_group():
-                close_old_connections()
-                s = Student.objects.get(telegram_id=str(user_id))
-                g = Group.objects.get(id=group["id"])
-                s.groups.add(g)
-
-            await asyncio.to_thread(_add_group)
-        else:
-            await save_student(user_id, data, group["id"])
+        await repo.save_registration(user_id, data, group["id"], existing=bool(data.get("is_existing")))
     except Exception as e:
         logging.error(f"save_student error for {user_id}: {e}")
         await send_msg.answer(
@@ -503,7 +363,7 @@ async def cmd_start(message: types.Message, state: FSMContext):
         await message.answer("👋 Salom, Admin!", reply_markup=admin_key)
         return
 
-    student = await get_student(message.from_user.id)
+    student = await repo.student_profile(message.from_user.id)
 
     if student["exists"]:
         # Barcha ma'lumotlar to'ldirilganmi? (math_score faqat "Ball oralig'i bo'yicha"
@@ -523,7 +383,9 @@ async def cmd_start(message: types.Message, state: FSMContext):
                     f"👋 Xush kelibsiz, {student['full_name']}!\n\n"
                     f"👥 Guruhlar:\n{g_text}\n\n"
                     f"📝 Vazifa yuborish uchun pastdagi tugmalardan foydalaning.",
-                    reply_markup=await build_vazifa_keyboard(message.from_user.id),
+                    reply_markup=await build_vazifa_keyboard(
+                        message.from_user.id, show_assignment=student["has_assignment_course"],
+                    ),
                 )
             else:
                 # Ro'yxatdan o'tgan, lekin guruh yo'q — qayta urinib ko'ramiz
@@ -544,13 +406,7 @@ async def cmd_start(message: types.Message, state: FSMContext):
 
                 if group:
                     # Avtomatik guruhga biriktirish
-                    def _assign_group():
-                        close_old_connections()
-                        s = Student.objects.get(telegram_id=str(message.from_user.id))
-                        g = Group.objects.get(id=group["id"])
-                        s.groups.add(g)
-
-                    await asyncio.to_thread(_assign_group)
+                    await repo.add_student_to_group(message.from_user.id, group["id"])
 
                     await message.answer(
                         f"👋 Xush kelibsiz, {student['full_name']}!\n\n"
@@ -762,10 +618,8 @@ async def _after_phone(message: types.Message, state: FSMContext):
       - score_range: matematika balli so'raladi
       - capacity:    hech narsa so'ralmaydi, to'g'ridan-to'g'ri guruh qidiriladi
     """
-    from base_app.models import Course
-
     data = await state.get_data()
-    course = await sync_to_async(Course.objects.get)(id=data["course_id"])
+    course = await catalog.course(data["course_id"])
     strategy = course.registration_strategy
 
     if strategy == 'role':
@@ -822,7 +676,7 @@ async def show_profile(message: types.Message, state: FSMContext):
     except Exception:
         pass
 
-    student = await get_student(message.from_user.id)
+    student = await repo.student_profile(message.from_user.id)
     if not student["exists"]:
         await message.answer("❌ Siz ro'yxatdan o'tmagansiz. /start ni bosing.")
         return
@@ -868,11 +722,7 @@ async def process_name_change(message: types.Message, state: FSMContext):
 
     telegram_id = message.from_user.id
 
-    def _update():
-        close_old_connections()
-        Student.objects.filter(telegram_id=str(telegram_id)).update(full_name=new_name)
-
-    await asyncio.to_thread(_update)
+    await repo.rename_student(telegram_id, new_name)
 
     keyboard = admin_key if str(telegram_id) in ADMINS else await build_vazifa_keyboard(telegram_id)
     await message.answer(
@@ -888,8 +738,7 @@ async def process_name_change(message: types.Message, state: FSMContext):
 
 @dp.message_handler(IsPrivate(), Text(equals="📊 Natijalarim"), state="*")
 async def show_results(message: types.Message, state: FSMContext):
-    import aiohttp
-    from data.config import API_BASE_URL
+    from utils.api_client import api
 
     try:
         await state.finish()
@@ -897,25 +746,26 @@ async def show_results(message: types.Message, state: FSMContext):
         pass
 
     telegram_id = message.from_user.id
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"{API_BASE_URL}/students/{telegram_id}/results/") as resp:
-            if resp.status == 404:
-                err = await resp.json()
-                if "no groups" in err.get("error", "").lower():
-                    await message.answer(
-                        "⚠️ Sizga guruh biriktirilmagan.\n\n"
-                        f"📞 Admin bilan bog'laning: {ADMIN_CONTACT}"
-                    )
-                else:
-                    await message.answer("❌ Siz ro'yxatdan o'tmagansiz. /start ni bosing.")
-                return
-            elif resp.status != 200:
-                await message.answer("❌ Ma'lumot olishda xatolik. Qayta urinib ko'ring.")
-                return
-            data = await resp.json()
+    async with api.get_student_results(telegram_id) as resp:
+        if resp.status == 404:
+            err = await resp.json()
+            if "no groups" in err.get("error", "").lower():
+                await message.answer(
+                    "⚠️ Sizga guruh biriktirilmagan.\n\n"
+                    f"📞 Admin bilan bog'laning: {ADMIN_CONTACT}"
+                )
+            else:
+                await message.answer("❌ Siz ro'yxatdan o'tmagansiz. /start ni bosing.")
+            return
+        elif resp.status != 200:
+            await message.answer("❌ Ma'lumot olishda xatolik. Qayta urinib ko'ring.")
+            return
+        data = await resp.json()
 
     full_name = data.get("full_name", "N/A")
     results = data.get("results", [])
+    # Kurslar bo'yicha bo'linma (o'rtacha, topshirilganlar, streak) — eski API da bo'lmasa bitta jadval
+    courses = data.get("courses") or [{"topics": results}]
 
     if not results:
         await message.answer(f"👤 {full_name}\n\n📊 Natijalar hali yo'q")
@@ -923,16 +773,31 @@ async def show_results(message: types.Message, state: FSMContext):
 
     lines = (
         "<b>📊 NATIJALARIM</b>\n\n"
-        f"<b>👤 {full_name}</b>\n\n"
-        "<pre>"
-        "┌────────────────────────────┬──────┐\n"
-        "│ Mavzu                      │ Ball │\n"
-        "├────────────────────────────┼──────┤\n"
+        f"<b>👤 {full_name}</b>\n"
     )
-    for r in results:
-        title = r.get("topic_title", "N/A")[:25]
-        grade = r.get("grade", 0)
-        lines += f"│ {title:<26} │ {grade:>4} │\n"
-    lines += "└────────────────────────────┴──────┘</pre>"
+    for course in courses:
+        topics = course.get("topics", [])
+        if not topics:
+            continue
+        if course.get("course_name"):
+            lines += f"\n<b>📚 {course['course_name']}</b>\n"
+        if "topic_count" in course:
+            lines += (
+                f"✅ Topshirilgan: {course.get('submitted_count', 0)}/{course['topic_count']}   "
+                f"📈 O'rtacha: {course.get('average_grade', 0)}\n"
+                f"🔥 Streak: {course.get('current_streak', 0)} (eng uzun: {course.get('longest_streak', 0)})   "
+                f"🪙 {course.get('total_coins', 0)}\n"
+            )
+        lines += (
+            "<pre>"
+            "┌────────────────────────────┬──────┐\n"
+            "│ Mavzu                      │ Ball │\n"
+            "├────────────────────────────┼──────┤\n"
+        )
+        for r in topics:
+            title = r.get("topic_title", "N/A")[:25]
+            grade = r.get("grade", 0)
+            lines += f"│ {title:<26} │ {grade:>4} │\n"
+        lines += "└────────────────────────────┴──────┘</pre>\n"
 
     await message.answer(lines, parse_mode="HTML")
@@ -1,5 +1,6 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-from asgiref.sync import sync_to_async
+
+from utils.db_api import repository as repo
 
 vazifa_key = ReplyKeyboardMarkup(
     keyboard = [
@@ -20,24 +21,13 @@ vazifa_key = ReplyKeyboardMarkup(
 )
 
 
-@sync_to_async
-def _student_has_assignment_course(telegram_id) -> bool:
-    """Student a'zo bo'lgan faol kurslardan birortasida has_assignments=True bo'lsa True"""
-    from base_app.models import Student
-
-    try:
-        student = Student.objects.get(telegram_id=str(telegram_id))
-    except Student.DoesNotExist:
-        return False
-
-    return student.groups.filter(
-        course__is_active=True, course__has_assignments=True
-    ).exists()
-
-
-async def build_vazifa_keyboard(telegram_id) -> ReplyKeyboardMarkup:
-    """Studentning kurslariga qarab 'Maxsus topshiriq yuborish' tugmasini shartli qo'shadi"""
-    show_assignment = await _student_has_assignment_course(telegram_id)
+async def build_vazifa_keyboard(telegram_id, show_assignment=None) -> ReplyKeyboardMarkup:
+    """
+    Studentning kurslariga qarab 'Maxsus topshiriq yuborish' tugmasini shartli qo'shadi.
+    show_assignment oldindan ma'lum bo'lsa (masalan, student_profile dan) DB ga murojaat qilinmaydi.
+    """
+    if show_assignment is None:
+        show_assignment = await repo.has_assignment_course(telegram_id)
 
     first_row = [KeyboardButton(text='📝 Test yuborish')]
     if show_assignment:
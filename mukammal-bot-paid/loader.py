@@ -2,7 +2,12 @@ from aiogram import Bot, Dispatcher, types
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 
 from data import config
+from utils.db_api.fsm_storage import DjangoFSMStorage
 
 bot = Bot(token=config.BOT_TOKEN, parse_mode=types.ParseMode.HTML)
-storage = MemoryStorage()
+if config.FSM_STORAGE == "memory":
+    storage = MemoryStorage()
+else:
+    # Holatlar DB'da — restart yoki bir nechta jarayonda ham saqlanadi
+    storage = DjangoFSMStorage(cache_size=config.FSM_CACHE_SIZE, cache_ttl=config.FSM_CACHE_TTL)
 dp = Dispatcher(bot, storage=storage)
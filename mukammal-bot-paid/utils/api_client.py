@@ -0,0 +1,216 @@
+"""
+Bot → Django API uchun yagona (pooled) aiohttp klienti.
+
+Har so'rovda yangi ClientSession ochish o'rniga bitta session bot umri davomida
+ishlatiladi — TCP ulanishlar keep-alive bilan qayta ishlatiladi.
+app.py: on_startup'da api.start(), on_shutdown'da api.close().
+
+Metodlar aiohttp so'rov context manager'ini qaytaradi, ishlatilishi:
+
+    async with api.get_student(telegram_id) as resp:
+        if resp.status == 200:
+            data = await resp.json()
+
+Paginatsiyali ro'yxatlar (list_tasks) esa coroutine — barcha sahifalarni yig'ib
+tayyor ro'yxat qaytaradi: tasks = await api.list_tasks(student_id=...)
+"""
+import logging
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from data.config import API_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=5)
+REPORT_TIMEOUT = aiohttp.ClientTimeout(total=60, connect=5)
+
+ETAG_CACHE_SIZE = 5000  # (student, task_type) juftliklari — eng eskisi chiqariladi
+
+
+class ApiClient:
+    def __init__(self, base_url: str, pool_size: int = 50):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+        # ETag li javoblar: kalit -> (etag, data); 304 kelsa data qayta ishlatiladi
+        self._etag_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def _new_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            self._session = self._new_session()
+            logger.info(f"🔌 API klient ishga tushdi: {self.base_url}")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # start() chaqirilmagan bo'lsa ham (masalan, alohida skriptlarda) lazy yaratamiz
+        if self._session is None or self._session.closed:
+            self._session = self._new_session()
+        return self._session
+
+    def _request(self, method: str, path: str, **kwargs):
+        return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+
+    async def _fetch_pages(self, path: str, params: dict):
+        """
+        Keyset paginatsiyali endpointning barcha sahifalari ({"next", "results"}).
+        next URL dan faqat query (cursor) olinadi — host/sxema API_BASE_URL niki qoladi.
+        Xato bo'lsa None.
+        """
+        results = []
+        url = f"{self.base_url}{path}"
+        while url:
+            async with self.session.get(url, params=params) as resp:
+                if resp.status != 200:
+                    logger.warning(f"{path}: HTTP {resp.status}")
+                    return None
+                data = await resp.json()
+            results.extend(data["results"])
+            next_url = data.get("next")
+            url = f"{self.base_url}{path}?{urlsplit(next_url).query}" if next_url else None
+            params = None
+        return results
+
+    # --- Students ---
+    def get_student(self, telegram_id):
+        return self._request("GET", f"/students/{telegram_id}/")
+
+    def get_student_results(self, telegram_id):
+        return self._request("GET", f"/students/{telegram_id}/results/")
+
+    async def pending_topics(self, telegram_id, task_type: Optional[str] = None):
+        """
+        Student topshirmagan faol mavzular: {"courses": [...], "topics": [...]}.
+        Oldingi javob ETag'i If-None-Match bilan yuboriladi — o'zgarmagan bo'lsa
+        server 304 qaytaradi va keshdagi ro'yxat ishlatiladi. Xato bo'lsa None.
+        """
+        key = (str(telegram_id), task_type)
+        cached = self._etag_cache.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else None
+        params = {"task_type": task_type} if task_type else None
+        async with self._request(
+            "GET", f"/students/{telegram_id}/pending-topics/", params=params, headers=headers
+        ) as resp:
+            if resp.status == 304 and cached:
+                self._etag_cache.move_to_end(key)
+                return cached[1]
+            if resp.status != 200:
+                logger.warning(f"pending-topics {telegram_id}: HTTP {resp.status}")
+                return None
+            data = await resp.json()
+            etag = resp.headers.get("ETag")
+        if etag:
+            self._etag_cache[key] = (etag, data)
+            self._etag_cache.move_to_end(key)
+            if len(self._etag_cache) > ETAG_CACHE_SIZE:
+                self._etag_cache.popitem(last=False)
+        return data
+
+    # --- Courses / groups ---
+    def list_courses(self):
+        return self._request("GET", "/courses/")
+
+    def list_groups(self):
+        return self._request("GET", "/groups/")
+
+    # --- Topics ---
+    def list_topics(self, student_id=None, course_id: Optional[int] = None, all_topics: bool = False):
+        params = {}
+        if student_id is not None:
+            params["student_id"] = str(student_id)
+        if course_id is not None:
+            params["course_id"] = course_id
+        if all_topics:
+            params["all"] = 1
+        return self._request("GET", "/topics/", params=params)
+
+    def get_topic(self, topic_id: int):
+        return self._request("GET", f"/topics/{topic_id}/")
+
+    def create_topic(self, payload: dict):
+        return self._request("POST", "/topics/create/", json=payload)
+
+    def update_topic(self, topic_id: int, payload: dict):
+        return self._request("PATCH", f"/topics/{topic_id}/", json=payload)
+
+    # --- Tasks ---
+    async def list_tasks(self, student_id=None, fields: Optional[str] = None, **filters):
+        """
+        Barcha sahifalardagi vazifalar ro'yxati (xato bo'lsa None).
+        filters: course_id, group_id, topic_id, task_type, submitted_after, submitted_before
+        fields: "id,topic_pk,task_type" — faqat kerakli maydonlar
+        """
+        params = {key: value for key, value in filters.items() if value is not None}
+        if student_id is not None:
+            params["student_id"] = str(student_id)
+        if fields:
+            params["fields"] = fields
+        params["limit"] = 500
+        return await self._fetch_pages("/tasks/", params)
+
+    def get_task(self, task_id: int):
+        return self._request("GET", f"/tasks/{task_id}/")
+
+    def submit_task(self, payload: dict, fields: Optional[str] = None):
+        """fields: "id,grade" — javobda faqat shu maydonlar (+ coin_info)"""
+        params = {"fields": fields} if fields else None
+        return self._request("POST", "/tasks/submit/", json=payload, params=params)
+
+    def update_task(self, task_id: int, payload: dict):
+        return self._request("PATCH", f"/tasks/{task_id}/", json=payload)
+
+    # --- Reports ---
+    def weekly_report_pdf(self, group_id: int):
+        return self._request("GET", f"/reports/{group_id}/weekly/pdf/", timeout=REPORT_TIMEOUT)
+
+    # --- Coins ---
+    def coin_leaderboard(self, course_id: int, telegram_id, **extra):
+        params = {"course_id": course_id, "telegram_id": str(telegram_id), **extra}
+        return self._request("GET", "/coins/leaderboard/", params=params)
+
+    def my_coins(self, telegram_id, year: Optional[int] = None, month: Optional[int] = None):
+        params = {"telegram_id": str(telegram_id)}
+        if year and month:
+            params.update(year=year, month=month)
+        return self._request("GET", "/coins/my/", params=params)
+
+    def my_coin_ranks(self, telegram_id, year: Optional[int] = None, month: Optional[int] = None):
+        """Barcha hamyonlar + har kursdagi reyting o'rni (bitta so'rov)."""
+        params = {"telegram_id": str(telegram_id)}
+        if year and month:
+            params.update(year=year, month=month)
+        return self._request("GET", "/coins/my-ranks/", params=params)
+
+    def admin_coin_leaderboard(self, course_id: int, sort: str = "coins", **extra):
+        params = {"course_id": course_id, "sort": sort, **extra}
+        return self._request("GET", "/coins/admin-leaderboard/", params=params)
+
+    # --- Attendance ---
+    def create_attendance_session(self, code: str, expires_at: str, created_by: str):
+        payload = {"code": code, "expires_at": expires_at, "created_by": created_by}
+        return self._request("POST", "/attendance/session/", json=payload)
+
+    def mark_attendance(self, telegram_id, code: str):
+        return self._request("POST", "/attendance/mark/", json={"telegram_id": str(telegram_id), "code": code})
+
+    def attendance_csv(self, date_from: str, date_to: str):
+        return self._request("GET", "/attendance/csv/", params={"from": date_from, "to": date_to})
+
+
+api = ApiClient(API_BASE_URL)
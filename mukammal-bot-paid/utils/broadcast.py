@@ -0,0 +1,301 @@
+"""
+Broadcast engine: ko'p studentga xabarni (copy_message) tezlik cheklovi ostida,
+parallel workerlar bilan yuborish.
+
+- Global token-bucket (Telegram: ~30 xabar/sek) va har bir chat uchun minimal interval
+- RetryAfter kelganda butun oqim to'xtab turadi va xabar qayta yuboriladi
+- Admin'ga progress xabari vaqti-vaqti bilan yangilanadi
+- Progress BroadcastJob jadvaliga yozib boriladi — bot qayta ishga tushsa
+  resume_pending_broadcasts() to'xtagan joyidan davom ettiradi
+- Progress xabaridagi "⛔ To'xtatish" tugmasi jobni 'cancelled' qiladi: workerlar
+  navbatdagi xabarni olmaydi; boshqa jarayondagi bekor qilish checkpoint da ko'rinadi
+- DB chaqiruvlari repository executor ida
+"""
+import asyncio
+import logging
+import time
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.exceptions import (
+    ChatNotFound, MessageNotModified, NetworkError, RetryAfter,
+    TelegramAPIError, Unauthorized, UserDeactivated,
+)
+
+from loader import bot
+from utils.db_api import repository as repo
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 25            # xabar/sek (Telegram limiti ~30, zaxira bilan)
+PER_CHAT_INTERVAL = 1.0     # bitta chatga ketma-ket xabarlar orasidagi minimal vaqt (sek)
+WORKERS = 8
+MAX_ATTEMPTS = 3            # tarmoq xatolarida qayta urinishlar soni
+MAX_FLOOD_RETRIES = 5       # RetryAfter bo'yicha qayta urinishlar soni
+PROGRESS_INTERVAL = 5       # progress xabari va checkpoint oralig'i (sek)
+
+_PENDING, _OK, _FAILED = 0, 1, 2
+
+# Ishlayotgan broadcast job'lari: id -> to'xtatish eventi
+# (bitta jobni ikki marta ishga tushirmaslik va bekor qilish uchun)
+_running = {}
+# create_task natijalarini GC yig'ib olmasligi uchun
+_tasks = set()
+
+
+class TokenBucket:
+    """Oddiy async token-bucket: sekundiga `rate` ta token, maksimal `capacity` ta."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Flood control (RetryAfter) — barcha yuborishlarni `seconds` ga to'xtatadi."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatThrottle:
+    """Har bir chat uchun ketma-ket xabarlar orasida kamida `interval` sekund."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_at = {}
+
+    async def wait(self, chat_id):
+        now = time.monotonic()
+        ready_at = self._next_at.get(chat_id, 0.0)
+        self._next_at[chat_id] = max(now, ready_at) + self.interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+
+async def _copy_with_retry(chat_id, from_chat_id, message_id, bucket, throttle):
+    """Bitta qabul qiluvchiga xabar nusxasini yuboradi. True — yuborildi, False — yo'q."""
+    attempts = 0
+    floods = 0
+    while True:
+        await bucket.acquire()
+        await throttle.wait(chat_id)
+        try:
+            await bot.copy_message(chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id)
+            return True
+        except RetryAfter as e:
+            floods += 1
+            logger.warning(f"⏳ Flood control: {e.timeout} sek kutiladi (chat {chat_id})")
+            bucket.pause(e.timeout)
+            if floods > MAX_FLOOD_RETRIES:
+                return False
+        except (Unauthorized, ChatNotFound, UserDeactivated) as e:
+            # Bot bloklangan / chat yo'q — qayta urinishdan foyda yo'q
+            logger.info(f"🚫 {chat_id} ga yuborib bo'lmaydi: {e}")
+            return False
+        except (NetworkError, asyncio.TimeoutError) as e:
+            attempts += 1
+            if attempts >= MAX_ATTEMPTS:
+                logger.error(f"❌ {chat_id} ga yuborishda tarmoq xatosi: {e}")
+                return False
+            await asyncio.sleep(2 ** attempts)
+        except TelegramAPIError as e:
+            logger.error(f"❌ {chat_id} ga yuborishda xatolik: {e}")
+            return False
+
+
+def _progress_text(job, total, success, fail):
+    done = success + fail
+    percent = (done * 100 // total) if total else 100
+    return (
+        f"📤 Xabar yuborilmoqda... {done}/{total} ({percent}%)\n\n" +
+        (job.summary or "") +
+        f"\n\n✅ Muvaffaqiyatli: {success}\n"
+        f"❌ Xato: {fail}"
+    )
+
+
+def _result_text(job, total, success, fail, cancelled=False):
+    return (
+        ("⛔ Xabar yuborish to'xtatildi!\n\n" if cancelled else "✅ Xabar yuborish tugadi!\n\n") +
+        (job.summary or "") +
+        f"\n\n📊 Natija:\n"
+        f"✅ Muvaffaqiyatli: {success}\n"
+        f"❌ Xato: {fail}\n"
+        f"📝 Jami: {total}"
+    )
+
+
+def _stop_keyboard(job_id):
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton("⛔ To'xtatish", callback_data=f"broadcast_stop_{job_id}"))
+    return keyboard
+
+
+async def _edit_progress(job, text, reply_markup=None):
+    if not job.progress_message_id:
+        return
+    try:
+        await bot.edit_message_text(
+            text, chat_id=job.admin_telegram_id, message_id=job.progress_message_id,
+            reply_markup=reply_markup,
+        )
+    except MessageNotModified:
+        pass
+    except Exception as e:
+        logger.warning(f"⚠️ Broadcast #{job.id} progress xabarini yangilab bo'lmadi: {e}")
+
+
+async def run_broadcast(job_id):
+    """
+    BroadcastJob'ni position'dan boshlab oxirigacha yuboradi.
+    Workerlar tartibsiz tugatgani uchun position — "shu joygacha hammasi tayyor" chegarasi;
+    uzilishdan keyin chegaradan keyingi (WORKERS tagacha) xabar qayta yuborilishi mumkin.
+    """
+    if job_id in _running:
+        return
+    stop = _running[job_id] = asyncio.Event()
+    try:
+        job = await repo.broadcast_job(job_id)
+        if job.status != 'running':
+            return
+        recipients = job.recipients
+        total = len(recipients)
+        start = job.position
+
+        results = bytearray(total)
+        state = {
+            'position': start,
+            'success': job.success_count,   # position gacha tasdiqlangan natijalar
+            'fail': job.fail_count,
+            'live_success': 0,              # position dan keyingi, hali tasdiqlanmagan
+            'live_fail': 0,
+        }
+
+        def advance():
+            pos = state['position']
+            while pos < total and results[pos] != _PENDING:
+                if results[pos] == _OK:
+                    state['success'] += 1
+                    state['live_success'] -= 1
+                else:
+                    state['fail'] += 1
+                    state['live_fail'] -= 1
+                pos += 1
+            state['position'] = pos
+
+        async def checkpoint(finish=False):
+            running = await repo.save_broadcast_progress(
+                job_id, state['position'], state['success'], state['fail'], finish=finish,
+            )
+            if not running:
+                # Boshqa jarayonda (yoki admin tugmasi bilan) bekor qilingan
+                stop.set()
+
+        bucket = TokenBucket(GLOBAL_RATE)
+        throttle = ChatThrottle(PER_CHAT_INTERVAL)
+        queue = asyncio.Queue()
+        for idx in range(start, total):
+            queue.put_nowait(idx)
+
+        async def worker():
+            while not stop.is_set():
+                try:
+                    idx = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    ok = await _copy_with_retry(
+                        recipients[idx], job.from_chat_id, job.message_id, bucket, throttle
+                    )
+                except Exception as e:
+                    logger.error(f"❌ Broadcast #{job_id}: {recipients[idx]} ga yuborishda xatolik: {e}", exc_info=True)
+                    ok = False
+                results[idx] = _OK if ok else _FAILED
+                state['live_success' if ok else 'live_fail'] += 1
+                advance()
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(PROGRESS_INTERVAL)
+                await checkpoint()
+                if stop.is_set():
+                    return
+                await _edit_progress(job, _progress_text(
+                    job, total,
+                    state['success'] + state['live_success'],
+                    state['fail'] + state['live_fail'],
+                ), _stop_keyboard(job_id))
+
+        logger.info(f"📢 Broadcast #{job_id}: {start}/{total} dan boshlandi")
+        await _edit_progress(job, _progress_text(job, total, state['success'], state['fail']), _stop_keyboard(job_id))
+        reporter_task = asyncio.create_task(reporter())
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(WORKERS, max(total - start, 1)))))
+        finally:
+            reporter_task.cancel()
+
+        await checkpoint(finish=not stop.is_set())
+        cancelled = stop.is_set()
+        if cancelled:
+            # Tasdiqlanmagan (position dan keyingi) natijalar ham hisobotga qo'shiladi
+            state['success'] += state['live_success']
+            state['fail'] += state['live_fail']
+        result = _result_text(job, total, state['success'], state['fail'], cancelled)
+        await _edit_progress(job, result)
+        try:
+            await bot.send_message(job.admin_telegram_id, result)
+        except Exception as e:
+            logger.error(f"⚠️ Admin {job.admin_telegram_id} ga broadcast natijasini yuborishda xatolik: {e}")
+        logger.info(
+            f"📢 Broadcast #{job_id} {'bekor qilindi' if cancelled else 'tugadi'}: "
+            f"{state['success']} ok, {state['fail']} xato"
+        )
+    except Exception as e:
+        logger.error(f"❌ Broadcast #{job_id} da critical xatolik: {e}", exc_info=True)
+    finally:
+        _running.pop(job_id, None)
+
+
+def start_broadcast_job(job_id):
+    """run_broadcast'ni fon vazifasi sifatida ishga tushiradi (handler kutib turmaydi)."""
+    task = asyncio.create_task(run_broadcast(job_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def stop_broadcast_job(job_id):
+    """
+    Broadcastni to'xtatadi: DB da 'cancelled', shu jarayonda ishlayotgan bo'lsa workerlar
+    navbatdagi xabarni olmaydi. Qaytaradi: False — job allaqachon tugagan/bekor qilingan.
+    """
+    cancelled = await repo.cancel_broadcast_job(job_id)
+    stop = _running.get(job_id)
+    if cancelled and stop is not None:
+        stop.set()
+    return cancelled
+
+
+async def resume_pending_broadcasts():
+    """Bot ishga tushganda tugallanmay qolgan broadcastlarni davom ettiradi."""
+    job_ids = await repo.running_broadcast_ids()
+    for job_id in job_ids:
+        logger.info(f"♻️ Broadcast #{job_id} davom ettirilmoqda")
+        start_broadcast_job(job_id)
+    return len(job_ids)
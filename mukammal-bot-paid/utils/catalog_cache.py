@@ -0,0 +1,178 @@
+"""
+Bot ichidagi katalog keshi: faol mavzular (parse qilingan correct_answers bilan),
+kurslar, guruhlar va tizim holati (course_guard uchun).
+
+Bu ma'lumotlar faqat admin tahrirlaganda o'zgaradi, shuning uchun har tugma
+bosilganda API/DB ga bormasdan TTL bilan xotirada saqlanadi. Mavzu/kurs/guruhni
+o'zgartiruvchi admin handlerlar tegishli invalidate_*() ni chaqiradi; Django admin
+paneldagi o'zgarishlar TTL tugagach ko'rinadi.
+"""
+import asyncio
+import logging
+import time
+
+from base_app.grading import get_answer_key
+from utils.db_api.repository import db_call
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TTL = 300  # sekund
+
+TOPICS = "topics"
+COURSES = "courses"
+GROUPS = "groups"
+SYSTEM_STATE = "system_state"
+
+
+def _topic_to_dict(t):
+    correct_answers = t.correct_answers or {}
+    return {
+        'id': t.id,
+        'title': t.title,
+        'course_id': t.course_id,
+        'is_active': bool(t.is_active),
+        # API (/topics/{id}/) javobidagidek ISO satr
+        'deadline': t.deadline.isoformat() if t.deadline else None,
+        'show_detailed_results': t.show_detailed_results,
+        'correct_answers': correct_answers,
+        # test_code -> kompilyatsiya qilingan AnswerKey (base_app.grading)
+        'answer_keys': {code: get_answer_key(ans) for code, ans in correct_answers.items()},
+    }
+
+
+@db_call
+def _load_active_topics():
+    from base_app.models import Topic
+
+    topics = Topic.objects.filter(is_active=True, course__is_active=True)
+    return {t.id: _topic_to_dict(t) for t in topics}
+
+
+@db_call
+def _load_topic(topic_id):
+    from base_app.models import Topic
+
+    t = Topic.objects.filter(id=topic_id).first()
+    return _topic_to_dict(t) if t else None
+
+
+@db_call
+def _load_courses():
+    from base_app.models import Course
+
+    return list(Course.objects.all().order_by('name'))
+
+
+@db_call
+def _load_groups():
+    from base_app.models import Group
+
+    return list(Group.objects.select_related('course').order_by('id'))
+
+
+@db_call
+def _load_system_state():
+    from base_app.models import Course
+
+    active_courses = Course.objects.filter(is_active=True)
+    if not active_courses.exists():
+        return "no_course"
+    if not active_courses.filter(groups__enrolled_students__isnull=False).exists():
+        return "no_student"
+    return None
+
+
+class CatalogCache:
+    def __init__(self, ttl=CATALOG_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}   # key -> (expires_at, value)
+        self._locks = {}     # key -> asyncio.Lock (bir vaqtda bitta yuklash)
+
+    async def _get(self, key, loader):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Kutib turgan paytda boshqa coroutine yuklab qo'ygan bo'lishi mumkin
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            value = await loader()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            return value
+
+    def invalidate(self, *keys):
+        """Berilgan kalitlarni (bo'sh bo'lsa — hammasini) keshdan o'chiradi."""
+        if not keys:
+            self._entries.clear()
+            return
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def invalidate_topics(self):
+        self.invalidate(TOPICS)
+
+    def invalidate_courses(self):
+        # Faol mavzular va tizim holati kursning is_active'iga bog'liq
+        self.invalidate(COURSES, TOPICS, GROUPS, SYSTEM_STATE)
+
+    def invalidate_groups(self):
+        self.invalidate(GROUPS, SYSTEM_STATE)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0,
+            'keys': sorted(self._entries),
+        }
+
+    # --- Ma'lumotlar ---
+    async def active_topics(self):
+        """{topic_id: topic_dict} — faqat faol kurslarning faol mavzulari."""
+        return await self._get(TOPICS, _load_active_topics)
+
+    async def get_topic(self, topic_id):
+        """
+        Mavzu (dict, /topics/{id}/ javobi bilan bir xil kalitlar + answer_keys).
+        Faol bo'lmagan mavzu keshda yo'q — to'g'ridan-to'g'ri DB dan olinadi.
+        """
+        topics = await self.active_topics()
+        topic = topics.get(topic_id)
+        if topic is not None:
+            return topic
+        # Faol ro'yxatda yo'q — DB ga boriladi, miss sifatida hisoblaymiz
+        self.misses += 1
+        return await _load_topic(topic_id)
+
+    async def courses(self, active_only=False):
+        courses = await self._get(COURSES, _load_courses)
+        if active_only:
+            return [c for c in courses if c.is_active]
+        return courses
+
+    async def course(self, course_id):
+        """Kurs (Course obyekti) yoki None."""
+        course_id = int(course_id)
+        return next((c for c in await self.courses() if c.id == course_id), None)
+
+    async def groups(self):
+        return await self._get(GROUPS, _load_groups)
+
+    async def system_state(self):
+        state = await self._get(SYSTEM_STATE, _load_system_state)
+        if state is not None:
+            # Tizim hali tayyor emas — keshlamaymiz, birinchi kurs/student qo'shilishi darhol ko'rinsin
+            self.invalidate(SYSTEM_STATE)
+        return state
+
+
+catalog = CatalogCache()
@@ -0,0 +1,235 @@
+"""
+FSM storage: holat va ma'lumotlar Django DB'da (BotFSMState jadvali),
+tez o'qish uchun jarayon ichidagi LRU kesh orqali.
+
+- O'qish: avval LRU (xotira tezligida), bo'lmasa DB'dan bitta SELECT
+- Yozish: write-through — LRU darhol yangilanadi, keyin DB'ga upsert
+  (holat ham, data ham bo'sh bo'lsa qator o'chiriladi)
+- data ixcham JSON satr sifatida saqlanadi; JSON ga aylanmaydigan qiymat (model
+  obyekti, datetime, ...) yozilsa TypeError — keshga ham tushmaydi
+- DB chaqiruvlari repository executor ida (db_call); har (chat, user) yozuvlari o'z
+  asyncio.Lock i bilan navbatma-navbat — bir foydalanuvchining ketma-ket holatlari
+  tartibi buzilmaydi, turli foydalanuvchilar esa parallel yoziladi (lock faqat yozuv
+  kutilayotganda saqlanadi). Umumiy lock faqat reset_all uchun
+- bucket (antiflood throttling) faqat xotirada — har xabarda DB'ga yozmaslik uchun
+- Bir nechta bot jarayoni bo'lsa cache_ttl kichik qo'yiladi (yoki cache_size=0) —
+  shunda boshqa jarayondagi o'zgarishlar ham ko'rinadi
+"""
+import asyncio
+import copy
+import json
+import logging
+import time
+import typing
+from collections import OrderedDict
+
+from aiogram.dispatcher.storage import BaseStorage
+
+from utils.db_api.repository import db_call
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(data):
+    if not data:
+        return ''
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def _loads(payload):
+    if not payload:
+        return {}
+    try:
+        return json.loads(payload)
+    except ValueError:
+        logger.warning("FSM data o'qib bo'lmadi, bo'sh deb olinadi")
+        return {}
+
+
+@db_call
+def _db_load(chat_id, user_id):
+    from base_app.models import BotFSMState
+
+    row = (
+        BotFSMState.objects.filter(chat_id=chat_id, user_id=user_id)
+        .values_list('state', 'data').first()
+    )
+    if row is None:
+        return None, {}
+    return row[0], _loads(row[1])
+
+
+@db_call
+def _db_save(chat_id, user_id, state, payload):
+    from base_app.models import BotFSMState
+
+    if state is None and not payload:
+        BotFSMState.objects.filter(chat_id=chat_id, user_id=user_id).delete()
+        return
+    BotFSMState.objects.update_or_create(
+        chat_id=chat_id, user_id=user_id,
+        defaults={'state': state, 'data': payload},
+    )
+
+
+@db_call
+def _db_clear():
+    from base_app.models import BotFSMState
+
+    BotFSMState.objects.all().delete()
+
+
+class DjangoFSMStorage(BaseStorage):
+    """
+    aiogram FSM storage — BotFSMState jadvali + write-through LRU.
+
+    cache_size: LRU dagi (chat, user) yozuvlar soni (0 — keshsiz, har safar DB)
+    cache_ttl: keshdagi yozuv necha sekunddan keyin DB'dan qayta o'qiladi
+               (None — faqat shu jarayon yozadi deb hisoblanadi, muddatsiz)
+    """
+
+    def __init__(self, cache_size=10000, cache_ttl=None):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()  # (chat, user) -> (state, data, loaded_at)
+        self._buckets = {}           # (chat, user) -> bucket
+        # Executor da bir nechta thread — har kalit yozuvlari tartibini o'z lock'i saqlaydi
+        self._key_locks = {}         # (chat, user) -> [asyncio.Lock, kutayotgan yozuvlar soni]
+        self._reset_lock = asyncio.Lock()
+
+    async def close(self):
+        self._cache.clear()
+        self._buckets.clear()
+
+    async def wait_closed(self):
+        pass
+
+    def _key(self, chat, user):
+        chat, user = self.check_address(chat=chat, user=user)
+        return int(chat), int(user)
+
+    async def _get(self, key):
+        cached = self._cache.get(key)
+        if cached is not None:
+            if self.cache_ttl is None or time.monotonic() - cached[2] < self.cache_ttl:
+                self._cache.move_to_end(key)
+                return cached[0], cached[1]
+        state, data = await _db_load(*key)
+        self._remember(key, state, data)
+        return state, data
+
+    def _remember(self, key, state, data):
+        if not self.cache_size:
+            return
+        self._cache[key] = (state, data, time.monotonic())
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _put(self, key, state, data):
+        # Serializatsiya birinchi (xato shu yerda chiqadi), keyin kesh — keyingi o'qish
+        # darhol yangi qiymatni ko'radi — va DB
+        payload = _dumps(data)
+        while self._reset_lock.locked():
+            # reset_all tugashini kutamiz — undan keyingi yozuv o'chib ketmasin
+            async with self._reset_lock:
+                pass
+        self._remember(key, state, data)
+        # Tekshiruv va ro'yxatdan o'tish orasida await yo'q — reset_all bu yozuvni ko'radi
+        entry = self._key_locks.get(key)
+        if entry is None:
+            entry = self._key_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await _db_save(*key, state, payload)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._key_locks[key]
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        state, _ = await self._get(self._key(chat, user))
+        return state if state is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        _, data = await self._get(self._key(chat, user))
+        return copy.deepcopy(data) if data else (default or {})
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        key = self._key(chat, user)
+        _, data = await self._get(key)
+        await self._put(key, self.resolve_state(state), data)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        key = self._key(chat, user)
+        state, _ = await self._get(key)
+        await self._put(key, state, copy.deepcopy(data or {}))
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        key = self._key(chat, user)
+        state, old_data = await self._get(key)
+        new_data = copy.deepcopy(old_data)
+        new_data.update(data or {}, **kwargs)
+        await self._put(key, state, new_data)
+
+    async def reset_state(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        key = self._key(chat, user)
+        _, data = await self._get(key)
+        await self._put(key, None, {} if with_data else data)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        bucket = self._buckets.get(self._key(chat, user))
+        return copy.deepcopy(bucket) if bucket else (default or {})
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        key = self._key(chat, user)
+        if bucket:
+            self._buckets[key] = copy.deepcopy(bucket)
+        else:
+            self._buckets.pop(key, None)
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        key = self._key(chat, user)
+        self._buckets.setdefault(key, {}).update(bucket or {}, **kwargs)
+
+    async def reset_all(self, full=True):
+        """Barcha holatlarni o'chiradi (RedisStorage2.reset_all bilan bir xil)."""
+        async with self._reset_lock:
+            # Boshlangan yozuvlar tugaguncha kutiladi, yangilari _put da kutadi
+            for lock, _ in list(self._key_locks.values()):
+                async with lock:
+                    pass
+            self._cache.clear()
+            self._buckets.clear()
+            await _db_clear()
@@ -0,0 +1,1021 @@
+"""
+Bot uchun ma'lumotlar qatlami: handlerlar ORM ga to'g'ridan-to'g'ri
+(sync_to_async / asyncio.to_thread / close_old_connections) murojaat qilish o'rniga
+shu yerdagi yirik, bitta chaqiruvda kerakli hamma narsani qaytaradigan metodlardan
+foydalanadi — har handler uchun bitta "hop".
+
+- Barcha chaqiruvlar bitta maxsus ThreadPoolExecutor da bajariladi (DB_THREADS ta
+  thread); Django ulanishlari thread'ga bog'liq, shuning uchun har thread o'z
+  ulanishini CONN_MAX_AGE davomida qayta ishlatadi (har chaqiruvda yangi ulanish
+  ochilmaydi), eskirgan/uzilgani har chaqiruv atrofida yopiladi
+- Har chaqiruv vaqti o'lchanadi: db_stats() — metod bo'yicha soni / o'rtacha / max,
+  SLOW_CALL dan sekinlari log qilinadi
+- Handlerlar FSM data ga yozadigan qiymatlar oddiy dict/list ko'rinishida qaytariladi
+"""
+import asyncio
+import functools
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from data import config
+
+logger = logging.getLogger(__name__)
+
+SLOW_CALL = 0.5  # sek
+
+_executor = ThreadPoolExecutor(max_workers=config.DB_THREADS, thread_name_prefix="bot-db")
+_stats = defaultdict(lambda: [0, 0.0, 0.0])  # nom -> [soni, jami vaqt, max]
+
+
+def _run(func, args, kwargs):
+    from django.db import close_old_connections
+
+    # Django request sikli kabi: oldin va keyin uzilgan / xato bergan / CONN_MAX_AGE dan
+    # eskirgan ulanish yopiladi, qolgani shu thread'da qayta ishlatiladi
+    # (CONN_HEALTH_CHECKS — qayta ishlatishdan oldin tiriklik tekshiruvi)
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def db_call(func):
+    """Sync ORM funksiyasini bot DB executor ida bajariladigan async funksiyaga aylantiradi."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(_executor, _run, func, args, kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            stat = _stats[name]
+            stat[0] += 1
+            stat[1] += elapsed
+            stat[2] = max(stat[2], elapsed)
+            if elapsed > SLOW_CALL:
+                logger.warning(f"🐢 DB {name}: {elapsed * 1000:.0f} ms")
+
+    return wrapper
+
+
+def db_stats():
+    """{metod: {calls, avg_ms, max_ms}} — eng ko'p vaqt olganlari birinchi."""
+    return {
+        name: {
+            "calls": calls,
+            "avg_ms": round(total / calls * 1000, 1),
+            "max_ms": round(longest * 1000, 1),
+        }
+        for name, (calls, total, longest) in sorted(_stats.items(), key=lambda kv: -kv[1][1])
+    }
+
+
+def _student_groups(student):
+    return [
+        {
+            "id": g.id,
+            "name": g.name,
+            "telegram_group_id": g.telegram_group_id,
+            "invite_link": g.invite_link,
+            "course_id": g.course_id,
+            "course_code": g.course.code if g.course_id else None,
+            "course_name": g.course.name if g.course_id else None,
+            "course_active": bool(g.course_id and g.course.is_active),
+            "course_has_assignments": bool(g.course_id and g.course.has_assignments),
+        }
+        for g in student.groups.all()
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Studentlar
+# ---------------------------------------------------------------------------
+
+@db_call
+def student_profile(telegram_id):
+    """
+    Student profili + guruhlari (kurs ma'lumoti bilan) — 2 ta so'rov.
+    Ro'yxatdan o'tmagan bo'lsa: {"exists": False}
+    """
+    from base_app.models import Student
+
+    s = (
+        Student.objects.select_related('registered_course')
+        .prefetch_related('groups__course')
+        .filter(telegram_id=str(telegram_id)).first()
+    )
+    if s is None:
+        return {"exists": False}
+
+    groups = _student_groups(s)
+    return {
+        "exists": True,
+        "full_name": s.full_name,
+        "is_blocked": s.is_blocked,
+        "viloyat": s.viloyat,
+        "tuman": s.tuman,
+        "phone": s.phone,
+        "math_score": s.math_score,
+        "groups": groups,
+        "registered_course_id": s.registered_course_id,
+        "registered_course_name": s.registered_course.name if s.registered_course_id else None,
+        "role": s.role,
+        # Faol kurslardan birortasida maxsus topshiriq bo'lsa — klaviaturada tugma chiqadi
+        "has_assignment_course": any(g["course_active"] and g["course_has_assignments"] for g in groups),
+        # Faol kurslar: {course_id: course_name}
+        "active_courses": {g["course_id"]: g["course_name"] for g in groups if g["course_active"]},
+    }
+
+
+@db_call
+def has_assignment_course(telegram_id):
+    """Student a'zo bo'lgan faol kurslardan birortasida has_assignments=True bo'lsa True"""
+    from base_app.models import Group
+
+    return Group.objects.filter(
+        enrolled_students__telegram_id=str(telegram_id),
+        course__is_active=True, course__has_assignments=True,
+    ).exists()
+
+
+@db_call
+def save_registration(telegram_id, data, group_id=None, existing=False):
+    """
+    Ro'yxatdan o'tish natijasini bitta tranzaksiyada saqlaydi:
+    yangi student — yaratiladi, mavjud — qo'shimcha ma'lumotlari yangilanadi;
+    group_id berilsa guruhga qo'shiladi.
+    """
+    from base_app.models import Student
+    from django.db import transaction
+
+    extra = {
+        "viloyat": data["viloyat"],
+        "tuman": data["tuman"],
+        "phone": data["phone"],
+        "math_score": data.get("math_score"),
+        "registered_course_id": data.get("course_id"),
+        "role": data.get("role"),
+    }
+    with transaction.atomic():
+        if existing:
+            Student.objects.filter(telegram_id=str(telegram_id)).update(**extra)
+            student = Student.objects.get(telegram_id=str(telegram_id))
+        else:
+            student, _ = Student.objects.update_or_create(
+                telegram_id=str(telegram_id),
+                defaults={"full_name": data["full_name"], **extra},
+            )
+        if group_id is not None:
+            student.groups.add(group_id)
+
+
+@db_call
+def add_student_to_group(telegram_id, group_id):
+    from base_app.models import Student
+
+    Student.objects.get(telegram_id=str(telegram_id)).groups.add(group_id)
+
+
+@db_call
+def rename_student(telegram_id, full_name):
+    from base_app.models import Student
+
+    Student.objects.filter(telegram_id=str(telegram_id)).update(full_name=full_name)
+
+
+# ---------------------------------------------------------------------------
+# Guruhlar
+# ---------------------------------------------------------------------------
+
+@db_call
+def registration_candidates(course_id, score=None, role=None, default_limit=None):
+    """
+    Kursning ro'yxatdan o'tish strategiyasiga mos nomzod guruhlar — kurs + guruhlar
+    bitta chaqiruvda. Kurs topilmasa None.
+      - capacity: bo'sh (is_full=False) guruhlar, max_students gacha
+      - role:     target_role == role bo'lgan bo'sh guruhlar
+      - score_range (default): ball > 26 — score_min >= 27, aks holda score_max <= 26
+    """
+    from base_app.models import Course, Group
+
+    strategy = (
+        Course.objects.filter(id=course_id).values_list('registration_strategy', flat=True).first()
+    )
+    if strategy is None:
+        return None
+
+    qs = Group.objects.filter(
+        course_id=course_id, telegram_group_id__isnull=False,
+    ).exclude(telegram_group_id='').order_by('id')
+
+    if strategy in ('capacity', 'role'):
+        qs = qs.filter(is_full=False)
+        if strategy == 'role':
+            qs = qs.filter(target_role=role)
+        return [
+            {"id": g.id, "name": g.name, "tgid": g.telegram_group_id, "limit": g.max_students, "mark_full": True}
+            for g in qs
+        ]
+
+    if score is not None and score > 26:
+        qs = qs.filter(score_min__gte=27)
+    else:
+        qs = qs.filter(score_max__lte=26)
+    return [
+        {"id": g.id, "name": g.name, "tgid": g.telegram_group_id, "limit": default_limit, "mark_full": False}
+        for g in qs
+    ]
+
+
+@db_call
+def mark_group_full(group_id):
+    from base_app.models import Group
+
+    Group.objects.filter(id=group_id).update(is_full=True)
+
+
+# ---------------------------------------------------------------------------
+# Mavzular va vazifalar
+# ---------------------------------------------------------------------------
+
+@db_call
+def unsubmitted_reminder_data():
+    """
+    Topshirilmagan vazifalar eslatmasi uchun ma'lumotlar — bitta chaqiruvda.
+    Faol mavzu bo'lmasa None, aks holda (students, active_topics, submitted_rows):
+      students       — bloklanmagan studentlar (groups__course prefetch qilingan)
+      active_topics  — faol kurslardagi faol mavzular (course bilan)
+      submitted_rows — [(student_id, topic_id, task_type), ...]
+    """
+    from base_app.models import Student, Task, Topic
+
+    if not Topic.objects.filter(is_active=True).exists():
+        return None
+
+    students = list(
+        Student.objects.filter(is_blocked=False)
+        .prefetch_related('groups__course')
+        .only('id', 'telegram_id', 'full_name', 'phone')
+    )
+    active_topics = list(
+        Topic.objects.filter(is_active=True, course__is_active=True)
+        .select_related('course')
+        .only('id', 'title', 'deadline', 'correct_answers', 'course')
+    )
+    submitted_rows = list(
+        Task.objects.filter(topic_id__in=[t.id for t in active_topics], student__is_blocked=False)
+        .values_list('student_id', 'topic_id', 'task_type')
+        .distinct()
+    )
+    return students, active_topics, submitted_rows
+
+
+@db_call
+def followups_with_unsubmitted():
+    """
+    Qo'ng'iroq qilingan (bloklanmagan) studentlar va har birining faol mavzulardan
+    topshirmaganlari soni — student bo'yicha alohida so'rov o'rniga bitta Task so'rovi.
+    Faol mavzu yoki followup bo'lmasa: [] . Qaytaradi: [(followup, unsubmitted_count), ...]
+    """
+    from base_app.models import FollowUp, Task, Topic
+
+    followups = list(
+        FollowUp.objects.filter(called_at__isnull=False, student__is_blocked=False)
+        .select_related('student')
+    )
+    if not followups:
+        return []
+    active_topic_ids = list(
+        Topic.objects.filter(is_active=True, course__is_active=True).values_list('id', flat=True)
+    )
+    if not active_topic_ids:
+        return []
+
+    submitted = defaultdict(set)
+    for student_id, topic_id in Task.objects.filter(
+        student_id__in={fu.student_id for fu in followups}, topic_id__in=active_topic_ids,
+    ).values_list('student_id', 'topic_id'):
+        submitted[student_id].add(topic_id)
+
+    total = len(active_topic_ids)
+    return [(fu, total - len(submitted[fu.student_id])) for fu in followups]
+
+
+# ---------------------------------------------------------------------------
+# Tangalar
+# ---------------------------------------------------------------------------
+
+@db_call
+def coin_months(telegram_id):
+    """Studentning tanga tranzaksiyalari bor oylar (yangi → eski) — kunlik rollup'lardan."""
+    from base_app.models import CoinDailyRollup
+
+    return list(
+        CoinDailyRollup.objects.filter(wallet__student__telegram_id=str(telegram_id))
+        .dates('day', 'month', order='DESC')
+    )
+
+
+@db_call
+def coin_report_months(course_id, group_id=0):
+    """
+    Kurs (guruh berilsa — shu guruh studentlari) tanga reytingida ma'lumot bor oylar.
+    Qaytaradi: (group_name, months) — group_id=0 bo'lsa group_name None.
+    """
+    from base_app.models import CoinDailyRollup, Group
+
+    qs = CoinDailyRollup.objects.filter(course_id=course_id)
+    group_name = None
+    if group_id:
+        group_name = Group.objects.values_list('name', flat=True).get(id=group_id)
+        qs = qs.filter(wallet__student__groups__id=group_id)
+    return group_name, list(qs.dates('day', 'month', order='DESC'))
+
+
+@db_call
+def coin_rating_data(course_id, group_id=0, year=0, month=0, limit=None):
+    """
+    Tanga reytingi PDF uchun ma'lumotlar — bitta chaqiruvda.
+    Qaytaradi: (course, group_name, rows):
+      year va month berilsa — get_monthly_rating_rows qatorlari,
+      aks holda — hamyonlar (student bilan, tanga va eng uzun streak bo'yicha), limit gacha
+    """
+    from base_app.coins import get_monthly_rating_rows
+    from base_app.models import CoinWallet, Course, Group
+
+    course = Course.objects.get(id=course_id)
+    student_ids = None
+    group_name = None
+    if group_id:
+        group = Group.objects.get(id=group_id)
+        group_name = group.name
+        student_ids = list(group.enrolled_students.values_list('id', flat=True))
+
+    if year and month:
+        return course, group_name, get_monthly_rating_rows(course_id, year, month, student_ids)
+
+    qs = CoinWallet.objects.filter(course_id=course_id).select_related('student')
+    if student_ids is not None:
+        qs = qs.filter(student_id__in=student_ids)
+    qs = qs.order_by('-total_coins', '-longest_streak')
+    return course, group_name, list(qs[:limit] if limit else qs)
+
+
+# ---------------------------------------------------------------------------
+# Admin: mavzular, test kalitlari va hisobotlar
+# ---------------------------------------------------------------------------
+
+@db_call
+def all_topics():
+    """/topics ro'yxati: [{"id", "title", "is_active", "course_code"}] — kurs bilan bitta so'rov."""
+    from base_app.models import Topic
+
+    return [
+        {"id": t.id, "title": t.title, "is_active": t.is_active, "course_code": t.course.code if t.course_id else None}
+        for t in Topic.objects.select_related('course').order_by('id')
+    ]
+
+
+@db_call
+def activate_topic(topic_id):
+    """
+    Mavzuni faollashtiradi va xabar yuboriladigan studentlarni qaytaradi.
+    Topilmasa None, aks holda dict:
+      title, course_name (kurs yo'q bo'lsa None), was_active,
+      activated — nofaol kurs mavzusi bo'lsa False (saqlanmaydi),
+      recipients — kurs guruhlaridagi studentlar telegram_id lari (takrorlanmaydi)
+    """
+    from base_app.models import Student, Topic
+
+    topic = Topic.objects.select_related('course').filter(id=topic_id).first()
+    if topic is None:
+        return None
+
+    result = {
+        "title": topic.title,
+        "course_name": topic.course.name if topic.course_id else None,
+        "was_active": bool(topic.is_active),
+        "activated": False,
+        "recipients": [],
+    }
+    if topic.course_id and not topic.course.is_active:
+        return result
+
+    topic.is_active = True
+    topic.save(update_fields=['is_active', 'activated_at'])
+    result["activated"] = True
+    if topic.course_id:
+        result["recipients"] = list(
+            Student.objects.filter(groups__course_id=topic.course_id)
+            .values_list('telegram_id', flat=True).distinct()
+        )
+    return result
+
+
+@db_call
+def topic(topic_id):
+    """Mavzu (topilmasa Topic.DoesNotExist)."""
+    from base_app.models import Topic
+
+    return Topic.objects.get(id=topic_id)
+
+
+@db_call
+def course_test_topics(course_id, group_id=0):
+    """
+    Kursning test kaliti bor mavzulari (yangi → eski) va guruh nomi (group_id=0 — None).
+    Qaytaradi: (topics, group_name)
+    """
+    from base_app.models import Group, Topic
+
+    topics = [
+        t for t in Topic.objects.filter(course_id=course_id, correct_answers__isnull=False).order_by('-id')
+        if t.correct_answers
+    ]
+    group_name = Group.objects.values_list('name', flat=True).get(id=group_id) if group_id else None
+    return topics, group_name
+
+
+@db_call
+def topics_by_ids(topic_ids):
+    """Mavzular topic_ids tartibida (kurs bilan)."""
+    from base_app.models import Topic
+
+    by_id = Topic.objects.select_related('course').in_bulk(topic_ids)
+    return [by_id[tid] for tid in topic_ids if tid in by_id]
+
+
+@db_call
+def active_test_topics():
+    """Test kaliti bor faol mavzular (yangi → eski)."""
+    from base_app.models import Topic
+
+    return list(Topic.objects.filter(correct_answers__isnull=False, is_active=True).order_by('-id'))
+
+
+@db_call
+def set_topic_answers(topic_id, test_code, new_answers):
+    """Mavzuning bitta test kodi javoblarini almashtiradi (boshqa kodlar saqlanadi). Qaytaradi: eski javoblar."""
+    from base_app.models import Topic
+
+    topic = Topic.objects.get(id=topic_id)
+    old_answers = topic.correct_answers[test_code]
+    topic.correct_answers[test_code] = new_answers
+    topic.save(update_fields=['correct_answers'])
+    return old_answers
+
+
+@db_call
+def regrade_topic(topic_id, test_code, new_answers):
+    """base_app.regrade.regrade_topic_answers — DB executor ida."""
+    from base_app.regrade import regrade_topic_answers
+
+    return regrade_topic_answers(topic_id, test_code, new_answers)
+
+
+def _graded_test_tasks(qs, year=0, month=0):
+    if year and month:
+        qs = qs.filter(submitted_at__year=year, submitted_at__month=month)
+    return qs.filter(task_type='test').exclude(test_answers__isnull=True).exclude(test_answers='')
+
+
+@db_call
+def task_report_months(topic_ids, group_id=0):
+    """Mavzular bo'yicha javobli test topshirilgan oylar (guruh berilsa — shu guruh studentlari)."""
+    from base_app.models import Task
+
+    qs = _graded_test_tasks(Task.objects.filter(topic_id__in=topic_ids))
+    if group_id:
+        qs = qs.filter(student__groups__id=group_id)
+    return list(qs.dates('submitted_at', 'month', order='DESC'))
+
+
+@db_call
+def group_matrix_data(topic_ids, group_id=0, year=0, month=0):
+    """
+    Guruh natijalari matritsasi uchun: (topics, students, tasks).
+    group_id=0 — barcha topshirganlar, aks holda guruh studentlari (natijasi yo'qlari ham).
+    Studentlar full_name bo'yicha, topics — topic_ids tartibida.
+    """
+    from base_app.models import Group, Task, Topic
+
+    by_id = Topic.objects.select_related('course').in_bulk(topic_ids)
+    topics = [by_id[tid] for tid in topic_ids if tid in by_id]
+
+    qs = _graded_test_tasks(Task.objects.filter(topic_id__in=topic_ids), year, month).select_related('student')
+    if group_id:
+        students = list(Group.objects.get(id=group_id).enrolled_students.order_by('full_name'))
+        tasks = list(qs.filter(student_id__in=[s.id for s in students]))
+    else:
+        tasks = list(qs)
+        students = sorted({t.student_id: t.student for t in tasks}.values(), key=lambda s: s.full_name)
+    return topics, students, tasks
+
+
+@db_call
+def topic_pdf_data(topic_id):
+    """Attestat PDF uchun: (topic (kurs bilan), javobli test task'lari (student bilan))."""
+    from base_app.models import Task, Topic
+
+    topic = Topic.objects.select_related('course').get(id=topic_id)
+    tasks = list(_graded_test_tasks(Task.objects.filter(topic_id=topic_id)).select_related('student'))
+    return topic, tasks
+
+
+@db_call
+def test_stats(course_filter):
+    """
+    Test statistikasi: (courses, stats) — kurslar (faollari oldin) va test_code bo'yicha
+    unikal studentlar soni [{"test_code", "topic__title", "topic__course__name", "count"}].
+    course_filter — 'all' yoki kurs id si.
+    """
+    from base_app.models import Course, Task
+    from django.db.models import Count
+
+    courses = list(Course.objects.order_by('-is_active', 'name'))
+    qs = Task.objects.filter(task_type='test').exclude(test_code__isnull=True).exclude(test_code='')
+    if course_filter != 'all':
+        try:
+            qs = qs.filter(topic__course__id=int(course_filter))
+        except (ValueError, TypeError):
+            pass
+    stats = list(
+        qs.values('test_code', 'topic__title', 'topic__course__name')
+        .annotate(count=Count('student', distinct=True))
+        .order_by('-topic__id')
+    )
+    return courses, stats
+
+
+@db_call
+def deadline_results_data(day_start, day_end):
+    """
+    Deadline shu oraliqda tugagan test mavzulari va deadline gacha javob yuborilgan
+    task'lar (student bilan) — mavzular soni qancha bo'lsa ham 2 ta so'rov.
+    Qaytaradi: [(topic, tasks), ...]
+    """
+    from base_app.models import Task, Topic
+    from django.db.models import F
+
+    topics = list(
+        Topic.objects.filter(deadline__gte=day_start, deadline__lte=day_end, correct_answers__isnull=False)
+        .exclude(correct_answers={})
+    )
+    if not topics:
+        return []
+
+    by_topic = defaultdict(list)
+    for task in (
+        Task.objects.filter(
+            topic_id__in=[t.id for t in topics], task_type='test', test_answers__isnull=False,
+            # Deadline dan keyin yechganlar batafsil javoblarni allaqachon ko'rgan
+            submitted_at__lte=F('topic__deadline'),
+        ).exclude(test_answers='')
+        .select_related('student')
+        .only('id', 'topic_id', 'test_code', 'test_answers', 'student__telegram_id', 'student__full_name',
+              'submitted_at')
+    ):
+        by_topic[task.topic_id].append(task)
+    return [(t, by_topic[t.id]) for t in topics]
+
+
+# ---------------------------------------------------------------------------
+# Admin: kurslar
+# ---------------------------------------------------------------------------
+
+@db_call
+def courses(active_only=False, order_by=('-is_active', 'name')):
+    """Kurslar (menyular uchun)."""
+    from base_app.models import Course
+
+    qs = Course.objects.all()
+    if active_only:
+        qs = qs.filter(is_active=True)
+    return list(qs.order_by(*order_by))
+
+
+@db_call
+def course(course_id):
+    """Kurs (topilmasa Course.DoesNotExist)."""
+    from base_app.models import Course
+
+    return Course.objects.get(id=course_id)
+
+
+@db_call
+def new_course_code(name):
+    """Nom band bo'lsa None, aks holda nomdan yasalgan unikal kod ('Ingliz tili' → 'ingliz_tili')."""
+    import re
+
+    from base_app.models import Course
+
+    if Course.objects.filter(name=name).exists():
+        return None
+    base = re.sub(r"[^a-z0-9]+", "_", name.strip().lower()).strip("_") or "kurs"
+    taken = set(Course.objects.filter(code__startswith=base).values_list('code', flat=True))
+    code = base
+    i = 2
+    while code in taken:
+        code = f"{base}_{i}"
+        i += 1
+    return code
+
+
+@db_call
+def create_course(name, code, task_type, registration_strategy):
+    from base_app.models import Course
+
+    return Course.objects.create(
+        name=name, code=code, task_type=task_type,
+        registration_strategy=registration_strategy, is_active=True,
+    )
+
+
+@db_call
+def update_course(course_id, **fields):
+    """Kurs maydonlarini yangilaydi. Qaytaradi: yangilangan kurs."""
+    from base_app.models import Course
+
+    course = Course.objects.get(id=course_id)
+    for name, value in fields.items():
+        setattr(course, name, value)
+    course.save(update_fields=list(fields))
+    return course
+
+
+@db_call
+def toggle_course_active(course_id):
+    """Kurs faolligini almashtiradi. Qaytaradi: yangilangan kurs."""
+    from base_app.models import Course
+
+    course = Course.objects.get(id=course_id)
+    course.is_active = not course.is_active
+    course.save(update_fields=['is_active'])
+    return course
+
+
+@db_call
+def rename_course(course_id, new_name):
+    """Nom boshqa kursda band bo'lsa None, aks holda eski nom."""
+    from base_app.models import Course
+
+    if Course.objects.filter(name=new_name).exclude(id=course_id).exists():
+        return None
+    course = Course.objects.get(id=course_id)
+    old_name = course.name
+    course.name = new_name
+    course.save(update_fields=['name'])
+    return old_name
+
+
+@db_call
+def delete_course(course_id):
+    """
+    Kursni o'chiradi. Qaytaradi: (name, blockers) — o'chirilgan bo'lsa blockers None,
+    guruh/mavzular bog'langani uchun o'chmasa (groups_count, topics_count).
+    """
+    from base_app.models import Course
+    from django.db.models import ProtectedError
+
+    course = Course.objects.get(id=course_id)
+    try:
+        course.delete()
+    except ProtectedError:
+        return course.name, (course.groups.count(), course.topics.count())
+    return course.name, None
+
+
+# ---------------------------------------------------------------------------
+# Admin: guruhlar
+# ---------------------------------------------------------------------------
+
+def _groups_with_counts():
+    from base_app.models import Group
+    from django.db.models import Count
+
+    return Group.objects.select_related('course').annotate(student_count=Count('enrolled_students'))
+
+
+@db_call
+def course_groups(course_id, order_by='name'):
+    """Kurs guruhlari, har biri student_count bilan — bitta so'rov."""
+    return list(_groups_with_counts().filter(course_id=course_id).order_by(order_by))
+
+
+@db_call
+def group(group_id):
+    """Guruh (kurs va student_count bilan; topilmasa Group.DoesNotExist)."""
+    return _groups_with_counts().get(id=group_id)
+
+
+@db_call
+def group_name_taken(name, exclude_id=None):
+    from base_app.models import Group
+
+    qs = Group.objects.filter(name=name)
+    if exclude_id is not None:
+        qs = qs.exclude(id=exclude_id)
+    return qs.exists()
+
+
+@db_call
+def create_group(course_id, **fields):
+    """Guruh yaratadi. Qaytaradi: guruh (kurs va student_count bilan)."""
+    from base_app.models import Group
+
+    group = Group.objects.create(course_id=course_id, **fields)
+    return _groups_with_counts().get(id=group.id)
+
+
+@db_call
+def update_group(group_id, **fields):
+    """Guruh maydonlarini yangilaydi. Qaytaradi: guruh (kurs va student_count bilan)."""
+    from base_app.models import Group
+
+    Group.objects.filter(id=group_id).update(**fields)
+    return _groups_with_counts().get(id=group_id)
+
+
+@db_call
+def delete_group(group_id):
+    """Guruhni o'chiradi. Qaytaradi: guruh nomi."""
+    from base_app.models import Group
+
+    group = Group.objects.get(id=group_id)
+    group.delete()
+    return group.name
+
+
+# ---------------------------------------------------------------------------
+# Broadcast
+# ---------------------------------------------------------------------------
+
+@db_call
+def broadcast_group_menu(session_id=None):
+    """
+    Broadcast guruh tanlash ekrani — bitta chaqiruvda.
+    Qaytaradi: (groups, session_code):
+      groups       — [{"id", "label", "count"}] (label: "Kurs - Guruh")
+      session_code — session_id berilgan va topilgan bo'lsa kod, aks holda None
+    """
+    from base_app.models import AttendanceSession
+
+    groups = [
+        {
+            "id": g.id,
+            "label": f"{g.course.name if g.course_id else 'N/A'} - {g.name}",
+            "count": g.student_count,
+        }
+        for g in _groups_with_counts().order_by('id')
+    ]
+    session_code = None
+    if session_id:
+        session_code = AttendanceSession.objects.filter(id=session_id).values_list('code', flat=True).first()
+    return groups, session_code
+
+
+@db_call
+def broadcast_targets(group_ids, session_id=None):
+    """
+    Broadcast oluvchilari: tanlangan guruhlar studentlari (takrorlanmaydi); session_id
+    berilsa — shu sessiyada davomat qo'ymaganlari.
+    Qaytaradi: dict — group_names, telegram_ids, session_code
+    (guruhlar topilmasa group_names bo'sh, sessiya topilmasa session_code None).
+    """
+    from base_app.models import Attendance, AttendanceSession, Group, Student
+
+    groups = Group.objects.filter(id__in=group_ids).select_related('course').order_by('id')
+    group_names = [f"{g.course.name if g.course_id else 'N/A'} - {g.name}" for g in groups]
+    result = {"group_names": group_names, "telegram_ids": [], "session_code": None}
+    if not group_names:
+        return result
+
+    students = Student.objects.filter(groups__id__in=group_ids)
+    if session_id:
+        result["session_code"] = (
+            AttendanceSession.objects.filter(id=session_id).values_list('code', flat=True).first()
+        )
+        if result["session_code"] is None:
+            return result
+        students = students.exclude(
+            id__in=Attendance.objects.filter(session_id=session_id).values('student_id')
+        )
+    result["telegram_ids"] = list(students.values_list('telegram_id', flat=True).distinct())
+    return result
+
+
+@db_call
+def create_broadcast_job(**fields):
+    """BroadcastJob yaratadi. Qaytaradi: job id."""
+    from base_app.models import BroadcastJob
+
+    return BroadcastJob.objects.create(**fields).id
+
+
+@db_call
+def broadcast_job(job_id):
+    from base_app.models import BroadcastJob
+
+    return BroadcastJob.objects.get(pk=job_id)
+
+
+@db_call
+def running_broadcast_ids():
+    from base_app.models import BroadcastJob
+
+    return list(BroadcastJob.objects.filter(status='running').values_list('id', flat=True))
+
+
+@db_call
+def save_broadcast_progress(job_id, position, success_count, fail_count, finish=False):
+    """
+    Progress checkpoint. Faqat status='running' bo'lsa yoziladi (finish=True — 'done' ga
+    o'tkaziladi). Qaytaradi: False — job bekor qilingan (progress baribir saqlanadi).
+    """
+    from base_app.models import BroadcastJob
+    from django.utils import timezone
+
+    progress = {'position': position, 'success_count': success_count, 'fail_count': fail_count}
+    running = BroadcastJob.objects.filter(pk=job_id, status='running')
+    extra = {'status': 'done', 'finished_at': timezone.now()} if finish else {}
+    if running.update(**progress, **extra):
+        return True
+    BroadcastJob.objects.filter(pk=job_id).update(**progress)
+    return False
+
+
+@db_call
+def cancel_broadcast_job(job_id):
+    """Yuborilayotgan jobni 'cancelled' qiladi. Qaytaradi: True — bekor qilindi."""
+    from base_app.models import BroadcastJob
+    from django.utils import timezone
+
+    return bool(
+        BroadcastJob.objects.filter(pk=job_id, status='running')
+        .update(status='cancelled', finished_at=timezone.now())
+    )
+
+
+# ---------------------------------------------------------------------------
+# Davomat
+# ---------------------------------------------------------------------------
+
+@db_call
+def attendance_sessions_page(page, page_size):
+    """
+    Davomat sessiyalari sahifasi (yangi → eski, page 1-based, chegaradan chiqsa qisqartiriladi).
+    Qaytaradi: (sessions, page, total_pages, total)
+    """
+    from base_app.models import AttendanceSession
+
+    qs = AttendanceSession.objects.order_by('-created_at')
+    total = qs.count()
+    total_pages = max(1, (total + page_size - 1) // page_size)
+    page = max(1, min(page, total_pages))
+    start = (page - 1) * page_size
+    return list(qs[start:start + page_size]), page, total_pages, total
+
+
+@db_call
+def attendance_session_code(session_id):
+    """Sessiya kodi (topilmasa None)."""
+    from base_app.models import AttendanceSession
+
+    return AttendanceSession.objects.filter(id=session_id).values_list('code', flat=True).first()
+
+
+@db_call
+def open_attendance_session(code, expires_at, created_by):
+    """Adminning oldingi faol sessiyalari yopiladi va yangisi ochiladi (bitta tranzaksiyada)."""
+    from base_app.models import AttendanceSession
+    from django.db import transaction
+
+    with transaction.atomic():
+        AttendanceSession.objects.filter(created_by=created_by, is_active=True).update(is_active=False)
+        return AttendanceSession.objects.create(
+            code=code, expires_at=expires_at, created_by=created_by, is_active=True,
+        ).id
+
+
+@db_call
+def mark_attendance(telegram_id, code):
+    """
+    Studentga faol va muddati o'tmagan sessiya kodi bo'yicha davomat qo'yadi.
+    Qaytaradi: (status, session_date) — status: 'marked' | 'already' | 'no_student' | 'invalid'
+    """
+    from base_app.models import Attendance, AttendanceSession, Student
+    from django.utils import timezone
+
+    student_id = Student.objects.filter(telegram_id=str(telegram_id)).values_list('id', flat=True).first()
+    if student_id is None:
+        return 'no_student', None
+    session = AttendanceSession.objects.filter(
+        code=code, is_active=True, expires_at__gt=timezone.now(),
+    ).first()
+    if session is None:
+        return 'invalid', None
+
+    # get_or_create — bir vaqtda ikki marta bosilsa ham (unique_together) bitta yozuv
+    _, created = Attendance.objects.get_or_create(student_id=student_id, session=session)
+    return ('marked' if created else 'already'), session.created_at.strftime("%d.%m.%Y")
+
+
+# ---------------------------------------------------------------------------
+# Sozlamalar
+# ---------------------------------------------------------------------------
+
+@db_call
+def schedule_configs():
+    """{job_key: ScheduleConfig} — saqlanganlari (yo'qlari DEFAULT_SCHEDULE dan olinadi)."""
+    from base_app.models import ScheduleConfig
+
+    return {c.job_key: c for c in ScheduleConfig.objects.all()}
+
+
+@db_call
+def schedule_config(job_key, defaults=None):
+    """
+    Bitta vazifa sozlamasi. defaults berilsa — yo'q bo'lsa shu qiymatlar bilan yaratiladi
+    (enabled=True), aks holda yo'q bo'lsa None.
+    """
+    from base_app.models import ScheduleConfig
+
+    if defaults is None:
+        return ScheduleConfig.objects.filter(job_key=job_key).first()
+    cfg, _ = ScheduleConfig.objects.get_or_create(job_key=job_key, defaults={
+        'enabled': True, 'weekdays': defaults['weekdays'], 'hour': defaults['hour'], 'minute': defaults['minute'],
+    })
+    return cfg
+
+
+@db_call
+def update_schedule_config(job_key, defaults, toggle=False, **fields):
+    """
+    Vazifa sozlamasini yangilaydi (yo'q bo'lsa defaults bilan yaratiladi);
+    toggle=True — enabled almashtiriladi. Qaytaradi: yangilangan ScheduleConfig.
+    """
+    from base_app.models import ScheduleConfig
+
+    cfg, _ = ScheduleConfig.objects.get_or_create(job_key=job_key, defaults={
+        'enabled': True, 'weekdays': defaults['weekdays'], 'hour': defaults['hour'], 'minute': defaults['minute'],
+    })
+    if toggle:
+        fields['enabled'] = not cfg.enabled
+    for name, value in fields.items():
+        setattr(cfg, name, value)
+    cfg.save(update_fields=list(fields))
+    return cfg
+
+
+@db_call
+def weekly_report_setting():
+    """WeeklyReportSetting (yo'q bo'lsa None)."""
+    from base_app.models import WeeklyReportSetting
+
+    return WeeklyReportSetting.objects.first()
+
+
+@db_call
+def save_weekly_report_setting(mode, year=None, month=None):
+    from base_app.models import WeeklyReportSetting
+
+    setting, _ = WeeklyReportSetting.objects.get_or_create(id=1, defaults={'mode': 'last10'})
+    setting.mode = mode
+    setting.year = year if mode == 'month' else None
+    setting.month = month if mode == 'month' else None
+    setting.save(update_fields=['mode', 'year', 'month'])
+
+
+@db_call
+def topic_activation_months():
+    """Mavzular faollashtirilgan oylar (yangi → eski)."""
+    from base_app.models import Topic
+
+    return list(Topic.objects.filter(activated_at__isnull=False).dates('activated_at', 'month', order='DESC'))
+
+
+@db_call
+def monthly_streak_menu():
+    """Oylik streak menyusi: (months, enabled_pairs) — enabled_pairs: {(year, month), ...}."""
+    from base_app.models import MonthlyStreakSetting, Topic
+
+    months = list(Topic.objects.filter(activated_at__isnull=False).dates('activated_at', 'month', order='DESC'))
+    enabled = set(MonthlyStreakSetting.objects.filter(enabled=True).values_list('year', 'month'))
+    return months, enabled
+
+
+@db_call
+def toggle_monthly_streak(year, month):
+    """Oy uchun streak rejimini almashtiradi. Qaytaradi: yangi holat."""
+    from base_app.models import MonthlyStreakSetting
+
+    setting, _ = MonthlyStreakSetting.objects.get_or_create(year=year, month=month)
+    setting.enabled = not setting.enabled
+    setting.save(update_fields=['enabled'])
+    return setting.enabled
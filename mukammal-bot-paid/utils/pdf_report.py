@@ -3,7 +3,6 @@ PDF hisobot generatori — 50 savollik testlar uchun
 Struktura: №, F.I.Sh, Fan (1-35)/70, Ped (36-50)/30, Jami/100, Toifa
 """
 import io
-import re
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
@@ -13,6 +12,8 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
 
+from base_app.grading import fan_ped_many, get_answer_key, grade_many
+
 FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
 FONT_BOLD_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
 
@@ -32,36 +33,6 @@ def get_category(ball: int) -> str:
     return "O'tmagan"
 
 
-def _parse_answers(s: str) -> list[str]:
-    """Javoblar satrini ro'yxatga aylantiradi: 'abc' → ['a','b','c'], '1a2b3c' → ['a','b','c']"""
-    if not s:
-        return []
-    s = s.lower().strip()
-    if re.search(r'\d', s):
-        return [m.group(1)[0] for m in re.finditer(r'\d+([a-zx]+)', s)]
-    return list(re.sub(r'[^a-zx]', '', s))
-
-
-def calc_fan_ped(correct_str: str, student_str: str):
-    """
-    50 savollik test uchun fan va ped balllarini hisoblaydi.
-    Qaytaradi: (fan_ball, ped_ball) yoki (None, None) agar 50 savol bo'lmasa.
-    """
-    correct = _parse_answers(correct_str)
-    if len(correct) != 50:
-        return None, None
-
-    student = _parse_answers(student_str)
-    # Savol soni yetmasa bo'sh javob deb hisoblaymiz
-    while len(student) < 50:
-        student.append("")
-
-    fan_correct = sum(1 for i in range(35) if correct[i] == student[i])
-    ped_correct = sum(1 for i in range(35, 50) if correct[i] == student[i])
-
-    return fan_correct * 2, ped_correct * 2
-
-
 def generate_coin_rating_pdf(course, wallets: list, group_name: str = None) -> io.BytesIO:
     """
     course     — Course model instance
@@ -130,12 +101,11 @@ def generate_topic_pdf(topic, tasks: list) -> io.BytesIO:
     test_code = next(iter(topic.correct_answers), None) if topic.correct_answers else None
     correct_str = topic.correct_answers.get(test_code, "") if test_code else ""
 
-    # Har bir student uchun ball hisoblash
+    # Har bir student uchun ball hisoblash (bitta o'tishda)
+    answered = [task for task in tasks if task.test_answers]
+    scores = fan_ped_many(get_answer_key(correct_str), [t.test_answers for t in answered])
     rows = []
-    for task in tasks:
-        if not task.test_answers:
-            continue
-        fan_ball, ped_ball = calc_fan_ped(correct_str, task.test_answers)
+    for task, (fan_ball, ped_ball) in zip(answered, scores):
         if fan_ball is None:
             continue
         jami = fan_ball + ped_ball
@@ -248,6 +218,29 @@ def generate_coin_monthly_pdf(course, rows: list, group_name: str = None, month_
     return buffer
 
 
+def _topic_scores(key, student_tasks: dict) -> dict:
+    """
+    Bitta mavzu bo'yicha {student_id: (ko'rinish, ulush)}.
+    50q: jami ball  |  boshqa: "to'g'ri/jami". Topshirmagan/baholab bo'lmaydigan — yo'q.
+    """
+    total_q = key.n_questions
+    if total_q == 0:
+        return {}
+    items = [(sid, task.test_answers) for sid, task in student_tasks.items() if task and task.test_answers]
+    answers = [a for _, a in items]
+    result = {}
+    if key.has_blocks:
+        for (sid, _), (fan, ped) in zip(items, fan_ped_many(key, answers, pad=True)):
+            if fan is not None:
+                jami = fan + ped
+                result[sid] = (str(jami), jami / 100)
+        return result
+    for (sid, _), cnt in zip(items, grade_many(key, answers, pad=True)):
+        if cnt is not None:
+            result[sid] = (f"{cnt}/{total_q}", cnt / total_q)
+    return result
+
+
 def generate_group_matrix_pdf(group_name, topics: list, tasks_map: dict, students: list, month_label: str = None) -> io.BytesIO:
     """
     Har sahifada max 10 ta mavzu ustun (matrix).
@@ -283,39 +276,25 @@ def generate_group_matrix_pdf(group_name, topics: list, tasks_map: dict, student
         page_topics = topics[page_idx * COLS_PER_PAGE:(page_idx + 1) * COLS_PER_PAGE]
         n = len(page_topics)
 
-        # Har mavzu uchun meta ma'lumot
+        # Har mavzu uchun meta ma'lumot va studentlar ballari (mavzu bo'yicha bitta o'tishda)
         metas = []
+        topic_scores = []
         for t in page_topics:
             tc = next(iter(t.correct_answers), None) if t.correct_answers else None
             cs = t.correct_answers.get(tc, "") if tc else ""
-            cl = _parse_answers(cs)
-            metas.append((tc, cs, cl, len(cl)))
-
-        def _score(topic, meta, student):
-            tc, cs, cl, total_q = meta
-            task = tasks_map.get(topic.id, {}).get(student.id)
-            if not task or not task.test_answers:
-                return "—", None
-            if total_q == 50:
-                fan, ped = calc_fan_ped(cs, task.test_answers)
-                if fan is None:
-                    return "—", None
-                jami = fan + ped
-                return str(jami), jami / 100
-            if total_q == 0:
-                return "—", None
-            sl = _parse_answers(task.test_answers)
-            while len(sl) < total_q:
-                sl.append("")
-            cnt = sum(1 for j in range(total_q) if cl[j] == sl[j])
-            return f"{cnt}/{total_q}", cnt / total_q
+            key = get_answer_key(cs)
+            metas.append((tc, cs, key, key.n_questions))
+            topic_scores.append(_topic_scores(key, tasks_map.get(t.id, {})))
+
+        def _score(topic_idx, student):
+            return topic_scores[topic_idx].get(student.id, ("—", None))
 
         # Studentlar satrlarini qurish
         rows = []
         for student in students:
             scores, pcts = [], []
-            for topic, meta in zip(page_topics, metas):
-                disp, pct = _score(topic, meta, student)
+            for topic_idx in range(n):
+                disp, pct = _score(topic_idx, student)
                 scores.append(disp)
                 if pct is not None:
                     pcts.append(pct)
@@ -0,0 +1,184 @@
+"""
+Webhook rejimi: Telegram update'lari aiohttp orqali qabul qilinadi va N ta async
+worker'ga taqsimlanadi.
+
+- Har bir foydalanuvchi update'lari doim bitta worker navbatiga tushadi
+  (user_id % N) — FSM jarayonlari tartibi buzilmaydi
+- Navbatlar chegaralangan: to'lib qolsa webhook javobi kutadi (backpressure),
+  Telegram esa yangi update'larni sekinroq yuboradi
+- Metrikalar: navbat chuqurligi, handler kechikishi (o'rtacha / max / p95),
+  DB chaqiruvlari vaqti (utils/db_api/repository.py) — GET <webhook_path>/metrics
+  (webhook secret sarlavhasi bilan) va davriy log
+- To'xtashda yangi update qabul qilinmaydi, navbatdagilar drain_timeout ichida
+  qayta ishlanadi
+"""
+import asyncio
+import hmac
+import logging
+import time
+from collections import deque
+
+from aiogram import Bot, Dispatcher, types
+from aiohttp import web
+
+from utils.db_api.repository import db_stats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 1000   # p95 uchun oxirgi N ta update kechikishi
+METRICS_LOG_INTERVAL = 60  # sek
+
+
+def update_user_id(data):
+    """Update (xom dict) qaysi foydalanuvchi/chatga tegishli — navbat kaliti uchun."""
+    for key, value in data.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        for field in ('from', 'user', 'chat'):
+            owner = value.get(field)
+            if isinstance(owner, dict) and 'id' in owner:
+                return owner['id']
+        message = value.get('message')  # callback_query.message (from bo'lmasa)
+        if isinstance(message, dict) and isinstance(message.get('chat'), dict):
+            return message['chat']['id']
+    return 0
+
+
+class UpdateMetrics:
+    """Qabul qilingan / qayta ishlangan update'lar va handler kechikishi statistikasi."""
+
+    def __init__(self):
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.max_queue_wait = 0.0
+        self._recent = deque(maxlen=LATENCY_WINDOW)
+
+    def observe(self, latency, queue_wait, ok):
+        self.processed += 1
+        if not ok:
+            self.failed += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+        self._recent.append(latency)
+
+    def snapshot(self, queue_depths):
+        recent = sorted(self._recent)
+        p95 = recent[int(len(recent) * 0.95) - 1] if recent else 0.0
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "queue_depth": sum(queue_depths),
+            "queue_depth_max": max(queue_depths) if queue_depths else 0,
+            "latency_avg_ms": round(self.total_latency / self.processed * 1000, 1) if self.processed else 0.0,
+            "latency_p95_ms": round(p95 * 1000, 1),
+            "latency_max_ms": round(self.max_latency * 1000, 1),
+            "queue_wait_max_ms": round(self.max_queue_wait * 1000, 1),
+        }
+
+
+class UpdateWorkerPool:
+    """
+    Update'lar uchun N ta navbat + N ta worker.
+    Bitta foydalanuvchining update'lari bitta navbatga tushadi va ketma-ket bajariladi.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, workers=8, queue_size=1000):
+        self.dp = dispatcher
+        self.workers = workers
+        self.queues = [asyncio.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.metrics = UpdateMetrics()
+        self._tasks = []
+        self._accepting = False
+
+    def start(self):
+        self._accepting = True
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self.queues]
+        self._tasks.append(asyncio.create_task(self._log_metrics()))
+
+    @property
+    def accepting(self):
+        return self._accepting
+
+    async def put(self, data):
+        """Update'ni foydalanuvchi navbatiga qo'yadi (navbat to'la bo'lsa kutadi)."""
+        self.metrics.received += 1
+        queue = self.queues[update_user_id(data) % self.workers]
+        await queue.put((time.monotonic(), data))
+
+    async def _worker(self, queue):
+        Bot.set_current(self.dp.bot)
+        Dispatcher.set_current(self.dp)
+        while True:
+            enqueued_at, data = await queue.get()
+            started = time.monotonic()
+            ok = True
+            try:
+                await self.dp.process_update(types.Update(**data))
+            except Exception:
+                ok = False
+                logger.exception(f"Update {data.get('update_id')} qayta ishlashda xato")
+            finally:
+                self.metrics.observe(time.monotonic() - started, started - enqueued_at, ok)
+                queue.task_done()
+
+    async def _log_metrics(self):
+        while True:
+            await asyncio.sleep(METRICS_LOG_INTERVAL)
+            logger.info(f"📊 Update navbati: {self.snapshot()}")
+
+    def snapshot(self):
+        return self.metrics.snapshot([q.qsize() for q in self.queues])
+
+    async def drain(self, timeout=30):
+        """Yangi update qabul qilishni to'xtatadi va navbatdagilarni tugatadi."""
+        self._accepting = False
+        pending = sum(q.qsize() for q in self.queues)
+        if pending:
+            logger.info(f"⏳ Navbatdagi {pending} ta update tugatilmoqda...")
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            left = sum(q.qsize() for q in self.queues)
+            logger.warning(f"⚠️ Drain vaqti tugadi, {left} ta update qayta ishlanmadi")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def build_webhook_app(pool: UpdateWorkerPool, path, secret_token):
+    """
+    aiohttp ilova: POST <path> — update qabul qilish, GET <path>/metrics — metrikalar.
+    Ikkala yo'l ham X-Telegram-Bot-Api-Secret-Token sarlavhasini talab qiladi — secret_token
+    majburiy (aks holda soxta update bilan admin handlerlarini chaqirish mumkin bo'lar edi).
+    """
+    if not secret_token:
+        raise ValueError("Webhook uchun secret_token (WEBHOOK_SECRET) bo'sh bo'lmasligi kerak")
+    expected = secret_token.encode()
+
+    def authorized(request):
+        received = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '').encode()
+        return hmac.compare_digest(received, expected)
+
+    async def receive_update(request):
+        if not authorized(request):
+            return web.Response(status=403)
+        if not pool.accepting:
+            # Telegram keyinroq qayta yuboradi
+            return web.Response(status=503)
+        await pool.put(await request.json())
+        return web.Response(status=200)
+
+    async def metrics(request):
+        if not authorized(request):
+            return web.Response(status=403)
+        return web.json_response({**pool.snapshot(), "db": db_stats()})
+
+    app = web.Application()
+    app.router.add_post(path, receive_update)
+    app.router.add_get(path.rstrip('/') + '/metrics', metrics)
+    return app